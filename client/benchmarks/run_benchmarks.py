@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmarks of the client's own hot paths: serializing request bodies, parsing
+responses, comparing document lists, generating documents, writing the HTTP log and
+sending requests over HTTP and WebSocket.  Nothing here needs a Test Server or a
+backend; requests go to the in-memory stand-ins (LocalTestServer and
+LocalSyncGateway), so what is measured is the client's side of each call.
+
+The results are written as JSON (see cbltest.microbench), and if a baseline written
+by an earlier run is given, any benchmark that got slower by more than the tolerance
+is listed and the script exits with status 1.  Timings are only comparable between
+runs on the same machine, so keep a baseline per machine (e.g. from the commit being
+compared against) rather than sharing one.
+
+Usage:
+    uv run client/benchmarks/run_benchmarks.py --output results.json
+    uv run client/benchmarks/run_benchmarks.py --baseline results.json --tolerance 0.2
+"""
+
+import argparse
+import asyncio
+import copy
+import os
+import sys
+import tempfile
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+import cbltest.requests as cbl_requests
+import cbltest.v1.requests as v1_requests
+import cbltest.v1.responses as v1_responses
+import cbltest.v2.requests as v2_requests
+from cbltest.api import testserver
+from cbltest.api.database import AllDocumentsEntry
+from cbltest.api.json_generator import JSONGenerator
+from cbltest.api.jsonserializable import JSONDictionary
+from cbltest.api.replicator_types import ReplicatorType
+from cbltest.api.syncgateway import AllDocumentsResponse, DatabaseConfig, DocumentUpdateEntry
+from cbltest.api.test_functions import compare_doc_results
+from cbltest.configparser import ParsedConfig
+from cbltest.httplog import get_next_writer
+from cbltest.jsonhelper import json_equivalent
+from cbltest.localsyncgateway import LocalSyncGateway
+from cbltest.localtestserver import LocalTestServer
+from cbltest.microbench import (
+    BenchmarkResult,
+    find_regressions,
+    format_seconds,
+    load_results,
+    measure,
+    measure_async,
+    write_results,
+)
+from cbltest.request_types import DatabaseUpdateEntry, DatabaseUpdateType
+from cbltest.response_types import PostGetAllDocumentsEntry
+
+# A benchmark takes the rounds and minimum round time, and returns its result
+_Benchmark = Callable[[int, float], Awaitable[BenchmarkResult]]
+_BENCHMARKS: dict[str, _Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[_Benchmark], _Benchmark]:
+    def deco(func: _Benchmark) -> _Benchmark:
+        _BENCHMARKS[name] = func
+        return func
+
+    return deco
+
+
+def _documents(count: int) -> dict[str, Any]:
+    return JSONGenerator(seed=1, size=count).generate_all_documents()
+
+
+def _update_entries(count: int) -> list[DatabaseUpdateEntry]:
+    return [
+        DatabaseUpdateEntry(
+            DatabaseUpdateType.UPDATE,
+            "_default._default",
+            f"doc_{i}",
+            [{"name.first": f"first_{i}", "tags[2]": "tag"}],
+            ["name.middle"],
+        )
+        for i in range(count)
+    ]
+
+
+@benchmark("serialize.json_dictionary")
+async def _serialize_json_dictionary(rounds: int, min_round_time: float) -> BenchmarkResult:
+    body = JSONDictionary({"docs": list(_documents(500).values())})
+    return measure("serialize.json_dictionary", body.serialize, rounds=rounds, min_round_time=min_round_time)
+
+
+@benchmark("serialize.update_database_v1")
+async def _serialize_update_database_v1(rounds: int, min_round_time: float) -> BenchmarkResult:
+    body = v1_requests.PostUpdateDatabaseRequestBody(database="db1", updates=_update_entries(1000))
+    return measure("serialize.update_database_v1", body.serialize, rounds=rounds, min_round_time=min_round_time)
+
+
+@benchmark("serialize.update_database_v2")
+async def _serialize_update_database_v2(rounds: int, min_round_time: float) -> BenchmarkResult:
+    body = v2_requests.PostUpdateDatabaseRequestBody(database="db1", updates=_update_entries(1000))
+    return measure("serialize.update_database_v2", body.serialize, rounds=rounds, min_round_time=min_round_time)
+
+
+@benchmark("parse.get_all_documents")
+async def _parse_get_all_documents(rounds: int, min_round_time: float) -> BenchmarkResult:
+    body = {"_default._default": [{"id": f"doc_{i}", "rev": f"{i:x}@source"} for i in range(10000)]}
+    return measure(
+        "parse.get_all_documents",
+        lambda: v1_responses.PostGetAllDocumentsResponse(200, "uuid", body),
+        rounds=rounds,
+        min_round_time=min_round_time,
+    )
+
+
+@benchmark("parse.replicator_status")
+async def _parse_replicator_status(rounds: int, min_round_time: float) -> BenchmarkResult:
+    body = {
+        "activity": "BUSY",
+        "progress": {"completed": False},
+        "documents": [
+            {"collection": "_default._default", "documentID": f"doc_{i}", "isPush": i % 2 == 0, "flags": []}
+            for i in range(1000)
+        ],
+    }
+    return measure(
+        "parse.replicator_status",
+        lambda: v1_responses.PostGetReplicatorStatusResponse(200, "uuid", body),
+        rounds=rounds,
+        min_round_time=min_round_time,
+    )
+
+
+@benchmark("parse.sgw_all_docs")
+async def _parse_sgw_all_docs(rounds: int, min_round_time: float) -> BenchmarkResult:
+    rows = [{"key": f"doc_{i}", "id": f"doc_{i}", "value": {"rev": f"1-{i:032x}"}} for i in range(10000)]
+    body = {"total_rows": len(rows), "rows": rows}
+    return measure(
+        "parse.sgw_all_docs", lambda: AllDocumentsResponse(body), rounds=rounds, min_round_time=min_round_time
+    )
+
+
+@benchmark("compare_doc_results.100k")
+async def _compare_doc_results(rounds: int, min_round_time: float) -> BenchmarkResult:
+    rows = [{"key": f"doc_{i}", "id": f"doc_{i}", "value": {"rev": f"1-{i:032x}"}} for i in range(100000)]
+    remote = AllDocumentsResponse({"total_rows": len(rows), "rows": rows}).rows
+    local = [AllDocumentsEntry(PostGetAllDocumentsEntry({"id": r.id, "rev": r.revid})) for r in remote]
+
+    def compare() -> None:
+        assert compare_doc_results(local, remote, ReplicatorType.PUSH_AND_PULL).success
+
+    return measure("compare_doc_results.100k", compare, rounds=rounds, min_round_time=min_round_time)
+
+
+@benchmark("json_equivalent.equal")
+async def _json_equivalent_equal(rounds: int, min_round_time: float) -> BenchmarkResult:
+    left = _documents(1000)
+    right = copy.deepcopy(left)
+    return measure(
+        "json_equivalent.equal",
+        lambda: json_equivalent(left, right),
+        rounds=rounds,
+        min_round_time=min_round_time,
+    )
+
+
+@benchmark("json_equivalent.unordered")
+async def _json_equivalent_unordered(rounds: int, min_round_time: float) -> BenchmarkResult:
+    left = list(_documents(200).values())
+    right = list(reversed(copy.deepcopy(left)))
+    return measure(
+        "json_equivalent.unordered",
+        lambda: json_equivalent(left, right, unordered_arrays=True),
+        rounds=rounds,
+        min_round_time=min_round_time,
+    )
+
+
+@benchmark("json_generator.generate")
+async def _json_generator(rounds: int, min_round_time: float) -> BenchmarkResult:
+    generator = JSONGenerator(seed=1, size=1000)
+    return measure(
+        "json_generator.generate", generator.generate_all_documents, rounds=rounds, min_round_time=min_round_time
+    )
+
+
+@benchmark("http_log.write")
+async def _http_log_write(rounds: int, min_round_time: float) -> BenchmarkResult:
+    payload = JSONDictionary({"docs": list(_documents(20).values())}).serialize()
+
+    def write() -> None:
+        writer = get_next_writer()
+        writer.write_begin("Sync Gateway [http://localhost:4985] -> POST /db/_bulk_docs", payload)
+        writer.write_end("Sync Gateway [http://localhost:4985] <- POST /db/_bulk_docs 201", payload)
+
+    return measure("http_log.write", write, rounds=rounds, min_round_time=min_round_time)
+
+
+@asynccontextmanager
+async def _test_server(transport: str) -> AsyncGenerator[cbl_requests.RequestFactory]:
+    async with LocalTestServer() as local_server:
+        url = local_server.url if transport == "http" else "http://localhost:5173"
+        factory = cbl_requests.RequestFactory(ParsedConfig({"test-servers": [{"url": url, "transport": transport}]}))
+        try:
+            if transport == "ws":
+                start = asyncio.create_task(factory.start())
+                while factory.ws_router_port is None:
+                    await asyncio.sleep(0.01)
+
+                await local_server.connect(f"ws://localhost:{factory.ws_router_port}/")
+                await start
+
+            info = await testserver.TestServer(factory, 0, url, "4.0").get_info()
+            factory.version = info.version
+            yield factory
+        finally:
+            await factory.close()
+
+
+async def _test_server_log(transport: str, rounds: int, min_round_time: float) -> BenchmarkResult:
+    async with _test_server(transport) as factory:
+
+        async def log() -> None:
+            request = factory.create_request(cbl_requests.TestServerRequestType.LOG, msg="benchmark")
+            await factory.send_request(0, request)
+
+        return await measure_async(f"test_server.{transport}.log", log, rounds=rounds, min_round_time=min_round_time)
+
+
+@benchmark("test_server.http.log")
+async def _test_server_http(rounds: int, min_round_time: float) -> BenchmarkResult:
+    return await _test_server_log("http", rounds, min_round_time)
+
+
+@benchmark("test_server.ws.log")
+async def _test_server_ws(rounds: int, min_round_time: float) -> BenchmarkResult:
+    return await _test_server_log("ws", rounds, min_round_time)
+
+
+@benchmark("sync_gateway.get_all_documents")
+async def _sync_gateway_all_docs(rounds: int, min_round_time: float) -> BenchmarkResult:
+    with LocalSyncGateway() as local_sgw:
+        sg = local_sgw.sync_gateway()
+        try:
+            await sg.put_database("db", DatabaseConfig(bucket="db"))
+            updates = [DocumentUpdateEntry(k, None, v) for k, v in _documents(5000).items()]
+            await sg.update_documents("db", updates)
+            return await measure_async(
+                "sync_gateway.get_all_documents",
+                lambda: sg.get_all_documents("db"),
+                rounds=rounds,
+                min_round_time=min_round_time,
+            )
+        finally:
+            await sg.close()
+
+
+@benchmark("sync_gateway.upsert_documents")
+async def _sync_gateway_upsert(rounds: int, min_round_time: float) -> BenchmarkResult:
+    with LocalSyncGateway() as local_sgw:
+        sg = local_sgw.sync_gateway()
+        try:
+            await sg.put_database("db", DatabaseConfig(bucket="db"))
+            docs = _documents(50)
+            await sg.update_documents("db", [DocumentUpdateEntry(k, None, v) for k, v in docs.items()])
+
+            async def upsert() -> None:
+                await sg.upsert_documents("db", [DocumentUpdateEntry(k, None, {"updated": True}) for k in docs])
+
+            return await measure_async(
+                "sync_gateway.upsert_documents", upsert, rounds=rounds, min_round_time=min_round_time
+            )
+        finally:
+            await sg.close()
+
+
+async def _run(names: list[str], rounds: int, min_round_time: float) -> list[BenchmarkResult]:
+    results: list[BenchmarkResult] = []
+    for name in names:
+        result = await _BENCHMARKS[name](rounds, min_round_time)
+        print(f"{name:<40} {format_seconds(result.seconds):>10}/op {result.ops_per_second:>12,.1f} op/s")
+        results.append(result)
+
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Runs the client micro-benchmarks")
+    parser.add_argument("--output", type=Path, help="The file to write the results to (JSON)")
+    parser.add_argument("--baseline", type=Path, help="Results from an earlier run to check for regressions against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="How much slower than the baseline a benchmark may be (default 0.25, i.e. 25%%)",
+    )
+    parser.add_argument("--rounds", type=int, default=5, help="The number of rounds to time each benchmark for")
+    parser.add_argument("--min-round-time", type=float, default=0.2, help="The minimum time (in seconds) of each round")
+    parser.add_argument("-k", dest="filter", help="Only run the benchmarks whose name contains this")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    args = parser.parse_args()
+
+    names = [n for n in _BENCHMARKS if args.filter is None or args.filter in n]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix="cbl-bench-") as log_dir:
+        # Keep the HTTP logs of the benchmarks out of the real http_log folder (which
+        # RequestFactory would also clear)
+        os.environ["CBL_HTTP_LOG_DIR"] = str(Path(log_dir) / "http_log")
+        results = asyncio.run(_run(names, args.rounds, args.min_round_time))
+
+    if args.output is not None:
+        write_results(args.output, results)
+        print(f"Results written to {args.output}")
+
+    if args.baseline is None:
+        return 0
+
+    regressions = find_regressions(results, load_results(args.baseline), args.tolerance)
+    if not regressions:
+        print(f"No benchmark is more than {args.tolerance:.0%} slower than {args.baseline}")
+        return 0
+
+    print(f"{len(regressions)} benchmark(s) are more than {args.tolerance:.0%} slower than {args.baseline}:")
+    for regression in regressions:
+        print(f"  {regression}")
+
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
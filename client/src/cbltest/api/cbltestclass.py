@@ -10,6 +10,7 @@ from cbltest.api.testserver import TestServer
 from cbltest.globals import CBLPyTestGlobal
 from cbltest.logging import cbl_info, cbl_warning
 from cbltest.responses import ServerVariant
+from cbltest.steptiming import recorder
 
 
 class CBLTestClass(ABC):
@@ -25,9 +26,10 @@ class CBLTestClass(ABC):
 
     def mark_test_step(self, description: str) -> None:
         """
-        Lets the TDK know that a new test step is about to be performed.  Currently
-        all this does is log to the test server log, but could be expanded.
+        Lets the TDK know that a new test step is about to be performed.  The step
+        is logged, and timed for the step timing report (see cbltest.steptiming).
         """
+        recorder().begin_step(self.__step, description)
         cbl_info(f"Moving to step {self.__step}:")
         self.__step += 1
         for line in description.splitlines():
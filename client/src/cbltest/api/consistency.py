@@ -0,0 +1,230 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+
+from opentelemetry.trace import get_tracer
+
+from cbltest.api.couchbaseserver import CouchbaseServer
+from cbltest.api.database import Database
+from cbltest.api.edgeserver import EdgeServer
+from cbltest.api.syncgateway import SyncGateway
+from cbltest.version import VERSION
+
+VersionedDocument = tuple[str, str | None]
+"""A document ID paired with its version (rev ID or CV), or None if the source has no comparable version"""
+
+_tracer = get_tracer("consistency", VERSION)
+
+
+class ConsistencySource(ABC):
+    """
+    A collection on one of the systems under test (Couchbase Lite, Sync Gateway, Couchbase Server
+    or Edge Server) that can list its document IDs and versions for :func:`check_consistency`
+    """
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Gets a human readable name for the collection, used in reports"""
+
+    @abstractmethod
+    async def fetch_versions(self) -> Iterable[VersionedDocument]:
+        """Lists the ID and version of every document in the collection"""
+
+
+class DatabaseCollectionSource(ConsistencySource):
+    """A collection inside a Couchbase Lite database on a test server"""
+
+    def __init__(self, db: Database, collection: str) -> None:
+        self.__db = db
+        self.__collection = collection
+
+    @property
+    def name(self) -> str:
+        return f"cbl:{self.__db.name}.{self.__collection}"
+
+    async def fetch_versions(self) -> Iterable[VersionedDocument]:
+        all_docs = await self.__db.get_all_documents(self.__collection)
+        return ((entry.id, entry.rev) for entry in all_docs[self.__collection])
+
+
+class SyncGatewayCollectionSource(ConsistencySource):
+    """
+    A collection on Sync Gateway.  `version` selects which of the rev ID ("revid") or the
+    current version ("cv") is compared, and should match what the other side reports.
+    """
+
+    def __init__(
+        self,
+        sg: SyncGateway,
+        db_name: str,
+        scope: str = "_default",
+        collection: str = "_default",
+        version: str = "revid",
+    ) -> None:
+        assert version in ("revid", "cv"), f"Invalid version kind '{version}' (expecting 'revid' or 'cv')"
+        self.__sg = sg
+        self.__db_name = db_name
+        self.__scope = scope
+        self.__collection = collection
+        self.__version = version
+
+    @property
+    def name(self) -> str:
+        return f"sgw:{self.__db_name}.{self.__scope}.{self.__collection}"
+
+    async def fetch_versions(self) -> Iterable[VersionedDocument]:
+        all_docs = await self.__sg.get_all_documents(self.__db_name, self.__scope, self.__collection)
+        if self.__version == "cv":
+            return ((row.id, row.cv) for row in all_docs.rows)
+
+        return ((row.id, row.revid) for row in all_docs.rows)
+
+
+class EdgeServerCollectionSource(ConsistencySource):
+    """A collection on Edge Server"""
+
+    def __init__(self, es: EdgeServer, db_name: str, scope: str = "", collection: str = "") -> None:
+        self.__es = es
+        self.__db_name = db_name
+        self.__scope = scope
+        self.__collection = collection
+
+    @property
+    def name(self) -> str:
+        return f"edge:{self.__es.keyspace_builder(self.__db_name, self.__scope, self.__collection)}"
+
+    async def fetch_versions(self) -> Iterable[VersionedDocument]:
+        all_docs = await self.__es.get_all_documents(self.__db_name, self.__scope, self.__collection)
+        return ((row.id, row.revision) for row in all_docs.rows)
+
+
+class CouchbaseServerCollectionSource(ConsistencySource):
+    """
+    A collection on Couchbase Server.  Server CAS values are not comparable with mobile
+    versions, so only document IDs are listed (via a query that returns nothing but IDs)
+    and comparisons against this source check presence only.
+    """
+
+    def __init__(
+        self, cbs: CouchbaseServer, bucket: str, scope: str = "_default", collection: str = "_default"
+    ) -> None:
+        self.__cbs = cbs
+        self.__bucket = bucket
+        self.__scope = scope
+        self.__collection = collection
+
+    @property
+    def name(self) -> str:
+        return f"cbs:{self.__bucket}.{self.__scope}.{self.__collection}"
+
+    async def fetch_versions(self) -> Iterable[VersionedDocument]:
+        # The SDK call is blocking, so keep it off the event loop.  run_query returns
+        # rows as dicts, so the ID is selected as a field rather than RAW, and the '_'
+        # is escaped since LIKE treats it as a single character wildcard
+        rows = await asyncio.to_thread(
+            self.__cbs.run_query,
+            r'SELECT META().id AS id FROM {} WHERE META().id NOT LIKE "\\_sync:%"',
+            self.__bucket,
+            self.__scope,
+            self.__collection,
+        )
+        return ((str(row["id"]), None) for row in rows)
+
+
+def _canonical_version(version: str | None) -> str:
+    if version is None:
+        return ""
+
+    # Compare only the version part of a CV, since Couchbase Lite may report the
+    # source as '*' until CBL-6443 is fixed
+    at = version.find("@")
+    return version[:at] if at > 0 else version
+
+
+class ConsistencyReport:
+    """The result of :func:`check_consistency`.  Evaluates as truthy when the collections match."""
+
+    @property
+    def consistent(self) -> bool:
+        """Gets whether or not the two collections contain the same documents at the same versions"""
+        return not self.missing_left and not self.missing_right and not self.mismatched
+
+    def __init__(self, left_name: str, right_name: str) -> None:
+        self.left_name = left_name
+        """The name of the lefthand collection"""
+
+        self.right_name = right_name
+        """The name of the righthand collection"""
+
+        self.missing_left: list[str] = []
+        """IDs of documents present on the right but not the left"""
+
+        self.missing_right: list[str] = []
+        """IDs of documents present on the left but not the right"""
+
+        self.mismatched: list[tuple[str, str, str]] = []
+        """(ID, left version, right version) of documents present on both sides with different versions"""
+
+    def __bool__(self) -> bool:
+        return self.consistent
+
+    def __str__(self) -> str:
+        if self.consistent:
+            return f"{self.left_name} and {self.right_name} are consistent"
+
+        def sample(ids: list[str]) -> str:
+            return ", ".join(ids[:5]) + (", ..." if len(ids) > 5 else "")
+
+        lines = [f"{self.left_name} and {self.right_name} diverge:"]
+        if self.missing_right:
+            lines.append(f"  {len(self.missing_right)} missing from {self.right_name}: {sample(self.missing_right)}")
+
+        if self.missing_left:
+            lines.append(f"  {len(self.missing_left)} missing from {self.left_name}: {sample(self.missing_left)}")
+
+        if self.mismatched:
+            pairs = [f"{doc_id} ({left} != {right})" for doc_id, left, right in self.mismatched]
+            lines.append(f"  {len(self.mismatched)} with different versions: {sample(pairs)}")
+
+        return "\n".join(lines)
+
+
+async def check_consistency(
+    left: ConsistencySource,
+    right: ConsistencySource,
+    compare_versions: bool = True,
+) -> ConsistencyReport:
+    """
+    Checks that two collections, possibly on different systems, contain the same documents.
+    Both sides are listed in full, concurrently (none of the systems can summarize a
+    collection server side, so there is no cheaper way to tell where they differ), and the
+    listings are diffed by document ID and version in one pass over each.
+
+    :param left: The lefthand collection
+    :param right: The righthand collection
+    :param compare_versions: If false, or if either side has no comparable versions, only
+                             document presence is checked
+    """
+    with _tracer.start_as_current_span(
+        "check_consistency",
+        attributes={"cbl.consistency.left": left.name, "cbl.consistency.right": right.name},
+    ):
+        left_docs, right_docs = await asyncio.gather(left.fetch_versions(), right.fetch_versions())
+        left_versions = dict(left_docs)
+        right_versions = dict(right_docs)
+        if None in left_versions.values() or None in right_versions.values():
+            compare_versions = False
+
+        report = ConsistencyReport(left.name, right.name)
+        for doc_id, version in left_versions.items():
+            if doc_id not in right_versions:
+                report.missing_right.append(doc_id)
+            elif compare_versions:
+                left_version = _canonical_version(version)
+                right_version = _canonical_version(right_versions[doc_id])
+                if left_version != right_version:
+                    report.mismatched.append((doc_id, left_version, right_version))
+
+        report.missing_left.extend(doc_id for doc_id in right_versions if doc_id not in left_versions)
+        return report
@@ -1,15 +1,14 @@
-import asyncio
 import os
 import platform
 import subprocess
 import tempfile
 import time
 import zipfile
-from collections.abc import Callable, Sequence
+from collections.abc import Callable, Generator, Sequence
+from contextlib import contextmanager
 from datetime import timedelta
 from pathlib import Path
-from time import sleep
-from typing import TypeVar, cast
+from typing import Any, TypeVar, cast
 
 import aiohttp
 
@@ -33,14 +32,33 @@ from couchbase.management.buckets import CreateBucketSettings
 from couchbase.management.options import CreatePrimaryQueryIndexOptions
 from couchbase.options import ClusterOptions, ClusterTimeoutOptions
 from couchbase.subdocument import upsert
-from opentelemetry.trace import get_tracer
+from opentelemetry.trace import Span, get_tracer
 
 from cbltest.api.error import CblTestError
+from cbltest.latency import cbs_path_template, record_latency, timed
 from cbltest.logging import cbl_warning
+from cbltest.steptiming import COUCHBASE_SERVER, blocking_wait, record_call, service_call, wait
 from cbltest.utils import _try_n_times
 from cbltest.version import VERSION
 
 
+def _record_rest_call(resp: requests.Response, *args: Any, **kwargs: Any) -> None:
+    # REST calls made outside of an operation (e.g. health checks) still count
+    # towards the time spent in Couchbase Server
+    record_call(COUCHBASE_SERVER, resp.elapsed.total_seconds())
+    # requests only leaves these unset on a Response it hasn't received yet
+    method = resp.request.method if resp.request is not None else None
+    status: int | None = resp.status_code
+    assert status is not None, "response hooks only see received responses"
+    record_latency(
+        COUCHBASE_SERVER,
+        method or "GET",
+        cbs_path_template(urlparse(str(resp.url)).path),
+        status,
+        resp.elapsed.total_seconds(),
+    )
+
+
 class CouchbaseServer:
     """
     A class that interacts with a Couchbase Server cluster
@@ -89,11 +107,11 @@ class CouchbaseServer:
             if node_needs_recovery:
                 self.recover(cbs_node)
                 self.rebalance()
-                time.sleep(5)
+                blocking_wait(5)
             elif not node_in_cluster:
                 self.add_node(cbs_node)
                 self.rebalance()
-                time.sleep(5)
+                blocking_wait(5)
             # If node is in cluster and active, do nothing
 
         if not self.wait_for_cluster_healthy(timeout=120):
@@ -101,7 +119,7 @@ class CouchbaseServer:
 
     def __init__(self, url: str, username: str, password: str) -> None:
         self.__tracer = get_tracer(__name__, VERSION)
-        with self.__tracer.start_as_current_span("connect_to_couchbase_server"):
+        with self._operation("connect_to_couchbase_server"):
             if "://" not in url:
                 url = f"couchbase://{url}"
 
@@ -130,6 +148,19 @@ class CouchbaseServer:
             # Create a reusable HTTP session for REST API calls
             self.__http_session = requests.Session()
             self.__http_session.auth = (username, password)
+            self.__http_session.hooks["response"].append(_record_rest_call)
+
+    @contextmanager
+    def _operation(self, name: str, attributes: dict[str, Any] | None = None) -> Generator[Span]:
+        # Every operation is traced, and timed for the step timing report and the
+        # latency histograms (with the operation name in place of a path).  The span
+        # is yielded so that the operation can add events to it.
+        with (
+            service_call(COUCHBASE_SERVER),
+            timed(COUCHBASE_SERVER, "operation", name),
+            self.__tracer.start_as_current_span(name, attributes=attributes) as span,
+        ):
+            yield span
 
     def _parse_connection_url(self, url: str) -> None:
         """
@@ -160,7 +191,7 @@ class CouchbaseServer:
                       if it doesn't already exist, unless it is the default scope
         :param names: The names of the collections to create
         """
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "Create Scope",
             attributes={"cbl.scope.name": scope, "cbl.bucket.name": bucket},
         ):
@@ -173,7 +204,7 @@ class CouchbaseServer:
                 pass
 
             for name in names:
-                with self.__tracer.start_as_current_span(
+                with self._operation(
                     "Create Collection",
                     attributes={
                         "cbl.scope.name": scope,
@@ -196,7 +227,7 @@ class CouchbaseServer:
                         break
                     except Exception:
                         cbl_warning(f"{bucket}.{scope}.{name} appears to not be ready yet, waiting for 1 second...")
-                        sleep(1.0)
+                        blocking_wait(1.0)
 
                 if not success:
                     raise CblTestError(f"Unable to properly create {bucket}.{scope}.{name} in Couchbase Server")
@@ -216,7 +247,7 @@ class CouchbaseServer:
         :param retries: Number of readiness checks to perform (default 60)
         :param interval: Seconds to wait between checks (default 2.0)
         """
-        with self.__tracer.start_as_current_span("create_bucket", attributes={"cbl.bucket.name": name}):
+        with self._operation("create_bucket", attributes={"cbl.bucket.name": name}):
             mgr = self.__cluster.buckets()
             settings = CreateBucketSettings(
                 name=name,
@@ -234,7 +265,7 @@ class CouchbaseServer:
             for _ in range(retries):
                 if self.bucket_healthy(name) and self.bucket_kv_responding(name) and self.collections_ready(name):
                     return
-                sleep(interval)
+                blocking_wait(interval)
             raise TimeoutError(f"Bucket {name} did not become ready")
 
     def drop_bucket(self, name: str) -> None:
@@ -243,7 +274,7 @@ class CouchbaseServer:
 
         :param name: The name of the bucket to drop
         """
-        with self.__tracer.start_as_current_span("drop_bucket", attributes={"cbl.bucket.name": name}):
+        with self._operation("drop_bucket", attributes={"cbl.bucket.name": name}):
             try:
                 mgr = self.__cluster.buckets()
                 mgr.drop_bucket(name)
@@ -292,7 +323,7 @@ class CouchbaseServer:
 
         :return: A list of bucket names
         """
-        with self.__tracer.start_as_current_span("get_bucket_names"):
+        with self._operation("get_bucket_names"):
             buckets_resp = self.__http_session.get(f"http://{self.__hostname}:8091/pools/default/buckets")
             buckets_resp.raise_for_status()
             buckets_data = buckets_resp.json()
@@ -308,9 +339,7 @@ class CouchbaseServer:
         Waits for a bucket to be fully deleted from the Couchbase cluster.
         Async because deletion is eventual and requires polling remote state.
         """
-        with self.__tracer.start_as_current_span(
-            "wait_for_bucket_deleted", attributes={"cbl.bucket.name": bucket_name}
-        ):
+        with self._operation("wait_for_bucket_deleted", attributes={"cbl.bucket.name": bucket_name}):
             for _ in range(max_retries):
                 try:
                     # If bucket no longer exists, deletion is complete
@@ -319,7 +348,7 @@ class CouchbaseServer:
                 except Exception:
                     # Treat errors as "bucket gone"
                     return
-                await asyncio.sleep(retry_delay)
+                await wait(retry_delay)
 
             raise CblTestError(f"Bucket '{bucket_name}' was not deleted after {max_retries * retry_delay} seconds")
 
@@ -342,7 +371,7 @@ class CouchbaseServer:
             with no expiry (``--replace-ttl expired --replace-ttl-with 0``) so
             they are not purged on access.
         """
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "restore_bucket",
             attributes={"cbl.bucket.name": name, "cbl.backup.source": dataset_name},
         ):
@@ -405,7 +434,7 @@ class CouchbaseServer:
 
         :param bucket: The bucket to check for indexes
         """
-        with self.__tracer.start_as_current_span("indexes_count", attributes={"cbl.bucket.name": bucket}):
+        with self._operation("indexes_count", attributes={"cbl.bucket.name": bucket}):
             index_mgr = self.__cluster.query_indexes()
             indexes = list(index_mgr.get_all_indexes(bucket))
             return len(indexes)
@@ -431,7 +460,7 @@ class CouchbaseServer:
             format at execution time.
         """
         actual_query = query.format(f"{bucket}.{scope}.{collection}")
-        with self.__tracer.start_as_current_span("run_query", attributes={"cbl.query.name": actual_query}):
+        with self._operation("run_query", attributes={"cbl.query.name": actual_query}):
             query_obj = self.__cluster.query(actual_query)
             try:
                 self.__cluster.query_indexes().create_primary_index(
@@ -460,7 +489,7 @@ class CouchbaseServer:
         :param doc_id: The document ID.
         :param document: The document content (a dictionary).
         """
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "insert_document",
             attributes={
                 "cbl.bucket.name": bucket,
@@ -486,7 +515,7 @@ class CouchbaseServer:
         """
         Deletes a document from the specified bucket.scope.collection.
         """
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "delete_document",
             attributes={
                 "cbl.bucket.name": bucket,
@@ -520,7 +549,7 @@ class CouchbaseServer:
         :param collection: The collection name.
         :return: The document content as a dictionary, or None if not found.
         """
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "get_document",
             attributes={
                 "cbl.bucket.name": bucket,
@@ -558,7 +587,7 @@ class CouchbaseServer:
         :param scope: The scope containing the document (default '_default')
         :param collection: The collection containing the document (default '_default')
         """
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "upsert_document_xattr",
             attributes={
                 "cbl.bucket": bucket,
@@ -596,7 +625,7 @@ class CouchbaseServer:
         :param scope: The scope containing the document (default '_default')
         :param collection: The collection containing the document (default '_default')
         """
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "delete_document_xattr",
             attributes={
                 "cbl.bucket": bucket,
@@ -625,7 +654,7 @@ class CouchbaseServer:
         :param source_bucket: The bucket on this cluster to replicate from
         :param target_bucket: The bucket on the target cluster to replicate to
         """
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "start_xdcr",
             attributes={
                 "cbl.bucket": bucket_name,
@@ -710,7 +739,7 @@ class CouchbaseServer:
         :param source_bucket: The bucket on this cluster to replicate from
         :param target_bucket: The bucket on the target cluster to replicate to
         """
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "stop_xdcr",
             attributes={
                 "cbl.bucket": bucket_name,
@@ -763,7 +792,7 @@ class CouchbaseServer:
         if services is None:
             services = ["kv", "index", "n1ql"]
 
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "add_node",
             attributes={
                 "cbl.node.hostname": node_to_add.__hostname,
@@ -858,7 +887,7 @@ class CouchbaseServer:
         if eject_failed_nodes:
             attributes["cbl.eject_failed"] = "true"
 
-        with self.__tracer.start_as_current_span(
+        with self._operation(
             "rebalance",
             attributes=attributes,
         ):
@@ -936,7 +965,7 @@ class CouchbaseServer:
                 last_exception = e
                 if attempt < max_attempts - 1:
                     cbl_warning(f"{operation_name} failed (attempt {attempt + 1}/{max_attempts}): {e}")
-                    time.sleep(wait_seconds)
+                    blocking_wait(wait_seconds)
 
         # All attempts failed - last_exception is guaranteed to be set
         assert last_exception is not None
@@ -1034,7 +1063,7 @@ class CouchbaseServer:
 
                 # Check rebalance status
                 if pool_data.get("rebalanceStatus", "none") != "none":
-                    time.sleep(check_interval)
+                    blocking_wait(check_interval)
                     continue
 
                 # Check active nodes are healthy
@@ -1045,7 +1074,7 @@ class CouchbaseServer:
                 )
 
                 if not all_healthy:
-                    time.sleep(check_interval)
+                    blocking_wait(check_interval)
                     continue
 
                 # Check bucket vBuckets
@@ -1065,13 +1094,13 @@ class CouchbaseServer:
                         break
 
                 if not all_buckets_healthy:
-                    time.sleep(check_interval)
+                    blocking_wait(check_interval)
                     continue
 
                 return True
 
             except Exception:
-                time.sleep(check_interval)
+                blocking_wait(check_interval)
 
         return False
 
@@ -1090,7 +1119,7 @@ class CouchbaseServer:
             if status.get("status") == "none":
                 return
             # wait for 5 seconds before calling the API again
-            time.sleep(5)
+            blocking_wait(5)
 
         raise CblTestError(f"Rebalance did not complete within {timeout_seconds} seconds")
 
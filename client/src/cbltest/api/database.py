@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from itertools import islice
 from json import dumps
 from re import match
 from types import TracebackType
@@ -27,6 +30,32 @@ BASE_BLOB_URL = (
     "https://media.githubusercontent.com/media/couchbaselabs/couchbase-lite-tests/refs/heads/main/dataset/server/blobs/"
 )
 
+StreamedDocument = tuple[str, list[dict[str, Any]]]
+"""A document ID paired with the list of property updates to apply to it (see :meth:`DatabaseUpdater.upsert_document`)"""
+
+
+async def _chunked(
+    documents: Iterable[StreamedDocument] | AsyncIterable[StreamedDocument], size: int
+) -> AsyncIterator[list[StreamedDocument]]:
+    if isinstance(documents, AsyncIterable):
+        chunk: list[StreamedDocument] = []
+        async for doc in documents:
+            chunk.append(doc)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+        return
+
+    # Pull synchronous input on a worker thread so that generating the next
+    # chunk overlaps with the network I/O of the ones already in flight
+    it = iter(documents)
+    while chunk := await asyncio.to_thread(lambda: list(islice(it, size))):
+        yield chunk
+
 
 class SnapshotUpdater:
     def __init__(self, id: str) -> None:
@@ -367,6 +396,81 @@ class Database:
         """
         return DatabaseUpdater(self.__name, self.__request_factory, self.__index)
 
+    async def stream_upsert_documents(
+        self,
+        collection: str,
+        documents: Iterable[StreamedDocument] | AsyncIterable[StreamedDocument],
+        batch_size: int = 1000,
+        max_in_flight: int = 2,
+    ) -> int:
+        """
+        Upserts documents pulled lazily from a sync or async iterable, sending them to the
+        test server in chunked updateDatabase requests.  At most `max_in_flight` chunks are
+        being sent at any time, with up to `max_in_flight` more queued behind them and one
+        more being built from the iterable, so at most 2 * `max_in_flight` + 1 chunks are
+        held in memory.  The iterable is only advanced as fast as the test server accepts
+        documents, and memory use does not grow with the document count.
+
+        :param collection: The collection to upsert the documents into (scope-qualified)
+        :param documents: An iterable of (document ID, new properties) pairs
+        :param batch_size: The number of documents to send per updateDatabase request
+        :param max_in_flight: The number of updateDatabase requests that can be outstanding at once
+        :return: The number of documents that were upserted
+        """
+        assert batch_size > 0, "batch_size must be positive"
+        assert max_in_flight > 0, "max_in_flight must be positive"
+        with self.__tracer.start_as_current_span(
+            "stream_upsert_documents",
+            attributes={
+                "cbl.database.name": self.__name,
+                "cbl.collection.name": collection,
+            },
+        ):
+            queue: asyncio.Queue[list[DatabaseUpdateEntry] | None] = asyncio.Queue(maxsize=max_in_flight)
+
+            async def produce() -> None:
+                async for chunk in _chunked(documents, batch_size):
+                    await queue.put(
+                        [
+                            DatabaseUpdateEntry(DatabaseUpdateType.UPDATE, collection, doc_id, properties)
+                            for doc_id, properties in chunk
+                        ]
+                    )
+
+                for _ in range(max_in_flight):
+                    await queue.put(None)
+
+            async def consume() -> int:
+                sent = 0
+                while (updates := await queue.get()) is not None:
+                    req = self.__request_factory.create_request(
+                        TestServerRequestType.UPDATE_DB,
+                        database=self.__name,
+                        updates=updates,
+                    )
+                    resp = await self.__request_factory.send_request(self.__index, req)
+                    if resp.error is not None:
+                        cbl_error("Failed to update database (see trace log for details)")
+                        cbl_trace(resp.error.message)
+                        raise CblTestError(f"updateDatabase failed: {resp.error.message}")
+
+                    sent += len(updates)
+
+                return sent
+
+            consumers = [asyncio.create_task(consume()) for _ in range(max_in_flight)]
+            tasks = [asyncio.create_task(produce()), *consumers]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+            return sum(c.result() for c in consumers)
+
     async def get_all_documents(self, *collections: str) -> dict[str, list[AllDocumentsEntry]]:
         """
         Performs a getAllDocumentIDs request for the given collections
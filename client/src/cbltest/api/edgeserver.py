@@ -1,4 +1,3 @@
-import asyncio
 import json
 import ssl
 import urllib.parse
@@ -27,7 +26,9 @@ from cbltest.api.syncgateway import (
 from cbltest.assertions import _assert_not_null
 from cbltest.httplog import get_next_writer
 from cbltest.jsonhelper import _get_typed_required
+from cbltest.latency import sgw_path_template, timed
 from cbltest.logging import cbl_warning
+from cbltest.steptiming import EDGE_SERVER, service_call, wait
 from cbltest.version import VERSION
 
 
@@ -197,14 +198,17 @@ class EdgeServer:
             data = "" if payload is None else payload.serialize()
             writer = get_next_writer()
             writer.write_begin(f"Edge Server [{self.__hostname}] -> {method.upper()} {path}", data)
-            resp = await session.request(method, path, data=data, headers=headers, params=params)
+            # The shell endpoints are fixed, so only the REST API paths need templating
+            template = path if session is self.__shell_session else sgw_path_template(path)
+            with service_call(EDGE_SERVER), timed(EDGE_SERVER, method, template) as call:
+                resp = await session.request(method, path, data=data, headers=headers, params=params)
+                call.status = resp.status
+                if resp.content_type.startswith("application/json"):
+                    ret_val = await resp.json()
+                else:
+                    ret_val = await resp.text()
 
-            if resp.content_type.startswith("application/json"):
-                ret_val = await resp.json()
-                data = dumps(ret_val, indent=2)
-            else:
-                data = await resp.text()
-                ret_val = data
+            data = dumps(ret_val, indent=2) if resp.content_type.startswith("application/json") else ret_val
             writer.write_end(
                 f"Edge Server [{self.__hostname}] <- {method.upper()} {path} {resp.status}",
                 data,
@@ -1002,7 +1006,7 @@ class EdgeServer:
                 if status[replicator_key]["status"] == "Idle":
                     is_idle = True
                 else:
-                    await asyncio.sleep(timeout)
+                    await wait(timeout)
                     retry -= 1
             else:
                 is_idle = True
@@ -2,10 +2,20 @@ import random
 import sys
 import time
 import uuid
-from collections.abc import Callable
-from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from json import dumps
+from threading import Lock
 from typing import Any
 
+from cbltest.api.workload_profiles import WORKLOAD_PROFILES, WorkloadEstimate, WorkloadProfile
+
+_STATUSES = ["active", "inactive", "maintenance"]
+
+# The number of sample documents generated to estimate the average document size
+_ESTIMATE_SAMPLES = 256
+
 
 class JSONGenerator:
     """
@@ -16,82 +26,174 @@ class JSONGenerator:
         docs = gen.generate_all_documents()
         updated_docs = gen.update_all_documents(docs)
 
+        # Or lazily, without holding every document in memory
+        for doc_id, body in gen.iter_documents():
+            ...
+
+    Every document draws its random values from its own RNG stream, seeded from the
+    generator seed and the document ID, so the output does not depend on the order or
+    the process in which documents are generated.  Document IDs are random, so generators
+    never share IDs (even with the same seed), unless an ID seed is given, in which case
+    a generator produces the same sequence of IDs on every run while successive calls
+    still yield new IDs.
+
     Parameters:
         seed (int, optional): Random seed for reproducibility (default: random int).
         size (int, optional): Number of documents to generate (default: 60000).
         format (str, optional): Output format - "json" (dict) or "key-value" (list of dicts/documents).
                               To insert/update in CB-server/SGW/ Edge-server : use format "json".
                               To insert into test-server use format "key-value" .
+        processes (int, optional): Number of worker processes used by the *_all_documents methods
+                                   (default: 0, generate in the calling process).
+        profile (str | WorkloadProfile, optional): A workload profile (or the name of one in
+                                   WORKLOAD_PROFILES) that adds channels, nesting, arrays and padding
+                                   to each document (default: None, the small fixed document shape).
+        id_seed (int, optional): Seed for the document ID stream, to reproduce the same IDs on every run
+                                 (default: None, random IDs that are distinct across generators).
     """
 
     def __init__(
         self,
-        seed: int = random.randint(0, sys.maxsize),
+        seed: int | None = None,
         size: int = 60000,
         format: str = "json",
+        processes: int = 0,
+        profile: str | WorkloadProfile | None = None,
+        id_seed: int | None = None,
     ) -> None:
-        self.seed = seed
+        if isinstance(profile, str):
+            assert profile in WORKLOAD_PROFILES, f"Unknown workload profile '{profile}'"
+            profile = WORKLOAD_PROFILES[profile]
+
+        self.seed = seed if seed is not None else random.randint(0, sys.maxsize)
         self.size = size
         self.format = format
+        self.processes = processes
+        self.profile = profile
+        self.__id_rng = random.Random(id_seed)
+        self.__id_lock = Lock()
 
-    def generate_document(self, doc_id: str) -> dict[str, Any]:
-        """Generate a single JSON document with reproducible random data"""
-        random.seed(self.seed + int(doc_id.split("-")[0], 16))
+    def __getstate__(self) -> dict[str, Any]:
+        # Only the per-document methods run in worker processes, and those
+        # never touch the ID stream
+        state = self.__dict__.copy()
+        del state["_JSONGenerator__id_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.__id_lock = Lock()
+
+    def _document_rng(self, doc_id: str, rng: random.Random | None = None) -> random.Random:
+        seed = self.seed + int(doc_id.split("-")[0], 16)
+        if rng is None:
+            return random.Random(seed)
+
+        rng.seed(seed)
+        return rng
+
+    def _new_body(self, rng: random.Random, now: int) -> Any:
+        data = {
+            "temperature": rng.uniform(-20, 40),
+            "humidity": rng.randint(0, 100),
+            "status": rng.choice(_STATUSES),
+        }
+        metadata = {"version": 1, "created_at": now, "modified_at": now}
+        if self.profile is None:
+            if self.format == "json":
+                return {"data": data, "metadata": metadata}
+
+            return [{"data": data}, {"metadata": metadata}]
+
+        extra = self.profile.extra_properties(rng, {"data": data, "metadata": metadata})
         if self.format == "json":
-            return {
-                doc_id: {
-                    "data": {
-                        "temperature": random.uniform(-20, 40),
-                        "humidity": random.randint(0, 100),
-                        "status": random.choice(["active", "inactive", "maintenance"]),
-                    },
-                    "metadata": {
-                        "version": 1,
-                        "created_at": int(time.time()),
-                        "modified_at": int(time.time()),
-                    },
-                }
-            }
-        else:
-            return {
-                doc_id: [
-                    {
-                        "data": {
-                            "temperature": random.uniform(-20, 40),
-                            "humidity": random.randint(0, 100),
-                            "status": random.choice(["active", "inactive", "maintenance"]),
-                        }
-                    },
-                    {
-                        "metadata": {
-                            "version": 1,
-                            "created_at": int(time.time()),
-                            "modified_at": int(time.time()),
-                        }
-                    },
-                ]
-            }
+            return {"data": data, "metadata": metadata, **extra}
 
-    def update_document(self, doc: Any, doc_id: str) -> dict[str, Any]:
-        """Update a document with reproducible modifications"""
-        offset = int(doc_id.split("-")[0], 16)
-        random.seed(self.seed + offset)
+        return [{"data": data}, {"metadata": metadata}, extra]
+
+    def _updated_body(self, doc: Any, rng: random.Random, now: int) -> Any:
         if self.format == "json":
-            doc["data"]["temperature"] += random.uniform(-5, 5)
-            doc["data"]["humidity"] = (doc["data"]["humidity"] + random.randint(-10, 10)) % 100
-            doc["data"]["status"] = random.choice(["active", "inactive", "maintenance"])
+            doc["data"]["temperature"] += rng.uniform(-5, 5)
+            doc["data"]["humidity"] = (doc["data"]["humidity"] + rng.randint(-10, 10)) % 100
+            doc["data"]["status"] = rng.choice(_STATUSES)
             doc["metadata"]["version"] = doc["metadata"]["version"] + 1
-            doc["metadata"]["modified_at"] = int(time.time())
-
+            doc["metadata"]["modified_at"] = now
         else:
             doc[0]["data"] = {
-                "temperature": random.uniform(-20, 40),
-                "humidity": random.randint(0, 100),
-                "status": random.choice(["active", "inactive", "maintenance"]),
+                "temperature": rng.uniform(-20, 40),
+                "humidity": rng.randint(0, 100),
+                "status": rng.choice(_STATUSES),
             }
             doc[1]["metadata"]["version"] = doc[1]["metadata"]["version"] + 1
-            doc[1]["metadata"]["modified_at"] = int(time.time())
-        return {doc_id: doc}
+            doc[1]["metadata"]["modified_at"] = now
+
+        return doc
+
+    def blobs_for_document(self, doc_id: str) -> dict[str, str]:
+        """
+        Gets the blobs the workload profile attaches to the given document, as keypath to
+        blob name (pass as `new_blobs` when upserting).  Empty if there is no profile.
+        """
+        if self.profile is None:
+            return {}
+
+        return self.profile.blobs(random.Random(f"{self.seed}:{doc_id}:blobs"))
+
+    def estimate_bytes(self, size: int | None = None) -> WorkloadEstimate:
+        """
+        Estimates the volume of data that generating `size` documents (default: the generator
+        size) will produce, by sizing a sample of documents, without generating the workload
+        """
+        if size is None:
+            size = self.size
+
+        samples = min(size, _ESTIMATE_SAMPLES)
+        if samples == 0:
+            return WorkloadEstimate(0, 0, 0)
+
+        sample_bytes = 0
+        for i in range(samples):
+            body = self._new_body(random.Random(self.seed + i), 0)
+            if self.format != "json":
+                body = {k: v for entry in body for k, v in entry.items()}
+
+            sample_bytes += len(dumps(body, separators=(",", ":")))
+
+        blob_bytes = self.profile.mean_blob_bytes() if self.profile is not None else 0.0
+        return WorkloadEstimate(size, round(sample_bytes / samples * size), round(blob_bytes * size))
+
+    def generate_document_ids(self, size: int) -> list[str]:
+        """Draw the next `size` document IDs from this generator's ID stream"""
+        with self.__id_lock:
+            return [str(uuid.UUID(int=self.__id_rng.getrandbits(128), version=4)) for _ in range(size)]
+
+    def generate_document(self, doc_id: str) -> dict[str, Any]:
+        """Generate a single JSON document with reproducible random data"""
+        return {doc_id: self._new_body(self._document_rng(doc_id), int(time.time()))}
+
+    def update_document(self, doc: Any, doc_id: str) -> dict[str, Any]:
+        """Update a document with reproducible modifications"""
+        return {doc_id: self._updated_body(doc, self._document_rng(doc_id), int(time.time()))}
+
+    def _generate_batch(self, doc_ids: list[str]) -> list[tuple[str, Any]]:
+        # One RNG object reseeded per document and one timestamp per batch
+        rng = random.Random()
+        now = int(time.time())
+        return [(doc_id, self._new_body(self._document_rng(doc_id, rng), now)) for doc_id in doc_ids]
+
+    def _update_batch(self, docs: list[tuple[str, Any]]) -> list[tuple[str, Any]]:
+        rng = random.Random()
+        now = int(time.time())
+        return [(doc_id, self._updated_body(doc, self._document_rng(doc_id, rng), now)) for doc_id, doc in docs]
+
+    def _map_batches(
+        self, fn: Callable[[list[Any]], list[tuple[str, Any]]], batches: list[list[Any]]
+    ) -> dict[str, Any]:
+        if self.processes > 0 and len(batches) > 1:
+            with ProcessPoolExecutor(self.processes) as executor:
+                return {k: v for result in executor.map(fn, batches) for k, v in result}
+
+        return {k: v for b in batches for k, v in fn(b)}
 
     def batch_process(
         self,
@@ -100,38 +202,72 @@ class JSONGenerator:
         items_doc: dict[str, Any] | None = None,
         batch_size: int = 1000,
     ) -> dict[Any, Any]:
-        """Generic batch processing function with threading"""
-        results = {}
-
-        def process_batch(batch: list[Any]) -> dict[Any, Any]:
-            result = {}
-            for item in batch:
-                output = process_fn(items_doc[item], item) if items_doc is not None else process_fn(item)
-                result.update(output)
-            return result
-
-        with ThreadPoolExecutor() as executor:
-            futures = [
-                executor.submit(process_batch, items_ids[i : i + batch_size])
-                for i in range(0, len(items_ids), batch_size)
-            ]
-            for future in futures:
-                results.update(future.result())
+        """Generic batch processing function, spread over `processes` worker processes if set"""
+        results: dict[Any, Any] = {}
+        batches = [items_ids[i : i + batch_size] for i in range(0, len(items_ids), batch_size)]
+        if self.processes > 0 and len(batches) > 1:
+            with ProcessPoolExecutor(self.processes) as executor:
+                futures = [
+                    executor.submit(
+                        _process_batch,
+                        process_fn,
+                        b,
+                        {k: items_doc[k] for k in b} if items_doc is not None else None,
+                    )
+                    for b in batches
+                ]
+                for future in futures:
+                    results.update(future.result())
+
+            return results
+
+        for b in batches:
+            results.update(_process_batch(process_fn, b, items_doc))
 
         return results
 
-    def generate_all_documents(self, size: int | None = None) -> dict[str, Any]:
-        """Generate all documents using parallel processing"""
+    def iter_documents(self, size: int | None = None, batch_size: int = 1000) -> Iterator[tuple[str, Any]]:
+        """
+        Lazily generate (doc ID, body) pairs, only holding `batch_size` documents at a time.
+        With format "key-value" the output can be passed straight to
+        :meth:`cbltest.api.database.Database.stream_upsert_documents`.
+        """
+        remaining = self.size if size is None else size
+        while remaining > 0:
+            count = min(batch_size, remaining)
+            yield from self._generate_batch(self.generate_document_ids(count))
+            remaining -= count
+
+    def iter_updated_documents(
+        self, documents: Iterable[tuple[str, Any]], batch_size: int = 1000
+    ) -> Iterator[tuple[str, Any]]:
+        """Lazily apply :meth:`update_document` to a stream of (doc ID, body) pairs"""
+        it = iter(documents)
+        while batch := list(islice(it, batch_size)):
+            yield from self._update_batch(batch)
+
+    def generate_all_documents(self, size: int | None = None, batch_size: int = 1000) -> dict[str, Any]:
+        """Generate all documents, in worker processes if `processes` is set"""
         if size is None:
             size = self.size
 
-        doc_ids = [str(uuid.uuid4()) for _ in range(size)]
-        documents = self.batch_process(self.generate_document, doc_ids)
-        return documents
+        doc_ids = self.generate_document_ids(size)
+        return self._map_batches(
+            self._generate_batch, [doc_ids[i : i + batch_size] for i in range(0, size, batch_size)]
+        )
 
-    def update_all_documents(self, documents: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    def update_all_documents(self, documents: dict[str, Any], batch_size: int = 1000) -> dict[str, Any]:
         """Update all documents with consistent modifications"""
+        items = list(documents.items())
+        return self._map_batches(
+            self._update_batch, [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+        )
+
+
+def _process_batch(process_fn: Callable, batch: list[Any], items_doc: dict[str, Any] | None) -> dict[Any, Any]:
+    result = {}
+    for item in batch:
+        output = process_fn(items_doc[item], item) if items_doc is not None else process_fn(item)
+        result.update(output)
 
-        doc_ids = list(documents.keys())
-        updated = self.batch_process(self.update_document, doc_ids, documents)
-        return updated
+    return result
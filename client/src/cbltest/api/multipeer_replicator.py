@@ -1,4 +1,3 @@
-import asyncio
 from datetime import timedelta
 from time import time
 from typing import cast
@@ -21,6 +20,7 @@ from cbltest.response_types import (
     PostGetMultipeerReplicatorStatusResponseMethods,
     PostStartMultipeerReplicatorResponseMethods,
 )
+from cbltest.steptiming import wait
 from cbltest.version import VERSION
 
 
@@ -175,6 +175,6 @@ class MultipeerReplicator:
                     r.status.activity == ReplicatorActivityLevel.IDLE for r in next_status.replicators
                 )
                 if not all_idle:
-                    await asyncio.sleep(interval.total_seconds())
+                    await wait(interval.total_seconds())
 
             return next_status
@@ -1,4 +1,3 @@
-import asyncio
 from datetime import timedelta
 from itertools import islice
 from time import time
@@ -23,6 +22,7 @@ from cbltest.response_types import (
     PostGetReplicatorStatusResponseMethods,
     PostStartReplicatorResponseMethods,
 )
+from cbltest.steptiming import wait
 from cbltest.version import VERSION
 
 
@@ -186,7 +186,7 @@ class Replicator:
                 next_status = await self.get_status()
                 status_matches = next_status.activity == activity
                 if not status_matches:
-                    await asyncio.sleep(interval.total_seconds())
+                    await wait(interval.total_seconds())
 
             return next_status
 
@@ -237,7 +237,7 @@ class Replicator:
                 if status.activity == ReplicatorActivityLevel.STOPPED:
                     return False
 
-                await asyncio.sleep(interval.total_seconds())
+                await wait(interval.total_seconds())
 
     async def wait_for_all_doc_events(
         self,
@@ -294,7 +294,7 @@ class Replicator:
                 if len(events) == 0:
                     return status
 
-                await asyncio.sleep(0.5)
+                await wait(0.5)
                 iteration += 1
 
             raise CblTimeoutError("Timeout waiting for document update events")
@@ -345,7 +345,7 @@ class Replicator:
 
                     processed += 1
 
-                await asyncio.sleep(ping_interval.total_seconds())
+                await wait(ping_interval.total_seconds())
                 iteration += 1
 
             return None
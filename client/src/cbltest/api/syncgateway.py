@@ -24,7 +24,9 @@ from cbltest.api.error import CblSyncGatewayBadResponseError, CblTestError
 from cbltest.api.jsonserializable import JSONDictionary, JSONSerializable
 from cbltest.assertions import _assert_not_null
 from cbltest.httplog import get_next_writer
+from cbltest.latency import sgw_path_template, timed
 from cbltest.logging import cbl_error, cbl_info, cbl_trace, cbl_warning
+from cbltest.steptiming import SYNC_GATEWAY, service_call, wait
 from cbltest.utils import assert_not_null, retry_assert
 from cbltest.version import VERSION
 
@@ -738,13 +740,16 @@ class _SyncGatewayBase:
             data = "" if payload is None else payload.serialize()
             writer = get_next_writer()
             writer.write_begin(f"Sync Gateway [{self.__http_url}] -> {method.upper()} {path}", data)
-            resp = await session.request(method, path, data=data, headers=headers, params=params)
-            if resp.content_type.startswith("application/json"):
-                ret_val = await resp.json()
-                data = dumps(ret_val, indent=2)
-            else:
-                data = await resp.text()
-                ret_val = data
+            template = sgw_path_template(path)
+            with service_call(SYNC_GATEWAY), timed(SYNC_GATEWAY, method, template) as call:
+                resp = await session.request(method, path, data=data, headers=headers, params=params)
+                call.status = resp.status
+                if resp.content_type.startswith("application/json"):
+                    ret_val = await resp.json()
+                else:
+                    ret_val = await resp.text()
+
+            data = dumps(ret_val, indent=2) if resp.content_type.startswith("application/json") else ret_val
             writer.write_end(
                 f"Sync Gateway [{self.__http_url}] <- {method.upper()} {path} {resp.status}",
                 data,
@@ -884,7 +889,7 @@ class _SyncGatewayBase:
                 if e.code == 500 and retry_count < 3:
                     cbl_warning(f"Sync gateway returned 500 from DELETE database call, retrying ({retry_count + 1})...")
                     current_span.add_event("SGW returned 500, retry")
-                    await asyncio.sleep(2)
+                    await wait(2)
                     await self._delete_database(db_name, retry_count + 1)
                 elif e.code == 403 or e.code == 404:
                     pass  # Database doesn't exist anyway.
@@ -1698,7 +1703,7 @@ class _SyncGatewayBase:
             status_resp = await self.get_sgcollect_status()
             if status_resp.get("status") in ["stopped", "completed"]:
                 return
-            await asyncio.sleep(wait_time)
+            await wait(wait_time)
 
         raise Exception(
             f"SGCollect did not complete after {max_attempts * wait_time} seconds.\n"
@@ -2318,7 +2323,7 @@ class SyncGateway(_SyncGatewayBase):
                     raise Exception(
                         f"ISGR {replication_id} entered error state: {status.get('error_message', 'unknown error')}"
                     )
-                await asyncio.sleep(poll_interval)
+                await wait(poll_interval)
 
             raise TimeoutError(f"ISGR {replication_id} did not reach status '{target_status}' within {timeout} seconds")
 
@@ -168,6 +168,7 @@ async def compare_local_and_remote(
     """
     with _test_function_tracer.start_as_current_span("compare_local_and_remote"):
         lite_all_docs = await local.get_all_documents(*collections)
+        wanted_ids = set(doc_ids) if doc_ids is not None else None
 
         for collection in collections:
             split = collection.split(".")
@@ -177,9 +178,9 @@ async def compare_local_and_remote(
             lite_docs = lite_all_docs[collection]
             sg_docs = sg_all_docs.rows
 
-            if doc_ids is not None:
-                lite_docs = [entry for entry in lite_docs if entry.id in doc_ids]
-                sg_docs = [entry for entry in sg_docs if entry.id in doc_ids]
+            if wanted_ids is not None:
+                lite_docs = [entry for entry in lite_docs if entry.id in wanted_ids]
+                sg_docs = [entry for entry in sg_docs if entry.id in wanted_ids]
 
             compare_result = compare_doc_results(lite_docs, sg_docs, mode)
             assert compare_result.success, f"{compare_result.message} ({collection})"
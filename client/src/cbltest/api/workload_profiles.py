@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import random
+from json import dumps
+from math import exp, log
+from typing import Any
+
+BLOB_SIZES: dict[str, int] = {
+    "s1.jpg": 49840,
+    "s2.jpg": 45276,
+    "s3.jpg": 49569,
+    "s4.jpg": 66432,
+    "s5.jpg": 96057,
+    "s6.jpg": 47446,
+    "s7.jpg": 63559,
+    "s8.jpg": 118777,
+    "s9.jpg": 230490,
+    "s10.jpg": 199095,
+    "l1.jpg": 2017190,
+    "l2.jpg": 2011345,
+    "l3.jpg": 1794585,
+    "l4.jpg": 2025840,
+    "l5.jpg": 2641716,
+    "l6.jpg": 3181859,
+    "l7.jpg": 1697024,
+    "l8.jpg": 2286496,
+    "l9.jpg": 2838244,
+    "l10.jpg": 1986238,
+    "xl1.jpg": 21200000,
+    "xl2.jpg": 52428800,
+}
+"""The size in bytes of each blob in dataset/server/blobs (see spec/dataset/blobs.md)"""
+
+SMALL_BLOBS = [f"s{i}.jpg" for i in range(1, 11)]
+LARGE_BLOBS = [f"l{i}.jpg" for i in range(1, 11)]
+
+
+class Distribution:
+    """
+    A seedable distribution of non-negative integers, used for document sizes,
+    nesting depths, array lengths and fan-outs
+    """
+
+    def __init__(self, kind: str, low: int, high: int, median: int = 0, sigma: float = 0.0) -> None:
+        assert kind in ("fixed", "uniform", "lognormal"), f"Unknown distribution kind '{kind}'"
+        assert 0 <= low <= high, "Distribution bounds must satisfy 0 <= low <= high"
+        self.kind = kind
+        self.low = low
+        self.high = high
+        self.median = median
+        self.sigma = sigma
+
+    @staticmethod
+    def fixed(value: int) -> Distribution:
+        """A distribution that always yields `value`"""
+        return Distribution("fixed", value, value)
+
+    @staticmethod
+    def uniform(low: int, high: int) -> Distribution:
+        """A distribution yielding integers in [low, high] with equal probability"""
+        return Distribution("uniform", low, high)
+
+    @staticmethod
+    def lognormal(median: int, sigma: float, high: int, low: int = 1) -> Distribution:
+        """A long tailed distribution around `median`, clamped to [low, high]"""
+        return Distribution("lognormal", low, high, median, sigma)
+
+    def sample(self, rng: random.Random) -> int:
+        """Draws a value from the distribution using the given RNG"""
+        if self.kind == "fixed":
+            return self.low
+
+        if self.kind == "uniform":
+            return rng.randint(self.low, self.high)
+
+        return min(self.high, max(self.low, int(rng.lognormvariate(log(self.median), self.sigma))))
+
+    def mean(self) -> float:
+        """Gets the expected value of the distribution (approximate for lognormal)"""
+        if self.kind == "fixed":
+            return float(self.low)
+
+        if self.kind == "uniform":
+            return (self.low + self.high) / 2
+
+        return min(float(self.high), max(float(self.low), self.median * exp(self.sigma**2 / 2)))
+
+    def __str__(self) -> str:
+        if self.kind == "fixed":
+            return str(self.low)
+
+        if self.kind == "uniform":
+            return f"uniform({self.low}, {self.high})"
+
+        return f"lognormal(median={self.median}, sigma={self.sigma}, range=[{self.low}, {self.high}])"
+
+
+class WorkloadEstimate:
+    """The expected volume of data a workload will produce"""
+
+    @property
+    def document_count(self) -> int:
+        """Gets the number of documents in the workload"""
+        return self.__document_count
+
+    @property
+    def document_bytes(self) -> int:
+        """Gets the expected total size of the document bodies, as compact JSON"""
+        return self.__document_bytes
+
+    @property
+    def blob_bytes(self) -> int:
+        """Gets the expected total size of the blobs referenced by the documents"""
+        return self.__blob_bytes
+
+    @property
+    def total_bytes(self) -> int:
+        """Gets the expected total size of the workload"""
+        return self.__document_bytes + self.__blob_bytes
+
+    def __init__(self, document_count: int, document_bytes: int, blob_bytes: int) -> None:
+        self.__document_count = document_count
+        self.__document_bytes = document_bytes
+        self.__blob_bytes = blob_bytes
+
+    def to_json(self) -> dict[str, int]:
+        return {
+            "document_count": self.__document_count,
+            "document_bytes": self.__document_bytes,
+            "blob_bytes": self.__blob_bytes,
+            "total_bytes": self.total_bytes,
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__document_count} docs, ~{self.__document_bytes / 1024 / 1024:.1f} MiB of JSON, "
+            f"~{self.__blob_bytes / 1024 / 1024:.1f} MiB of blobs"
+        )
+
+
+class WorkloadProfile:
+    """
+    Describes the shape of the documents a :class:`cbltest.api.json_generator.JSONGenerator`
+    produces, on top of its base `data` and `metadata` properties: a channel list drawn from
+    a pool of `channel_count` channels, a nested object, an array of small objects, a padding
+    string that brings the body up to the sampled size, and optionally blob references.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        document_size: Distribution,
+        nesting_depth: Distribution | None = None,
+        array_length: Distribution | None = None,
+        channel_count: int = 1,
+        channels_per_doc: Distribution | None = None,
+        blob_probability: float = 0.0,
+        blobs_per_doc: Distribution | None = None,
+        blob_names: list[str] | None = None,
+    ) -> None:
+        self.name = name
+        self.document_size = document_size
+        self.nesting_depth = nesting_depth if nesting_depth is not None else Distribution.fixed(0)
+        self.array_length = array_length if array_length is not None else Distribution.fixed(0)
+        self.channel_count = channel_count
+        self.channels_per_doc = channels_per_doc if channels_per_doc is not None else Distribution.fixed(1)
+        self.blob_probability = blob_probability
+        self.blobs_per_doc = blobs_per_doc if blobs_per_doc is not None else Distribution.fixed(1)
+        assert channel_count >= self.channels_per_doc.high, "channels_per_doc cannot exceed channel_count"
+        assert 0.0 <= blob_probability <= 1.0, "blob_probability must be between 0 and 1"
+        self.blob_names = blob_names if blob_names is not None else SMALL_BLOBS
+        for blob in self.blob_names:
+            assert blob in BLOB_SIZES, f"Unknown blob '{blob}' (not in dataset/server/blobs)"
+
+    def extra_properties(self, rng: random.Random, base: dict[str, Any]) -> dict[str, Any]:
+        """
+        Generates the profile specific properties of a document, sized so that together
+        with `base` the compact JSON body is approximately the sampled document size
+        """
+        channels = rng.sample(range(self.channel_count), self.channels_per_doc.sample(rng))
+        extra: dict[str, Any] = {"channels": [f"channel_{c}" for c in channels]}
+        depth = self.nesting_depth.sample(rng)
+        if depth > 0:
+            nested: dict[str, Any] = {"level": depth, "value": rng.random()}
+            for level in range(depth - 1, 0, -1):
+                nested = {"level": level, "value": rng.random(), "child": nested}
+
+            extra["nested"] = nested
+
+        length = self.array_length.sample(rng)
+        if length > 0:
+            extra["items"] = [{"index": i, "value": rng.randint(0, 1_000_000)} for i in range(length)]
+
+        target = self.document_size.sample(rng)
+        overhead = len(dumps({**base, **extra, "payload": ""}, separators=(",", ":")))
+        padding = max(0, target - overhead)
+        extra["payload"] = rng.randbytes((padding + 1) // 2).hex()[:padding]
+        return extra
+
+    def blobs(self, rng: random.Random) -> dict[str, str]:
+        """
+        Chooses the blobs to attach to a document, as a dictionary of keypath to blob name
+        suitable for the `new_blobs` argument of `upsert_document`
+        """
+        if self.blob_probability == 0.0 or rng.random() >= self.blob_probability:
+            return {}
+
+        return {f"blobs[{i}]": rng.choice(self.blob_names) for i in range(self.blobs_per_doc.sample(rng))}
+
+    def mean_blob_bytes(self) -> float:
+        """Gets the expected number of blob bytes referenced by a single document"""
+        if self.blob_probability == 0.0:
+            return 0.0
+
+        mean_size = sum(BLOB_SIZES[b] for b in self.blob_names) / len(self.blob_names)
+        return self.blob_probability * self.blobs_per_doc.mean() * mean_size
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: size={self.document_size}, depth={self.nesting_depth}, array={self.array_length}, "
+            f"channels={self.channels_per_doc} of {self.channel_count}, "
+            f"blobs={self.blob_probability:.0%} x {self.blobs_per_doc}"
+        )
+
+
+WORKLOAD_PROFILES: dict[str, WorkloadProfile] = {
+    p.name: p
+    for p in [
+        WorkloadProfile(
+            "small",
+            document_size=Distribution.uniform(256, 2048),
+            nesting_depth=Distribution.fixed(2),
+            array_length=Distribution.uniform(0, 5),
+            channel_count=10,
+            channels_per_doc=Distribution.uniform(1, 2),
+        ),
+        WorkloadProfile(
+            "medium",
+            document_size=Distribution.lognormal(8 * 1024, 0.5, 64 * 1024),
+            nesting_depth=Distribution.uniform(2, 5),
+            array_length=Distribution.uniform(5, 50),
+            channel_count=100,
+            channels_per_doc=Distribution.uniform(1, 5),
+            blob_probability=0.1,
+        ),
+        WorkloadProfile(
+            "large",
+            document_size=Distribution.lognormal(256 * 1024, 0.75, 2 * 1024 * 1024),
+            nesting_depth=Distribution.uniform(3, 8),
+            array_length=Distribution.uniform(10, 200),
+            channel_count=100,
+            channels_per_doc=Distribution.uniform(1, 10),
+            blob_probability=0.25,
+            blobs_per_doc=Distribution.uniform(1, 2),
+            blob_names=SMALL_BLOBS + LARGE_BLOBS,
+        ),
+        WorkloadProfile(
+            "deep",
+            document_size=Distribution.uniform(1024, 4096),
+            nesting_depth=Distribution.uniform(16, 32),
+            array_length=Distribution.uniform(0, 3),
+        ),
+        WorkloadProfile(
+            "fanout",
+            document_size=Distribution.uniform(512, 1024),
+            channel_count=1000,
+            channels_per_doc=Distribution.uniform(10, 50),
+        ),
+        WorkloadProfile(
+            "blob_heavy",
+            document_size=Distribution.uniform(256, 1024),
+            channel_count=10,
+            blob_probability=1.0,
+            blobs_per_doc=Distribution.uniform(1, 3),
+            blob_names=SMALL_BLOBS + LARGE_BLOBS,
+        ),
+    ]
+}
+"""The named workload profiles that can be passed to JSONGenerator"""
@@ -10,6 +10,7 @@ import pytest
 from _pytest.reports import TestReport
 from couchbase.auth import PasswordAuthenticator
 from couchbase.cluster import Cluster
+from couchbase.collection import Collection
 from couchbase.options import ClusterOptions
 from junitparser import JUnitXml
 from pydantic import BaseModel, ConfigDict, Field
@@ -55,6 +56,15 @@ def count_from_junit_xml(xml_path: Path) -> tuple[int, int, int]:
     return total_pass, total_fail, total_error
 
 
+def greenboard_spool_path() -> Path:
+    """
+    Gets the file that greenboard documents which failed to upload are kept in until
+    a later upload retries them, which is "greenboard_spool.jsonl" unless overridden
+    by the CBL_GREENBOARD_SPOOL environment variable
+    """
+    return Path(os.environ.get("CBL_GREENBOARD_SPOOL") or "greenboard_spool.jsonl")
+
+
 def resolve_job_url() -> str:
     """Return the Jenkins build URL for the current run, or ``"local"`` off-CI.
 
@@ -145,15 +155,37 @@ class GreenboardUploader:
       legacy upgrade-job path. Each pytest session appends to a JSON
       state file; the wrapper script invokes ``upload_upgrade_batch`` at
       the end to emit one aggregate ``platform="sgw-upgrade"`` doc.
+
+    The connection to the greenboard cluster is opened on the first upload and
+    reused after that, and each upload sends every pending document in one
+    multi-upsert.  Documents that can't be uploaded (the cluster is unreachable,
+    or the write fails) are appended to a local spool file (see
+    :py:func:`greenboard_spool_path`) instead of failing the job, and are sent
+    along with the next upload.  Once connecting has failed, later uploads by the
+    same uploader go straight to the spool rather than waiting for the cluster
+    again.
     """
 
-    def __init__(self, url: str, username: str, password: str) -> None:
+    def __init__(
+        self,
+        url: str,
+        username: str,
+        password: str,
+        *,
+        spool_path: Path | None = None,
+        connect_timeout: timedelta = timedelta(seconds=10),
+    ) -> None:
         if "://" not in url:
             url = f"couchbase://{url}"
 
         self.__url = url
         self.__username = username
         self.__password = password
+        self.__spool_path = spool_path if spool_path is not None else greenboard_spool_path()
+        self.__connect_timeout = connect_timeout
+        self.__cluster: Cluster | None = None
+        self.__collection: Collection | None = None
+        self.__connect_failed = False
         self.__fail_count = 0
         self.__pass_count = 0
         self.__overall_fail = False
@@ -491,21 +523,115 @@ class GreenboardUploader:
             f"failedAt={failed_at}"
         )
 
+    def close(self) -> None:
+        """Closes the connection to the greenboard cluster, if one was opened"""
+        if self.__cluster is not None:
+            self.__cluster.close()
+
+        self.__cluster = None
+        self.__collection = None
+
     def _upload_document(self, test_run: RunResult) -> None:
         self._upsert(test_run.model_dump(by_alias=True))
 
     def _upsert(self, doc: dict) -> None:
         """Add timestamp fields and write one document to the greenboard bucket."""
+        self._upsert_all([doc])
+
+    def _upsert_all(self, docs: list[dict]) -> None:
+        """Add timestamp fields to documents, and write them (along with any spooled
+        from earlier failed uploads) to the greenboard bucket in one multi-upsert,
+        spooling whichever of them fail."""
         now = datetime.now(timezone.utc)
         unix_timestamp = (now - datetime(1970, 1, 1, tzinfo=timezone.utc)).total_seconds()
 
-        # Do not add to RunResult since this code will go away shortly
-        doc["uploaded"] = unix_timestamp
-        doc["date"] = now.strftime("%Y-%m-%d")
+        pending: dict[str, dict] = {}
+        for doc in docs:
+            # Do not add to RunResult since this code will go away shortly
+            doc["uploaded"] = unix_timestamp
+            doc["date"] = now.strftime("%Y-%m-%d")
+            pending[str(uuid4())] = doc
+
+        # The keys of spooled documents are kept, so a retry of a document that did
+        # get written the first time overwrites it rather than duplicating it
+        spooled = self._read_spool()
+        batch = {**spooled, **pending}
+        failed = self._upsert_batch(batch)
+        if failed:
+            cbl_warning(
+                f"Greenboard: {len(failed)} of {len(batch)} document(s) not uploaded; "
+                f"keeping them in {self.__spool_path} to retry with the next upload"
+            )
+        elif spooled:
+            cbl_info(f"Greenboard: uploaded {len(spooled)} previously spooled document(s)")
+
+        if failed or spooled:
+            self._write_spool({k: batch[k] for k in failed})
+
+    def _get_collection(self) -> Collection | None:
+        if self.__collection is None and not self.__connect_failed:
+            try:
+                auth = PasswordAuthenticator(self.__username, self.__password)
+                cluster = Cluster(self.__url, ClusterOptions(auth))
+                cluster.wait_until_ready(self.__connect_timeout)
+                self.__cluster = cluster
+                self.__collection = cluster.bucket("greenboard").default_collection()
+            except Exception as e:
+                cbl_warning(f"Greenboard: could not connect to {self.__url}: {e}")
+                self.__connect_failed = True
+
+        return self.__collection
+
+    def _upsert_batch(self, batch: dict[str, dict]) -> set[str]:
+        """Writes documents in one multi-upsert, returning the keys of the ones that failed"""
+        collection = self._get_collection()
+        if collection is None:
+            return set(batch)
+
+        try:
+            result = collection.upsert_multi(batch)
+        except Exception as e:
+            cbl_warning(f"Greenboard: upload of {len(batch)} document(s) failed: {e}")
+            return set(batch)
+
+        for key, exception in result.exceptions.items():
+            cbl_warning(f"Greenboard: upload of document {key} failed: {exception}")
+
+        return set(result.exceptions)
 
-        auth = PasswordAuthenticator(self.__username, self.__password)
-        opts = ClusterOptions(auth)
-        cluster = Cluster(self.__url, opts)
-        cluster.wait_until_ready(timedelta(seconds=10))
+    def _read_spool(self) -> dict[str, dict]:
+        spooled: dict[str, dict] = {}
+        if not self.__spool_path.is_file():
+            return spooled
 
-        cluster.bucket("greenboard").default_collection().upsert(str(uuid4()), doc)
+        try:
+            with open(self.__spool_path, encoding="utf-8") as fin:
+                for line in fin:
+                    if not line.strip():
+                        continue
+
+                    try:
+                        entry = json.loads(line)
+                        spooled[entry["key"]] = entry["doc"]
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        cbl_warning(f"Greenboard: skipping malformed line in {self.__spool_path}")
+        except OSError as e:
+            cbl_warning(f"Greenboard: could not read spool file {self.__spool_path}: {e}")
+
+        return spooled
+
+    def _write_spool(self, docs: dict[str, dict]) -> None:
+        try:
+            if not docs:
+                self.__spool_path.unlink(missing_ok=True)
+                return
+
+            # Written to the side and moved into place, so an interrupted write can't
+            # lose the documents that were already spooled
+            temp_path = self.__spool_path.with_name(f"{self.__spool_path.name}.tmp")
+            with open(temp_path, "w", encoding="utf-8") as fout:
+                fout.writelines(json.dumps({"key": k, "doc": v}) + "\n" for k, v in docs.items())
+
+            temp_path.replace(self.__spool_path)
+        except OSError as e:
+            cbl_warning(f"Greenboard: could not write spool file {self.__spool_path}: {e}")
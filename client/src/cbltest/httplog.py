@@ -1,3 +1,4 @@
+import os
 from itertools import count
 from pathlib import Path
 
@@ -6,8 +7,17 @@ from cbltest.globals import CBLPyTestGlobal
 _http_num = count(1)
 
 
+def http_log_dir() -> Path:
+    """
+    Gets the folder that HTTP requests and responses are logged into, which
+    is "http_log" unless overridden by the CBL_HTTP_LOG_DIR environment variable
+    (e.g. to keep the logs of parallel test processes apart)
+    """
+    return Path(os.environ.get("CBL_HTTP_LOG_DIR") or "http_log")
+
+
 class _HttpLogWriter:
-    __record_path: Path = Path("http_log")
+    __record_path: Path
     __fname_prefix: str
     __folder_name: str
 
@@ -22,6 +32,9 @@ class _HttpLogWriter:
 
         mod_num = num % 100
         self.__num = num
+        # Looked up for every writer, so that setting CBL_HTTP_LOG_DIR takes effect
+        # even after this module has been imported
+        self.__record_path = http_log_dir()
         self.__fname_prefix = f"{mod_num:02d}_{test_name}"
         self.__folder_name = f"{(num // 100) * 100:08d}"
 
@@ -1,4 +1,5 @@
 import json
+from math import isclose
 from typing import Any, TypeVar, cast, get_origin
 
 from .logging import cbl_info, cbl_warning
@@ -134,57 +135,234 @@ def _get_typed_required(d: dict, key: str, expected_type: type[T]) -> T:
     return cast(T, ret_val)
 
 
-def json_equivalent(left: Any, right: Any, current_path: str = "") -> bool:
-    if isinstance(left, dict):
-        if not isinstance(right, dict):
-            left_obj = dumps_with_ellipsis(left)
-            right_obj = dumps_with_ellipsis(right)
-            cbl_info(f"Lefthand '{left_obj}' was a dict and righthand '{right_obj}' was not")
-            return False
+class JsonMismatch:
+    """A single difference found by :func:`json_diff`"""
 
-        left_dict = cast(dict, left)
-        right_dict = cast(dict, right)
-        for key in left_dict:
-            if key not in right_dict:
-                left_obj = dumps_with_ellipsis(left)
-                right_obj = dumps_with_ellipsis(right)
-                cbl_info(f"Lefthand '{left_obj}' contained key '{key}' and righthand '{right_obj}' did not")
-                return False
-
-            next_path = f"{current_path}.{key}"
-            cbl_info(f"Entering key '{next_path}'")
-            if not json_equivalent(left_dict[key], right_dict[key], next_path):
-                return False
-
-            cbl_info(f"Returning to key '{current_path}'")
-
-        return True
-
-    if isinstance(left, list):
-        if not isinstance(right, list):
-            left_obj = dumps_with_ellipsis(left)
-            right_obj = dumps_with_ellipsis(right)
-            cbl_info(f"Lefthand '{left_obj}' was a list and righthand '{right_obj}' was not")
-            return False
+    def __init__(self, path: str, reason: str, left: Any, right: Any) -> None:
+        self.path = path
+        """The path at which the difference was found (e.g. `.foo[0].bar`, empty for the root)"""
+
+        self.reason = reason
+        """A description of the difference"""
+
+        self.left = left
+        """The lefthand value at `path`"""
+
+        self.right = right
+        """The righthand value at `path`"""
+
+    def __str__(self) -> str:
+        path = self.path if self.path else "<root>"
+        return f"{path}: {self.reason} (left={dumps_with_ellipsis(self.left)}, right={dumps_with_ellipsis(self.right)})"
+
+
+class JsonDiffResult:
+    """The outcome of :func:`json_diff`.  Evaluates as truthy when the values are equivalent."""
+
+    @property
+    def equivalent(self) -> bool:
+        """Gets whether or not the two values are equivalent"""
+        return len(self.__mismatches) == 0
+
+    @property
+    def mismatches(self) -> list[JsonMismatch]:
+        """Gets the differences that were found, up to the requested maximum"""
+        return self.__mismatches
+
+    @property
+    def truncated(self) -> bool:
+        """Gets whether or not the comparison stopped early because the maximum number of mismatches was found"""
+        return self.__truncated
+
+    def __init__(self, mismatches: list[JsonMismatch], truncated: bool) -> None:
+        self.__mismatches = mismatches
+        self.__truncated = truncated
 
-        left_list = cast(list, left)
-        right_list = cast(list, right)
-        if len(left_list) != len(right_list):
-            left_obj = dumps_with_ellipsis(left)
-            right_obj = dumps_with_ellipsis(right)
-            cbl_info(
-                f"Lefthand '{left_obj}' has different count ({len(left_list)}) than righthand '{right_obj}' {len(right_list)}"
-            )
+    def __bool__(self) -> bool:
+        return self.equivalent
+
+    def __str__(self) -> str:
+        if self.equivalent:
+            return "equivalent"
+
+        lines = [str(m) for m in self.__mismatches]
+        if self.__truncated:
+            lines.append("(stopped after the first mismatches, there may be more)")
+
+        return "\n".join(lines)
+
+
+class _MismatchLimitReached(Exception):
+    pass
+
+
+class _JsonComparer:
+    def __init__(self, unordered_arrays: bool, float_tolerance: float, max_mismatches: int) -> None:
+        self.__unordered_arrays = unordered_arrays
+        self.__float_tolerance = float_tolerance
+        self.__max_mismatches = max_mismatches
+        self.mismatches: list[JsonMismatch] = []
+
+    def __add(self, path: str, reason: str, left: Any, right: Any) -> None:
+        self.mismatches.append(JsonMismatch(path, reason, left, right))
+        if len(self.mismatches) >= self.__max_mismatches:
+            raise _MismatchLimitReached
+
+    def __numbers_close(self, left: Any, right: Any) -> bool:
+        if (
+            self.__float_tolerance <= 0.0
+            or isinstance(left, bool)
+            or isinstance(right, bool)
+            or not isinstance(left, int | float)
+            or not isinstance(right, int | float)
+        ):
             return False
 
-        for i in range(len(left_list)):
-            next_path = f"{current_path}[{i}]"
-            cbl_info(f"Entering index '{next_path}'")
-            if not json_equivalent(left_list[i], right_list[i]):
-                return False
+        return isclose(left, right, rel_tol=self.__float_tolerance, abs_tol=self.__float_tolerance)
+
+    def equivalent(self, left: Any, right: Any) -> bool:
+        # A silent yes / no check, used when matching unordered array elements
+        if left == right:
+            return True
+
+        if isinstance(left, dict):
+            return isinstance(right, dict) and all(k in right and self.equivalent(v, right[k]) for k, v in left.items())
 
-            cbl_info(f"Returning to '{current_path}'")
+        if isinstance(left, list):
+            return isinstance(right, list) and len(left) == len(right) and self.__lists_equivalent(left, right)
 
-        return True
+        return self.__numbers_close(left, right)
 
-    return left == right
+    def __lists_equivalent(self, left: list, right: list) -> bool:
+        if not self.__unordered_arrays:
+            return all(self.equivalent(lv, rv) for lv, rv in zip(left, right))
+
+        return len(self.__unmatched(left, right)) == 0
+
+    def __unmatched(self, left: list, right: list) -> list[int]:
+        # Pair off identical elements by their canonical encoding first, and only fall
+        # back to pairwise comparison for whatever is left over
+        remaining: dict[str, list[int]] = {}
+        for i, rv in enumerate(right):
+            remaining.setdefault(json.dumps(rv, sort_keys=True), []).append(i)
+
+        leftover_left: list[int] = []
+        for i, lv in enumerate(left):
+            candidates = remaining.get(json.dumps(lv, sort_keys=True))
+            if candidates:
+                candidates.pop()
+            else:
+                leftover_left.append(i)
+
+        leftover_right = [i for indexes in remaining.values() for i in indexes]
+        unmatched: list[int] = []
+        for i in leftover_left:
+            match = next((j for j in leftover_right if self.equivalent(left[i], right[j])), None)
+            if match is None:
+                unmatched.append(i)
+            else:
+                leftover_right.remove(match)
+
+        return unmatched
+
+    def compare(self, left: Any, right: Any, path: str) -> None:
+        if left == right:
+            return
+
+        if isinstance(left, dict):
+            if not isinstance(right, dict):
+                self.__add(path, "lefthand is a dict and righthand is not", left, right)
+                return
+
+            for key in [k for k in left if k not in right]:
+                self.__add(f"{path}.{key}", "key missing from righthand", left[key], None)
+
+            for key, value in left.items():
+                if key in right and value != right[key]:
+                    self.compare(value, right[key], f"{path}.{key}")
+
+            return
+
+        if isinstance(left, list):
+            if not isinstance(right, list):
+                self.__add(path, "lefthand is a list and righthand is not", left, right)
+                return
+
+            if len(left) != len(right):
+                self.__add(path, f"lefthand has {len(left)} elements and righthand has {len(right)}", left, right)
+                return
+
+            if self.__unordered_arrays:
+                for i in self.__unmatched(left, right):
+                    self.__add(f"{path}[{i}]", "no equivalent element in righthand", left[i], None)
+
+                return
+
+            for i, (lv, rv) in enumerate(zip(left, right)):
+                if lv != rv:
+                    self.compare(lv, rv, f"{path}[{i}]")
+
+            return
+
+        if not self.__numbers_close(left, right):
+            self.__add(path, "values differ", left, right)
+
+
+def json_diff(
+    left: Any,
+    right: Any,
+    *,
+    unordered_arrays: bool = False,
+    float_tolerance: float = 0.0,
+    max_mismatches: int = 10,
+    current_path: str = "",
+) -> JsonDiffResult:
+    """
+    Structurally compares two JSON values without logging anything.  Every key in a lefthand
+    dict must be present and equivalent in the righthand one (the righthand side may contain
+    extra keys), arrays must be the same length with equivalent elements, and other values
+    must be equal.  Identical subtrees are skipped using a single native equality check, so
+    the cost of the walk is proportional to the parts that differ.
+
+    :param left: The lefthand value
+    :param right: The righthand value
+    :param unordered_arrays: If true, arrays match if their elements can be paired off in any order
+    :param float_tolerance: If positive, numbers match if they are within this relative or absolute tolerance
+    :param max_mismatches: The number of mismatches to record before giving up
+    :param current_path: A prefix for the recorded mismatch paths
+    """
+    assert max_mismatches > 0, "max_mismatches must be positive"
+    comparer = _JsonComparer(unordered_arrays, float_tolerance, max_mismatches)
+    truncated = False
+    try:
+        comparer.compare(left, right, current_path)
+    except _MismatchLimitReached:
+        truncated = True
+
+    return JsonDiffResult(comparer.mismatches, truncated)
+
+
+def json_equivalent(
+    left: Any,
+    right: Any,
+    current_path: str = "",
+    *,
+    unordered_arrays: bool = False,
+    float_tolerance: float = 0.0,
+) -> bool:
+    """
+    Checks whether two JSON values are equivalent according to :func:`json_diff`, logging
+    the first difference if they are not
+    """
+    result = json_diff(
+        left,
+        right,
+        unordered_arrays=unordered_arrays,
+        float_tolerance=float_tolerance,
+        max_mismatches=1,
+        current_path=current_path,
+    )
+    if not result:
+        cbl_info(f"JSON values are not equivalent: {result.mismatches[0]}")
+
+    return result.equivalent
@@ -0,0 +1,362 @@
+import json
+import math
+import re
+import time
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, NamedTuple
+
+# This module keeps latency histograms of every call the client makes to a backend
+# service (see cbltest.steptiming for the service names), keyed by the component,
+# the method, a template of the path (e.g. /{keyspace}/_bulk_docs) and the status.
+# Like the step timings, it works entirely in process, so that e.g. the p99 latency
+# of Sync Gateway _bulk_docs calls over a run can be seen without collecting traces.
+#
+# The histograms are HDR style: latencies are counted in microsecond buckets that
+# are exact below 256us and then grow with the value, so that every bucket is within
+# 1/128 (<1%) of the values it holds, no matter how large.  That keeps them small
+# and cheap enough to record every call, and they can be merged (e.g. across shards).
+
+_SUB_BUCKET_BITS = 7
+_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+
+# Segments of a Sync Gateway / Edge Server path that name a specific thing rather
+# than an endpoint (anything not starting with an underscore after the first)
+_SEGMENT_PLACEHOLDER = "{id}"
+
+
+class LatencyKey(NamedTuple):
+    """What a latency histogram is recorded for"""
+
+    component: str
+    method: str
+    path: str
+    status: str
+
+
+class LatencyHistogram:
+    """A histogram of latencies, accurate to within 1%"""
+
+    @property
+    def count(self) -> int:
+        """Gets the number of latencies recorded"""
+        return self.__count
+
+    @property
+    def total(self) -> float:
+        """Gets the sum of all latencies recorded, in seconds"""
+        return self.__total_us / 1_000_000
+
+    @property
+    def min(self) -> float:
+        """Gets the smallest latency recorded, in seconds"""
+        return self.__min_us / 1_000_000 if self.__count else 0.0
+
+    @property
+    def max(self) -> float:
+        """Gets the largest latency recorded, in seconds"""
+        return self.__max_us / 1_000_000
+
+    @property
+    def mean(self) -> float:
+        """Gets the mean latency recorded, in seconds"""
+        return self.total / self.__count if self.__count else 0.0
+
+    def __init__(self) -> None:
+        self.__buckets: dict[int, int] = {}
+        self.__count = 0
+        self.__total_us = 0
+        self.__min_us = 0
+        self.__max_us = 0
+
+    @staticmethod
+    def _bucket_index(value_us: int) -> int:
+        shift = max(0, value_us.bit_length() - _SUB_BUCKET_BITS - 1)
+        return shift * _SUB_BUCKETS + (value_us >> shift)
+
+    @staticmethod
+    def _bucket_value(index: int) -> int:
+        # The middle of the range of values that fall in the bucket
+        shift = max(0, index // _SUB_BUCKETS - 1)
+        low = (index - shift * _SUB_BUCKETS) << shift
+        return low + ((1 << shift) - 1) // 2
+
+    def record(self, seconds: float) -> None:
+        """
+        Records one latency
+
+        :param seconds: The latency, in seconds
+        """
+        value_us = max(0, round(seconds * 1_000_000))
+        index = self._bucket_index(value_us)
+        self.__buckets[index] = self.__buckets.get(index, 0) + 1
+        self.__min_us = value_us if self.__count == 0 else min(self.__min_us, value_us)
+        self.__max_us = max(self.__max_us, value_us)
+        self.__count += 1
+        self.__total_us += value_us
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """
+        Adds all of the latencies recorded in another histogram to this one
+
+        :param other: The histogram to merge in
+        """
+        if other.__count == 0:
+            return
+
+        for index, count in other.__buckets.items():
+            self.__buckets[index] = self.__buckets.get(index, 0) + count
+
+        self.__min_us = other.__min_us if self.__count == 0 else min(self.__min_us, other.__min_us)
+        self.__max_us = max(self.__max_us, other.__max_us)
+        self.__count += other.__count
+        self.__total_us += other.__total_us
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Gets the latency (in seconds) that the given percentage of latencies are at or below
+
+        :param percentile: The percentile to get, from 0 to 100
+        """
+        if self.__count == 0:
+            return 0.0
+
+        rank = max(1, math.ceil(self.__count * percentile / 100))
+        if rank >= self.__count:
+            return self.max
+
+        seen = 0
+        for index in sorted(self.__buckets):
+            seen += self.__buckets[index]
+            if seen >= rank:
+                value_us = min(max(self._bucket_value(index), self.__min_us), self.__max_us)
+                return value_us / 1_000_000
+
+        return self.max
+
+    def summary(self) -> dict[str, Any]:
+        """Gets the count, total and notable percentiles of the histogram (in seconds)"""
+        return {
+            "count": self.__count,
+            "total": round(self.total, 6),
+            "mean": round(self.mean, 6),
+            "min": round(self.min, 6),
+            "p50": round(self.percentile(50), 6),
+            "p90": round(self.percentile(90), 6),
+            "p99": round(self.percentile(99), 6),
+            "max": round(self.max, 6),
+        }
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            **self.summary(),
+            "buckets": {str(k): v for k, v in sorted(self.__buckets.items())},
+        }
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> "LatencyHistogram":
+        ret_val = LatencyHistogram()
+        ret_val.__buckets = {int(k): v for k, v in data.get("buckets", {}).items()}
+        ret_val.__count = data["count"]
+        ret_val.__total_us = round(data["total"] * 1_000_000)
+        ret_val.__min_us = round(data["min"] * 1_000_000)
+        ret_val.__max_us = round(data["max"] * 1_000_000)
+        return ret_val
+
+
+class LatencyRegistry:
+    """A set of latency histograms, one per LatencyKey"""
+
+    @property
+    def histograms(self) -> dict[LatencyKey, LatencyHistogram]:
+        """Gets the histograms recorded so far"""
+        return self.__histograms
+
+    def __init__(self) -> None:
+        self.__histograms: dict[LatencyKey, LatencyHistogram] = {}
+
+    def record(self, key: LatencyKey, seconds: float) -> None:
+        """
+        Records one latency
+
+        :param key: What the latency was measured for
+        :param seconds: The latency, in seconds
+        """
+        histogram = self.__histograms.get(key)
+        if histogram is None:
+            histogram = self.__histograms[key] = LatencyHistogram()
+
+        histogram.record(seconds)
+
+    def merge(self, other: "LatencyRegistry") -> None:
+        """
+        Adds all of the latencies recorded in another registry to this one
+
+        :param other: The registry to merge in
+        """
+        for key, histogram in other.histograms.items():
+            self.__histograms.setdefault(key, LatencyHistogram()).merge(histogram)
+
+    def to_json(self, with_buckets: bool = True) -> list[dict[str, Any]]:
+        """
+        Gets the histograms as JSON, busiest first
+
+        :param with_buckets: Whether to include the buckets, which are needed to merge
+            the histograms later but are otherwise noise
+        """
+        ret_val: list[dict[str, Any]] = []
+        for key, histogram in sorted(self.__histograms.items(), key=lambda kv: kv[1].total, reverse=True):
+            ret_val.append({**key._asdict(), **(histogram.to_json() if with_buckets else histogram.summary())})
+
+        return ret_val
+
+    @staticmethod
+    def from_json(data: list[dict[str, Any]]) -> "LatencyRegistry":
+        ret_val = LatencyRegistry()
+        for entry in data:
+            key = LatencyKey(entry["component"], entry["method"], entry["path"], entry["status"])
+            ret_val.histograms[key] = LatencyHistogram.from_json(entry)
+
+        return ret_val
+
+
+class _TimedCall:
+    def __init__(self) -> None:
+        self.status: str | int | None = None
+
+
+_session_registry = LatencyRegistry()
+_test_registry: LatencyRegistry | None = None
+_listeners: list[Callable[[LatencyKey, float], None]] = []
+
+
+def session_registry() -> LatencyRegistry:
+    """Gets the latencies recorded by this process so far"""
+    return _session_registry
+
+
+def begin_test() -> None:
+    """Starts recording latencies for a test, separately from the rest of the session"""
+    global _test_registry
+    _test_registry = LatencyRegistry()
+
+
+def end_test() -> LatencyRegistry | None:
+    """Stops recording latencies for the current test, and returns them"""
+    global _test_registry
+    ret_val, _test_registry = _test_registry, None
+    return ret_val
+
+
+def add_listener(listener: Callable[[LatencyKey, float], None]) -> None:
+    """
+    Adds a function to be called with every latency recorded (e.g. to export them
+    somewhere else as well)
+    """
+    _listeners.append(listener)
+
+
+def record_latency(component: str, method: str, path: str, status: str | int, seconds: float) -> None:
+    """
+    Records the latency of one call to a backend service
+
+    :param component: The service called (one of cbltest.steptiming.SERVICES)
+    :param method: The HTTP method, or the name of the operation for non-HTTP calls
+    :param path: The path template (see sgw_path_template), or "" if not applicable
+    :param status: The HTTP status, or the name of the error if the call failed
+    :param seconds: How long the call took
+    """
+    key = LatencyKey(component, method.upper(), path, str(status))
+    _session_registry.record(key, seconds)
+    if _test_registry is not None:
+        _test_registry.record(key, seconds)
+
+    for listener in _listeners:
+        listener(key, seconds)
+
+
+@contextmanager
+def timed(component: str, method: str, path: str) -> Generator[_TimedCall]:
+    """
+    Records the latency of the call made inside the block.  Set the status of the
+    yielded object to the status of the response; if the block raises an exception
+    before a status is set, the name of the exception is recorded as the status.
+    """
+    call = _TimedCall()
+    start = time.monotonic()
+    try:
+        yield call
+    except BaseException as e:
+        if call.status is None:
+            call.status = type(e).__name__
+
+        raise
+    finally:
+        record_latency(
+            component, method, path, call.status if call.status is not None else "ok", time.monotonic() - start
+        )
+
+
+def sgw_path_template(path: str) -> str:
+    """
+    Turns a Sync Gateway (or Edge Server) REST path into a template, so that calls to
+    the same endpoint for different databases or documents are counted together, e.g.
+    /db1.scope.coll/doc1?rev=1 -> /{keyspace}/{id}
+
+    :param path: The path of the request
+    """
+    bare = path.split("?", 1)[0]
+    if not bare.strip("/"):
+        return "/"
+
+    templated: list[str] = []
+    for i, segment in enumerate(bare.strip("/").split("/")):
+        if segment.startswith("_") or segment == "":
+            templated.append(segment)
+        elif i == 0:
+            templated.append("{keyspace}" if "." in segment else "{db}")
+        else:
+            templated.append(_SEGMENT_PLACEHOLDER)
+
+    return "/" + "/".join(templated) + ("/" if bare.endswith("/") else "")
+
+
+# Couchbase Server REST paths have names in them after these segments
+_CBS_NAMED_SEGMENTS = re.compile(r"/(buckets|scopes|collections|remoteClusters|replications|nodes)/[^/]+")
+
+
+def cbs_path_template(path: str) -> str:
+    """
+    Turns a Couchbase Server REST path into a template, e.g.
+    /pools/default/buckets/travel/scopes -> /pools/default/buckets/{name}/scopes
+
+    :param path: The path of the request
+    """
+    return _CBS_NAMED_SEGMENTS.sub(r"/\1/{name}", path.split("?", 1)[0])
+
+
+def write_report(path: Path, tests: dict[str, list[dict[str, Any]]]) -> None:
+    """
+    Writes the latencies of the whole session (with buckets, so that reports can be
+    merged with load_report) and a summary of those of each test as JSON.
+
+    :param path: The file to write
+    :param tests: The summary of the latencies recorded in each test (as returned by
+        LatencyRegistry.to_json without buckets), by test ID
+    """
+    with open(path, "w") as fout:
+        json.dump({"session": _session_registry.to_json(), "tests": tests}, fout, indent=2)
+
+
+def load_report(path: Path) -> tuple[LatencyRegistry, dict[str, list[dict[str, Any]]]]:
+    """
+    Reads a report written by write_report
+
+    :param path: The file to read
+    :return: The session latencies, and the summary of each test's latencies
+    """
+    with open(path) as fin:
+        data = json.load(fin)
+
+    return LatencyRegistry.from_json(data["session"]), data.get("tests", {})
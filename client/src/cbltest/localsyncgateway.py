@@ -0,0 +1,757 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, cast
+from uuid import uuid4
+
+from aiohttp import BasicAuth, MultipartWriter, web
+
+from cbltest.logging import cbl_error, cbl_info
+
+if TYPE_CHECKING:
+    from cbltest.api.syncgateway import SyncGateway
+
+# This module is an in-memory stand-in for Sync Gateway, so that the client code that
+# drives it (load_dataset, upsert_documents, compare_local_and_remote, reading the
+# changes feed, etc) can be benchmarked and tuned without a backend.  It serves an
+# admin port and a public port from its own thread and event loop (SyncGateway's
+# constructor makes a blocking call to /_config, and the stand-in's work shouldn't be
+# counted against the client's event loop), with an optional latency (plus random
+# jitter) before every response.
+#
+# Documents get rev tree revisions ("<generation>-<md5>") and, like SGW 4.0, a
+# current version ("<hex timestamp>@<source>"), and every write takes the next
+# sequence of its database, which is what the changes feed is ordered by.  What it
+# implements:
+#
+# - /, /_status, /_config, /_ping, /_all_dbs, /_expvar
+# - PUT / GET / DELETE /{db}/ and GET /{db}/_config
+# - PUT / GET / DELETE /{db}/_user/{name} and /{db}/_role/{name}
+# - On each keyspace: _bulk_docs (including new_edits=false), _all_docs (GET, or
+#   POST with keys), _changes (normal or longpoll, since / limit / include_docs /
+#   version_type / doc_ids), _bulk_get (multipart, current revisions only), _purge
+#   and PUT / GET / DELETE of single documents
+#
+# The public port authenticates users and only shows them documents in channels
+# they can access, with channels assigned like the default sync function does (from
+# the "channels" property).  There is no import, no replication, no attachments and
+# no revision history beyond the current revision.
+
+_DEFAULT_KEYSPACE = ("_default", "_default")
+
+
+class _SyncGatewayError(Exception):
+    def __init__(self, status: int, error: str, reason: str) -> None:
+        super().__init__(reason)
+        self.status = status
+        self.error = error
+
+
+def _not_found(reason: str) -> _SyncGatewayError:
+    return _SyncGatewayError(404, "not_found", reason)
+
+
+class _Document:
+    def __init__(self) -> None:
+        self.body: dict[str, Any] = {}
+        self.rev = ""
+        self.cv = ""
+        self.seq = 0
+        self.deleted = False
+
+    @property
+    def generation(self) -> int:
+        return int(self.rev.split("-", 1)[0]) if self.rev else 0
+
+    def channels(self) -> set[str]:
+        channels = self.body.get("channels", [])
+        return {channels} if isinstance(channels, str) else {str(c) for c in channels}
+
+
+class _Collection(dict[str, _Document]):
+    def __init__(self, database: _Database, scope: str, name: str) -> None:
+        super().__init__()
+        self.database = database
+        self.scope = scope
+        self.name = name
+
+
+class _Database:
+    def __init__(self, name: str, config: dict[str, Any]) -> None:
+        self.name = name
+        self.config = config
+        self.collections: dict[tuple[str, str], _Collection] = {}
+        scopes = cast(dict[str, dict[str, Any]], config.get("scopes") or {})
+        for scope, scope_config in scopes.items():
+            for collection in scope_config.get("collections") or []:
+                self.collections[(scope, collection)] = _Collection(self, scope, collection)
+
+        if not self.collections:
+            self.collections[_DEFAULT_KEYSPACE] = _Collection(self, *_DEFAULT_KEYSPACE)
+
+        self.users: dict[str, dict[str, Any]] = {}
+        self.roles: dict[str, dict[str, Any]] = {}
+        self.last_seq = 0
+        self.start_time = time.time_ns() // 1000
+        self.doc_writes = 0
+        self.doc_reads = 0
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class LocalSyncGateway:
+    """
+    An in-memory stand-in for Sync Gateway's admin and public REST APIs (see the comment
+    at the top of this module for what it implements).
+
+    It runs on its own thread, so it is started and stopped synchronously (or used as a
+    ``with`` block), and :meth:`sync_gateway` then creates a client for it.
+    """
+
+    @property
+    def hostname(self) -> str:
+        """Gets the hostname to connect to"""
+        return "localhost"
+
+    @property
+    def admin_port(self) -> int:
+        """Gets the port of the admin API (only valid once started)"""
+        assert self.__admin_port is not None, "LocalSyncGateway not started"
+        return self.__admin_port
+
+    @property
+    def public_port(self) -> int:
+        """Gets the port of the public API (only valid once started)"""
+        assert self.__public_port is not None, "LocalSyncGateway not started"
+        return self.__public_port
+
+    @property
+    def request_counts(self) -> Counter[str]:
+        """Gets the number of requests received so far, by method and path template (e.g. "POST /{keyspace}/_bulk_docs")"""
+        return self.__request_counts
+
+    def __init__(
+        self,
+        *,
+        username: str = "admin",
+        password: str = "password",
+        latency: float = 0,
+        jitter: float = 0,
+        version_vectors: bool = True,
+        seed: int | None = None,
+    ) -> None:
+        """
+        :param username: The user name of the admin API
+        :param password: The password of the admin API
+        :param latency: The time (in seconds) to wait before sending each response
+        :param jitter: The maximum random time (in seconds) added to the latency of each response
+        :param version_vectors: Whether to behave like Sync Gateway 4.0 (with current versions) or 3.x
+        :param seed: The seed for the jitter, for repeatable runs
+        """
+        assert latency >= 0 and jitter >= 0, "latency and jitter cannot be negative"
+        self.__username = username
+        self.__password = password
+        self.__latency = latency
+        self.__jitter = jitter
+        self.__random = random.Random(seed)
+        self.__version_vectors = version_vectors
+        self.__source_id = base64.b64encode(uuid4().bytes).decode("ascii").rstrip("=")
+        self.__server_uuid = uuid4().hex
+        self.__last_timestamp = 0
+        self.__databases: dict[str, _Database] = {}
+        self.__request_counts: Counter[str] = Counter()
+        self.__admin_port: int | None = None
+        self.__public_port: int | None = None
+        self.__thread: threading.Thread | None = None
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__ready = threading.Event()
+        self.__start_error: BaseException | None = None
+
+    def start(self) -> None:
+        """Starts serving both APIs on ports chosen by the OS"""
+        assert self.__thread is None, "LocalSyncGateway already started"
+        self.__ready.clear()
+        self.__start_error = None
+        self.__thread = threading.Thread(target=self._run, name="local-sync-gateway", daemon=True)
+        self.__thread.start()
+        self.__ready.wait()
+        if self.__start_error is not None:
+            self.__thread.join()
+            self.__thread = None
+            raise self.__start_error
+
+        cbl_info(f"LocalSyncGateway listening on {self.admin_port} (admin) and {self.public_port} (public)")
+
+    def stop(self) -> None:
+        """Stops serving, and waits for the server thread to finish"""
+        if self.__thread is None or self.__loop is None:
+            return
+
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__thread = None
+        self.__admin_port = None
+        self.__public_port = None
+
+    def __enter__(self) -> LocalSyncGateway:  # noqa: PYI034
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.stop()
+
+    def sync_gateway(self) -> SyncGateway:
+        """Creates a :class:`SyncGateway` client for this stand-in (call it from inside an event loop)"""
+        from cbltest.api.syncgateway import SyncGateway
+
+        return SyncGateway(
+            self.hostname,
+            self.__username,
+            self.__password,
+            port=self.admin_port,
+            public_port=self.public_port,
+        )
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        self.__loop = loop
+        runners: list[web.AppRunner] = []
+        try:
+            for admin in (True, False):
+                runner, port = loop.run_until_complete(self._start_site(admin))
+                runners.append(runner)
+                if admin:
+                    self.__admin_port = port
+                else:
+                    self.__public_port = port
+        except BaseException as e:
+            self.__start_error = e
+            self.__ready.set()
+            for runner in runners:
+                loop.run_until_complete(runner.cleanup())
+            loop.close()
+            return
+
+        self.__ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            for runner in runners:
+                loop.run_until_complete(runner.cleanup())
+            loop.close()
+
+    async def _start_site(self, admin: bool) -> tuple[web.AppRunner, int]:
+        app = web.Application(client_max_size=0)
+        app["admin"] = admin
+        app.router.add_route("*", "/{tail:.*}", self._handler)
+        runner = web.AppRunner(app, access_log=None, shutdown_timeout=1)
+        await runner.setup()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("localhost", 0))
+        sock.listen(128)
+        await web.SockSite(runner, sock).start()
+        return runner, cast(int, sock.getsockname()[1])
+
+    async def _handler(self, request: web.Request) -> web.StreamResponse:
+        delay = self.__latency + (self.__random.uniform(0, self.__jitter) if self.__jitter > 0 else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        admin = cast(bool, request.app["admin"])
+        segments = [s for s in request.match_info["tail"].split("/") if s]
+        try:
+            user = self._authenticate(request, admin, segments)
+            return await self._route(request, admin, segments, user)
+        except _SyncGatewayError as e:
+            return web.json_response({"error": e.error, "reason": str(e)}, status=e.status)
+        except Exception as e:
+            cbl_error(f"LocalSyncGateway failed to handle {request.method} {request.path}: {e!r}")
+            return web.json_response({"error": "Internal Server Error", "reason": str(e)}, status=500)
+
+    def _count(self, request: web.Request, template: str) -> None:
+        self.__request_counts[f"{request.method} {template}"] += 1
+
+    def _authenticate(self, request: web.Request, admin: bool, segments: list[str]) -> dict[str, Any] | None:
+        header = request.headers.get("Authorization")
+        credentials = BasicAuth.decode(header) if header is not None and header.startswith("Basic ") else None
+        if admin:
+            if credentials is None or (credentials.login, credentials.password) != (self.__username, self.__password):
+                raise _SyncGatewayError(401, "Unauthorized", "Login required")
+
+            return None
+
+        if not segments or segments[0].startswith("_"):
+            return None
+
+        database = self._database(segments[0].split(".")[0])
+        user = database.users.get(credentials.login) if credentials is not None else None
+        if user is None or user.get("password") != cast(BasicAuth, credentials).password:
+            raise _SyncGatewayError(401, "Unauthorized", "Invalid login")
+
+        return user
+
+    def _database(self, name: str) -> _Database:
+        database = self.__databases.get(name)
+        if database is None:
+            raise _SyncGatewayError(404, "Not Found", f"no such database {name!r}")
+
+        return database
+
+    def _keyspace(self, keyspace: str) -> _Collection:
+        parts = keyspace.split(".")
+        if len(parts) > 3:
+            raise _SyncGatewayError(400, "Bad Request", f"invalid keyspace {keyspace!r}")
+
+        database = self._database(parts[0])
+        scope_and_collection = (
+            _DEFAULT_KEYSPACE
+            if len(parts) == 1
+            else ("_default", parts[1])
+            if len(parts) == 2
+            else (parts[1], parts[2])
+        )
+        collection = database.collections.get(scope_and_collection)
+        if collection is None:
+            raise _SyncGatewayError(404, "Not Found", f"keyspace {keyspace} not found")
+
+        return collection
+
+    async def _route(
+        self, request: web.Request, admin: bool, segments: list[str], user: dict[str, Any] | None
+    ) -> web.StreamResponse:
+        method = request.method
+        if not segments:
+            self._count(request, "/")
+            return web.json_response({"couchdb": "Welcome", **self._version_info()})
+
+        first = segments[0]
+        if first.startswith("_"):
+            if not admin and first not in ("_ping",):
+                raise _SyncGatewayError(403, "Forbidden", f"{first} is only on the admin port")
+
+            self._count(request, f"/{first}")
+            if first == "_ping":
+                return web.Response(text="OK")
+            if first == "_status":
+                return web.json_response(self._version_info())
+            if first == "_config":
+                return web.json_response({"bootstrap": {"server": "rosmar://local"}})
+            if first == "_all_dbs":
+                return web.json_response(self._all_dbs(request.query.get("verbose") == "true"))
+            if first == "_expvar":
+                return web.json_response(self._expvar())
+
+            raise _SyncGatewayError(404, "Not Found", f"unknown URL {request.path}")
+
+        if len(segments) == 1:
+            if "." in first:
+                raise _SyncGatewayError(404, "Not Found", f"unknown URL {request.path}")
+
+            self._count(request, "/{db}")
+            return await self._database_request(request, admin, first)
+
+        if segments[1] in ("_user", "_role", "_config") and "." not in first:
+            if not admin:
+                raise _SyncGatewayError(403, "Forbidden", f"{segments[1]} is only on the admin port")
+
+            if segments[1] == "_config":
+                self._count(request, "/{db}/_config")
+                return web.json_response({**self._database(first).config, "name": first})
+
+            self._count(request, f"/{{db}}/{segments[1]}/{{name}}")
+            return await self._principal_request(request, first, segments[1], "/".join(segments[2:]))
+
+        collection = self._keyspace(first)
+        channels = self._channels(collection, user)
+        name = "/".join(segments[1:])
+        if name.startswith("_"):
+            self._count(request, f"/{{keyspace}}/{name}")
+            if name == "_bulk_docs" and method == "POST":
+                return web.json_response(self._bulk_docs(collection, await request.json()), status=201)
+            if name == "_all_docs" and method in ("GET", "POST"):
+                body = await request.json() if method == "POST" and request.can_read_body else {}
+                return web.json_response(self._all_docs(collection, request, body, channels))
+            if name == "_changes" and method in ("GET", "POST"):
+                body = await request.json() if method == "POST" and request.can_read_body else {}
+                return web.json_response(await self._changes(collection, request, body, channels))
+            if name == "_bulk_get" and method == "POST":
+                return await self._bulk_get(collection, request, await request.json(), channels)
+            if name == "_purge" and method == "POST":
+                if not admin:
+                    raise _SyncGatewayError(403, "Forbidden", "_purge is only on the admin port")
+                return web.json_response(self._purge(collection, await request.json()))
+
+            raise _SyncGatewayError(404, "Not Found", f"unknown URL {request.path}")
+
+        self._count(request, "/{keyspace}/{id}")
+        return await self._document_request(request, collection, name, channels)
+
+    def _version_info(self) -> dict[str, Any]:
+        version = "4.0" if self.__version_vectors else "3.2"
+        return {
+            "vendor": {"name": "Couchbase Sync Gateway", "version": version},
+            "version": f"Couchbase Sync Gateway/{version}.0(1;local) EE",
+        }
+
+    def _all_dbs(self, verbose: bool) -> list[Any]:
+        if not verbose:
+            return sorted(self.__databases)
+
+        return [
+            {"db_name": name, "bucket": db.config.get("bucket") or name, "state": "Online"}
+            for name, db in sorted(self.__databases.items())
+        ]
+
+    def _expvar(self) -> dict[str, Any]:
+        per_db: dict[str, Any] = {}
+        for name, db in self.__databases.items():
+            per_db[name] = {
+                "database": {
+                    "num_doc_writes": db.doc_writes,
+                    "num_doc_reads_rest": db.doc_reads,
+                    "doc_reads_bytes_blip": 0,
+                    "doc_writes_bytes_blip": 0,
+                    "sequence_get_count": db.last_seq,
+                },
+                "delta_sync": {},
+                "shared_bucket_import": {"import_count": 0},
+            }
+
+        return {"syncgateway": {"global": {}, "per_db": per_db}}
+
+    async def _database_request(self, request: web.Request, admin: bool, name: str) -> web.StreamResponse:
+        if request.method == "GET":
+            database = self._database(name)
+            return web.json_response(
+                {
+                    "db_name": name,
+                    "state": "Online",
+                    "update_seq": database.last_seq,
+                    "committed_update_seq": database.last_seq,
+                    "instance_start_time": database.start_time,
+                    "server_uuid": self.__server_uuid,
+                    "compact_running": False,
+                    "init_in_progress": False,
+                    "require_resync": False,
+                }
+            )
+
+        if not admin:
+            raise _SyncGatewayError(403, "Forbidden", "databases can only be changed on the admin port")
+
+        if request.method == "PUT":
+            if name in self.__databases:
+                raise _SyncGatewayError(412, "Precondition Failed", f"Duplicate database name {name!r}")
+
+            config = cast(dict[str, Any], await request.json()) if request.can_read_body else {}
+            self.__databases[name] = _Database(name, config)
+            return web.json_response({}, status=201)
+
+        if request.method == "DELETE":
+            self._database(name)
+            del self.__databases[name]
+            return web.json_response({})
+
+        raise _SyncGatewayError(405, "Method Not Allowed", f"{request.method} not allowed on a database")
+
+    async def _principal_request(self, request: web.Request, db_name: str, kind: str, name: str) -> web.Response:
+        database = self._database(db_name)
+        principals = database.users if kind == "_user" else database.roles
+        if request.method == "PUT":
+            body = cast(dict[str, Any], await request.json())
+            status = 200 if name in principals else 201
+            principals[name] = {**body, "name": name}
+            return web.json_response({}, status=status)
+
+        if name not in principals:
+            raise _not_found(f"{kind[1:]} {name!r} not found")
+
+        if request.method == "GET":
+            return web.json_response({k: v for k, v in principals[name].items() if k != "password"})
+
+        if request.method == "DELETE":
+            del principals[name]
+            return web.json_response({})
+
+        raise _SyncGatewayError(405, "Method Not Allowed", f"{request.method} not allowed on a {kind[1:]}")
+
+    @staticmethod
+    def _channels(collection: _Collection, user: dict[str, Any] | None) -> set[str] | None:
+        # The channels that a user can see in a collection, or None for everything (i.e. the admin port)
+        if user is None:
+            return None
+
+        channels = set(user.get("admin_channels") or []) if collection.scope == collection.name == "_default" else set()
+        grants = [user, *(collection.database.roles.get(r, {}) for r in user.get("admin_roles") or [])]
+        for grant in grants:
+            access = grant.get("collection_access", {}).get(collection.scope, {}).get(collection.name, {})
+            channels.update(access.get("admin_channels") or [])
+
+        return None if "*" in channels else channels | {"!"}
+
+    @staticmethod
+    def _visible(doc: _Document, channels: set[str] | None) -> bool:
+        return channels is None or not channels.isdisjoint(doc.channels())
+
+    def _next_versions(self, doc: _Document, body: dict[str, Any], deleted: bool) -> tuple[str, str]:
+        content = json.dumps(body, sort_keys=True) + doc.rev + str(deleted)
+        rev = f"{doc.generation + 1}-{hashlib.md5(content.encode('utf-8')).hexdigest()}"
+        self.__last_timestamp = max(time.time_ns(), self.__last_timestamp + 1)
+        return rev, f"{self.__last_timestamp:x}@{self.__source_id}"
+
+    def _write(
+        self,
+        collection: _Collection,
+        doc_id: str,
+        body: dict[str, Any],
+        rev: str | None,
+        deleted: bool = False,
+        new_edits: bool = True,
+    ) -> _Document:
+        doc = collection.get(doc_id)
+        if doc is None:
+            doc = _Document()
+
+        if new_edits:
+            # An update has to be of the current revision, and a create can't have a revision (unless
+            # it is of the tombstone it replaces)
+            if rev != doc.rev and (rev is not None or not doc.deleted and doc.rev):
+                raise _SyncGatewayError(409, "conflict", "Document revision conflict")
+
+            new_rev, cv = self._next_versions(doc, body, deleted)
+        else:
+            if rev is None:
+                raise _SyncGatewayError(400, "Bad Request", "new_edits=false requires a _rev")
+            if doc.rev and int(rev.split("-", 1)[0]) <= doc.generation:
+                # An older (or the same) revision, which would only go into the rev tree
+                return doc
+
+            new_rev = rev
+            self.__last_timestamp = max(time.time_ns(), self.__last_timestamp + 1)
+            cv = f"{self.__last_timestamp:x}@{self.__source_id}"
+
+        database = collection.database
+        collection[doc_id] = doc
+        database.last_seq += 1
+        database.doc_writes += 1
+        doc.body = body
+        doc.deleted = deleted
+        doc.rev = new_rev
+        doc.cv = cv
+        doc.seq = database.last_seq
+        return doc
+
+    def _write_result(self, doc_id: str, doc: _Document) -> dict[str, Any]:
+        ret_val: dict[str, Any] = {"id": doc_id, "rev": doc.rev}
+        if self.__version_vectors:
+            ret_val["cv"] = doc.cv
+
+        return ret_val
+
+    @staticmethod
+    def _split_body(raw: dict[str, Any]) -> tuple[str | None, str | None, bool, dict[str, Any]]:
+        body = {k: v for k, v in raw.items() if not k.startswith("_")}
+        return raw.get("_id"), raw.get("_rev"), bool(raw.get("_deleted", False)), body
+
+    def _bulk_docs(self, collection: _Collection, request: dict[str, Any]) -> list[dict[str, Any]]:
+        new_edits = bool(request.get("new_edits", True))
+        results: list[dict[str, Any]] = []
+        for raw in cast(list[dict[str, Any]], request.get("docs", [])):
+            doc_id, rev, deleted, body = self._split_body(raw)
+            doc_id = doc_id or uuid4().hex
+            try:
+                doc = self._write(collection, doc_id, body, rev, deleted, new_edits)
+                results.append(self._write_result(doc_id, doc))
+            except _SyncGatewayError as e:
+                results.append({"id": doc_id, "error": e.error, "reason": str(e), "status": e.status})
+
+        collection.database.notify()
+        return results
+
+    def _document_json(self, doc_id: str, doc: _Document, show_cv: bool) -> dict[str, Any]:
+        ret_val = {**doc.body, "_id": doc_id, "_rev": doc.rev}
+        if show_cv and self.__version_vectors:
+            ret_val["_cv"] = doc.cv
+
+        return ret_val
+
+    def _all_docs(
+        self, collection: _Collection, request: web.Request, body: dict[str, Any], channels: set[str] | None
+    ) -> dict[str, Any]:
+        include_docs = request.query.get("include_docs") == "true" or bool(body.get("include_docs", False))
+        keys = body.get("keys")
+        if keys is None and "keys" in request.query:
+            keys = json.loads(request.query["keys"])
+
+        rows: list[dict[str, Any]] = []
+        ids = cast(list[str], keys) if keys is not None else sorted(collection)
+        for doc_id in ids:
+            doc = collection.get(doc_id)
+            if doc is None or doc.deleted or not self._visible(doc, channels):
+                if keys is not None:
+                    rows.append({"key": doc_id, "error": "not_found"})
+                continue
+
+            value: dict[str, Any] = {"rev": doc.rev}
+            if self.__version_vectors:
+                value["cv"] = doc.cv
+
+            row: dict[str, Any] = {"key": doc_id, "id": doc_id, "value": value}
+            if include_docs:
+                row["doc"] = self._document_json(doc_id, doc, False)
+
+            rows.append(row)
+
+        if "limit" in request.query:
+            rows = rows[: int(request.query["limit"])]
+
+        return {"rows": rows, "total_rows": len(rows), "update_seq": collection.database.last_seq}
+
+    async def _changes(
+        self,
+        collection: _Collection,
+        request: web.Request,
+        body: dict[str, Any],
+        channels: set[str] | None,
+    ) -> dict[str, Any]:
+        database = collection.database
+        options = {**request.query, **body}
+        feed = str(options.get("feed", "normal"))
+        if feed not in ("normal", "longpoll"):
+            raise _SyncGatewayError(400, "Bad Request", f"feed={feed} is not supported by LocalSyncGateway")
+
+        since = int(options.get("since", 0) or 0)
+        limit = int(options["limit"]) if "limit" in options else None
+        include_docs = str(options.get("include_docs", "false")).lower() == "true"
+        use_cv = options.get("version_type") == "cv" and self.__version_vectors
+        doc_ids = options.get("doc_ids")
+        if isinstance(doc_ids, str):
+            doc_ids = json.loads(doc_ids)
+
+        def collect() -> list[tuple[str, _Document]]:
+            ret_val = [
+                (doc_id, doc)
+                for doc_id, doc in collection.items()
+                if doc.seq > since and (doc_ids is None or doc_id in doc_ids) and self._visible(doc, channels)
+            ]
+            ret_val.sort(key=lambda d: d[1].seq)
+            return ret_val[:limit] if limit is not None else ret_val
+
+        changed = collect()
+        if not changed and feed == "longpoll":
+            timeout = int(options.get("timeout", 300000)) / 1000
+            waiter = database.changed
+            try:
+                await asyncio.wait_for(waiter.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            changed = collect()
+
+        results: list[dict[str, Any]] = []
+        for doc_id, doc in changed:
+            entry: dict[str, Any] = {
+                "seq": doc.seq,
+                "id": doc_id,
+                "changes": [{"cv": doc.cv}] if use_cv else [{"rev": doc.rev}],
+            }
+            if doc.deleted:
+                entry["deleted"] = True
+            if include_docs:
+                entry["doc"] = self._document_json(doc_id, doc, use_cv)
+
+            results.append(entry)
+
+        last_seq = results[-1]["seq"] if results else max(since, database.last_seq if feed == "normal" else since)
+        return {"results": results, "last_seq": str(last_seq)}
+
+    async def _bulk_get(
+        self,
+        collection: _Collection,
+        request: web.Request,
+        body: dict[str, Any],
+        channels: set[str] | None,
+    ) -> web.Response:
+        show_cv = request.query.get("show_cv") == "true"
+        writer = MultipartWriter("mixed")
+        for entry in cast(list[dict[str, Any]], body.get("docs", [])):
+            doc_id = cast(str, entry.get("id"))
+            doc = collection.get(doc_id)
+            wanted_rev = entry.get("rev")
+            if doc is None or doc.deleted or (wanted_rev is not None and wanted_rev != doc.rev):
+                part: dict[str, Any] = {"id": doc_id, "error": "not_found", "reason": "missing", "status": 404}
+            elif not self._visible(doc, channels):
+                part = {"id": doc_id, "error": "forbidden", "reason": "forbidden", "status": 403}
+            else:
+                collection.database.doc_reads += 1
+                part = self._document_json(doc_id, doc, show_cv)
+
+            writer.append_json(part)
+
+        # The writer is a payload, which serializes itself and sets the content type
+        # (with its boundary)
+        return web.Response(body=writer)
+
+    def _purge(self, collection: _Collection, body: dict[str, Any]) -> dict[str, Any]:
+        purged: dict[str, list[str]] = {}
+        for doc_id in body:
+            if collection.pop(doc_id, None) is not None:
+                purged[doc_id] = ["*"]
+
+        return {"purged": purged}
+
+    async def _document_request(
+        self,
+        request: web.Request,
+        collection: _Collection,
+        doc_id: str,
+        channels: set[str] | None,
+    ) -> web.Response:
+        database = collection.database
+        doc = collection.get(doc_id)
+        if request.method == "GET":
+            if doc is None:
+                raise _not_found("missing")
+            if doc.deleted:
+                raise _not_found("deleted")
+            if not self._visible(doc, channels):
+                raise _SyncGatewayError(403, "Forbidden", "forbidden")
+
+            database.doc_reads += 1
+            return web.json_response(self._document_json(doc_id, doc, request.query.get("show_cv") == "true"))
+
+        if request.method == "PUT":
+            _, body_rev, deleted, body = self._split_body(cast(dict[str, Any], await request.json()))
+            rev = request.query.get("rev") or body_rev
+            new_edits = request.query.get("new_edits", "true") != "false"
+            written = self._write(collection, doc_id, body, rev, deleted, new_edits)
+            database.notify()
+            return web.json_response({**self._write_result(doc_id, written), "ok": True}, status=201)
+
+        if request.method == "DELETE":
+            if doc is None or doc.deleted:
+                raise _not_found("missing" if doc is None else "deleted")
+
+            written = self._write(collection, doc_id, {}, request.query.get("rev"), deleted=True)
+            database.notify()
+            return web.json_response({**self._write_result(doc_id, written), "ok": True})
+
+        raise _SyncGatewayError(405, "Method Not Allowed", f"{request.method} not allowed on a document")
@@ -0,0 +1,747 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import platform
+import posixpath
+import random
+import re
+import socket
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from copy import deepcopy
+from types import TracebackType
+from typing import Any, cast
+from urllib.parse import urlparse
+from uuid import uuid4
+
+from aiohttp import ClientSession, ClientWebSocketResponse, WSMsgType, web
+
+from cbltest.logging import cbl_error, cbl_info
+
+# This module is an in-memory stand-in for a Couchbase Lite Test Server, written in
+# Python so that work on the client side (batching, pipelining, the WebSocket
+# transport, etc) can be benchmarked and tested without building or running a real
+# one.  It speaks the same protocol (spec/api/api.yaml) over HTTP, and over the
+# WebSocket "ts_*" envelope used by the JS Test Server, but it only implements what
+# the client's hot paths need:
+#
+# - /, /reset, /newSession, /log and /performMaintenance
+# - /getAllDocuments, /getDocument and /updateDatabase (keypaths as in the spec,
+#   blobs are replaced by stub blob dictionaries that are never downloaded)
+# - /snapshotDocuments and /verifyDocuments
+# - /runQuery, for "SELECT meta().id" or "SELECT *" from one collection (with an
+#   optional LIMIT).  Anything else is a 400 error.
+# - /startReplicator, /stopReplicator and /getReplicatorStatus.  Replicators are
+#   recorded but don't replicate, and are always stopped with nothing to do.
+#
+# Datasets aren't downloaded either; they have to be passed to the constructor by
+# name.  A latency (plus random jitter) can be added before every response.
+
+Document = dict[str, Any]
+Dataset = dict[str, dict[str, Document]]
+"""The documents of a dataset, by collection ("scope.collection") and then ID"""
+
+_DEFAULT_COLLECTION = "_default._default"
+_QUERY_PATTERN = re.compile(
+    r"^\s*select\s+(?P<what>meta\(\)\.id|\*)\s+from\s+(?P<collection>[\w.]+)(?:\s+limit\s+(?P<limit>\d+))?\s*;?\s*$",
+    re.IGNORECASE,
+)
+_ESCAPED_KEYPATH_CHARS = re.compile(r"([.\[\]\\])")
+
+
+class _RequestError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class _Missing:
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+_MISSING = _Missing()
+
+
+def _parse_keypath(keypath: str) -> list[str | int]:
+    """Splits a keypath (e.g. "foo.bar[1].baz") into property names and array indexes"""
+    keypath = keypath.removeprefix("$.")
+
+    ret_val: list[str | int] = []
+    current = ""
+    has_current = False
+    i = 0
+    while i < len(keypath):
+        c = keypath[i]
+        if c == "\\" and i + 1 < len(keypath):
+            current += keypath[i + 1]
+            has_current = True
+            i += 2
+            continue
+
+        if c == ".":
+            if not has_current and (len(ret_val) == 0 or isinstance(ret_val[-1], str)):
+                raise _RequestError(400, f"Invalid keypath '{keypath}' (empty property)")
+
+            if has_current:
+                ret_val.append(current)
+            current, has_current = "", False
+        elif c == "[":
+            if has_current:
+                ret_val.append(current)
+            current, has_current = "", False
+            end = keypath.find("]", i)
+            if end == -1 or not keypath[i + 1 : end].isdigit():
+                raise _RequestError(400, f"Invalid keypath '{keypath}' (bad array index)")
+
+            ret_val.append(int(keypath[i + 1 : end]))
+            i = end
+        elif c == "]":
+            raise _RequestError(400, f"Invalid keypath '{keypath}' (unexpected ']')")
+        else:
+            current += c
+            has_current = True
+
+        i += 1
+
+    if has_current:
+        ret_val.append(current)
+
+    if len(ret_val) == 0 or not isinstance(ret_val[0], str):
+        raise _RequestError(400, f"Invalid keypath '{keypath}' (must start with a property)")
+
+    return ret_val
+
+
+def _set_keypath(doc: Document, keypath: str, value: Any) -> None:
+    """Sets the value at a keypath, creating dictionaries and arrays (padded with nulls) as needed"""
+    path = _parse_keypath(keypath)
+    current: Any = doc
+    for component, next_component in zip(path, [*path[1:], None]):
+        empty: list | dict = [] if isinstance(next_component, int) else {}
+        if isinstance(component, int):
+            if not isinstance(current, list):
+                raise _RequestError(400, f"Keypath '{keypath}' indexes something that isn't an array")
+
+            current.extend([None] * (component + 1 - len(current)))
+            if next_component is None:
+                current[component] = deepcopy(value)
+                return
+
+            if current[component] is None:
+                current[component] = empty
+
+            current = current[component]
+        else:
+            if not isinstance(current, dict):
+                raise _RequestError(400, f"Keypath '{keypath}' has a property of something that isn't a dictionary")
+
+            if next_component is None:
+                current[component] = deepcopy(value)
+                return
+
+            if current.get(component) is None:
+                current[component] = empty
+
+            current = current[component]
+
+
+def _remove_keypath(doc: Document, keypath: str) -> None:
+    """Removes the value at a keypath, if there is one"""
+    path = _parse_keypath(keypath)
+    current: Any = doc
+    for component in path[:-1]:
+        if isinstance(component, int):
+            if not isinstance(current, list) or component >= len(current):
+                return
+        elif not isinstance(current, dict) or component not in current:
+            return
+
+        current = current[component]
+
+    last = path[-1]
+    if isinstance(last, int):
+        if isinstance(current, list) and last < len(current):
+            del current[last]
+    elif isinstance(current, dict):
+        current.pop(last, None)
+
+
+def _stub_blob(name: str) -> Document:
+    """Creates the blob dictionary that stands in for the blob with the given name"""
+    name = name.removesuffix(".zip")
+
+    digest = base64.b64encode(hashlib.sha1(name.encode("utf-8")).digest()).decode("ascii")
+    return {
+        "@type": "blob",
+        "content_type": "image/jpeg" if name.endswith(".jpg") else "application/octet-stream",
+        "digest": f"sha1-{digest}",
+        "length": 0,
+    }
+
+
+def _join_keypath(parent: str, component: str | int) -> str:
+    if isinstance(component, int):
+        return f"{parent}[{component}]"
+
+    escaped = _ESCAPED_KEYPATH_CHARS.sub(r"\\\1", component)
+    return f"{parent}.{escaped}" if parent else escaped
+
+
+def _first_difference(actual: Any, expected: Any, keypath: str = "") -> tuple[str, Any, Any] | None:
+    """Finds the first keypath that has a different value in two documents (with MISSING for absent values)"""
+    if isinstance(actual, dict) and isinstance(expected, dict):
+        for key in sorted(actual.keys() | expected.keys()):
+            diff = _first_difference(
+                actual.get(key, _MISSING), expected.get(key, _MISSING), _join_keypath(keypath, key)
+            )
+            if diff is not None:
+                return diff
+
+        return None
+
+    if isinstance(actual, list) and isinstance(expected, list):
+        for i in range(max(len(actual), len(expected))):
+            diff = _first_difference(
+                actual[i] if i < len(actual) else _MISSING,
+                expected[i] if i < len(expected) else _MISSING,
+                _join_keypath(keypath, i),
+            )
+            if diff is not None:
+                return diff
+
+        return None
+
+    # JSON true and 1 are different things, but not to Python
+    if type(actual) is bool or type(expected) is bool:
+        equal = type(actual) is type(expected) and actual == expected
+    else:
+        equal = actual == expected
+
+    return None if equal else (keypath, actual, expected)
+
+
+def _dataset_name(dataset: str) -> str:
+    """Gets the name of a dataset from its URL (or from its name, in API v1)"""
+    name = posixpath.basename(urlparse(dataset).path)
+    return name.removesuffix(".zip").removesuffix(".cblite2")
+
+
+def _collection_name(query_name: str) -> str:
+    if query_name in ("_", "_default"):
+        return _DEFAULT_COLLECTION
+
+    return query_name if "." in query_name else f"_default.{query_name}"
+
+
+class _Document:
+    def __init__(self, body: Document) -> None:
+        self.body = body
+        self.revs: list[str] = []
+        self.deleted = False
+
+
+_Collection = dict[str, _Document]
+_Database = dict[str, _Collection]
+
+
+class LocalTestServer:
+    """
+    An in-memory stand-in for a Couchbase Lite Test Server, for exercising the client
+    without a real one (see the comment at the top of this module for what it implements).
+
+    Over HTTP, start it and put its :attr:`url` in the test-servers of the config.  Over
+    WebSocket, start the client's :class:`WebSocketRouter` and then :meth:`connect` this
+    to it, as the JS Test Server's tdk.html page would.
+    """
+
+    @property
+    def url(self) -> str:
+        """Gets the HTTP URL of the server (only valid once started)"""
+        assert self.__port is not None, "LocalTestServer not started"
+        return f"http://localhost:{self.__port}/"
+
+    @property
+    def server_id(self) -> str:
+        """Gets the ID that the server sends in CBLTest-Server-ID"""
+        return self.__server_id
+
+    @property
+    def request_counts(self) -> Counter[str]:
+        """Gets the number of requests received so far, by command (e.g. "/updateDatabase")"""
+        return self.__request_counts
+
+    @property
+    def log_messages(self) -> list[str]:
+        """Gets the messages received by /log"""
+        return self.__log_messages
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0,
+        jitter: float = 0,
+        api_version: int = 2,
+        datasets: dict[str, Dataset] | None = None,
+        cbl_version: str = "4.0.0",
+        seed: int | None = None,
+    ) -> None:
+        """
+        :param latency: The time (in seconds) to wait before sending each response
+        :param jitter: The maximum random time (in seconds) added to the latency of each response
+        :param api_version: The API version that the server reports and expects
+        :param datasets: The datasets that /reset can load, by name (e.g. "travel")
+        :param cbl_version: The Couchbase Lite version that the server reports
+        :param seed: The seed for the jitter, for repeatable runs
+        """
+        assert latency >= 0 and jitter >= 0, "latency and jitter cannot be negative"
+        self.__latency = latency
+        self.__jitter = jitter
+        self.__random = random.Random(seed)
+        self.__api_version = api_version
+        self.__datasets = datasets if datasets is not None else {}
+        self.__cbl_version = cbl_version
+        self.__server_id = str(uuid4())
+        self.__source_id = base64.b64encode(uuid4().bytes).decode("ascii").rstrip("=")
+        self.__last_timestamp = 0
+        self.__databases: dict[str, _Database] = {}
+        self.__snapshots: dict[str, tuple[str, dict[tuple[str, str], Document | None]]] = {}
+        self.__replicators: dict[str, dict[str, Any]] = {}
+        self.__request_counts: Counter[str] = Counter()
+        self.__log_messages: list[str] = []
+        self.__port: int | None = None
+        self.__runner: web.AppRunner | None = None
+        self.__ws_session: ClientSession | None = None
+        self.__ws: ClientWebSocketResponse[bool] | None = None
+        self.__ws_task: asyncio.Task | None = None
+        self.__handlers: dict[str, Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]] = {
+            "/": self._get_root,
+            "/reset": self._reset,
+            "/newSession": self._ignore,
+            "/log": self._log,
+            "/performMaintenance": self._perform_maintenance,
+            "/getAllDocuments": self._get_all_documents,
+            "/getDocument": self._get_document,
+            "/updateDatabase": self._update_database,
+            "/snapshotDocuments": self._snapshot_documents,
+            "/verifyDocuments": self._verify_documents,
+            "/runQuery": self._run_query,
+            "/startReplicator": self._start_replicator,
+            "/stopReplicator": self._stop_replicator,
+            "/getReplicatorStatus": self._get_replicator_status,
+        }
+
+    async def start(self) -> None:
+        """Starts listening for HTTP requests on a port chosen by the OS"""
+        app = web.Application(client_max_size=0)
+        app.router.add_route("*", "/{command:.*}", self._http_handler)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("localhost", 0))
+        sock.listen(128)
+        site = web.SockSite(self.__runner, sock)
+        await site.start()
+        self.__port = sock.getsockname()[1]
+        cbl_info(f"LocalTestServer listening on {self.url}")
+
+    async def connect(self, tdk_url: str, device: str = "ws0") -> None:
+        """
+        Connects to the client's WebSocket router and starts answering requests from it
+
+        :param tdk_url: The URL of the router (e.g. ws://localhost:<port>/)
+        :param device: The device ID to register as ("ws<n>" for the n-th test server in the config)
+        """
+        self.__ws_session = ClientSession()
+        ws = self.__ws = await self.__ws_session.ws_connect(tdk_url, max_msg_size=0)
+        await ws.send_str(json.dumps({"device": device, "apiVersion": self.__api_version}))
+        self.__ws_task = asyncio.create_task(self._ws_loop(ws))
+
+    async def close(self) -> None:
+        """Stops listening and disconnects from the WebSocket router"""
+        if self.__ws is not None:
+            await self.__ws.close()
+            self.__ws = None
+
+        if self.__ws_task is not None:
+            await asyncio.gather(self.__ws_task, return_exceptions=True)
+            self.__ws_task = None
+
+        if self.__ws_session is not None:
+            await self.__ws_session.close()
+            self.__ws_session = None
+
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+            self.__port = None
+
+    async def __aenter__(self) -> LocalTestServer:  # noqa: PYI034
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+    async def _dispatch(self, command: str, body: dict[str, Any]) -> tuple[int, dict[str, Any]]:
+        self.__request_counts[command] += 1
+        delay = self.__latency + (self.__random.uniform(0, self.__jitter) if self.__jitter > 0 else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        handler = self.__handlers.get(command)
+        if handler is None:
+            return 404, self._error_body(f"{command} is not supported by LocalTestServer")
+
+        try:
+            return 200, await handler(body)
+        except _RequestError as e:
+            return e.status, self._error_body(str(e))
+        except Exception as e:
+            cbl_error(f"LocalTestServer failed to handle {command}: {e!r}")
+            return 500, self._error_body(f"{type(e).__name__}: {e}")
+
+    @staticmethod
+    def _error_body(message: str) -> dict[str, Any]:
+        return {"domain": "TESTSERVER", "code": 1, "message": message}
+
+    async def _http_handler(self, request: web.Request) -> web.Response:
+        body: dict[str, Any] = {}
+        if request.can_read_body:
+            try:
+                body = cast(dict[str, Any], await request.json())
+            except ValueError:
+                return self._http_response(400, self._error_body("Request body is not valid JSON"))
+
+        status, result = await self._dispatch(f"/{request.match_info['command']}", body)
+        return self._http_response(status, result)
+
+    def _http_response(self, status: int, body: dict[str, Any]) -> web.Response:
+        headers = {
+            "CBLTest-Server-ID": self.__server_id,
+            "CBLTest-API-Version": str(self.__api_version),
+        }
+        return web.json_response(body, status=status, headers=headers)
+
+    async def _ws_loop(self, ws: ClientWebSocketResponse[bool]) -> None:
+        # Requests are answered concurrently (in whatever order they finish), like the
+        # JS Test Server does, so that pipelined requests see the latency overlap
+        pending: set[asyncio.Task] = set()
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+
+            task = asyncio.create_task(self._ws_respond(ws, cast(dict[str, Any], json.loads(msg.data))))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        for task in list(pending):
+            task.cancel()
+
+    async def _ws_respond(self, ws: ClientWebSocketResponse[bool], request: dict[str, Any]) -> None:
+        request_id = request.get("ts_id")
+        command = request.get("ts_command")
+        if not isinstance(request_id, int) or not isinstance(command, str):
+            cbl_error(f"LocalTestServer received an invalid WebSocket request: {request}")
+            return
+
+        body = {k: v for k, v in request.items() if not k.startswith("ts_")}
+        status, result = await self._dispatch(command, body)
+        response: dict[str, Any] = {
+            "ts_id": request_id,
+            "ts_serverID": self.__server_id,
+            "ts_apiVersion": self.__api_version,
+        }
+        if status == 200:
+            response.update(result)
+        else:
+            # The client takes the code of the error as the status of the response
+            response["ts_error"] = {**result, "code": status}
+
+        if not ws.closed:
+            await ws.send_str(json.dumps(response))
+
+    def _database(self, body: dict[str, Any]) -> tuple[str, _Database]:
+        name = body.get("database")
+        if not isinstance(name, str) or name not in self.__databases:
+            raise _RequestError(400, f"Database '{name}' not found")
+
+        return name, self.__databases[name]
+
+    @staticmethod
+    def _collection(database: _Database, db_name: str, collection: str) -> _Collection:
+        if collection not in database:
+            raise _RequestError(400, f"Collection '{collection}' not found in database '{db_name}'")
+
+        return database[collection]
+
+    def _next_rev(self, doc: _Document) -> str:
+        if self.__api_version < 2:
+            generation = len(doc.revs) + 1
+            parent = doc.revs[0] if doc.revs else ""
+            content = json.dumps(doc.body, sort_keys=True) + parent + str(doc.deleted)
+            return f"{generation}-{hashlib.sha1(content.encode('utf-8')).hexdigest()}"
+
+        self.__last_timestamp = max(time.time_ns(), self.__last_timestamp + 1)
+        return f"{self.__last_timestamp:x}@{self.__source_id}"
+
+    def _save(self, collection: _Collection, doc_id: str, body: Document, deleted: bool = False) -> None:
+        doc = collection.get(doc_id)
+        if doc is None:
+            doc = _Document(body)
+            collection[doc_id] = doc
+
+        doc.body = body
+        doc.deleted = deleted
+        doc.revs.insert(0, self._next_rev(doc))
+
+    async def _ignore(self, body: dict[str, Any]) -> dict[str, Any]:
+        return {}
+
+    async def _get_root(self, body: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "version": self.__cbl_version,
+            "apiVersion": self.__api_version,
+            "cbl": "couchbase-lite-c",
+            "device": {
+                "systemName": platform.system(),
+                "systemVersion": platform.release(),
+            },
+            "additionalInfo": "LocalTestServer (in-memory stand-in)",
+        }
+
+    async def _reset(self, body: dict[str, Any]) -> dict[str, Any]:
+        databases: dict[str, _Database] = {}
+        for db_name, config in cast(dict[str, dict[str, Any]], body.get("databases", {})).items():
+            database: _Database = {_DEFAULT_COLLECTION: {}}
+            if "dataset" in config:
+                dataset_name = _dataset_name(cast(str, config["dataset"]))
+                if dataset_name not in self.__datasets:
+                    raise _RequestError(400, f"Dataset '{dataset_name}' not loaded into LocalTestServer")
+
+                for collection_name, docs in self.__datasets[dataset_name].items():
+                    collection = database.setdefault(collection_name, {})
+                    for doc_id, doc_body in docs.items():
+                        self._save(collection, doc_id, deepcopy(doc_body))
+            else:
+                for collection_name in config.get("collections", []):
+                    database.setdefault(collection_name, {})
+
+            databases[db_name] = database
+
+        self.__databases = databases
+        self.__snapshots.clear()
+        self.__replicators.clear()
+        return {}
+
+    async def _log(self, body: dict[str, Any]) -> dict[str, Any]:
+        message = str(body.get("message", ""))
+        self.__log_messages.append(message)
+        cbl_info(f"[LocalTestServer] {message}")
+        return {}
+
+    async def _perform_maintenance(self, body: dict[str, Any]) -> dict[str, Any]:
+        self._database(body)
+        return {}
+
+    async def _get_all_documents(self, body: dict[str, Any]) -> dict[str, Any]:
+        db_name, database = self._database(body)
+        ret_val: dict[str, Any] = {}
+        for collection_name in cast(list[str], body.get("collections", [])):
+            collection = self._collection(database, db_name, collection_name)
+            ret_val[collection_name] = [
+                {"id": doc_id, "rev": doc.revs[0]} for doc_id, doc in collection.items() if not doc.deleted
+            ]
+
+        return ret_val
+
+    async def _get_document(self, body: dict[str, Any]) -> dict[str, Any]:
+        db_name, database = self._database(body)
+        entry = cast(dict[str, str], body.get("document", {}))
+        collection = self._collection(database, db_name, entry.get("collection", ""))
+        doc = collection.get(entry.get("id", ""))
+        if doc is None or doc.deleted:
+            raise _RequestError(404, f"Document '{entry.get('id')}' not found in '{entry.get('collection')}'")
+
+        return {"_id": entry["id"], "_revs": ", ".join(doc.revs), **doc.body}
+
+    @staticmethod
+    def _apply_update(body: Document, update: dict[str, Any]) -> Document:
+        for properties in cast(list[dict[str, Any]], update.get("updatedProperties", [])):
+            for keypath, value in properties.items():
+                _set_keypath(body, keypath, value)
+
+        for keypath in cast(list[str], update.get("removedProperties", [])):
+            _remove_keypath(body, keypath)
+
+        for keypath, blob in cast(dict[str, str], update.get("updatedBlobs", {})).items():
+            _set_keypath(body, keypath, _stub_blob(posixpath.basename(urlparse(blob).path)))
+
+        return body
+
+    async def _update_database(self, body: dict[str, Any]) -> dict[str, Any]:
+        db_name, database = self._database(body)
+
+        # Work out every change first, so that a bad one leaves the database untouched
+        # like a transaction on a real Test Server would
+        staged: dict[tuple[str, str], tuple[str, Document | None]] = {}
+        for update in cast(list[dict[str, Any]], body.get("updates", [])):
+            collection_name = cast(str, update.get("collection"))
+            doc_id = cast(str, update.get("documentID"))
+            collection = self._collection(database, db_name, collection_name)
+            key = (collection_name, doc_id)
+            if key in staged:
+                current = staged[key][1]
+            else:
+                existing = collection.get(doc_id)
+                current = None if existing is None or existing.deleted else deepcopy(existing.body)
+
+            update_type = str(update.get("type", "")).upper()
+            if update_type == "UPDATE":
+                staged[key] = ("UPDATE", self._apply_update(current if current is not None else {}, update))
+            elif update_type == "DELETE":
+                staged[key] = ("DELETE", None)
+            elif update_type == "PURGE":
+                staged[key] = ("PURGE", None)
+            else:
+                raise _RequestError(400, f"Unknown update type '{update.get('type')}'")
+
+        for (collection_name, doc_id), (update_type, new_body) in staged.items():
+            collection = database[collection_name]
+            if update_type == "UPDATE":
+                self._save(collection, doc_id, cast(Document, new_body))
+            elif update_type == "DELETE":
+                existing = collection.get(doc_id)
+                if existing is not None and not existing.deleted:
+                    self._save(collection, doc_id, {}, deleted=True)
+            else:
+                collection.pop(doc_id, None)
+
+        return {}
+
+    async def _snapshot_documents(self, body: dict[str, Any]) -> dict[str, Any]:
+        db_name, database = self._database(body)
+        documents: dict[tuple[str, str], Document | None] = {}
+        for entry in cast(list[dict[str, str]], body.get("documents", [])):
+            collection = self._collection(database, db_name, entry["collection"])
+            doc = collection.get(entry["id"])
+            documents[(entry["collection"], entry["id"])] = None if doc is None or doc.deleted else deepcopy(doc.body)
+
+        snapshot_id = str(uuid4())
+        self.__snapshots[snapshot_id] = (db_name, documents)
+        return {"id": snapshot_id}
+
+    async def _verify_documents(self, body: dict[str, Any]) -> dict[str, Any]:
+        db_name, database = self._database(body)
+        snapshot_id = cast(str, body.get("snapshot"))
+        if snapshot_id not in self.__snapshots or self.__snapshots[snapshot_id][0] != db_name:
+            raise _RequestError(400, f"Snapshot '{snapshot_id}' not found")
+
+        snapshot = self.__snapshots[snapshot_id][1]
+        changes: dict[tuple[str, str], dict[str, Any]] = {}
+        for change in cast(list[dict[str, Any]], body.get("changes", [])):
+            key = (cast(str, change.get("collection")), cast(str, change.get("documentID")))
+            if key not in snapshot:
+                raise _RequestError(400, f"Document '{key[1]}' in '{key[0]}' is not in snapshot '{snapshot_id}'")
+
+            changes[key] = change
+
+        for (collection_name, doc_id), before in snapshot.items():
+            existing = database.get(collection_name, {}).get(doc_id)
+            actual = None if existing is None or existing.deleted else existing.body
+            prefix = f"Document '{doc_id}' in '{collection_name}'"
+            change = changes.get((collection_name, doc_id))
+            change_type = str(change.get("type", "")).upper() if change is not None else None
+
+            if change_type == "PURGE":
+                if existing is not None:
+                    return {"result": False, "description": f"{prefix} was not purged"}
+                continue
+
+            if change_type == "DELETE":
+                if actual is not None:
+                    return {"result": False, "description": f"{prefix} was not deleted"}
+                continue
+
+            if change_type is None and before is None:
+                if actual is not None:
+                    return {"result": False, "description": f"{prefix} should not exist"}
+                continue
+
+            if actual is None:
+                return {"result": False, "description": f"{prefix} was not found"}
+
+            expected = deepcopy(before) if before is not None else {}
+            if change is not None:
+                expected = self._apply_update(expected, change)
+
+            diff = _first_difference(actual, expected)
+            if diff is not None:
+                keypath, actual_value, expected_value = diff
+                ret_val: dict[str, Any] = {
+                    "result": False,
+                    "description": f"{prefix} had unexpected properties at key '{keypath}'",
+                    "document": actual,
+                }
+                if actual_value is not _MISSING:
+                    ret_val["actual"] = actual_value
+                if expected_value is not _MISSING:
+                    ret_val["expected"] = expected_value
+
+                return ret_val
+
+        return {"result": True}
+
+    async def _run_query(self, body: dict[str, Any]) -> dict[str, Any]:
+        db_name, database = self._database(body)
+        query = cast(str, body.get("query", ""))
+        match = _QUERY_PATTERN.match(query)
+        if match is None:
+            raise _RequestError(400, f"Query not supported by LocalTestServer: {query}")
+
+        collection_name = _collection_name(match["collection"])
+        collection = self._collection(database, db_name, collection_name)
+        alias = collection_name.split(".")[-1]
+        results: list[dict[str, Any]] = []
+        for doc_id, doc in collection.items():
+            if doc.deleted:
+                continue
+
+            results.append({"id": doc_id} if match["what"] != "*" else {alias: doc.body})
+
+        if match["limit"] is not None:
+            results = results[: int(match["limit"])]
+
+        return {"results": results}
+
+    async def _start_replicator(self, body: dict[str, Any]) -> dict[str, Any]:
+        config = cast(dict[str, Any], body.get("config", {}))
+        self._database(config)
+        replicator_id = str(uuid4())
+        self.__replicators[replicator_id] = config
+        return {"id": replicator_id}
+
+    def _replicator(self, body: dict[str, Any]) -> dict[str, Any]:
+        replicator_id = body.get("id")
+        if not isinstance(replicator_id, str) or replicator_id not in self.__replicators:
+            raise _RequestError(400, f"Replicator '{replicator_id}' not found")
+
+        return self.__replicators[replicator_id]
+
+    async def _stop_replicator(self, body: dict[str, Any]) -> dict[str, Any]:
+        self._replicator(body)
+        return {}
+
+    async def _get_replicator_status(self, body: dict[str, Any]) -> dict[str, Any]:
+        self._replicator(body)
+        return {"activity": "STOPPED", "progress": {"completed": True}, "documents": []}
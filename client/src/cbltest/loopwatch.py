@@ -0,0 +1,221 @@
+import asyncio
+import json
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Any
+
+# This module finds the places where the client blocks the asyncio event loop
+# (synchronous SDK or HTTP calls, sleeps, file writes...), which delays every other
+# task on the loop and so throws off the timing of concurrent workloads.
+#
+# While it is running, every callback the loop runs (which includes each step of
+# each task) is timed.  A watchdog thread looks at the callbacks in progress, and
+# when one has been running for longer than the threshold it records the Python stack
+# of the loop thread at that moment, which shows what the callback is blocked on.
+# It works for any event loop in the process, without needing to know about them.
+
+_SUPPORT_PATHS = tuple(
+    str(Path(p)) for p in {sysconfig.get_paths()["stdlib"], sysconfig.get_paths()["platstdlib"]} if p
+)
+_CBLTEST_PATH = str(Path(__file__).parent)
+_EVENTS_FILE = asyncio.events.__file__
+
+
+class LoopStall:
+    """A callback that blocked an event loop for longer than the threshold"""
+
+    @property
+    def test(self) -> str | None:
+        """Gets the ID of the test that was running, if any"""
+        return self.__test
+
+    @property
+    def duration(self) -> float:
+        """Gets how long the callback blocked the loop for, in seconds"""
+        return self.__duration
+
+    @property
+    def callback(self) -> str:
+        """Gets a description of the callback"""
+        return self.__callback
+
+    @property
+    def stack(self) -> list[str]:
+        """
+        Gets the stack of the loop thread (innermost last) once the callback was over the
+        threshold.  Empty if the callback finished before the watchdog could look at it.
+        """
+        return self.__stack
+
+    @property
+    def location(self) -> str:
+        """
+        Gets the innermost frame of the stack that isn't part of Python or an installed
+        package, which is usually the helper that is doing the blocking
+        """
+        return self.__location
+
+    def __init__(self, test: str | None, duration: float, callback: str, stack: list[str], location: str) -> None:
+        self.__test = test
+        self.__duration = duration
+        self.__callback = callback
+        self.__stack = stack
+        self.__location = location
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "test": self.__test,
+            "duration": round(self.__duration, 4),
+            "callback": self.__callback,
+            "location": self.__location,
+            "stack": self.__stack,
+        }
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> "LoopStall":
+        return LoopStall(data.get("test"), data["duration"], data["callback"], data["stack"], data["location"])
+
+
+class _RunningCallback:
+    def __init__(self, handle: asyncio.Handle) -> None:
+        self.handle = handle
+        self.start = time.monotonic()
+        self.stack: list[traceback.FrameSummary] | None = None
+
+
+def _is_support_frame(frame: traceback.FrameSummary) -> bool:
+    # cbltest itself may well be installed as a package, but it is what we are looking for
+    if frame.filename.startswith(_CBLTEST_PATH):
+        return False
+
+    return "site-packages" in frame.filename or frame.filename.startswith(_SUPPORT_PATHS)
+
+
+class LoopStallDetector:
+    """
+    Records the callbacks that block any event loop in the process for longer than a
+    threshold.  Only one can be started at a time.
+    """
+
+    @property
+    def stalls(self) -> list[LoopStall]:
+        """Gets the stalls recorded so far, in order"""
+        return self.__stalls
+
+    @property
+    def test(self) -> str | None:
+        """Gets the ID of the test that new stalls are attributed to"""
+        return self.__test
+
+    @test.setter
+    def test(self, value: str | None) -> None:
+        self.__test = value
+
+    def __init__(self, threshold: float) -> None:
+        """
+        :param threshold: How long (in seconds) a callback can run before it counts as a stall
+        """
+        self.__threshold = threshold
+        self.__stalls: list[LoopStall] = []
+        self.__test: str | None = None
+        self.__running: dict[int, _RunningCallback] = {}
+        self.__original_run: Any = None
+        self.__stop = threading.Event()
+        self.__watchdog: threading.Thread | None = None
+
+    def start(self) -> None:
+        assert self.__original_run is None, "LoopStallDetector already started"
+        original_run = self.__original_run = asyncio.Handle._run
+        detector = self
+
+        def _run(handle: asyncio.Handle) -> None:
+            detector._enter(handle)
+            try:
+                original_run(handle)
+            finally:
+                detector._exit(handle)
+
+        asyncio.Handle._run = _run  # ty: ignore[invalid-assignment]
+        self.__stop.clear()
+        self.__watchdog = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self.__watchdog.start()
+
+    def stop(self) -> None:
+        if self.__original_run is None:
+            return
+
+        asyncio.Handle._run = self.__original_run
+        self.__original_run = None
+        self.__stop.set()
+        if self.__watchdog is not None:
+            self.__watchdog.join()
+            self.__watchdog = None
+
+    def _enter(self, handle: asyncio.Handle) -> None:
+        # A loop run from inside a callback (e.g. asyncio.run in synchronous code) is
+        # part of the outer callback as far as the outer loop is concerned
+        thread_id = threading.get_ident()
+        if thread_id not in self.__running:
+            self.__running[thread_id] = _RunningCallback(handle)
+
+    def _exit(self, handle: asyncio.Handle) -> None:
+        thread_id = threading.get_ident()
+        running = self.__running.get(thread_id)
+        if running is None or running.handle is not handle:
+            return
+
+        del self.__running[thread_id]
+        duration = time.monotonic() - running.start
+        if duration < self.__threshold:
+            return
+
+        # The stack starts with the loop machinery that ran the callback, which is noise
+        stack = running.stack or []
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i].filename == __file__ or (stack[i].name == "_run" and stack[i].filename == _EVENTS_FILE):
+                stack = stack[i + 1 :]
+                break
+
+        culprit = next((f for f in reversed(stack) if not _is_support_frame(f)), stack[-1] if stack else None)
+        location = f"{culprit.filename}:{culprit.lineno} in {culprit.name}" if culprit is not None else "(unknown)"
+        self.__stalls.append(
+            LoopStall(
+                self.__test,
+                duration,
+                repr(handle)[:200],
+                [f"{f.filename}:{f.lineno} in {f.name}: {f.line}" for f in stack],
+                location,
+            )
+        )
+
+    def _watch(self) -> None:
+        interval = max(self.__threshold / 4, 0.005)
+        while not self.__stop.wait(interval):
+            now = time.monotonic()
+            frames: dict[int, Any] | None = None
+            for thread_id, running in list(self.__running.items()):
+                if running.stack is not None or now - running.start < self.__threshold:
+                    continue
+
+                if frames is None:
+                    frames = sys._current_frames()
+
+                frame = frames.get(thread_id)
+                if frame is not None and self.__running.get(thread_id) is running:
+                    running.stack = traceback.extract_stack(frame)
+
+
+def write_report(path: Path, stalls: list[LoopStall]) -> None:
+    """Writes the stalls as JSON, so that they can be read back with load_report"""
+    with open(path, "w") as fout:
+        json.dump({"stalls": [s.to_json() for s in stalls]}, fout, indent=2)
+
+
+def load_report(path: Path) -> list[LoopStall]:
+    """Reads the stalls from a report written by write_report"""
+    with open(path) as fin:
+        return [LoopStall.from_json(s) for s in json.load(fin)["stalls"]]
@@ -0,0 +1,221 @@
+import json
+import platform
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+# This module times the client's own hot paths (serializing request bodies, parsing
+# responses, comparing document lists, etc) so that their cost can be tracked from
+# one change to the next.  Each benchmark is an operation that is run in rounds:
+# the number of iterations per round is calibrated so that a round takes at least
+# a minimum time, and the median time per operation over the rounds is reported
+# (the median, so that one round disturbed by something else on the machine
+# doesn't move the result).  The results are written as JSON, and a later run can
+# be compared against them as a baseline (see find_regressions).
+
+
+class BenchmarkResult:
+    """The time taken by one benchmark"""
+
+    @property
+    def name(self) -> str:
+        """Gets the name of the benchmark"""
+        return self.__name
+
+    @property
+    def seconds(self) -> float:
+        """Gets the median time (in seconds) of one operation"""
+        return self.__seconds
+
+    @property
+    def min_seconds(self) -> float:
+        """Gets the time (in seconds) of one operation in the fastest round"""
+        return self.__min_seconds
+
+    @property
+    def iterations(self) -> int:
+        """Gets the number of operations in each round"""
+        return self.__iterations
+
+    @property
+    def rounds(self) -> int:
+        """Gets the number of rounds that were timed"""
+        return self.__rounds
+
+    @property
+    def ops_per_second(self) -> float:
+        """Gets the number of operations per second, based on the median"""
+        return 1 / self.__seconds if self.__seconds > 0 else float("inf")
+
+    def __init__(self, name: str, seconds: float, min_seconds: float, iterations: int, rounds: int) -> None:
+        self.__name = name
+        self.__seconds = seconds
+        self.__min_seconds = min_seconds
+        self.__iterations = iterations
+        self.__rounds = rounds
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "name": self.__name,
+            "seconds": self.__seconds,
+            "min_seconds": self.__min_seconds,
+            "iterations": self.__iterations,
+            "rounds": self.__rounds,
+        }
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> "BenchmarkResult":
+        return BenchmarkResult(
+            data["name"],
+            data["seconds"],
+            data.get("min_seconds", data["seconds"]),
+            data.get("iterations", 1),
+            data.get("rounds", 1),
+        )
+
+
+class BenchmarkRegression:
+    """A benchmark that got slower than it was in the baseline"""
+
+    def __init__(self, current: BenchmarkResult, baseline: BenchmarkResult) -> None:
+        self.current = current
+        self.baseline = baseline
+
+    @property
+    def ratio(self) -> float:
+        """Gets how many times longer the benchmark took than in the baseline"""
+        return self.current.seconds / self.baseline.seconds if self.baseline.seconds > 0 else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.current.name}: {format_seconds(self.baseline.seconds)} -> "
+            f"{format_seconds(self.current.seconds)} (x{self.ratio:.2f})"
+        )
+
+
+def format_seconds(seconds: float) -> str:
+    """Formats the time of an operation with a unit that suits it (e.g. 12.3us)"""
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+
+    return f"{seconds / 1e-9:.3g}ns"
+
+
+def _result(name: str, round_times: list[float], iterations: int) -> BenchmarkResult:
+    per_op = [t / iterations for t in round_times]
+    return BenchmarkResult(name, statistics.median(per_op), min(per_op), iterations, len(per_op))
+
+
+def measure(name: str, op: Callable[[], Any], *, rounds: int = 5, min_round_time: float = 0.2) -> BenchmarkResult:
+    """
+    Times a synchronous operation
+
+    :param name: The name to give the result
+    :param op: The operation to time
+    :param rounds: The number of rounds to time
+    :param min_round_time: The minimum time (in seconds) of a round, which sets the number of operations in each
+    """
+    assert rounds > 0, "rounds must be positive"
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time:
+            break
+
+        iterations = max(iterations * 2, int(iterations * min_round_time / elapsed) if elapsed > 0 else 0)
+
+    round_times = [elapsed]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            op()
+        round_times.append(time.perf_counter() - start)
+
+    return _result(name, round_times, iterations)
+
+
+async def measure_async(
+    name: str, op: Callable[[], Awaitable[Any]], *, rounds: int = 5, min_round_time: float = 0.2
+) -> BenchmarkResult:
+    """
+    Times an asynchronous operation (awaiting each one before starting the next)
+
+    :param name: The name to give the result
+    :param op: The operation to time
+    :param rounds: The number of rounds to time
+    :param min_round_time: The minimum time (in seconds) of a round, which sets the number of operations in each
+    """
+    assert rounds > 0, "rounds must be positive"
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time:
+            break
+
+        iterations = max(iterations * 2, int(iterations * min_round_time / elapsed) if elapsed > 0 else 0)
+
+    round_times = [elapsed]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await op()
+        round_times.append(time.perf_counter() - start)
+
+    return _result(name, round_times, iterations)
+
+
+def write_results(path: Path, results: list[BenchmarkResult]) -> None:
+    """
+    Writes benchmark results (and the machine they were measured on) as JSON, so that
+    the file can be used as the baseline for a later run (see load_results)
+    """
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "results": [r.to_json() for r in results],
+    }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as fout:
+        json.dump(report, fout, indent=2)
+
+
+def load_results(path: Path) -> list[BenchmarkResult]:
+    """Reads the results written by write_results"""
+    with open(path) as fin:
+        report = json.load(fin)
+
+    return [BenchmarkResult.from_json(r) for r in report.get("results", [])]
+
+
+def find_regressions(
+    results: list[BenchmarkResult], baseline: list[BenchmarkResult], tolerance: float
+) -> list[BenchmarkRegression]:
+    """
+    Compares results against a baseline (matching them by name), and returns the
+    ones that are slower by more than the tolerance, slowest (relative to the
+    baseline) first.  Benchmarks that aren't in the baseline are skipped.
+
+    :param results: The results of the current run
+    :param baseline: The results of the run to compare against
+    :param tolerance: How much slower a benchmark may get before it counts (e.g. 0.2 for 20%)
+    """
+    by_name = {r.name: r for r in baseline}
+    regressions: list[BenchmarkRegression] = []
+    for result in results:
+        previous = by_name.get(result.name)
+        if previous is not None and result.seconds > previous.seconds * (1 + tolerance):
+            regressions.append(BenchmarkRegression(result, previous))
+
+    regressions.sort(key=lambda r: r.ratio, reverse=True)
+    return regressions
@@ -0,0 +1,74 @@
+from collections.abc import Generator
+from pathlib import Path
+from typing import Any, Final
+
+import pytest
+from cbltest.profiling import ClientProfiler
+
+# This plugin adds a --cbl-profile option that profiles the client's CPU usage in
+# each test (see cbltest.profiling).  For each test, a <test>.prof file (for pstats
+# or snakeviz) and a <test>.collapsed file (for flamegraph.pl or speedscope) are
+# written to --cbl-profile-dir, along with session.prof / session.collapsed for the
+# whole run, and the functions with the most cumulative time are listed at the end.
+
+cbl_profiler_key: Final[pytest.StashKey[ClientProfiler]] = pytest.StashKey()
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    if config.getoption("--cbl-profile"):
+        config.stash[cbl_profiler_key] = ClientProfiler(Path(config.getoption("--cbl-profile-dir")))
+
+
+# Setup and teardown are profiled as part of the test, since fixtures (e.g. loading
+# datasets) can be where the time goes
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_protocol(item: pytest.Item) -> Generator[None, object, object]:
+    profiler = item.config.stash.get(cbl_profiler_key, None)
+    if profiler is None:
+        return (yield)
+
+    profiler.begin_test(item.nodeid)
+    try:
+        return (yield)
+    finally:
+        profiler.end_test()
+
+
+def pytest_terminal_summary(terminalreporter: Any, config: pytest.Config) -> None:
+    profiler = config.stash.get(cbl_profiler_key, None)
+    if profiler is None:
+        return
+
+    top = profiler.top_functions(20 if config.getoption("verbose") > 0 else 10)
+    if not top:
+        return
+
+    terminalreporter.section("client profile")
+    terminalreporter.write_line(f"{'cumulative':>10} {'own':>9} {'calls':>9}  function")
+    for function in top:
+        terminalreporter.write_line(
+            f"{function.cumulative:>9.2f}s {function.own:>8.2f}s {function.calls:>9}  {function.location}"
+        )
+
+    terminalreporter.write_line(f"per test profiles written to {profiler.output_dir}")
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    profiler = session.config.stash.get(cbl_profiler_key, None)
+    if profiler is not None:
+        profiler.write_session()
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("CBL E2E Testing")
+    group.addoption(
+        "--cbl-profile",
+        action="store_true",
+        help="Profile the CPU usage of the client in each test",
+    )
+    group.addoption(
+        "--cbl-profile-dir",
+        metavar="PATH",
+        default="profiles",
+        help="Where to write the profiles from --cbl-profile (default: profiles)",
+    )
@@ -7,6 +7,7 @@ import pytest
 # run only those tests that are related to a specific ticket number.
 
 _cbse_key: Final[str] = "cbse"
+_deselected_key: Final[pytest.StashKey[int]] = pytest.StashKey()
 
 
 # This makes pytest.mark.cbse(num) available for use in test files.
@@ -17,16 +18,34 @@ def pytest_configure(config: pytest.Config) -> None:
     )
 
 
-# This runs at the beginning of each test to check if CBSE filtering
-# was requested.
-def pytest_runtest_setup(item: pytest.Function) -> None:
-    specified_cbse = item.config.getoption("--cbse")
+# This runs once the tests are collected to deselect the ones unrelated to
+# the CBSE ticket, if CBSE filtering was requested.
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    specified_cbse = config.getoption("--cbse")
     if specified_cbse is None:
         return
 
-    cbse_nums = [mark.args[0] for mark in item.iter_markers(name="cbse")]
-    if not cbse_nums or int(specified_cbse) not in cbse_nums:
-        pytest.skip(f"Unrelated to CBSE-{specified_cbse}")
+    selected: list[pytest.Item] = []
+    deselected: list[pytest.Item] = []
+    for item in items:
+        cbse_nums = [mark.args[0] for mark in item.iter_markers(name=_cbse_key)]
+        if int(specified_cbse) in cbse_nums:
+            selected.append(item)
+        else:
+            deselected.append(item)
+
+    if deselected:
+        config.stash[_deselected_key] = len(deselected)
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+# Running nothing because no test relates to the ticket is not an error (it used
+# to be reported as a run of skipped tests), so don't let pytest treat it as an
+# empty collection.
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    if exitstatus == pytest.ExitCode.NO_TESTS_COLLECTED and session.config.stash.get(_deselected_key, 0) > 0:
+        session.exitstatus = pytest.ExitCode.OK
 
 
 # This adds the --cbse command line option to pytest.
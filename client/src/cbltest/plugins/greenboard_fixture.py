@@ -1,6 +1,8 @@
+import asyncio
 import os
 from collections.abc import AsyncGenerator
 from pathlib import Path
+from typing import cast
 
 import pytest
 import pytest_asyncio
@@ -8,6 +10,7 @@ from cbltest import CBLPyTest
 from cbltest.api.syncgateway import CouchbaseVersion
 from cbltest.greenboarduploader import GreenboardUploader, resolve_branch
 from cbltest.logging import cbl_info, cbl_warning
+from cbltest.plugins.cblpytest_fixture import parsed_config_key
 
 # This plugin provides an automatic (i.e. not used directly by tests)
 # fixture that will upload test results to greenboard, if it is
@@ -32,6 +35,11 @@ async def greenboard(cblpytest: CBLPyTest, pytestconfig: pytest.Config) -> Async
         cbl_info("Greenboard uploading disabled by flag")
         yield
         return
+
+    if pytestconfig.getoption("--shards", 0) > 1:
+        # The shard runner uploads once for the whole run (see upload_sharded_results)
+        yield
+        return
     if len(cblpytest.test_servers) == 0 and len(cblpytest.sync_gateways) == 0:
         yield
         return
@@ -92,44 +100,100 @@ async def greenboard(cblpytest: CBLPyTest, pytestconfig: pytest.Config) -> Async
                 os.environ.get("SGW_UPGRADED_NODE_INDEX"),
             )
         else:
-            sgw_version: CouchbaseVersion | None = None
-            test_platform: str = "sync-gateway"
-            os_name: str = "n/a"
-            library_version: str = "n/a"
-            if len(cblpytest.test_servers) > 0:
-                test_server_info = await cblpytest.test_servers[0].get_info()
-                # Keep the platform as SGW if it has one of the sgw markers, since
-                # the test might still use test server with it, but still belong
-                # to SGW and not CBL test platform.
-                library_version = test_server_info.library_version
-                if not uploader.has_sgw_marker():
-                    test_platform = test_server_info.cbl
-                if "systemName" in test_server_info.device:
-                    os_name = test_server_info.device["systemName"]
-            if len(cblpytest.sync_gateways) > 0:
-                try:
-                    sgw_version = await cblpytest.sync_gateways[0].get_version()
-                except Exception as e:
-                    cbl_warning(f"Could not fetch SGW version for greenboard doc: {e}")
-            xmlpath = pytestconfig.option.xmlpath
-            if xmlpath:
-                uploader.upload_from_junit_file(
-                    Path(xmlpath),
-                    test_platform,
-                    os_name,
-                    library_version,
-                    sgw_version,
-                )
-            else:
-                # No --junitxml configured. Normally our pytest_configure
-                # hook defaults this to "junit_result.xml", but it doesn't
-                # fire for synthetic Configs (e.g. ones built via
-                # pytest.Config.fromdictargs in unit tests). Fall back to
-                # the in-process counter — mirrors upload_from_junit_file's
-                # file-missing branch.
-                uploader.upload(test_platform, os_name, library_version, sgw_version)
+            await _upload_results(cblpytest, uploader, pytestconfig.option.xmlpath, uploader.has_sgw_marker())
     finally:
         pytestconfig.pluginmanager.unregister(uploader)
+        uploader.close()
+
+
+async def _upload_results(
+    cblpytest: CBLPyTest, uploader: GreenboardUploader, xmlpath: str | None, has_sgw_marker: bool
+) -> None:
+    sgw_version: CouchbaseVersion | None = None
+    test_platform: str = "sync-gateway"
+    os_name: str = "n/a"
+    library_version: str = "n/a"
+    if len(cblpytest.test_servers) > 0:
+        test_server_info = await cblpytest.test_servers[0].get_info()
+        # Keep the platform as SGW if it has one of the sgw markers, since
+        # the test might still use test server with it, but still belong
+        # to SGW and not CBL test platform.
+        library_version = test_server_info.library_version
+        if not has_sgw_marker:
+            test_platform = test_server_info.cbl
+        if "systemName" in test_server_info.device:
+            os_name = test_server_info.device["systemName"]
+    if len(cblpytest.sync_gateways) > 0:
+        try:
+            sgw_version = await cblpytest.sync_gateways[0].get_version()
+        except Exception as e:
+            cbl_warning(f"Could not fetch SGW version for greenboard doc: {e}")
+    if xmlpath:
+        uploader.upload_from_junit_file(
+            Path(xmlpath),
+            test_platform,
+            os_name,
+            library_version,
+            sgw_version,
+        )
+    else:
+        # No --junitxml configured. Normally our pytest_configure
+        # hook defaults this to "junit_result.xml", but it doesn't
+        # fire for synthetic Configs (e.g. ones built via
+        # pytest.Config.fromdictargs in unit tests). Fall back to
+        # the in-process counter — mirrors upload_from_junit_file's
+        # file-missing branch.
+        uploader.upload(test_platform, os_name, library_version, sgw_version)
+
+
+def upload_sharded_results(pytestconfig: pytest.Config, has_sgw_marker: bool) -> None:
+    """
+    Uploads the results of a sharded run (see the shard_runner plugin) from the
+    merged JUnit XML, applying the same checks as the greenboard fixture.  The
+    platform information comes from a fresh CBLPyTest on the full topology, since
+    the one used by the tests (if any) has been closed by the time the shards
+    have all finished.
+    """
+    config = pytestconfig.stash[parsed_config_key]
+    if config.greenboard_username is None or config.greenboard_password is None or config.greenboard_url is None:
+        return
+
+    if pytestconfig.getoption("--no-result-upload"):
+        cbl_info("Greenboard uploading disabled by flag")
+        return
+
+    if len(config.test_servers) == 0 and len(config.sync_gateways) == 0:
+        return
+
+    branch = resolve_branch(pytestconfig.getoption("--branch"))
+    if branch != "main":
+        cbl_info(
+            "Greenboard upload skipped: results are uploaded only from "
+            f"the 'main' tests branch (resolved branch: {branch or 'local'})"
+        )
+        return
+
+    async def upload() -> None:
+        cblpytest = await CBLPyTest.create(
+            config,
+            pytestconfig.getoption("--cbl-log-level"),
+            pytestconfig.getoption("--test-props"),
+            dataset_version=pytestconfig.getoption("--dataset-version", "4.0"),
+        )
+        try:
+            uploader = GreenboardUploader(
+                cast(str, config.greenboard_url),
+                cast(str, config.greenboard_username),
+                cast(str, config.greenboard_password),
+            )
+            try:
+                await _upload_results(cblpytest, uploader, pytestconfig.option.xmlpath, has_sgw_marker)
+            finally:
+                uploader.close()
+        finally:
+            await cblpytest.close()
+
+    asyncio.run(upload())
 
 
 # This adds CLI options for greenboard result uploads.
@@ -0,0 +1,94 @@
+from collections.abc import Generator
+from pathlib import Path
+from typing import Any, Final
+
+import pytest
+from cbltest import latency
+from cbltest.version import VERSION
+from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+
+# This plugin reports the latency histograms of the calls made to backend services
+# (see cbltest.latency).  At the end of the session it writes the histograms of
+# the whole session, and a summary of those of each test, to a JSON report
+# (--latency-report), and shows the calls that took the most time overall in the
+# terminal.  If --otel-endpoint is given, every call is also exported to the
+# collector as an OpenTelemetry histogram metric.
+
+# The summarized latencies of each test, by test ID (the shard runner adds those of
+# the tests that ran in shards)
+latency_tests_key: Final[pytest.StashKey[dict[str, list[dict[str, Any]]]]] = pytest.StashKey()
+_meter_provider_key: Final[pytest.StashKey[MeterProvider]] = pytest.StashKey()
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.stash[latency_tests_key] = {}
+
+
+def pytest_sessionstart(session: pytest.Session) -> None:
+    otel_endpoint = session.config.getoption("--otel-endpoint", None)
+    if otel_endpoint is None:
+        return
+
+    reader = PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=f"http://{otel_endpoint}:4317", timeout=5))
+    provider = MeterProvider(
+        resource=Resource(attributes={SERVICE_NAME: "Python Test Client"}), metric_readers=[reader]
+    )
+    histogram = provider.get_meter("cbltest", VERSION).create_histogram(
+        "cbltest.backend.call.duration", unit="s", description="The latency of calls to backend services"
+    )
+    latency.add_listener(lambda key, seconds: histogram.record(seconds, attributes=key._asdict()))
+    session.config.stash[_meter_provider_key] = provider
+
+
+# Setup and teardown count as part of the test here, since fixtures make plenty of
+# backend calls themselves
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_protocol(item: pytest.Item) -> Generator[None, object, object]:
+    latency.begin_test()
+    try:
+        return (yield)
+    finally:
+        registry = latency.end_test()
+        if registry is not None and registry.histograms:
+            item.config.stash[latency_tests_key][item.nodeid] = registry.to_json(with_buckets=False)
+
+
+def pytest_terminal_summary(terminalreporter: Any) -> None:
+    histograms = latency.session_registry().histograms
+    if not histograms:
+        return
+
+    terminalreporter.section("backend latency")
+    terminalreporter.write_line(f"{'calls':>7} {'total':>9} {'p50':>8} {'p99':>8} {'max':>8}  call")
+    busiest = sorted(histograms.items(), key=lambda kv: kv[1].total, reverse=True)[:10]
+    for key, histogram in busiest:
+        terminalreporter.write_line(
+            f"{histogram.count:>7} {histogram.total:>8.2f}s {histogram.percentile(50):>7.3f}s "
+            f"{histogram.percentile(99):>7.3f}s {histogram.max:>7.3f}s  "
+            f"{key.component} {key.method} {key.path} -> {key.status}"
+        )
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    provider = session.config.stash.get(_meter_provider_key, None)
+    if provider is not None:
+        # Flushes the last metrics, but don't hold up the end of the run for long
+        # if the collector has gone away
+        provider.shutdown(timeout_millis=5000)
+
+    report_path = session.config.getoption("--latency-report")
+    if report_path and latency.session_registry().histograms:
+        latency.write_report(Path(report_path), session.config.stash[latency_tests_key])
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("CBL E2E Testing")
+    group.addoption(
+        "--latency-report",
+        metavar="PATH",
+        default="latency.json",
+        help="Where to write the latency histograms of backend calls (default: latency.json)",
+    )
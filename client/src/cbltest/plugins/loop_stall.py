@@ -0,0 +1,115 @@
+from collections.abc import Generator
+from pathlib import Path
+from typing import Any, Final
+
+import pytest
+from cbltest.loopwatch import LoopStall, LoopStallDetector, write_report
+
+# This plugin adds a --loop-stall-threshold option that watches for code blocking
+# the asyncio event loop (see cbltest.loopwatch), which is what makes concurrent
+# workloads lose their timing accuracy.  Each callback that blocks the loop for
+# longer than the threshold is recorded along with the stack it was blocked in, and
+# at the end of the session they are written to a JSON report (--loop-stall-report)
+# and summarized in the terminal, both by test and by the code that blocked.  It is
+# off by default, since it times every callback the loop runs.
+
+loop_stall_detector_key: Final[pytest.StashKey[LoopStallDetector]] = pytest.StashKey()
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    threshold = config.getoption("--loop-stall-threshold")
+    if threshold is None:
+        return
+
+    if threshold <= 0:
+        raise pytest.UsageError("--loop-stall-threshold must be greater than zero")
+
+    config.stash[loop_stall_detector_key] = LoopStallDetector(threshold / 1000)
+
+
+def pytest_sessionstart(session: pytest.Session) -> None:
+    detector = session.config.stash.get(loop_stall_detector_key, None)
+    if detector is not None:
+        detector.start()
+
+
+# Setup and teardown count as part of the test, since async fixtures run on the loop too
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_protocol(item: pytest.Item) -> Generator[None, object, object]:
+    detector = item.config.stash.get(loop_stall_detector_key, None)
+    if detector is None:
+        return (yield)
+
+    detector.test = item.nodeid
+    try:
+        return (yield)
+    finally:
+        detector.test = None
+
+
+def _summarize(stalls: list[LoopStall], key: Any) -> list[tuple[str, list[LoopStall]]]:
+    groups: dict[str, list[LoopStall]] = {}
+    for stall in stalls:
+        groups.setdefault(key(stall), []).append(stall)
+
+    return sorted(groups.items(), key=lambda kv: sum(s.duration for s in kv[1]), reverse=True)
+
+
+def pytest_terminal_summary(terminalreporter: Any, config: pytest.Config) -> None:
+    detector = config.stash.get(loop_stall_detector_key, None)
+    if detector is None:
+        return
+
+    terminalreporter.section("event loop stalls")
+    stalls = detector.stalls
+    if not stalls:
+        terminalreporter.write_line("no callbacks blocked the event loop for longer than the threshold")
+        return
+
+    total = sum(s.duration for s in stalls)
+    terminalreporter.write_line(f"{len(stalls)} stalls blocked the event loop for {total:.2f}s in total")
+
+    terminalreporter.write_line("by test:")
+    for test, test_stalls in _summarize(stalls, lambda s: s.test or "(outside of a test)")[:10]:
+        blocked = sum(s.duration for s in test_stalls)
+        worst = max(s.duration for s in test_stalls)
+        terminalreporter.write_line(f"  {blocked:8.2f}s  {len(test_stalls):>4} stalls (max {worst:.2f}s)  {test}")
+
+    terminalreporter.write_line("by location:")
+    verbose = config.getoption("verbose") > 0
+    for location, location_stalls in _summarize(stalls, lambda s: s.location)[:10]:
+        blocked = sum(s.duration for s in location_stalls)
+        tests = len({s.test for s in location_stalls})
+        terminalreporter.write_line(
+            f"  {blocked:8.2f}s  {len(location_stalls):>4} stalls in {tests} tests  {location}",
+            yellow=True,
+        )
+        if verbose:
+            worst = max(location_stalls, key=lambda s: s.duration)
+            for line in worst.stack:
+                terminalreporter.write_line(f"      {line}")
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    detector = session.config.stash.get(loop_stall_detector_key, None)
+    if detector is None:
+        return
+
+    detector.stop()
+    write_report(Path(session.config.getoption("--loop-stall-report")), detector.stalls)
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("CBL E2E Testing")
+    group.addoption(
+        "--loop-stall-threshold",
+        metavar="MS",
+        type=float,
+        help="Record the stack of any callback that blocks the event loop for longer than this many milliseconds",
+    )
+    group.addoption(
+        "--loop-stall-report",
+        metavar="PATH",
+        default="loop_stalls.json",
+        help="Where to write the stalls found with --loop-stall-threshold (default: loop_stalls.json)",
+    )
@@ -2,6 +2,7 @@ from typing import Final
 
 import pytest
 from cbltest import SyncGatewayInfo
+from cbltest.configparser import ParsedConfig
 from cbltest.logging import cbl_info
 from cbltest.plugins.cblpytest_fixture import parsed_config_key
 
@@ -11,9 +12,10 @@ _min_couchbase_servers_key: Final[str] = "min_couchbase_servers"
 _min_load_balancers_key: Final[str] = "min_load_balancers"
 _min_edge_servers_key: Final[str] = "min_edge_servers"
 _min_clusters_key: Final[str] = "min_clusters"
+_deselected_key: Final[pytest.StashKey[int]] = pytest.StashKey()
 
 # This plugin adds test markers to check that the required topology is present
-# in the TDK config file.  If not, the test will be skipped.
+# in the TDK config file.  If not, the test will be deselected.
 
 
 # This adds markers for minimum number of test servers, sync gateways,
@@ -45,60 +47,93 @@ def pytest_configure(config: pytest.Config) -> None:
     )
 
 
-# This is run before each test to determine if there are enough backend
-# resources to run the test.  If not, the test is skipped.
-def pytest_runtest_setup(item: pytest.Item) -> None:
-    min_test_servers_mark = item.get_closest_marker(_min_test_servers_key)
-    min_sync_gateways_mark = item.get_closest_marker(_min_sync_gateways_key)
-    min_couchbase_servers_mark = item.get_closest_marker(_min_couchbase_servers_key)
-    min_load_balancers_mark = item.get_closest_marker(_min_load_balancers_key)
-    min_edge_servers_mark = item.get_closest_marker(_min_edge_servers_key)
-    min_clusters_mark = item.get_closest_marker(_min_clusters_key)
-
-    if (
-        min_test_servers_mark is None
-        and min_sync_gateways_mark is None
-        and min_couchbase_servers_mark is None
-        and min_load_balancers_mark is None
-        and min_edge_servers_mark is None
-        and min_clusters_mark is None
-    ):
+# The markers, in the order they are checked, and a description of what they count
+_requirement_descs: Final[dict[str, str]] = {
+    _min_test_servers_key: "Test Servers",
+    _min_sync_gateways_key: "Sync Gateways",
+    _min_couchbase_servers_key: "Couchbase Servers",
+    _min_load_balancers_key: "Load Balancers",
+    _min_edge_servers_key: "Edge Servers",
+    _min_clusters_key: "clusters",
+}
+
+
+def topology_requirements(item: pytest.Item) -> dict[str, int]:
+    """
+    Gets the minimum topology that a test declares with its min_* markers,
+    keyed by marker name.  Markers that are not present are omitted.
+    """
+    requirements: dict[str, int] = {}
+    for key in _requirement_descs:
+        mark = item.get_closest_marker(key)
+        if mark is not None:
+            requirements[key] = int(mark.args[0])
+
+    return requirements
+
+
+def _cluster_count(sgw_list: list[dict]) -> int:
+    # The ID of the sync gateway clusters will always be greater than or equal
+    # to the CBS cluster index since every cluster requires at least one sync gateway
+    return max((SyncGatewayInfo(sgw).cluster_index + 1 for sgw in sgw_list), default=0)
+
+
+def unmet_requirement(requirements: dict[str, int], config: ParsedConfig, quiet: bool = False) -> str | None:
+    """
+    Checks a set of requirements (as returned by topology_requirements) against
+    a parsed TDK config, and returns the reason the config cannot satisfy them
+    (e.g. "Insufficient Sync Gateways"), or None if it can.  Unless quiet is set,
+    the shortfall is also logged.
+    """
+    available = {
+        _min_test_servers_key: len(config.test_servers),
+        _min_sync_gateways_key: len(config.sync_gateways),
+        _min_couchbase_servers_key: len(config.couchbase_servers),
+        _min_load_balancers_key: len(config.load_balancers),
+        _min_edge_servers_key: len(config.edge_servers),
+        _min_clusters_key: _cluster_count(config.sync_gateways),
+    }
+
+    for key, desc in _requirement_descs.items():
+        minimum = requirements.get(key)
+        if minimum is not None and available[key] < minimum:
+            if not quiet:
+                cbl_info(f"Test requires at least {minimum} {desc}, but only {available[key]} are available.")
+            return f"Insufficient {desc}"
+
+    return None
+
+
+# This is run once the tests are collected to deselect the ones that need more
+# backend resources than the TDK config provides, so that they never go through
+# fixture setup at all.
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    parsed_config = config.stash[parsed_config_key]
+    selected: list[pytest.Item] = []
+    deselected: list[pytest.Item] = []
+    reasons: dict[str, int] = {}
+    for item in items:
+        reason = unmet_requirement(topology_requirements(item), parsed_config, quiet=True)
+        if reason is None:
+            selected.append(item)
+        else:
+            deselected.append(item)
+            reasons[reason] = reasons.get(reason, 0) + 1
+
+    if not deselected:
         return
 
-    config = item.config.stash[parsed_config_key]
-
-    def check(mark: pytest.Mark | None, value: list, desc: str) -> None:
-        if mark is None:
-            return
-
-        minimum = mark.args[0]
-        if len(value) < minimum:
-            cbl_info(f"Test requires at least {minimum} {desc}, but only {len(value)} are available.")
-            pytest.skip(f"Insufficient {desc}")
-
-    def check_clusters(mark: pytest.Mark | None, sgw_list: list[dict]) -> None:
-        if mark is None:
-            return
-
-        requested = mark.args[0]
-        minimum = requested - 1  # We use a zero based index to check
-        max_found = 0
-
-        # For min clusters, check the ID of the sync gateway clusters.  It will always
-        # be greater than or equal to the CBS cluster index since every cluster requires
-        # at least one sync gateway
-        for sgw in sgw_list:
-            info = SyncGatewayInfo(sgw)
-            max_found = max(max_found, info.cluster_index + 1)
-            if info.cluster_index >= minimum:
-                return
-
-        cbl_info(f"Test requires at least {requested} clusters, but only {max_found} are available.")
-        pytest.skip("Insufficient clusters")
-
-    check(min_test_servers_mark, config.test_servers, "Test Servers")
-    check(min_sync_gateways_mark, config.sync_gateways, "Sync Gateways")
-    check(min_couchbase_servers_mark, config.couchbase_servers, "Couchbase Servers")
-    check(min_load_balancers_mark, config.load_balancers, "Load Balancers")
-    check(min_edge_servers_mark, config.edge_servers, "Edge Servers")
-    check_clusters(min_clusters_mark, config.sync_gateways)
+    for reason, count in reasons.items():
+        cbl_info(f"Deselected {count} test(s) for the topology in the config: {reason}")
+
+    config.stash[_deselected_key] = len(deselected)
+    config.hook.pytest_deselected(items=deselected)
+    items[:] = selected
+
+
+# Not running anything because the topology is too small is not an error (it
+# used to be reported as a run of skipped tests), so don't let pytest treat it
+# as an empty collection.
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    if exitstatus == pytest.ExitCode.NO_TESTS_COLLECTED and session.config.stash.get(_deselected_key, 0) > 0:
+        session.exitstatus = pytest.ExitCode.OK
@@ -0,0 +1,296 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+from collections.abc import Generator
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Final
+
+import pytest
+from cbltest import latency, loopwatch
+from cbltest.configparser import ParsedConfig
+from cbltest.greenboarduploader import count_from_junit_xml
+from cbltest.httplog import http_log_dir
+from cbltest.logging import cbl_warning
+from cbltest.plugins.cbl_profile import cbl_profiler_key
+from cbltest.plugins.greenboard_fixture import upload_sharded_results
+from cbltest.plugins.latency_metrics import latency_tests_key
+from cbltest.plugins.loop_stall import loop_stall_detector_key
+from cbltest.plugins.required_topology import topology_requirements
+from cbltest.sharding import assign_groups, merge_junit, partition_config
+from cbltest.steptiming import load_report, recorder
+
+# This plugin adds a --shards option that splits a run across several worker
+# processes.  The topology in config.json is partitioned into isolated
+# sub-topologies (see cbltest.sharding), each module's tests are dispatched to
+# a shard that satisfies their min_* markers, and each shard runs in its own
+# pytest process with its own config, and therefore its own CBLPyTest.
+#
+# Tests without any min_* markers, or whose markers no shard can satisfy, run
+# in this process on the full topology after the shards have finished.  At the
+# end, the JUnit output of every shard is merged into the --junitxml file, the
+# HTTP logs are moved under http_log/shard<N>, and a single greenboard upload
+# is made for the whole run.
+
+# The options that are passed through to the worker processes as they are
+_forwarded_options: Final[list[str]] = [
+    "--cbl-log-level",
+    "--test-props",
+    "--otel-endpoint",
+    "--dataset-version",
+    "--cbse",
+    "--sgcollect-on-test-failure",
+    "--loop-stall-threshold",
+    "--cbl-profile",
+]
+
+# How long a worker that is still running when this process stops (e.g. on Ctrl-C
+# or a Jenkins abort) is given to exit after being terminated, before it is killed
+_WORKER_STOP_GRACE: Final[float] = 10.0
+
+
+def _stop_workers(processes: list[tuple[int, subprocess.Popen]]) -> None:
+    # Normally every worker has been waited for by now, but if this process is
+    # interrupted while they run, don't leave them running against the backend
+    running = [process for _, process in processes if process.poll() is None]
+    for process in running:
+        process.terminate()
+
+    for process in running:
+        try:
+            process.wait(_WORKER_STOP_GRACE)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class _ShardResult:
+    def __init__(self, index: int, passed: int, failed: int, returncode: int) -> None:
+        self.index = index
+        self.passed = passed
+        self.failed = failed
+        self.returncode = returncode
+
+
+class ShardRunner:
+    """
+    Runs the tests of a session on several sub-topologies at once.  Registered
+    by pytest_configure when --shards is greater than one.
+    """
+
+    def __init__(self, config: pytest.Config, shards: int) -> None:
+        self.__config = config
+        self.__output_dir = config.invocation_params.dir / "shards"
+        with open(config.getoption("--config")) as fin:
+            raw = json.load(fin)
+
+        self.__shard_configs = partition_config(raw, shards)
+        self.__parsed_configs = [ParsedConfig(c) for c in self.__shard_configs]
+        self.__results: list[_ShardResult] = []
+        self.__has_sgw_marker = False
+
+    def _shard_dir(self, index: int) -> Path:
+        return self.__output_dir / f"shard{index}"
+
+    def _dispatch(self, items: list[pytest.Item]) -> tuple[list[list[pytest.Item]], list[pytest.Item]]:
+        # Tests in the same module usually share setup (and are written to run
+        # in order), so they are kept together when their requirements match
+        groups: dict[tuple[str, tuple[tuple[str, int], ...]], list[pytest.Item]] = {}
+        for item in items:
+            requirements = tuple(sorted(topology_requirements(item).items()))
+            groups.setdefault((item.nodeid.split("::")[0], requirements), []).append(item)
+
+        keys = list(groups)
+        assignments = assign_groups([(dict(k[1]), len(groups[k])) for k in keys], self.__parsed_configs)
+        dispatched: list[list[pytest.Item]] = [[] for _ in self.__parsed_configs]
+        assigned: set[str] = set()
+        for key, shard in zip(keys, assignments):
+            if shard is not None:
+                dispatched[shard].extend(groups[key])
+                assigned.update(item.nodeid for item in groups[key])
+
+        # Keep the collection order within each shard, and for the rest
+        order = {item.nodeid: i for i, item in enumerate(items)}
+        for shard_items in dispatched:
+            shard_items.sort(key=lambda item: order[item.nodeid])
+
+        return dispatched, [item for item in items if item.nodeid not in assigned]
+
+    def _worker_args(self, index: int, items: list[pytest.Item]) -> list[str]:
+        shard_dir = self._shard_dir(index)
+        config_path = shard_dir / "config.json"
+        with open(config_path, "w") as fout:
+            json.dump(self.__shard_configs[index], fout, indent=2)
+
+        args = [
+            "--config",
+            str(config_path),
+            f"--junitxml={shard_dir / 'junit_result.xml'}",
+            f"--step-report={shard_dir / 'step_timings.json'}",
+            f"--latency-report={shard_dir / 'latency.json'}",
+            f"--loop-stall-report={shard_dir / 'loop_stalls.json'}",
+            f"--cbl-profile-dir={shard_dir / 'profiles'}",
+            "--no-result-upload",
+            "-p",
+            "no:cacheprovider",
+            "--rootdir",
+            str(self.__config.rootpath),
+        ]
+        for option in _forwarded_options:
+            value = self.__config.getoption(option, None)
+            if value is True:
+                args.append(option)
+            elif value not in (None, False):
+                args.append(f"{option}={value}")
+
+        args += [f"{self.__config.rootpath}/{item.nodeid}" for item in items]
+        return args
+
+    def _run_shards(self, dispatched: list[list[pytest.Item]]) -> None:
+        if self.__output_dir.exists():
+            shutil.rmtree(self.__output_dir)
+
+        terminal = self.__config.pluginmanager.get_plugin("terminalreporter")
+        processes: list[tuple[int, subprocess.Popen]] = []
+        with ExitStack() as stack:
+            stack.callback(_stop_workers, processes)
+            for index, items in enumerate(dispatched):
+                if not items:
+                    continue
+
+                shard_dir = self._shard_dir(index)
+                shard_dir.mkdir(parents=True)
+
+                # The node IDs could easily overflow the command line, so pass the
+                # arguments in a file instead (one per line, read by pytest via @)
+                args_path = shard_dir / "args.txt"
+                args_path.write_text("\n".join(self._worker_args(index, items)) + "\n")
+                log = stack.enter_context(open(shard_dir / "output.log", "w"))
+                process = subprocess.Popen(
+                    [sys.executable, "-m", "pytest", f"@{args_path}"],
+                    cwd=self.__config.invocation_params.dir,
+                    env={**os.environ, "CBL_HTTP_LOG_DIR": str(shard_dir / "http_log")},
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                )
+                processes.append((index, process))
+                if terminal is not None:
+                    terminal.write_line(f"shard {index}: running {len(items)} tests (output in {log.name})")
+
+            for index, process in processes:
+                returncode = process.wait()
+                junit_path = self._shard_dir(index) / "junit_result.xml"
+                if junit_path.is_file():
+                    passed, failed, errored = count_from_junit_xml(junit_path)
+                    failed += errored
+                else:
+                    # The worker died before writing any results, which counts as a failure
+                    cbl_warning(f"Shard {index} exited with {returncode} without writing {junit_path}")
+                    passed, failed = 0, 1
+
+                self.__results.append(_ShardResult(index, passed, failed, returncode))
+
+                # Fold the step timings and latencies of the shard into this process,
+                # so that they are reported (and compared against any baseline) with the rest
+                step_path = self._shard_dir(index) / "step_timings.json"
+                if step_path.is_file():
+                    recorder().steps.extend(load_report(step_path))
+
+                latency_path = self._shard_dir(index) / "latency.json"
+                if latency_path.is_file():
+                    shard_latencies, shard_tests = latency.load_report(latency_path)
+                    latency.session_registry().merge(shard_latencies)
+                    self.__config.stash[latency_tests_key].update(shard_tests)
+
+                detector = self.__config.stash.get(loop_stall_detector_key, None)
+                stall_path = self._shard_dir(index) / "loop_stalls.json"
+                if detector is not None and stall_path.is_file():
+                    detector.stalls.extend(loopwatch.load_report(stall_path))
+
+                profiler = self.__config.stash.get(cbl_profiler_key, None)
+                if profiler is not None:
+                    profile_dir = self._shard_dir(index) / "profiles"
+                    profiler.add_session_profile(profile_dir / "session.prof", profile_dir / "session.collapsed")
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtestloop(self, session: pytest.Session) -> Generator[None, object, object]:
+        if session.config.option.collectonly:
+            return (yield)
+
+        self.__has_sgw_marker = any(
+            item.get_closest_marker("sgw") or item.get_closest_marker("upg_sgw") for item in session.items
+        )
+        dispatched, remaining = self._dispatch(session.items)
+        self._run_shards(dispatched)
+        session.items = remaining
+
+        # Only add the shard failures now, since the default loop treats any
+        # failure already counted when it starts as a collection error
+        ret_val = yield
+        session.testsfailed += sum(r.failed for r in self.__results)
+        return ret_val
+
+    def pytest_terminal_summary(self, terminalreporter: Any) -> None:
+        if not self.__results:
+            return
+
+        terminalreporter.section("shards")
+        for result in sorted(self.__results, key=lambda r: r.index):
+            terminalreporter.write_line(
+                f"shard {result.index}: {result.passed} passed, {result.failed} failed "
+                f"(exit code {result.returncode}, output in {self._shard_dir(result.index) / 'output.log'})"
+            )
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_sessionfinish(self, session: pytest.Session) -> None:
+        if not self.__results:
+            return
+
+        # This runs after the junitxml plugin has written the results of the
+        # tests that ran in this process
+        xmlpath = self.__config.option.xmlpath
+        if xmlpath:
+            inputs = [Path(xmlpath)] if Path(xmlpath).is_file() else []
+            inputs += [
+                junit_path
+                for r in self.__results
+                if (junit_path := self._shard_dir(r.index) / "junit_result.xml").is_file()
+            ]
+            merge_junit(inputs, Path(xmlpath))
+
+        upload_sharded_results(self.__config, self.__has_sgw_marker)
+
+        # After the upload, since creating a CBLPyTest clears the HTTP log folder
+        for result in self.__results:
+            shard_log = self._shard_dir(result.index) / "http_log"
+            if shard_log.is_dir():
+                dest = http_log_dir() / f"shard{result.index}"
+                shutil.rmtree(dest, ignore_errors=True)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(shard_log), str(dest))
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("CBL E2E Testing")
+    group.addoption(
+        "--shards",
+        metavar="N",
+        type=int,
+        default=0,
+        help="Partition the topology in the config into (up to) N isolated sub-topologies and run "
+        "the tests on all of them at once, in separate processes, dispatching each test by its "
+        "min_* markers",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    shards = config.getoption("--shards", 0)
+    if shards <= 1:
+        return
+
+    if config.getoption("--upgrade-versions", None):
+        raise pytest.UsageError("--shards cannot be combined with --upgrade-versions")
+
+    config.pluginmanager.register(ShardRunner(config, shards), "cbl_shard_runner")
@@ -0,0 +1,106 @@
+from collections.abc import Generator
+from pathlib import Path
+from typing import Any
+
+import pytest
+from cbltest.logging import cbl_warning
+from cbltest.steptiming import SERVICES, find_regressions, load_report, recorder, write_report
+
+# This plugin times every test step (see CBLTestClass.mark_test_step and
+# cbltest.steptiming).  At the end of the session it writes every step, with the
+# time spent in each backend service, waiting, and in the client, to a JSON report
+# (--step-report), and summarizes the slowest steps in the terminal.  If a previous
+# report is given as a baseline (--step-baseline), steps that got slower by more
+# than the threshold are flagged.  None of this needs an OpenTelemetry collector.
+
+
+# Each test is recorded only while it runs, so that fixture setup and teardown
+# don't end up in its first or last step.
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item: pytest.Item) -> Generator[None, None, None]:
+    recorder().begin_test(item.nodeid)
+    try:
+        return (yield)
+    finally:
+        recorder().end_test()
+
+
+def _format_step(duration: float, services: dict[str, float], wait: float, other: float) -> str:
+    parts = [f"{svc} {services[svc]:.2f}s" for svc in SERVICES if services.get(svc, 0.0) >= 0.005]
+    parts += [f"wait {wait:.2f}s", f"client/other {other:.2f}s"]
+    return f"{duration:8.2f}s  ({', '.join(parts)})"
+
+
+def pytest_terminal_summary(terminalreporter: Any, config: pytest.Config) -> None:
+    steps = recorder().steps
+    if not steps:
+        return
+
+    terminalreporter.section("step timings")
+    total = sum(s.duration for s in steps)
+    wait = sum(s.wait for s in steps)
+    services = {svc: sum(s.services.get(svc, 0.0) for s in steps) for svc in SERVICES}
+    other = sum(s.other for s in steps)
+    terminalreporter.write_line(f"{len(steps)} steps: {_format_step(total, services, wait, other)}")
+    if total > 0:
+        terminalreporter.write_line(f"waiting: {wait / total:.0%} of step time, working: {1 - wait / total:.0%}")
+
+    count = 20 if config.getoption("verbose") > 0 else 5
+    terminalreporter.write_line(f"slowest {min(count, len(steps))} steps:")
+    for step in sorted(steps, key=lambda s: s.duration, reverse=True)[:count]:
+        terminalreporter.write_line(
+            f"{_format_step(step.duration, step.services, step.wait, step.other)}  "
+            f"{step.test} step {step.index}: {step.description}"
+        )
+
+    baseline_path = config.getoption("--step-baseline")
+    if baseline_path is None:
+        return
+
+    try:
+        baseline = load_report(Path(baseline_path))
+    except (OSError, ValueError, KeyError) as e:
+        cbl_warning(f"Unable to read step timing baseline {baseline_path}: {e}")
+        return
+
+    threshold = config.getoption("--step-regression-threshold")
+    regressions = find_regressions(steps, baseline, threshold)
+    if not regressions:
+        terminalreporter.write_line(f"no steps regressed by more than {threshold:.0%} against {baseline_path}")
+        return
+
+    terminalreporter.write_line(
+        f"{len(regressions)} steps regressed by more than {threshold:.0%} against {baseline_path}:",
+        yellow=True,
+    )
+    for regression in regressions:
+        terminalreporter.write_line(f"  {regression}", yellow=True)
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    steps = recorder().steps
+    report_path = session.config.getoption("--step-report")
+    if steps and report_path:
+        write_report(Path(report_path), steps)
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("CBL E2E Testing")
+    group.addoption(
+        "--step-report",
+        metavar="PATH",
+        default="step_timings.json",
+        help="Where to write the timings of every test step (default: step_timings.json)",
+    )
+    group.addoption(
+        "--step-baseline",
+        metavar="PATH",
+        help="A step timing report from a previous run to compare this run against",
+    )
+    group.addoption(
+        "--step-regression-threshold",
+        metavar="FRACTION",
+        type=float,
+        default=0.2,
+        help="How much slower (e.g. 0.2 for 20%%) a step must be than in the baseline to be flagged",
+    )
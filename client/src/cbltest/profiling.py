@@ -0,0 +1,212 @@
+import cProfile
+import hashlib
+import os
+import pstats
+import re
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+
+# This module profiles where the client spends its CPU time during each test.  Two
+# profilers run side by side:
+#
+# - cProfile, which counts every call, so that the per test .prof files can be
+#   explored with pstats / snakeviz and the top functions of the session listed
+# - a stack sampler, which records the whole stack of the test thread every few
+#   milliseconds and writes it in the "collapsed" format that flamegraph.pl and
+#   speedscope take as input (cProfile only knows callers, not whole stacks)
+#
+# Samples taken while the event loop is idle (i.e. waiting on the network) are left
+# out of the collapsed stacks, so that they show where the client itself is busy.
+
+# Code that is just the test framework (or event loop) running the test, and would
+# top every list, or the event loop waiting, which isn't CPU time
+_FRAMEWORK_PATTERN = re.compile(r"[/\\](_pytest|pluggy|pytest_asyncio|asyncio)[/\\]|selectors\.py$|^~$")
+
+
+class _StackSampler:
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.__thread_id = thread_id
+        self.__interval = interval
+        self.__stacks: Counter[str] = Counter()
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self._run, name="cbl-profile-sampler", daemon=True)
+
+    @property
+    def stacks(self) -> Counter[str]:
+        return self.__stacks
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        self.__thread.join()
+
+    @staticmethod
+    def _frame_name(frame: FrameType) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self) -> None:
+        while not self.__stop.wait(self.__interval):
+            frame = sys._current_frames().get(self.__thread_id)
+            if frame is None:
+                continue
+
+            # An event loop waiting for something to happen isn't using the CPU
+            if frame.f_code.co_name == "select" and frame.f_code.co_filename.endswith("selectors.py"):
+                continue
+
+            names: list[str] = []
+            current: FrameType | None = frame
+            while current is not None:
+                names.append(self._frame_name(current))
+                current = current.f_back
+
+            self.__stacks[";".join(reversed(names))] += 1
+
+
+# Keeps the profile file names well inside the usual 255 byte file name limit
+_MAX_STEM_LENGTH = 150
+
+
+def profile_file_stem(test: str) -> str:
+    """
+    Gets the file name (without extension) that the profile of a test is written to
+
+    :param test: The ID of the test
+    """
+    stem = re.sub(r"[^\w.-]+", "_", test).strip("_")
+    if len(stem) <= _MAX_STEM_LENGTH:
+        return stem
+
+    # Long parametrized IDs can share a prefix, so keep the truncated names distinct
+    digest = hashlib.sha1(test.encode()).hexdigest()[:10]
+    return f"{stem[: _MAX_STEM_LENGTH - len(digest) - 1]}_{digest}"
+
+
+def write_collapsed(path: Path, stacks: Counter[str]) -> None:
+    """Writes stacks in the collapsed format (one "frame;frame;frame count" per line)"""
+    with open(path, "w") as fout:
+        fout.writelines(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+class FunctionTime:
+    """The time spent in one function over a profile"""
+
+    def __init__(self, location: str, cumulative: float, own: float, calls: int) -> None:
+        self.location = location
+        self.cumulative = cumulative
+        self.own = own
+        self.calls = calls
+
+
+class ClientProfiler:
+    """
+    Profiles each test in turn, writing the profiles of each one to a directory and
+    keeping the totals for the whole session
+    """
+
+    @property
+    def output_dir(self) -> Path:
+        """Gets the directory that the profiles are written to"""
+        return self.__output_dir
+
+    def __init__(self, output_dir: Path, interval: float = 0.005) -> None:
+        """
+        :param output_dir: The directory to write the profiles to
+        :param interval: How often (in seconds) to sample the stack for the collapsed stacks
+        """
+        self.__output_dir = output_dir
+        self.__interval = interval
+        self.__session_stats: pstats.Stats | None = None
+        self.__session_stacks: Counter[str] = Counter()
+        self.__test: str | None = None
+        self.__profile: cProfile.Profile | None = None
+        self.__sampler: _StackSampler | None = None
+
+    def begin_test(self, test: str) -> None:
+        """
+        Starts profiling a test on the current thread
+
+        :param test: The ID of the test
+        """
+        self.end_test()
+        self.__output_dir.mkdir(parents=True, exist_ok=True)
+        self.__test = test
+        self.__sampler = _StackSampler(threading.get_ident(), self.__interval)
+        self.__sampler.start()
+        self.__profile = cProfile.Profile()
+        self.__profile.enable()
+
+    def end_test(self) -> None:
+        """Stops profiling the current test, and writes its profiles"""
+        if self.__profile is None or self.__sampler is None or self.__test is None:
+            return
+
+        self.__profile.disable()
+        self.__sampler.stop()
+        stem = self.__output_dir / profile_file_stem(self.__test)
+        self.__profile.dump_stats(f"{stem}.prof")
+        write_collapsed(Path(f"{stem}.collapsed"), self.__sampler.stacks)
+        self._add_stats(pstats.Stats(self.__profile))
+        self.__session_stacks.update(self.__sampler.stacks)
+        self.__profile = None
+        self.__sampler = None
+        self.__test = None
+
+    def add_session_profile(self, prof_path: Path, collapsed_path: Path) -> None:
+        """
+        Adds the session totals written by another profiler (e.g. in a shard) to this one
+
+        :param prof_path: The session .prof file written by write_session
+        :param collapsed_path: The session .collapsed file written by write_session
+        """
+        if prof_path.is_file():
+            self._add_stats(pstats.Stats(str(prof_path)))
+
+        if collapsed_path.is_file():
+            with open(collapsed_path) as fin:
+                for line in fin:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if stack:
+                        self.__session_stacks[stack] += int(count)
+
+    def _add_stats(self, stats: pstats.Stats) -> None:
+        if self.__session_stats is None:
+            self.__session_stats = stats
+        else:
+            self.__session_stats.add(stats)
+
+    def write_session(self) -> None:
+        """Writes the totals of the whole session to session.prof and session.collapsed"""
+        if self.__session_stats is None:
+            return
+
+        self.__session_stats.dump_stats(str(self.__output_dir / "session.prof"))
+        write_collapsed(self.__output_dir / "session.collapsed", self.__session_stacks)
+
+    def top_functions(self, count: int) -> list[FunctionTime]:
+        """
+        Gets the functions with the most cumulative time over the session, leaving out
+        the test framework itself
+
+        :param count: The number of functions to return
+        """
+        if self.__session_stats is None:
+            return []
+
+        ret_val: list[FunctionTime] = []
+        # The raw table behind print_stats, which the stubs don't declare
+        stats = self.__session_stats.stats  # ty: ignore[unresolved-attribute]
+        for (filename, lineno, name), (_, calls, own, cumulative, _) in stats.items():
+            if _FRAMEWORK_PATTERN.search(filename) or filename == __file__:
+                continue
+
+            ret_val.append(FunctionTime(f"{filename}:{lineno}({name})", cumulative, own, calls))
+
+        ret_val.sort(key=lambda f: f.cumulative, reverse=True)
+        return ret_val[:count]
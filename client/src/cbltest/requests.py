@@ -4,7 +4,6 @@ import importlib
 import traceback
 from collections.abc import Callable
 from enum import Enum
-from pathlib import Path
 from shutil import rmtree
 from typing import Any, cast
 from uuid import UUID, uuid4
@@ -14,11 +13,13 @@ from aiohttp import ClientSession
 from .api.error import CblTestServerBadResponseError
 from .api.jsonserializable import JSONSerializable
 from .configparser import ParsedConfig, TransportType
-from .httplog import get_next_writer
+from .httplog import get_next_writer, http_log_dir
+from .latency import timed
 from .logging import cbl_error, cbl_info
 from .request_types import GetRootRequest, TestServerRequest
 from .requests_transport import RequestTransportFactory
 from .responses import TestServerResponse, _response_registry
+from .steptiming import TEST_SERVER, service_call
 from .websocket_router import WebSocketRouter
 
 
@@ -84,13 +85,13 @@ class RequestFactory:
     that is auditable and understandable, as well as reusing any state set.
 
     It will be created by :class:`CBLPyTest` using the parsed configuration.  It will log
-    every HTTP request and response into a folder called "http_log"
+    every HTTP request and response into a folder called "http_log" (see :func:`http_log_dir`)
     """
 
     __first_run: bool = True
 
     def __init__(self, config: ParsedConfig) -> None:
-        self.__record_path = Path("http_log")
+        self.__record_path = http_log_dir()
         self.__version = 0
         if RequestFactory.__first_run and self.__record_path.exists():
             rmtree(self.__record_path)
@@ -98,7 +99,7 @@ class RequestFactory:
         RequestFactory.__first_run = False
 
         if not self.__record_path.exists():
-            self.__record_path.mkdir()
+            self.__record_path.mkdir(parents=True)
 
         self.__uuid = uuid4()
         self.__server_infos: list[tuple[str, TransportType]] = []
@@ -144,6 +145,11 @@ class RequestFactory:
         """Gets the UUID identifying this request factory"""
         return self.__uuid
 
+    @property
+    def ws_router_port(self) -> int | None:
+        """Gets the port that WebSocket test servers connect to, or None if the router hasn't started"""
+        return self.__ws_router.port
+
     async def start(self) -> None:
         await self.__ws_router.start()
 
@@ -191,7 +197,14 @@ class RequestFactory:
                 session=self.__session,
                 ws_router=self.__ws_router,
             )
-            ret_val = await transport.send(r, writer.num)
+            with service_call(TEST_SERVER), timed(TEST_SERVER, r.method, f"/{r.http_name}") as call:
+                try:
+                    ret_val = await transport.send(r, writer.num)
+                except CblTestServerBadResponseError as e:
+                    call.status = e.code
+                    raise
+
+                call.status = ret_val.status_code
         except CblTestServerBadResponseError as e:
             cbl_error(f"Failed to send {r} to {server_info[0]} ({e!s})")
             msg = f"{e!s}\n\n{e.response.serialize()}"
@@ -0,0 +1,118 @@
+from collections.abc import Sequence
+from copy import deepcopy
+from pathlib import Path
+from typing import Any
+
+from junitparser import JUnitXml, TestSuite
+
+from cbltest.configparser import CouchbaseServerInfo, ParsedConfig, SyncGatewayInfo
+from cbltest.plugins.required_topology import unmet_requirement
+
+# The logic behind the shard_runner plugin, kept apart from pytest so that it
+# can be reasoned about (and tested) on its own.  A large topology is split into
+# isolated sub-topologies ("shards"), tests are assigned to shards according to
+# their min_* markers, and the JUnit results of each shard are merged at the end.
+
+
+def _cluster_indexes(raw: dict[str, Any]) -> list[int]:
+    indexes = {SyncGatewayInfo(sgw).cluster_index for sgw in raw.get("sync-gateways", [])}
+    indexes |= {CouchbaseServerInfo(cbs).cluster_index for cbs in raw.get("couchbase-servers", [])}
+    return sorted(indexes)
+
+
+def partition_config(raw: dict[str, Any], shards: int) -> list[dict[str, Any]]:
+    """
+    Splits a TDK config (as loaded from config.json) into at most the given number
+    of configs whose backends do not overlap.
+
+    Clusters are never split: every Couchbase Server and Sync Gateway of a cluster
+    goes to the same shard (with the cluster indexes renumbered from 0 in each
+    shard), so that no two shards ever create the same bucket or database on the
+    same server.  Test Servers and Edge Servers are dealt out in turn, and the load
+    balancers stay with the first cluster.  Greenboard details are dropped, since
+    the results are uploaded once for the whole run.
+
+    :param raw: The contents of the TDK config file
+    :param shards: The number of shards wanted
+    """
+    clusters = _cluster_indexes(raw)
+    test_servers = raw.get("test-servers", [])
+    edge_servers = raw.get("edge-servers", [])
+    count = max(1, min(shards, max(len(test_servers), len(clusters), len(edge_servers))))
+
+    ret_val: list[dict[str, Any]] = []
+    for shard in range(count):
+        config = deepcopy(raw)
+        config.pop("greenboard", None)
+        shard_clusters = clusters[shard::count]
+        renumber = {old: new for new, old in enumerate(shard_clusters)}
+
+        config["sync-gateways"] = []
+        for sgw in raw.get("sync-gateways", []):
+            index = SyncGatewayInfo(sgw).cluster_index
+            if index in renumber:
+                config["sync-gateways"].append({**sgw, "cluster_index": renumber[index]})
+
+        config["couchbase-servers"] = []
+        for cbs in raw.get("couchbase-servers", []):
+            index = CouchbaseServerInfo(cbs).cluster_index
+            if index in renumber:
+                config["couchbase-servers"].append({**cbs, "cluster_index": renumber[index]})
+
+        config["test-servers"] = deepcopy(test_servers[shard::count])
+        config["edge-servers"] = deepcopy(edge_servers[shard::count])
+        config["load-balancers"] = list(raw.get("load-balancers", [])) if shard == 0 else []
+        ret_val.append(config)
+
+    return ret_val
+
+
+def assign_groups(groups: Sequence[tuple[dict[str, int], int]], shards: Sequence[ParsedConfig]) -> list[int | None]:
+    """
+    Assigns groups of tests to shards.  Each group is described by the requirements
+    that its tests declare (see required_topology.topology_requirements) and the
+    number of tests in it.  The largest groups are placed first, each on the least
+    loaded shard that satisfies its requirements.
+
+    Groups that declare no requirements at all, or that no shard can satisfy, are
+    assigned None and are expected to run on the full topology instead, since there
+    is no way of knowing which part of the topology they use.
+
+    :param groups: The requirements and size of each group
+    :param shards: The parsed config of each shard
+    """
+    load = [0] * len(shards)
+    ret_val: list[int | None] = [None] * len(groups)
+    for index in sorted(range(len(groups)), key=lambda i: -groups[i][1]):
+        requirements, size = groups[index]
+        if not requirements:
+            continue
+
+        eligible = [s for s, config in enumerate(shards) if unmet_requirement(requirements, config, quiet=True) is None]
+        if not eligible:
+            continue
+
+        shard = min(eligible, key=lambda s: load[s])
+        load[shard] += size
+        ret_val[index] = shard
+
+    return ret_val
+
+
+def merge_junit(inputs: Sequence[Path], output: Path) -> None:
+    """
+    Merges the test suites of several JUnit XML files into one file.  The output
+    may also be one of the inputs.
+
+    :param inputs: The JUnit XML files to merge
+    :param output: The file to write the merged results to
+    """
+    merged = JUnitXml()
+    for path in inputs:
+        xml = JUnitXml.fromfile(str(path))
+        suites = [xml] if isinstance(xml, TestSuite) else list(xml)
+        for suite in suites:
+            merged.add_testsuite(suite)
+
+    merged.update_statistics()
+    merged.write(str(output))
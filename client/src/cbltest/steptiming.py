@@ -0,0 +1,315 @@
+import asyncio
+import json
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Final
+
+# This module times the steps of each test (as marked by CBLTestClass.mark_test_step)
+# and attributes the time spent in each one to the backend services that were
+# called, to waiting (polling intervals and other deliberate sleeps), and to
+# everything else (the client itself).  It works entirely in process, so unlike
+# the OpenTelemetry spans it needs no collector to be useful.
+#
+# Calls to services are timed where the client sends them (see service_call),
+# and waits by using wait / blocking_wait instead of sleeping directly.  When
+# no test is running, nothing is recorded.
+
+TEST_SERVER: Final[str] = "test_server"
+SYNC_GATEWAY: Final[str] = "sync_gateway"
+COUCHBASE_SERVER: Final[str] = "couchbase_server"
+EDGE_SERVER: Final[str] = "edge_server"
+SERVICES: Final[tuple[str, ...]] = (TEST_SERVER, SYNC_GATEWAY, COUCHBASE_SERVER, EDGE_SERVER)
+
+# The services whose calls are currently being timed, so that nested calls to the
+# same service (e.g. a Couchbase Server operation made of several REST calls) are
+# only counted once
+_active_services: ContextVar[frozenset[str]] = ContextVar("_active_services", default=frozenset())
+
+
+class StepTiming:
+    """The time spent in one step of a test, and what it was spent on"""
+
+    @property
+    def test(self) -> str:
+        """Gets the ID of the test that the step belongs to"""
+        return self.__test
+
+    @property
+    def index(self) -> int:
+        """Gets the number of the step within its test (0 is anything before the first step)"""
+        return self.__index
+
+    @property
+    def description(self) -> str:
+        """Gets the first line of the step description"""
+        return self.__description
+
+    @property
+    def duration(self) -> float:
+        """Gets the total time spent in the step, in seconds"""
+        return self.__duration
+
+    @property
+    def services(self) -> dict[str, float]:
+        """Gets the time spent in calls to each service, in seconds"""
+        return self.__services
+
+    @property
+    def calls(self) -> dict[str, int]:
+        """Gets the number of calls made to each service"""
+        return self.__calls
+
+    @property
+    def wait(self) -> float:
+        """Gets the time spent deliberately waiting (e.g. between polls), in seconds"""
+        return self.__wait
+
+    @property
+    def other(self) -> float:
+        """
+        Gets the time not accounted for by service calls or waiting, in seconds.  Calls
+        made concurrently can account for more than the step duration, in which case this
+        is zero.
+        """
+        return max(0.0, self.__duration - sum(self.__services.values()) - self.__wait)
+
+    def __init__(
+        self,
+        test: str,
+        index: int,
+        description: str,
+        duration: float = 0.0,
+        services: dict[str, float] | None = None,
+        calls: dict[str, int] | None = None,
+        wait: float = 0.0,
+    ) -> None:
+        self.__test = test
+        self.__index = index
+        self.__description = description
+        self.__duration = duration
+        self.__services = services if services is not None else {}
+        self.__calls = calls if calls is not None else {}
+        self.__wait = wait
+
+    def add_call(self, service: str, seconds: float) -> None:
+        self.__services[service] = self.__services.get(service, 0.0) + seconds
+        self.__calls[service] = self.__calls.get(service, 0) + 1
+
+    def add_wait(self, seconds: float) -> None:
+        self.__wait += seconds
+
+    def finish(self, duration: float) -> None:
+        self.__duration = duration
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "test": self.__test,
+            "index": self.__index,
+            "description": self.__description,
+            "duration": round(self.__duration, 4),
+            "services": {k: round(v, 4) for k, v in self.__services.items()},
+            "calls": self.__calls,
+            "wait": round(self.__wait, 4),
+            "other": round(self.other, 4),
+        }
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> "StepTiming":
+        return StepTiming(
+            data["test"],
+            data["index"],
+            data.get("description", ""),
+            data.get("duration", 0.0),
+            dict(data.get("services", {})),
+            dict(data.get("calls", {})),
+            data.get("wait", 0.0),
+        )
+
+
+class StepRegression:
+    """A step that took noticeably longer than it did in the baseline"""
+
+    def __init__(self, current: StepTiming, baseline: StepTiming) -> None:
+        self.current = current
+        self.baseline = baseline
+
+    @property
+    def ratio(self) -> float:
+        """Gets how many times longer the step took than in the baseline"""
+        return self.current.duration / self.baseline.duration if self.baseline.duration > 0 else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.current.test} step {self.current.index} ({self.current.description}): "
+            f"{self.baseline.duration:.2f}s -> {self.current.duration:.2f}s (x{self.ratio:.2f})"
+        )
+
+
+class StepRecorder:
+    """
+    Records the steps of the running test.  There is one for the whole process (see
+    the module level functions), driven by the step_timing plugin and CBLTestClass.
+    """
+
+    @property
+    def steps(self) -> list[StepTiming]:
+        """Gets every step recorded so far, in order"""
+        return self.__steps
+
+    def __init__(self) -> None:
+        self.__steps: list[StepTiming] = []
+        self.__test: str | None = None
+        self.__current: StepTiming | None = None
+        self.__step_start = 0.0
+
+    def begin_test(self, test: str) -> None:
+        self.end_test()
+        self.__test = test
+        self._start_step(0, "(before the first step)")
+
+    def begin_step(self, index: int, description: str) -> None:
+        if self.__test is None:
+            return
+
+        lines = [line.strip() for line in description.splitlines() if line.strip()]
+        self._finish_step(keep_first=True)
+        self._start_step(index, lines[0] if lines else "")
+
+    def end_test(self) -> None:
+        # A test that never marked a step has nothing worth reporting
+        self._finish_step(keep_first=False)
+        self.__test = None
+
+    def record_call(self, service: str, seconds: float) -> None:
+        if self.__current is not None:
+            self.__current.add_call(service, seconds)
+
+    def record_wait(self, seconds: float) -> None:
+        if self.__current is not None:
+            self.__current.add_wait(seconds)
+
+    def current_wait(self) -> float:
+        return self.__current.wait if self.__current is not None else 0.0
+
+    def _start_step(self, index: int, description: str) -> None:
+        assert self.__test is not None
+        self.__current = StepTiming(self.__test, index, description)
+        self.__step_start = time.monotonic()
+
+    def _finish_step(self, keep_first: bool) -> None:
+        current = self.__current
+        if current is None:
+            return
+
+        self.__current = None
+        current.finish(time.monotonic() - self.__step_start)
+
+        # The implicit first step is only interesting if something happened in it
+        if current.index > 0 or (keep_first and (current.calls or current.duration >= 0.01)):
+            self.__steps.append(current)
+
+
+_recorder = StepRecorder()
+
+
+def recorder() -> StepRecorder:
+    """Gets the step recorder for this process"""
+    return _recorder
+
+
+@contextmanager
+def service_call(service: str) -> Generator[None]:
+    """
+    Times a call to a backend service (one of SERVICES) and attributes it to the
+    current step.  Time spent in wait / blocking_wait inside the call counts as
+    waiting rather than as time in the service, and nested calls to the same service
+    are only counted once.  Works in both synchronous and asynchronous code.
+    """
+    active = _active_services.get()
+    if service in active:
+        yield
+        return
+
+    token = _active_services.set(active | {service})
+    wait_before = _recorder.current_wait()
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - start
+        _active_services.reset(token)
+        _recorder.record_call(service, max(0.0, elapsed - (_recorder.current_wait() - wait_before)))
+
+
+def record_call(service: str, seconds: float) -> None:
+    """
+    Attributes an already timed call to a backend service to the current step, unless
+    it was made inside a service_call for the same service (which times it already).
+    """
+    if service not in _active_services.get():
+        _recorder.record_call(service, seconds)
+
+
+async def wait(seconds: float) -> None:
+    """Sleeps for the given number of seconds, counting it as waiting in the current step"""
+    start = time.monotonic()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        _recorder.record_wait(time.monotonic() - start)
+
+
+def blocking_wait(seconds: float) -> None:
+    """Like wait, but blocks the thread (for synchronous code)"""
+    start = time.monotonic()
+    try:
+        time.sleep(seconds)
+    finally:
+        _recorder.record_wait(time.monotonic() - start)
+
+
+def write_report(path: Path, steps: list[StepTiming]) -> None:
+    """
+    Writes the recorded steps as JSON, along with the totals for the whole run.  The
+    file can be used as the baseline for a later run (see load_report).
+    """
+    totals = {
+        "duration": round(sum(s.duration for s in steps), 4),
+        "wait": round(sum(s.wait for s in steps), 4),
+        "other": round(sum(s.other for s in steps), 4),
+        "services": {svc: round(sum(s.services.get(svc, 0.0) for s in steps), 4) for svc in SERVICES},
+    }
+    with open(path, "w") as fout:
+        json.dump({"totals": totals, "steps": [s.to_json() for s in steps]}, fout, indent=2)
+
+
+def load_report(path: Path) -> list[StepTiming]:
+    """Reads the steps from a report written by write_report"""
+    with open(path) as fin:
+        return [StepTiming.from_json(s) for s in json.load(fin)["steps"]]
+
+
+def find_regressions(
+    steps: list[StepTiming], baseline: list[StepTiming], threshold: float, min_seconds: float = 1.0
+) -> list[StepRegression]:
+    """
+    Compares steps against a baseline (matching them by test and step number), and
+    returns the ones that took more than `threshold` (e.g. 0.2 for 20%) longer, slowest
+    first.  Steps that got slower by less than `min_seconds` are ignored, since short
+    steps are too noisy to compare.
+    """
+    by_key = {(s.test, s.index): s for s in baseline}
+    regressions: list[StepRegression] = []
+    for step in steps:
+        previous = by_key.get((step.test, step.index))
+        if previous is None:
+            continue
+
+        if step.duration - previous.duration >= min_seconds and step.duration > previous.duration * (1 + threshold):
+            regressions.append(StepRegression(step, previous))
+
+    regressions.sort(key=lambda r: r.current.duration - r.baseline.duration, reverse=True)
+    return regressions
@@ -2,7 +2,6 @@ import json
 import os
 import subprocess
 import sys
-import time
 from collections.abc import Awaitable, Callable
 from typing import Any, NoReturn, TypeVar, cast
 
@@ -11,6 +10,8 @@ import tenacity._utils
 import tenacity.asyncio
 
 from .api.error import CblTimeoutError
+from .steptiming import blocking_wait
+from .steptiming import wait as step_wait
 
 T = TypeVar("T")
 
@@ -40,6 +41,8 @@ async def retry_assert(
         stop=stop,
         retry=tenacity.retry_if_exception_type(AssertionError),
         retry_error_callback=_on_exhausted,
+        # Not `wait`, which is the tenacity wait strategy passed in
+        sleep=step_wait,
     )
     return await retrying(function)
 
@@ -56,13 +59,13 @@ def _try_n_times(
     for i in range(num_times):
         try:
             if i == 0 and wait_before_first_try:
-                time.sleep(seconds_between)
+                blocking_wait(seconds_between)
             ret = func(*args, **kwargs)
             return ret
         except Exception as e:
             if i < num_times - 1:
                 print(f"Trying {function_name} failed (reason='{e}'), retry in {seconds_between} seconds ...")
-                time.sleep(seconds_between)
+                blocking_wait(seconds_between)
             else:
                 print(f"Trying {function_name} failed (reason='{e}')")
 
@@ -22,6 +22,12 @@ class WebSocketRouter:
         self.__connections: dict[str, web.WebSocketResponse] = {}
         self.__runner = web.AppRunner(self.__app)
         self.__stopping = False
+        self.__port: int | None = None
+
+    @property
+    def port(self) -> int | None:
+        """Gets the port that the router is listening on, or None if it hasn't started"""
+        return self.__port
 
     async def start(self) -> None:
         if len(self.__server_urls) == 0:
@@ -38,6 +44,7 @@ class WebSocketRouter:
         site = web.SockSite(self.__runner, sock)
         chosen_port = sock.getsockname()[1]
         await site.start()
+        self.__port = chosen_port
 
         ws_index = 0
         for url in self.__server_urls:
@@ -70,6 +77,8 @@ class WebSocketRouter:
         if self.__runner:
             await self.__runner.cleanup()
 
+        self.__port = None
+
         for fut in self.__pending.values():
             if not fut.done():
                 fut.set_exception(RuntimeError("WebSocket router stopped before response received"))
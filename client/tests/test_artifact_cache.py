@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+from collections.abc import Iterator
+from itertools import count
+from pathlib import Path
+from typing import Any
+
+import pytest
+import requests
+
+from environment.aws.common import artifact_cache
+from environment.aws.common.artifact_cache import ArtifactCache
+
+URL = "https://example.com/packages/thing.zip"
+
+
+class _FakeResponse:
+    def __init__(
+        self, url: str, status_code: int, headers: dict[str, str], body: bytes, drop_after: int | None
+    ) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers
+        self.__body = body
+        self.__drop_after = drop_after
+
+    def __enter__(self) -> "_FakeResponse":  # noqa: PYI034
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        pass
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} for {self.url}")
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        body = self.__body if self.__drop_after is None else self.__body[: self.__drop_after]
+        for i in range(0, len(body), 16):
+            yield body[i : i + 16]
+
+        if self.__drop_after is not None:
+            raise requests.exceptions.ChunkedEncodingError("Connection broken")
+
+
+class _FakeServer:
+    """Serves one file, optionally honouring Range requests and dropping connections"""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.ranges = True
+        # Ranges starting at these offsets break half way through, once each
+        self.drop_once: set[int] = set()
+        self.drop_always = False
+        self.gets: list[str | None] = []
+
+    def head(self, url: str, **kwargs: Any) -> _FakeResponse:
+        assert kwargs.get("timeout") is not None
+        headers = {"content-length": str(len(self.data))}
+        if self.ranges:
+            headers["accept-ranges"] = "bytes"
+
+        return _FakeResponse(url, 200, headers, b"", None)
+
+    def get(self, url: str, headers: dict[str, str] | None = None, **kwargs: Any) -> _FakeResponse:
+        assert kwargs.get("timeout") is not None
+        byte_range = (headers or {}).get("Range")
+        self.gets.append(byte_range)
+        if byte_range is None or not self.ranges:
+            return _FakeResponse(url, 200, {}, self.data, None)
+
+        start, end = (int(x) for x in byte_range.removeprefix("bytes=").split("-"))
+        body = self.data[start : end + 1]
+        drop_after = None
+        if self.drop_always or start in self.drop_once:
+            self.drop_once.discard(start)
+            drop_after = len(body) // 2
+
+        return _FakeResponse(url, 206, {}, body, drop_after)
+
+
+@pytest.fixture
+def data() -> bytes:
+    return os.urandom(4096)
+
+
+@pytest.fixture
+def server(data: bytes, monkeypatch: pytest.MonkeyPatch) -> _FakeServer:
+    server = _FakeServer(data)
+    monkeypatch.setattr(artifact_cache.requests, "head", server.head)
+    monkeypatch.setattr(artifact_cache.requests, "get", server.get)
+    monkeypatch.setattr(artifact_cache, "_RANGE_THRESHOLD", 1024)
+    return server
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Every call is one second later than the last, so LRU order is deterministic
+    ticks = count(1_000_000)
+    monkeypatch.setattr(artifact_cache.time, "time", lambda: float(next(ticks)))
+
+
+class TestFetch:
+    def test_second_fetch_is_cached(self, tmp_path: Path, server: _FakeServer, data: bytes) -> None:
+        cache = ArtifactCache(tmp_path, range_parts=4)
+        first = cache.fetch(URL)
+        gets = len(server.gets)
+        second = cache.fetch(URL)
+
+        assert first == second
+        assert first.read_bytes() == data
+        assert len(server.gets) == gets
+
+    def test_index_records_the_url(self, tmp_path: Path, server: _FakeServer, data: bytes) -> None:
+        cache = ArtifactCache(tmp_path)
+        path = cache.fetch(URL)
+
+        digest = hashlib.sha256(data).hexdigest()
+        index = json.loads((tmp_path / "index.json").read_text())
+        assert index[URL]["sha256"] == digest
+        assert index[URL]["size"] == len(data)
+        assert path == tmp_path / "objects" / digest
+
+        # The same content is found by checksum under another URL
+        assert cache.lookup("https://mirror.example.com/thing.zip", digest) == path
+        assert cache.lookup("https://mirror.example.com/other.zip") is None
+
+    def test_checksum_mismatch(self, tmp_path: Path, server: _FakeServer) -> None:
+        cache = ArtifactCache(tmp_path)
+        with pytest.raises(ValueError, match="Checksum mismatch"):
+            cache.fetch(URL, "0" * 64)
+
+        assert cache.lookup(URL) is None
+        assert list((tmp_path / "tmp").iterdir()) == []
+
+
+class TestRangeDownload:
+    def test_parts_are_fetched_by_range(self, tmp_path: Path, server: _FakeServer, data: bytes) -> None:
+        path = ArtifactCache(tmp_path, range_parts=4).fetch(URL)
+
+        assert path.read_bytes() == data
+        assert sorted(server.gets, key=lambda r: int(r.split("=")[1].split("-")[0]) if r else -1) == [
+            "bytes=0-1023",
+            "bytes=1024-2047",
+            "bytes=2048-3071",
+            "bytes=3072-4095",
+        ]
+
+    def test_dropped_connections_resume(self, tmp_path: Path, server: _FakeServer, data: bytes) -> None:
+        server.drop_once = {0, 1024, 2048, 3072}
+        path = ArtifactCache(tmp_path, range_parts=4).fetch(URL)
+
+        assert path.read_bytes() == data
+        # Each part is asked for again from where its first response stopped
+        assert "bytes=512-1023" in server.gets
+        assert "bytes=3584-4095" in server.gets
+        assert len(server.gets) == 8
+
+    def test_too_many_drops_fail(self, tmp_path: Path, server: _FakeServer) -> None:
+        server.drop_always = True
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            ArtifactCache(tmp_path, range_parts=1).fetch(URL)
+
+        assert ArtifactCache(tmp_path).lookup(URL) is None
+
+    def test_ignored_ranges_fall_back_to_one_stream(self, tmp_path: Path, server: _FakeServer, data: bytes) -> None:
+        server.ranges = False
+        path = ArtifactCache(tmp_path, range_parts=4).fetch(URL)
+
+        assert path.read_bytes() == data
+        assert server.gets == [None]
+
+
+class TestEviction:
+    def test_least_recently_used_is_evicted(self, tmp_path: Path, clock: None) -> None:
+        cache = ArtifactCache(tmp_path / "cache", max_bytes=2500)
+        paths = {}
+        for name in ("a", "b", "c"):
+            source = tmp_path / name
+            source.write_bytes(name.encode() * 1000)
+            paths[name] = cache.put(f"https://example.com/{name}", source)
+
+        assert not paths["a"].exists()
+        assert paths["b"].exists()
+        assert paths["c"].exists()
+        assert cache.lookup("https://example.com/a") is None
+
+    def test_touch_changes_the_order(self, tmp_path: Path, clock: None) -> None:
+        cache = ArtifactCache(tmp_path / "cache", max_bytes=2500)
+        for name in ("a", "b"):
+            source = tmp_path / name
+            source.write_bytes(name.encode() * 1000)
+            cache.put(f"https://example.com/{name}", source)
+
+        assert cache.lookup("https://example.com/a") is not None
+        source = tmp_path / "c"
+        source.write_bytes(b"c" * 1000)
+        cache.put("https://example.com/c", source)
+
+        assert cache.lookup("https://example.com/a") is not None
+        assert cache.lookup("https://example.com/b") is None
+        index = json.loads((tmp_path / "cache" / "index.json").read_text())
+        assert sorted(index) == ["https://example.com/a", "https://example.com/c"]
+
+    def test_newest_is_kept_even_if_too_large(self, tmp_path: Path, clock: None) -> None:
+        cache = ArtifactCache(tmp_path / "cache", max_bytes=100)
+        source = tmp_path / "big"
+        source.write_bytes(b"x" * 1000)
+        path = cache.put("https://example.com/big", source)
+
+        assert path.exists()
+
+
+class TestMaterialize:
+    def test_editing_the_copy_leaves_the_cache_intact(self, tmp_path: Path, server: _FakeServer, data: bytes) -> None:
+        cache = ArtifactCache(tmp_path / "cache")
+        dest = cache.materialize(URL, tmp_path / "out" / "thing.zip")
+        with open(dest, "r+b") as f:
+            f.write(b"corrupted")
+
+        cached = cache.fetch(URL)
+        assert not os.path.samefile(dest, cached)
+        assert cached.read_bytes() == data
+
+        # Materializing again replaces the edited copy
+        cache.materialize(URL, dest)
+        assert dest.read_bytes() == data
@@ -0,0 +1,114 @@
+import re
+from collections.abc import Iterable
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import pytest
+from cbltest.api.consistency import (
+    ConsistencySource,
+    CouchbaseServerCollectionSource,
+    VersionedDocument,
+    check_consistency,
+)
+from cbltest.api.couchbaseserver import CouchbaseServer
+
+
+class _ListSource(ConsistencySource):
+    def __init__(self, name: str, docs: list[VersionedDocument]) -> None:
+        self.__name = name
+        self.__docs = docs
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    async def fetch_versions(self) -> Iterable[VersionedDocument]:
+        return self.__docs
+
+
+def _docs(count: int, rev: str = "1-abc") -> list[VersionedDocument]:
+    return [(f"doc_{i}", rev) for i in range(count)]
+
+
+def _fake_query(doc_ids: list[str]) -> Any:
+    # Evaluates just enough of the ID query to return rows shaped the way the SDK
+    # returns them: bare values for SELECT RAW, otherwise one dict per row
+    def query(statement: str) -> MagicMock:
+        match = re.search(r'NOT LIKE "((?:[^"\\]|\\.)*)"', statement)
+        assert match is not None
+        pattern = match.group(1).encode().decode("unicode_escape")
+        regex = "".join(
+            re.escape(token[1]) if token.startswith("\\") else {"%": ".*", "_": "."}.get(token, re.escape(token))
+            for token in re.findall(r"\\.|.", pattern)
+        )
+        ids = [doc_id for doc_id in doc_ids if not re.fullmatch(regex, doc_id)]
+        result = MagicMock()
+        if "SELECT RAW" in statement:
+            result.execute.return_value = ids
+        else:
+            field = re.search(r"AS (\w+)", statement)
+            assert field is not None
+            result.execute.return_value = [{field.group(1): doc_id} for doc_id in ids]
+
+        return result
+
+    return query
+
+
+class TestCheckConsistency:
+    @pytest.mark.asyncio
+    async def test_identical_collections_are_consistent(self) -> None:
+        report = await check_consistency(_ListSource("left", _docs(1000)), _ListSource("right", _docs(1000)[::-1]))
+
+        assert report
+        assert str(report) == "left and right are consistent"
+
+    @pytest.mark.asyncio
+    async def test_differences_are_reported(self) -> None:
+        left = _docs(1000)
+        right = _docs(1000)
+        right[10] = ("doc_10", "2-def")
+        del right[20]
+        right.append(("extra", "1-abc"))
+
+        report = await check_consistency(_ListSource("left", left), _ListSource("right", right))
+
+        assert not report
+        assert report.mismatched == [("doc_10", "1-abc", "2-def")]
+        assert report.missing_right == ["doc_20"]
+        assert report.missing_left == ["extra"]
+        assert "1 missing from right: doc_20" in str(report)
+
+    @pytest.mark.asyncio
+    async def test_cv_source_is_compared_by_version(self) -> None:
+        left = _ListSource("cbl", [("doc_1", "1823a4f5b0000000@*")])
+        right = _ListSource("sgw", [("doc_1", "1823a4f5b0000000@Hrd3cWf1pAUjy3BHm/S5JA")])
+
+        assert await check_consistency(left, right)
+
+        stale = _ListSource("sgw", [("doc_1", "1823a4f5c0000000@Hrd3cWf1pAUjy3BHm/S5JA")])
+        assert not await check_consistency(left, stale)
+
+    @pytest.mark.asyncio
+    async def test_versionless_source_compares_ids_only(self) -> None:
+        left = _ListSource("cbl", _docs(10, "3-xyz"))
+        right = _ListSource("cbs", [(doc_id, None) for doc_id, _ in _docs(10)])
+
+        assert await check_consistency(left, right)
+
+        short = _ListSource("cbs", [(doc_id, None) for doc_id, _ in _docs(9)])
+        report = await check_consistency(left, short)
+        assert report.missing_right == ["doc_9"]
+        assert report.mismatched == []
+
+    @pytest.mark.asyncio
+    async def test_couchbase_server_source(self) -> None:
+        server_ids = ["doc_0", "doc_1", "_sync:att2:doc_0", "xsync:doc"]
+        mock_cluster = MagicMock()
+        mock_cluster.query.side_effect = _fake_query(server_ids)
+        with patch("cbltest.api.couchbaseserver.Cluster", return_value=mock_cluster):
+            cbs = CouchbaseServer("localhost", "user", "pass")
+
+        source = CouchbaseServerCollectionSource(cbs, "travel", "inventory", "hotels")
+        assert sorted(await source.fetch_versions()) == [("doc_0", None), ("doc_1", None), ("xsync:doc", None)]
+        assert "FROM travel.inventory.hotels" in mock_cluster.query.call_args[0][0]
@@ -0,0 +1,66 @@
+from collections.abc import Iterator
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from cbltest.api import couchbaseserver
+
+
+class _Servers:
+    def __init__(self, tracer: MagicMock, sessions: list[MagicMock]) -> None:
+        self.span = tracer.start_as_current_span.return_value.__enter__.return_value
+        with patch("cbltest.api.couchbaseserver.Cluster", autospec=True):
+            self.primary = couchbaseserver.CouchbaseServer("couchbase://primary", "user", "pass")
+            self.node = couchbaseserver.CouchbaseServer("couchbase://203.0.113.7", "user", "pass")
+
+        self.primary_session, self.node_session = sessions
+
+
+def _response(status_code: int, json: object = None) -> MagicMock:
+    resp = MagicMock(spec=requests.Response)
+    resp.status_code = status_code
+    resp.json.return_value = json
+    return resp
+
+
+@pytest.fixture
+def servers() -> Iterator[_Servers]:
+    # Each server gets its own REST session, and every operation shares one span
+    sessions = [MagicMock(), MagicMock()]
+    tracer = MagicMock()
+    with (
+        patch("cbltest.api.couchbaseserver.get_tracer", return_value=tracer),
+        patch("cbltest.api.couchbaseserver.requests.Session", side_effect=sessions),
+    ):
+        servers = _Servers(tracer, sessions)
+        # The node reports a private address, so it is added by that and given the
+        # public one as its alternate address
+        servers.node_session.get.return_value = _response(200, {"hostname": "10.0.0.7:8091"})
+        servers.primary_session.post.return_value = _response(200)
+        yield servers
+
+
+class TestAddNode:
+    def test_alternate_address_is_set(self, servers: _Servers) -> None:
+        servers.primary.add_node(servers.node)
+
+        servers.primary_session.post.assert_called_once()
+        assert servers.primary_session.post.call_args.kwargs["data"]["hostname"] == "10.0.0.7"
+        servers.primary_session.put.assert_called_once_with(
+            "http://203.0.113.7:8091/node/controller/setupAlternateAddresses/external",
+            data={"hostname": "203.0.113.7", "mgmt": "8091"},
+        )
+        servers.span.add_event.assert_called_once_with("alternate_address_set", attributes={"hostname": "203.0.113.7"})
+
+    def test_alternate_address_failure_is_not_fatal(self, servers: _Servers) -> None:
+        servers.primary_session.put.return_value.raise_for_status.side_effect = requests.HTTPError("500")
+        servers.primary.add_node(servers.node)
+
+        servers.span.add_event.assert_called_once_with("alternate_address_failed", attributes={"error": "500"})
+
+    def test_no_alternate_address_for_internal_hostname(self, servers: _Servers) -> None:
+        servers.node_session.get.return_value = _response(200, {"hostname": "203.0.113.7:8091"})
+        servers.primary.add_node(servers.node)
+
+        servers.primary_session.put.assert_not_called()
+        servers.span.add_event.assert_not_called()
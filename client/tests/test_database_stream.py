@@ -0,0 +1,129 @@
+"""Unit tests for Database.stream_upsert_documents: chunking of sync and async
+document sources, the bound on outstanding updateDatabase requests, and error
+propagation.
+
+The request factory is replaced by a recorder that captures the updates of each
+updateDatabase request instead of sending them to a test server."""
+
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+from types import SimpleNamespace
+from typing import Any, cast
+
+import cbltest.requests as cbl_requests
+import pytest
+from cbltest.api.database import Database, StreamedDocument
+from cbltest.api.error import CblTestError
+from cbltest.api.error_types import ErrorResponseBody
+from cbltest.request_types import DatabaseUpdateEntry
+
+
+class _RecordingFactory:
+    def __init__(self, delay: float = 0, fail_on: int | None = None, error_on: int | None = None) -> None:
+        self.batches: list[list[DatabaseUpdateEntry]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.__delay = delay
+        self.__fail_on = fail_on
+        self.__error_on = error_on
+
+    def create_request(self, type: cbl_requests.TestServerRequestType, **kwargs: Any) -> dict[str, Any]:
+        assert type == cbl_requests.TestServerRequestType.UPDATE_DB
+        return kwargs
+
+    async def send_request(self, index: int, r: dict[str, Any]) -> SimpleNamespace:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.__delay)
+            if self.__fail_on is not None and len(self.batches) == self.__fail_on:
+                raise RuntimeError("update failed")
+
+            if self.__error_on is not None and len(self.batches) == self.__error_on:
+                body = {"domain": "CBL", "code": 1, "message": "invalid update"}
+                return SimpleNamespace(error=ErrorResponseBody.create(body))
+
+            self.batches.append(r["updates"])
+            return SimpleNamespace(error=None)
+        finally:
+            self.in_flight -= 1
+
+
+def _docs(count: int) -> Iterator[StreamedDocument]:
+    for i in range(count):
+        yield f"doc_{i}", [{"value": i}]
+
+
+def _db(factory: _RecordingFactory) -> Database:
+    return Database(cast(cbl_requests.RequestFactory, factory), 0, "db1")
+
+
+class TestStreamUpsertDocuments:
+    @pytest.mark.asyncio
+    async def test_sync_source_is_sent_in_chunks(self) -> None:
+        factory = _RecordingFactory()
+
+        count = await _db(factory).stream_upsert_documents("_default._default", _docs(25), batch_size=10)
+
+        assert count == 25
+        assert sorted(len(b) for b in factory.batches) == [5, 10, 10]
+        ids = sorted(int(u.document_id.split("_")[1]) for b in factory.batches for u in b)
+        assert ids == list(range(25))
+        assert factory.batches[0][0].collection == "_default._default"
+
+    @pytest.mark.asyncio
+    async def test_async_source_is_sent_in_chunks(self) -> None:
+        factory = _RecordingFactory()
+
+        async def source() -> AsyncIterator[StreamedDocument]:
+            for doc in _docs(7):
+                yield doc
+
+        count = await _db(factory).stream_upsert_documents("_default._default", source(), batch_size=3)
+
+        assert count == 7
+        assert sorted(len(b) for b in factory.batches) == [1, 3, 3]
+
+    @pytest.mark.asyncio
+    async def test_source_is_not_drained_ahead_of_the_server(self) -> None:
+        factory = _RecordingFactory(delay=0.01)
+        pulled = {"n": 0}
+
+        def source() -> Iterator[StreamedDocument]:
+            for doc in _docs(100):
+                pulled["n"] += 1
+                # At most max_in_flight chunks queued, max_in_flight being sent
+                # and one being built
+                sent = sum(len(b) for b in factory.batches)
+                assert pulled["n"] - sent <= 5 * 5
+                yield doc
+
+        count = await _db(factory).stream_upsert_documents("_default._default", source(), batch_size=5, max_in_flight=2)
+
+        assert count == 100
+        assert factory.max_in_flight == 2
+
+    @pytest.mark.asyncio
+    async def test_empty_source_sends_nothing(self) -> None:
+        factory = _RecordingFactory()
+
+        assert await _db(factory).stream_upsert_documents("_default._default", []) == 0
+        assert factory.batches == []
+
+    @pytest.mark.asyncio
+    async def test_failed_request_propagates(self) -> None:
+        factory = _RecordingFactory(fail_on=1)
+
+        with pytest.raises(RuntimeError, match="update failed"):
+            await _db(factory).stream_upsert_documents("_default._default", _docs(50), batch_size=5, max_in_flight=1)
+
+        assert len(factory.batches) == 1
+
+    @pytest.mark.asyncio
+    async def test_error_response_propagates(self) -> None:
+        factory = _RecordingFactory(error_on=1)
+
+        with pytest.raises(CblTestError, match="invalid update"):
+            await _db(factory).stream_upsert_documents("_default._default", _docs(50), batch_size=5, max_in_flight=1)
+
+        assert len(factory.batches) == 1
@@ -63,6 +63,12 @@ def _clear_branch_env(monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.delenv("BRANCH_NAME", raising=False)
 
 
+@pytest.fixture(autouse=True)
+def _spool_in_tmp_path(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Keep documents that fail to upload out of the working directory."""
+    monkeypatch.setenv("CBL_GREENBOARD_SPOOL", str(tmp_path / "greenboard_spool.jsonl"))
+
+
 def make_report(when: Literal["setup", "call", "teardown"], *, passed: bool = True) -> TestReport:
     return TestReport(
         nodeid="",
@@ -551,6 +557,7 @@ class TestRunResultFullDocument:
         mock_collection = MagicMock(spec=Collection)
         mock_cluster = MagicMock(spec=Cluster)
         mock_cluster.bucket.return_value.default_collection.return_value = mock_collection
+        mock_collection.upsert_multi.return_value.exceptions = {}
 
         with (
             patch("cbltest.greenboarduploader.Cluster", return_value=mock_cluster),
@@ -560,7 +567,7 @@ class TestRunResultFullDocument:
             mock_dt.side_effect = datetime
             uploader.upload(platform, os_name, version, sgw)
 
-        _, doc = mock_collection.upsert.call_args[0]
+        (doc,) = mock_collection.upsert_multi.call_args[0][0].values()
         return doc
 
     def test_all_fields_standard_run(self) -> None:
@@ -609,6 +616,65 @@ class TestRunResultFullDocument:
         }
 
 
+class TestUploadBatching:
+    """Verify the connection is reused and failed uploads are spooled and retried."""
+
+    @staticmethod
+    def _mock_cluster() -> tuple[MagicMock, MagicMock]:
+        mock_collection = MagicMock(spec=Collection)
+        mock_cluster = MagicMock(spec=Cluster)
+        mock_cluster.bucket.return_value.default_collection.return_value = mock_collection
+        mock_collection.upsert_multi.return_value.exceptions = {}
+        return mock_cluster, mock_collection
+
+    def test_connection_reused(self) -> None:
+        uploader = make_uploader()
+        mock_cluster, mock_collection = self._mock_cluster()
+        with patch("cbltest.greenboarduploader.Cluster", return_value=mock_cluster) as mock_ctor:
+            uploader.upload("couchbase-lite-ios", "iOS", "3.2.0-b1234", None)
+            uploader.upload("couchbase-lite-ios", "iOS", "3.2.0-b1234", None)
+            uploader.close()
+
+        assert mock_ctor.call_count == 1
+        assert mock_cluster.wait_until_ready.call_count == 1
+        assert mock_collection.upsert_multi.call_count == 2
+        mock_cluster.close.assert_called_once()
+
+    def test_failed_upload_spooled_then_retried(self, tmp_path: Path) -> None:
+        spool = tmp_path / "greenboard_spool.jsonl"
+        uploader = make_uploader()
+        with patch("cbltest.greenboarduploader.Cluster", side_effect=Exception("unreachable")) as mock_ctor:
+            uploader.upload("couchbase-lite-ios", "iOS", "3.2.0-b1234", None)
+            uploader.upload("couchbase-lite-ios", "iOS", "3.2.0-b1235", None)
+
+        # After the first failure, the second upload doesn't wait on the cluster again
+        assert mock_ctor.call_count == 1
+        assert len(spool.read_text().splitlines()) == 2
+
+        mock_cluster, mock_collection = self._mock_cluster()
+        with patch("cbltest.greenboarduploader.Cluster", return_value=mock_cluster):
+            make_uploader().upload("couchbase-lite-ios", "iOS", "3.2.0-b1236", None)
+
+        batch = mock_collection.upsert_multi.call_args[0][0]
+        assert sorted(d["build"] for d in batch.values()) == [1234, 1235, 1236]
+        assert not spool.exists()
+
+    def test_partial_failure_keeps_only_failed_docs(self, tmp_path: Path) -> None:
+        spool = tmp_path / "greenboard_spool.jsonl"
+        uploader = make_uploader()
+        mock_cluster, mock_collection = self._mock_cluster()
+        mock_collection.upsert_multi.side_effect = lambda docs: SimpleNamespace(
+            exceptions={k: Exception("timeout") for k, d in docs.items() if d["build"] == 1234}
+        )
+        with patch("cbltest.greenboarduploader.Cluster", return_value=mock_cluster):
+            uploader.upload("couchbase-lite-ios", "iOS", "3.2.0-b1234", None)
+            uploader.upload("couchbase-lite-ios", "iOS", "3.2.0-b1235", None)
+
+        # The spooled doc is retried (and fails again) alongside the second one
+        assert len(mock_collection.upsert_multi.call_args[0][0]) == 2
+        assert ['"build": 1234' in line for line in spool.read_text().splitlines()] == [True]
+
+
 class TestResolveJobUrl:
     """Direct unit tests for :func:`resolve_job_url`.
 
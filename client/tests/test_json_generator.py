@@ -0,0 +1,152 @@
+import json
+
+import pytest
+from cbltest.api.json_generator import JSONGenerator
+from cbltest.api.workload_profiles import BLOB_SIZES, WORKLOAD_PROFILES, Distribution, WorkloadProfile
+
+
+def _without_timestamps(docs: dict) -> dict:
+    return {k: v["data"] for k, v in docs.items()}
+
+
+class TestJSONGenerator:
+    def test_same_seed_generates_same_documents(self) -> None:
+        first = JSONGenerator(seed=42, size=50, id_seed=42).generate_all_documents()
+        second = JSONGenerator(seed=42, size=50, id_seed=42).generate_all_documents()
+
+        assert list(first.keys()) == list(second.keys())
+        assert _without_timestamps(first) == _without_timestamps(second)
+
+    def test_successive_calls_generate_new_ids(self) -> None:
+        gen = JSONGenerator(seed=42, size=10, id_seed=42)
+
+        first = gen.generate_all_documents()
+        second = gen.generate_all_documents()
+
+        assert first.keys().isdisjoint(second.keys())
+
+    def test_same_seed_generates_distinct_ids_by_default(self) -> None:
+        # Concurrent writers often pick seeds from a small range, so a seed collision
+        # must not make them write the same documents
+        first = JSONGenerator(seed=42, size=50).generate_all_documents()
+        second = JSONGenerator(seed=42, size=50).generate_all_documents()
+
+        assert first.keys().isdisjoint(second.keys())
+        doc_id = next(iter(second))
+        assert JSONGenerator(seed=42).generate_document(doc_id)[doc_id]["data"] == second[doc_id]["data"]
+
+    def test_document_does_not_depend_on_batching(self) -> None:
+        gen = JSONGenerator(seed=7, size=25)
+        docs = gen.generate_all_documents(batch_size=4)
+
+        for doc_id, body in docs.items():
+            assert gen.generate_document(doc_id)[doc_id]["data"] == body["data"]
+
+    def test_lazy_documents_match_eager_documents(self) -> None:
+        eager = JSONGenerator(seed=3, size=30, id_seed=3).generate_all_documents()
+        lazy = dict(JSONGenerator(seed=3, size=30, id_seed=3).iter_documents(batch_size=7))
+
+        assert _without_timestamps(lazy) == _without_timestamps(eager)
+
+    def test_key_value_format(self) -> None:
+        doc_id, body = next(JSONGenerator(seed=1, size=1, format="key-value").iter_documents())
+
+        assert isinstance(doc_id, str)
+        assert list(body[0].keys()) == ["data"]
+        assert body[1]["metadata"]["version"] == 1
+
+    @pytest.mark.parametrize("format", ["json", "key-value"])
+    def test_updates_are_reproducible(self, format: str) -> None:
+        gen = JSONGenerator(seed=11, size=20, format=format, id_seed=11)
+        docs = gen.generate_all_documents()
+        expected = gen.update_all_documents(
+            JSONGenerator(seed=11, size=20, format=format, id_seed=11).generate_all_documents()
+        )
+
+        fresh = JSONGenerator(seed=11, size=20, format=format, id_seed=11)
+        updated = dict(fresh.iter_updated_documents(fresh.iter_documents()))
+
+        assert updated.keys() == expected.keys() == docs.keys()
+        for doc_id, body in updated.items():
+            version = body["metadata"]["version"] if format == "json" else body[1]["metadata"]["version"]
+            assert version == 2
+            data = body["data"] if format == "json" else body[0]["data"]
+            expected_data = expected[doc_id]["data"] if format == "json" else expected[doc_id][0]["data"]
+            assert data == expected_data
+
+    def test_process_pool_matches_in_process(self) -> None:
+        serial = JSONGenerator(seed=5, size=40, id_seed=5)
+        parallel = JSONGenerator(seed=5, size=40, processes=2, id_seed=5)
+
+        serial_docs = serial.generate_all_documents(batch_size=10)
+        parallel_docs = parallel.generate_all_documents(batch_size=10)
+        assert _without_timestamps(parallel_docs) == _without_timestamps(serial_docs)
+
+        serial_updated = serial.update_all_documents(serial_docs, batch_size=10)
+        parallel_updated = parallel.update_all_documents(parallel_docs, batch_size=10)
+        assert _without_timestamps(parallel_updated) == _without_timestamps(serial_updated)
+
+
+class TestWorkloadProfiles:
+    @pytest.mark.parametrize("profile", list(WORKLOAD_PROFILES))
+    def test_estimate_matches_generated_volume(self, profile: str) -> None:
+        gen = JSONGenerator(seed=9, size=300, profile=profile)
+
+        estimate = gen.estimate_bytes()
+        actual = sum(len(json.dumps(d, separators=(",", ":"))) for d in gen.generate_all_documents().values())
+
+        assert estimate.document_count == 300
+        assert abs(actual - estimate.document_bytes) / actual < 0.15
+
+    def test_document_size_follows_distribution(self) -> None:
+        profile = WorkloadProfile("fixed_size", document_size=Distribution.fixed(4096))
+        docs = JSONGenerator(seed=2, size=20, profile=profile).generate_all_documents()
+
+        for body in docs.values():
+            assert len(json.dumps(body, separators=(",", ":"))) == 4096
+
+    def test_nesting_arrays_and_channels(self) -> None:
+        profile = WorkloadProfile(
+            "shape",
+            document_size=Distribution.fixed(0),
+            nesting_depth=Distribution.fixed(4),
+            array_length=Distribution.fixed(3),
+            channel_count=5,
+            channels_per_doc=Distribution.fixed(2),
+        )
+        body = next(iter(JSONGenerator(seed=2, size=1, profile=profile).generate_all_documents().values()))
+
+        depth = 0
+        node = body["nested"]
+        while node is not None:
+            depth += 1
+            node = node.get("child")
+
+        assert depth == 4
+        assert len(body["items"]) == 3
+        assert len(set(body["channels"])) == 2
+        assert all(c in {f"channel_{i}" for i in range(5)} for c in body["channels"])
+        assert body["data"].keys() == {"temperature", "humidity", "status"}
+
+    def test_profile_documents_are_reproducible_and_updatable(self) -> None:
+        first = JSONGenerator(seed=4, size=10, format="key-value", profile="medium", id_seed=4)
+        second = JSONGenerator(seed=4, size=10, format="key-value", profile="medium", id_seed=4)
+        first_docs = dict(first.iter_documents())
+        second_docs = dict(second.iter_documents())
+
+        assert [d[2] for d in first_docs.values()] == [d[2] for d in second_docs.values()]
+        updated = first.update_all_documents(first_docs)
+        assert all(d[1]["metadata"]["version"] == 2 for d in updated.values())
+
+    def test_blobs_come_from_the_dataset(self) -> None:
+        gen = JSONGenerator(seed=6, size=50, profile="blob_heavy")
+        doc_ids = gen.generate_document_ids(50)
+
+        for doc_id in doc_ids:
+            blobs = gen.blobs_for_document(doc_id)
+            assert blobs == gen.blobs_for_document(doc_id)
+            assert 1 <= len(blobs) <= 3
+            assert all(name in BLOB_SIZES for name in blobs.values())
+
+        assert gen.estimate_bytes().blob_bytes > 0
+        assert JSONGenerator(seed=6, size=50).blobs_for_document(doc_ids[0]) == {}
@@ -0,0 +1,80 @@
+import pytest
+from cbltest.jsonhelper import json_diff, json_equivalent
+
+
+class TestJsonEquivalent:
+    def test_identical_values_are_equivalent(self) -> None:
+        doc = {"a": [1, 2, {"b": "c"}], "d": None, "e": 1.5}
+
+        assert json_equivalent(doc, {"a": [1, 2, {"b": "c"}], "d": None, "e": 1.5})
+
+    def test_righthand_may_have_extra_keys(self) -> None:
+        assert json_equivalent({"a": 1}, {"a": 1, "b": 2})
+        assert not json_equivalent({"a": 1, "b": 2}, {"a": 1})
+
+    def test_arrays_are_ordered_by_default(self) -> None:
+        assert not json_equivalent([1, 2, 3], [3, 2, 1])
+        assert json_equivalent([1, 2, 3], [3, 2, 1], unordered_arrays=True)
+
+    def test_type_and_length_mismatches(self) -> None:
+        assert not json_equivalent({"a": 1}, [1])
+        assert not json_equivalent([1], {"a": 1})
+        assert not json_equivalent([1, 2], [1, 2, 3])
+
+    def test_does_not_log_on_success(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        logged: list[str] = []
+        monkeypatch.setattr("cbltest.jsonhelper.cbl_info", logged.append)
+
+        assert json_equivalent({"a": [{"b": i} for i in range(100)]}, {"a": [{"b": i} for i in range(100)]})
+        assert logged == []
+
+        assert not json_equivalent({"a": [{"b": 1}]}, {"a": [{"b": 2}]})
+        assert len(logged) == 1
+        assert ".a[0].b" in logged[0]
+
+
+class TestJsonDiff:
+    def test_reports_paths_of_mismatches(self) -> None:
+        result = json_diff(
+            {"a": {"b": [1, 2, 3]}, "c": "x", "d": True},
+            {"a": {"b": [1, 5, 3]}, "c": "y"},
+        )
+
+        assert not result
+        assert [m.path for m in result.mismatches] == [".d", ".a.b[1]", ".c"]
+        assert result.mismatches[1].left == 2
+        assert result.mismatches[1].right == 5
+        assert not result.truncated
+
+    def test_stops_after_max_mismatches(self) -> None:
+        left = [{"v": i} for i in range(1000)]
+        right = [{"v": -i - 1} for i in range(1000)]
+
+        result = json_diff(left, right, max_mismatches=3)
+
+        assert len(result.mismatches) == 3
+        assert result.truncated
+        assert "there may be more" in str(result)
+
+    def test_float_tolerance(self) -> None:
+        assert not json_diff({"t": 1.0}, {"t": 1.0000001})
+        assert json_diff({"t": 1.0}, {"t": 1.0000001}, float_tolerance=1e-6)
+        assert not json_diff({"t": 1.0}, {"t": 1.1}, float_tolerance=1e-6)
+        assert not json_diff({"t": True}, {"t": 1.0000001}, float_tolerance=1e-6)
+
+    def test_unordered_arrays_of_objects(self) -> None:
+        left = [{"id": 1, "v": 1.0}, {"id": 2, "v": 2.0}]
+        right = [{"id": 2, "v": 2.0000001, "extra": True}, {"id": 1, "v": 1.0}]
+
+        assert json_diff(left, right, unordered_arrays=True, float_tolerance=1e-6)
+
+        result = json_diff(left, [{"id": 1, "v": 1.0}, {"id": 3, "v": 2.0}], unordered_arrays=True)
+        assert [m.path for m in result.mismatches] == ["[1]"]
+
+    def test_unordered_arrays_respect_duplicates(self) -> None:
+        assert not json_diff([1, 1, 2], [1, 2, 2], unordered_arrays=True)
+
+    def test_current_path_prefixes_mismatches(self) -> None:
+        result = json_diff({"a": 1}, {"a": 2}, current_path="$")
+
+        assert result.mismatches[0].path == "$.a"
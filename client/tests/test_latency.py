@@ -0,0 +1,138 @@
+import random
+from pathlib import Path
+
+import pytest
+from cbltest import latency
+from cbltest.latency import (
+    LatencyHistogram,
+    LatencyKey,
+    LatencyRegistry,
+    cbs_path_template,
+    sgw_path_template,
+)
+
+
+@pytest.fixture
+def session_registry(monkeypatch: pytest.MonkeyPatch) -> LatencyRegistry:
+    # The latency_metrics plugin is recording this test into the global registries
+    # already, so use separate ones
+    registry = LatencyRegistry()
+    monkeypatch.setattr(latency, "_session_registry", registry)
+    monkeypatch.setattr(latency, "_test_registry", None)
+    monkeypatch.setattr(latency, "_listeners", [])
+    return registry
+
+
+class TestLatencyHistogram:
+    def test_percentiles_are_within_one_percent(self) -> None:
+        rng = random.Random(42)
+        values = sorted(rng.expovariate(1 / 0.05) for _ in range(10000))
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        assert histogram.count == 10000
+        assert histogram.percentile(50) == pytest.approx(values[4999], rel=0.01)
+        assert histogram.percentile(99) == pytest.approx(values[9899], rel=0.01)
+        assert histogram.percentile(100) == pytest.approx(values[-1], abs=1e-6)
+        assert histogram.min == pytest.approx(values[0], abs=1e-6)
+
+    def test_small_values_are_exact(self) -> None:
+        histogram = LatencyHistogram()
+        for us in (1, 2, 3, 250):
+            histogram.record(us / 1_000_000)
+
+        assert [histogram.percentile(p) for p in (25, 50, 75, 100)] == [0.000001, 0.000002, 0.000003, 0.00025]
+
+    def test_merge_and_round_trip(self) -> None:
+        first = LatencyHistogram()
+        second = LatencyHistogram()
+        for i in range(1, 101):
+            (first if i % 2 else second).record(i / 1000)
+
+        merged = LatencyHistogram.from_json(first.to_json())
+        merged.merge(second)
+
+        assert merged.count == 100
+        assert merged.min == 0.001
+        assert merged.max == 0.1
+        assert merged.percentile(50) == pytest.approx(0.05, rel=0.01)
+        assert merged.total == pytest.approx(5.05)
+
+    def test_empty(self) -> None:
+        histogram = LatencyHistogram()
+
+        assert histogram.percentile(99) == 0.0
+        assert histogram.summary()["count"] == 0
+
+
+class TestRecording:
+    def test_timed_records_status(self, session_registry: LatencyRegistry) -> None:
+        with latency.timed("sync_gateway", "get", "/_status") as call:
+            call.status = 200
+
+        with pytest.raises(ValueError), latency.timed("sync_gateway", "get", "/_status"):
+            raise ValueError
+
+        with latency.timed("couchbase_server", "operation", "create_bucket"):
+            pass
+
+        assert {(k.status, h.count) for k, h in session_registry.histograms.items()} == {
+            ("200", 1),
+            ("ValueError", 1),
+            ("ok", 1),
+        }
+        assert LatencyKey("sync_gateway", "GET", "/_status", "200") in session_registry.histograms
+
+    def test_tests_are_recorded_separately(self, session_registry: LatencyRegistry) -> None:
+        latency.record_latency("test_server", "post", "/reset", 200, 0.1)
+        latency.begin_test()
+        latency.record_latency("test_server", "post", "/reset", 200, 0.2)
+        test_registry = latency.end_test()
+        latency.record_latency("test_server", "post", "/reset", 200, 0.3)
+
+        assert test_registry is not None
+        assert [h.count for h in test_registry.histograms.values()] == [1]
+        assert [h.count for h in session_registry.histograms.values()] == [3]
+
+    def test_listeners_see_every_call(self, session_registry: LatencyRegistry) -> None:
+        seen: list[tuple[LatencyKey, float]] = []
+        latency.add_listener(lambda key, seconds: seen.append((key, seconds)))
+
+        latency.record_latency("edge_server", "get", "/", 200, 0.5)
+
+        assert seen == [(LatencyKey("edge_server", "GET", "/", "200"), 0.5)]
+
+    def test_report_round_trip(self, session_registry: LatencyRegistry, tmp_path: Path) -> None:
+        latency.record_latency("sync_gateway", "post", "/{keyspace}/_bulk_docs", 201, 0.25)
+        tests = {"test_a": session_registry.to_json(with_buckets=False)}
+
+        latency.write_report(tmp_path / "latency.json", tests)
+        loaded, loaded_tests = latency.load_report(tmp_path / "latency.json")
+
+        assert loaded.to_json() == session_registry.to_json()
+        assert loaded_tests == tests
+        assert "buckets" not in loaded_tests["test_a"][0]
+
+
+class TestPathTemplates:
+    @pytest.mark.parametrize(
+        "path, expected",
+        [
+            ("/", "/"),
+            ("/_all_dbs?verbose=true", "/_all_dbs"),
+            ("/db1/", "/{db}/"),
+            ("/db1/_config", "/{db}/_config"),
+            ("/db1.scope.coll/_bulk_docs", "/{keyspace}/_bulk_docs"),
+            ("db1.scope.coll/_changes", "/{keyspace}/_changes"),
+            ("/db1.scope.coll/doc1?rev=1-abc", "/{keyspace}/{id}"),
+            ("/db1/_user/bob/_access_history", "/{db}/_user/{id}/_access_history"),
+            ("/_replicate/abc123", "/_replicate/{id}"),
+        ],
+    )
+    def test_sgw(self, path: str, expected: str) -> None:
+        assert sgw_path_template(path) == expected
+
+    def test_cbs(self) -> None:
+        assert cbs_path_template("/pools/default/buckets/travel/scopes") == "/pools/default/buckets/{name}/scopes"
+        assert cbs_path_template("/pools/default/tasks") == "/pools/default/tasks"
@@ -0,0 +1,184 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from aiohttp import BodyPartReader, ClientSession, MultipartReader, encode_basic_auth
+from cbltest.api.error import CblSyncGatewayBadResponseError
+from cbltest.api.jsonserializable import JSONDictionary
+from cbltest.api.syncgateway import DatabaseConfig, DocumentUpdateEntry, SyncGateway, SyncGatewayUserClient
+from cbltest.localsyncgateway import LocalSyncGateway
+
+
+@pytest.fixture(autouse=True)
+def http_log(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CBL_HTTP_LOG_DIR", str(tmp_path / "http_log"))
+
+
+ADMIN_HEADERS = {"Authorization": encode_basic_auth("admin", "password", "ascii")}
+
+
+@pytest.fixture
+def local_sgw() -> Iterator[LocalSyncGateway]:
+    with LocalSyncGateway() as server:
+        yield server
+
+
+@pytest.fixture
+def dataset(tmp_path: Path) -> Path:
+    path = tmp_path / "names.jsonl"
+    with open(path, "w") as fout:
+        for i in range(1, 1201):
+            doc = {"scope": "_default", "collection": "_default", "_id": f"name_{i}", "index": i}
+            doc["channels"] = ["even"] if i % 2 == 0 else ["odd"]
+            fout.write(json.dumps(doc) + "\n")
+
+    return path
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def sync_gateway(local_sgw: LocalSyncGateway, dataset: Path) -> AsyncIterator[SyncGateway]:
+    sg = local_sgw.sync_gateway()
+    try:
+        await sg.put_database("names", DatabaseConfig(bucket="names"))
+        await sg.load_dataset("names", dataset)
+        yield sg
+    finally:
+        await sg.close()
+
+
+class TestLocalSyncGateway:
+    @pytest.mark.asyncio
+    async def test_bootstrap(self, local_sgw: LocalSyncGateway) -> None:
+        sg = local_sgw.sync_gateway()
+        try:
+            assert sg.using_rosmar
+            assert (await sg.get_version()).version == "4.0.0"
+            assert await sg.get_all_database_names() == []
+        finally:
+            await sg.close()
+
+    @pytest.mark.asyncio
+    async def test_load_dataset(self, local_sgw: LocalSyncGateway, sync_gateway: SyncGateway) -> None:
+        all_docs = await sync_gateway.get_all_documents("names")
+        assert len(all_docs.rows) == 1200
+        assert all_docs.rows[0].id == "name_1"
+        revid = all_docs.rows[0].revid
+        assert revid is not None and revid.startswith("1-")
+        assert all_docs.rows[0].cv is not None
+
+        # Batches of at most 500 documents
+        assert local_sgw.request_counts["POST /{keyspace}/_bulk_docs"] == 3
+
+        doc = await sync_gateway.get_document("names", "name_2")
+        assert doc is not None
+        assert doc.body["index"] == 2
+
+    @pytest.mark.asyncio
+    async def test_upsert_documents(self, sync_gateway: SyncGateway) -> None:
+        doc = await sync_gateway.get_document("names", "name_1")
+        assert doc is not None
+        await sync_gateway.upsert_documents(
+            "names",
+            [DocumentUpdateEntry("name_1", doc.revid, {"extra": True}), DocumentUpdateEntry("new_doc", None, {"a": 1})],
+        )
+
+        updated = await sync_gateway.get_document("names", "name_1")
+        assert updated is not None
+        assert updated.body["index"] == 1
+        assert updated.body["extra"]
+        assert updated.revid is not None and updated.revid.startswith("2-")
+
+        stale = JSONDictionary({"docs": [{"_id": "name_1", "_rev": doc.revid, "stale": True}]})
+        result = await sync_gateway._send_request("post", "/names/_bulk_docs", stale)
+        assert result[0]["status"] == 409
+
+    @pytest.mark.asyncio
+    async def test_changes_feed(self, sync_gateway: SyncGateway) -> None:
+        doc = await sync_gateway.get_document("names", "name_5")
+        assert doc is not None and doc.revid is not None
+        await sync_gateway.delete_document("name_5", doc.revid, "names")
+
+        changes = await sync_gateway.get_changes("names")
+        assert len(changes.results) == 1200
+        assert changes.results[-1].id == "name_5"
+        assert changes.results[-1].deleted
+        assert changes.last_seq == "1201"
+
+        cv_changes = await sync_gateway.get_changes("names", version_type="cv")
+        assert "@" in cv_changes.results[0].changes[0]
+
+        all_docs = await sync_gateway.get_all_documents("names")
+        assert len(all_docs.rows) == 1199
+
+    @pytest.mark.asyncio
+    async def test_longpoll(self, local_sgw: LocalSyncGateway, sync_gateway: SyncGateway) -> None:
+        url = f"http://localhost:{local_sgw.admin_port}/names/_changes"
+        async with ClientSession(headers=ADMIN_HEADERS) as session:
+
+            async def longpoll() -> dict:
+                async with session.get(url, params={"feed": "longpoll", "since": "1200"}) as resp:
+                    return await resp.json()
+
+            waiting = asyncio.create_task(longpoll())
+            await asyncio.sleep(0.1)
+            assert not waiting.done()
+
+            await sync_gateway.update_documents("names", [DocumentUpdateEntry("new_doc", None, {"a": 1})])
+            changes = await asyncio.wait_for(waiting, 5)
+
+        assert [r["id"] for r in changes["results"]] == ["new_doc"]
+        assert changes["last_seq"] == "1201"
+
+    @pytest.mark.asyncio
+    async def test_bulk_get(self, local_sgw: LocalSyncGateway, sync_gateway: SyncGateway) -> None:
+        url = f"http://localhost:{local_sgw.admin_port}/names/_bulk_get"
+        body = {"docs": [{"id": "name_1"}, {"id": "missing"}]}
+        async with ClientSession(headers=ADMIN_HEADERS) as session, session.post(url, json=body) as resp:
+            assert resp.status == 200
+            reader = MultipartReader.from_response(resp)
+            parts: list[dict[str, Any]] = []
+            while (part := await reader.next()) is not None:
+                assert isinstance(part, BodyPartReader)
+                data = await part.json()
+                assert data is not None
+                parts.append(data)
+
+        assert parts[0]["_id"] == "name_1"
+        assert parts[1]["status"] == 404
+
+    @pytest.mark.asyncio
+    async def test_user_channels(self, local_sgw: LocalSyncGateway, sync_gateway: SyncGateway) -> None:
+        async with sync_gateway.create_user_client("names", "user1", "pass", ["even"]) as user:
+            all_docs = await user.get_all_documents("names")
+            assert len(all_docs.rows) == 600
+            assert all(int(r.id.split("_")[1]) % 2 == 0 for r in all_docs.rows)
+            assert len((await user.get_changes("names")).results) == 600
+
+            with pytest.raises(CblSyncGatewayBadResponseError) as e:
+                await user.get_document("names", "name_1")
+            assert e.value.code == 403
+
+        await sync_gateway.add_role("names", "odd_role", {"_default": {"_default": {"admin_channels": ["odd"]}}})
+        await sync_gateway.add_user("names", "user2", "pass", {}, ["odd_role"])
+        user2 = SyncGatewayUserClient("localhost", "user2", "pass", port=local_sgw.public_port)
+        try:
+            doc = await user2.get_document("names", "name_1")
+            assert doc is not None
+            assert doc.body["index"] == 1
+        finally:
+            await user2.close()
+
+    @pytest.mark.asyncio
+    async def test_expvar(self, sync_gateway: SyncGateway) -> None:
+        expvar = await sync_gateway._send_request("get", "/_expvar")
+        assert expvar["syncgateway"]["per_db"]["names"]["database"]["num_doc_writes"] == 1200
+
+    @pytest.mark.asyncio
+    async def test_admin_auth(self, local_sgw: LocalSyncGateway) -> None:
+        url = f"http://localhost:{local_sgw.admin_port}/_all_dbs"
+        async with ClientSession() as session, session.get(url) as resp:
+            assert resp.status == 401
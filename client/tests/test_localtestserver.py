@@ -0,0 +1,223 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import cbltest.requests as cbl_requests
+import pytest
+import pytest_asyncio
+from cbltest.api import testserver
+from cbltest.api.database import Database, SnapshotUpdater
+from cbltest.api.database_types import DocumentEntry
+from cbltest.api.error import CblTestServerBadResponseError
+from cbltest.configparser import ParsedConfig
+from cbltest.localtestserver import LocalTestServer, _RequestError, _set_keypath
+
+DATASETS = {
+    "names": {
+        "_default._default": {
+            "name_1": {"name": {"first": "John", "last": "Doe"}, "tags": ["a", "b"]},
+            "name_2": {"name": {"first": "Jane", "last": "Doe"}},
+        }
+    }
+}
+
+
+async def _test_server(url: str, transport: str = "http") -> tuple[cbl_requests.RequestFactory, testserver.TestServer]:
+    factory = cbl_requests.RequestFactory(ParsedConfig({"test-servers": [{"url": url, "transport": transport}]}))
+    return factory, testserver.TestServer(factory, 0, url, "4.0")
+
+
+async def _connect(factory: cbl_requests.RequestFactory, server: testserver.TestServer) -> None:
+    info = await server.get_info()
+    factory.version = info.version
+
+
+@pytest.fixture(autouse=True)
+def http_log(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CBL_HTTP_LOG_DIR", str(tmp_path / "http_log"))
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def local_server() -> AsyncIterator[LocalTestServer]:
+    async with LocalTestServer(datasets=DATASETS) as server:
+        yield server
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def names_db(local_server: LocalTestServer) -> AsyncIterator[Database]:
+    factory, server = await _test_server(local_server.url)
+    try:
+        await _connect(factory, server)
+        dbs = await server.create_and_reset_db(["db1"], dataset="names")
+        yield dbs[0]
+    finally:
+        await factory.close()
+
+
+class TestLocalTestServer:
+    @pytest.mark.asyncio
+    async def test_root(self, local_server: LocalTestServer) -> None:
+        factory, server = await _test_server(local_server.url)
+        try:
+            info = await server.get_info()
+        finally:
+            await factory.close()
+
+        assert info.version == 2
+        assert info.library_version == "4.0.0"
+        assert info.uuid == local_server.server_id
+
+    @pytest.mark.asyncio
+    async def test_dataset_and_updates(self, names_db: Database) -> None:
+        async with names_db.batch_updater() as updater:
+            updater.upsert_document("_default._default", "name_1", [{"name.middle": "Sky", "tags[3]": "d"}])
+            updater.upsert_document("_default._default", "name_3", [{"name": "Jim"}])
+            updater.delete_document("_default._default", "name_2")
+
+        all_docs = await names_db.get_all_documents("_default._default")
+        assert sorted(d.id for d in all_docs["_default._default"]) == ["name_1", "name_3"]
+
+        doc = await names_db.get_document(DocumentEntry("_default._default", "name_1"))
+        assert doc.body == {"name": {"first": "John", "last": "Doe", "middle": "Sky"}, "tags": ["a", "b", None, "d"]}
+        assert doc.cv is not None
+        assert len(doc.revs.split(", ")) == 2
+
+        with pytest.raises(CblTestServerBadResponseError) as e:
+            await names_db.get_document(DocumentEntry("_default._default", "name_2"))
+        assert e.value.code == 404
+
+    @pytest.mark.asyncio
+    async def test_failed_update_changes_nothing(self, names_db: Database) -> None:
+        with pytest.raises(CblTestServerBadResponseError):
+            async with names_db.batch_updater() as updater:
+                updater.upsert_document("_default._default", "name_1", [{"updated": True}])
+                updater.upsert_document("_default._default", "name_2", [{"name.first.value": "Jane"}])
+
+        doc = await names_db.get_document(DocumentEntry("_default._default", "name_1"))
+        assert "updated" not in doc.body
+
+    @pytest.mark.asyncio
+    async def test_verify_documents(self, names_db: Database) -> None:
+        entries = [DocumentEntry("_default._default", id) for id in ("name_1", "name_2", "name_3")]
+        snapshot = await names_db.create_snapshot(entries)
+
+        async with names_db.batch_updater() as updater:
+            updater.upsert_document("_default._default", "name_1", [{"name.last": "Tiger"}], ["tags[1]"])
+            updater.purge_document("_default._default", "name_2")
+            updater.upsert_document("_default._default", "name_3", [{"new": True}])
+
+        expected = SnapshotUpdater(snapshot)
+        expected.upsert_document("_default._default", "name_1", [{"name.last": "Tiger"}], ["tags[1]"])
+        expected.purge_document("_default._default", "name_2")
+        expected.upsert_document("_default._default", "name_3", [{"new": True}])
+        assert (await names_db.verify_documents(expected)).result
+
+        wrong = SnapshotUpdater(snapshot)
+        wrong.upsert_document("_default._default", "name_1", [{"name.last": "Lion"}], ["tags[1]"])
+        wrong.purge_document("_default._default", "name_2")
+        wrong.upsert_document("_default._default", "name_3", [{"new": True}])
+        result = await names_db.verify_documents(wrong)
+        assert not result.result
+        assert (
+            result.description
+            == "Document 'name_1' in '_default._default' had unexpected properties at key 'name.last'"
+        )
+        assert result.actual.value == "Tiger"
+        assert result.expected.value == "Lion"
+
+        not_purged = SnapshotUpdater(await names_db.create_snapshot(entries[:1]))
+        not_purged.purge_document("_default._default", "name_1")
+        result = await names_db.verify_documents(not_purged)
+        assert result.description == "Document 'name_1' in '_default._default' was not purged"
+
+    @pytest.mark.asyncio
+    async def test_run_query(self, names_db: Database) -> None:
+        assert sorted(r["id"] for r in await names_db.run_query("SELECT meta().id FROM _")) == ["name_1", "name_2"]
+        assert len(await names_db.run_query("select * from _default._default limit 1")) == 1
+
+        with pytest.raises(CblTestServerBadResponseError) as e:
+            await names_db.run_query("SELECT name FROM _ WHERE name.first = 'John'")
+        assert e.value.code == 400
+
+    @pytest.mark.asyncio
+    async def test_unknown_dataset(self, local_server: LocalTestServer) -> None:
+        factory, server = await _test_server(local_server.url)
+        try:
+            await _connect(factory, server)
+            with pytest.raises(CblTestServerBadResponseError) as e:
+                await server.create_and_reset_db(["db1"], dataset="travel")
+        finally:
+            await factory.close()
+
+        assert e.value.code == 400
+
+    @pytest.mark.asyncio
+    async def test_latency_is_per_request(self) -> None:
+        async with LocalTestServer(latency=0.1, jitter=0.05, seed=1) as local_server:
+            factory, server = await _test_server(local_server.url)
+            try:
+                await _connect(factory, server)
+                start = time.monotonic()
+                await asyncio.gather(*(server.log(f"message {i}") for i in range(5)))
+                elapsed = time.monotonic() - start
+            finally:
+                await factory.close()
+
+            assert sorted(local_server.log_messages) == [f"message {i}" for i in range(5)]
+
+        assert 0.1 <= elapsed < 0.5
+
+    @pytest.mark.asyncio
+    async def test_websocket_transport(self) -> None:
+        local_server = LocalTestServer(datasets=DATASETS)
+        factory, server = await _test_server("http://localhost:5173", "ws")
+        try:
+            start = asyncio.create_task(factory.start())
+            while factory.ws_router_port is None:
+                await asyncio.sleep(0.01)
+
+            await local_server.connect(f"ws://localhost:{factory.ws_router_port}/")
+            await start
+            await _connect(factory, server)
+
+            db = (await server.create_and_reset_db(["db1"], dataset="names"))[0]
+            all_docs = await db.get_all_documents("_default._default")
+            assert sorted(d.id for d in all_docs["_default._default"]) == ["name_1", "name_2"]
+
+            request = factory.create_request(cbl_requests.TestServerRequestType.REPLICATOR_STATUS, id="missing")
+            with pytest.raises(CblTestServerBadResponseError) as e:
+                await factory.send_request(0, request)
+            assert e.value.code == 400
+        finally:
+            await factory.close()
+            await local_server.close()
+
+        assert local_server.request_counts["/reset"] == 1
+
+
+class TestKeypaths:
+    @pytest.mark.parametrize(
+        "keypath,value,expected",
+        [
+            ("name.last", "Doe", {"name": {"first": "John", "last": "Doe"}, "addresses": [{"city": "SF"}]}),
+            ("$.name", "John Doe", {"name": "John Doe", "addresses": [{"city": "SF"}]}),
+            (
+                "addresses[2].city",
+                "San Mateo",
+                {"name": {"first": "John"}, "addresses": [{"city": "SF"}, None, {"city": "San Mateo"}]},
+            ),
+            ("phones[1]", "650", {"name": {"first": "John"}, "addresses": [{"city": "SF"}], "phones": [None, "650"]}),
+            (r"a\.b", 1, {"name": {"first": "John"}, "addresses": [{"city": "SF"}], "a.b": 1}),
+        ],
+    )
+    def test_set(self, keypath: str, value: Any, expected: dict) -> None:
+        doc = {"name": {"first": "John"}, "addresses": [{"city": "SF"}]}
+        _set_keypath(doc, keypath, value)
+        assert doc == expected
+
+    @pytest.mark.parametrize("keypath", ["name.first.value", "addresses.city", "[0]", "name..first"])
+    def test_invalid(self, keypath: str) -> None:
+        with pytest.raises(_RequestError):
+            _set_keypath({"name": {"first": "John"}, "addresses": []}, keypath, 1)
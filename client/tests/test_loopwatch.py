@@ -0,0 +1,66 @@
+import asyncio
+import time
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from cbltest.loopwatch import LoopStallDetector, load_report, write_report
+
+
+def _blocking_helper() -> None:
+    time.sleep(0.2)
+
+
+async def _workload(block: bool) -> None:
+    await asyncio.sleep(0.01)
+    if block:
+        _blocking_helper()
+
+    await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def detector() -> Generator[LoopStallDetector, None, None]:
+    detector = LoopStallDetector(0.05)
+    detector.start()
+    try:
+        yield detector
+    finally:
+        detector.stop()
+
+
+class TestLoopStallDetector:
+    def test_blocking_callback_is_recorded(self, detector: LoopStallDetector) -> None:
+        detector.test = "test_a"
+        asyncio.run(_workload(True))
+        detector.stop()
+
+        assert len(detector.stalls) == 1
+        stall = detector.stalls[0]
+        assert stall.test == "test_a"
+        assert stall.duration >= 0.2
+        assert stall.location.endswith(f"{Path(__file__).name}:11 in _blocking_helper")
+        assert "in _workload" in stall.stack[0]
+        assert "in _blocking_helper" in stall.stack[-1]
+
+    def test_awaiting_is_not_a_stall(self, detector: LoopStallDetector) -> None:
+        asyncio.run(_workload(False))
+        detector.stop()
+
+        assert detector.stalls == []
+
+    def test_stop_restores_the_loop(self, detector: LoopStallDetector) -> None:
+        detector.stop()
+        asyncio.run(_workload(True))
+
+        assert detector.stalls == []
+        assert asyncio.Handle._run.__module__ == "asyncio.events"
+
+    def test_report_round_trip(self, detector: LoopStallDetector, tmp_path: Path) -> None:
+        asyncio.run(_workload(True))
+        detector.stop()
+
+        write_report(tmp_path / "stalls.json", detector.stalls)
+        loaded = load_report(tmp_path / "stalls.json")
+
+        assert [s.to_json() for s in loaded] == [s.to_json() for s in detector.stalls]
@@ -0,0 +1,70 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from cbltest.microbench import (
+    BenchmarkResult,
+    find_regressions,
+    format_seconds,
+    load_results,
+    measure,
+    measure_async,
+    write_results,
+)
+
+
+def _result(name: str, seconds: float) -> BenchmarkResult:
+    return BenchmarkResult(name, seconds, seconds, 100, 5)
+
+
+class TestMeasure:
+    def test_rounds_are_calibrated(self) -> None:
+        calls = 0
+
+        def op() -> None:
+            nonlocal calls
+            calls += 1
+
+        result = measure("counter", op, rounds=3, min_round_time=0.01)
+
+        assert result.name == "counter"
+        assert result.rounds == 3
+        assert result.iterations > 1
+        # The calibration runs count as the first round, so there are at least as many
+        # calls as the timed operations
+        assert calls >= result.iterations * result.rounds
+        assert 0 < result.min_seconds <= result.seconds
+
+    @pytest.mark.asyncio
+    async def test_async(self) -> None:
+        result = await measure_async("sleep", lambda: asyncio.sleep(0.005), rounds=2, min_round_time=0.02)
+
+        assert result.rounds == 2
+        assert result.seconds >= 0.005
+
+
+class TestRegressions:
+    def test_only_slower_than_tolerance(self) -> None:
+        baseline = [_result("fast", 1e-3), _result("slow", 1e-3), _result("faster", 1e-3)]
+        results = [_result("fast", 1.1e-3), _result("slow", 2e-3), _result("faster", 0.5e-3), _result("new", 1.0)]
+
+        regressions = find_regressions(results, baseline, 0.25)
+
+        assert [r.current.name for r in regressions] == ["slow"]
+        assert regressions[0].ratio == pytest.approx(2.0)
+        assert str(regressions[0]) == "slow: 1ms -> 2ms (x2.00)"
+
+    def test_results_round_trip(self, tmp_path: Path) -> None:
+        path = tmp_path / "results" / "bench.json"
+        write_results(path, [_result("one", 2.5e-6)])
+
+        loaded = load_results(path)
+        assert [r.to_json() for r in loaded] == [_result("one", 2.5e-6).to_json()]
+
+
+@pytest.mark.parametrize(
+    "seconds,expected",
+    [(2.0, "2s"), (0.0125, "12.5ms"), (3.2e-6, "3.2us"), (4e-8, "40ns")],
+)
+def test_format_seconds(seconds: float, expected: str) -> None:
+    assert format_seconds(seconds) == expected
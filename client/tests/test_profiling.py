@@ -0,0 +1,72 @@
+import time
+from pathlib import Path
+
+from cbltest.profiling import ClientProfiler, profile_file_stem
+
+
+def _busy_function() -> None:
+    end = time.monotonic() + 0.1
+    total = 0
+    while time.monotonic() < end:
+        total += sum(range(1000))
+
+
+class TestClientProfiler:
+    def test_profiles_are_written_per_test(self, tmp_path: Path) -> None:
+        profiler = ClientProfiler(tmp_path, interval=0.001)
+        profiler.begin_test("test_file.py::TestThing::test_busy[param]")
+        _busy_function()
+        profiler.end_test()
+        profiler.write_session()
+
+        stem = "test_file.py_TestThing_test_busy_param"
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "session.collapsed",
+            "session.prof",
+            f"{stem}.collapsed",
+            f"{stem}.prof",
+        ]
+
+        collapsed = (tmp_path / f"{stem}.collapsed").read_text().splitlines()
+        assert collapsed
+        assert all(line.rpartition(" ")[2].isdigit() for line in collapsed)
+        assert any("_busy_function (test_profiling.py:7)" in line for line in collapsed)
+
+    def test_top_functions_leave_out_the_framework(self, tmp_path: Path) -> None:
+        profiler = ClientProfiler(tmp_path)
+        profiler.begin_test("test_a")
+        _busy_function()
+        profiler.end_test()
+
+        top = profiler.top_functions(5)
+        assert any(f.location.endswith("(_busy_function)") and f.cumulative >= 0.1 for f in top)
+        assert not any("_pytest" in f.location or "pluggy" in f.location for f in top)
+
+    def test_session_profiles_are_merged(self, tmp_path: Path) -> None:
+        shard = ClientProfiler(tmp_path / "shard")
+        shard.begin_test("test_a")
+        _busy_function()
+        shard.end_test()
+        shard.write_session()
+
+        controller = ClientProfiler(tmp_path / "controller")
+        controller.add_session_profile(tmp_path / "shard" / "session.prof", tmp_path / "shard" / "session.collapsed")
+
+        assert [f.calls for f in controller.top_functions(50) if f.location.endswith("(_busy_function)")] == [1]
+
+    def test_nothing_profiled(self, tmp_path: Path) -> None:
+        profiler = ClientProfiler(tmp_path / "profiles")
+        profiler.end_test()
+        profiler.write_session()
+
+        assert profiler.top_functions(10) == []
+        assert not (tmp_path / "profiles").exists()
+
+    def test_file_stem(self) -> None:
+        assert profile_file_stem("tests/test_x.py::test_y[a/b c]") == "tests_test_x.py_test_y_a_b_c"
+
+        long_ids = [f"tests/test_x.py::test_y[{'a' * 200}-{i}]" for i in range(2)]
+        stems = [profile_file_stem(test) for test in long_ids]
+        assert stems[0] != stems[1]
+        assert all(len(stem) == 150 for stem in stems)
+        assert stems[0].startswith("tests_test_x.py_test_y_aaa")
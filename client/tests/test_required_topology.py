@@ -0,0 +1,88 @@
+from pathlib import Path
+from types import SimpleNamespace
+from typing import cast
+from unittest.mock import MagicMock
+
+import pytest
+from cbltest.configparser import ParsedConfig
+from cbltest.plugins import cbse_filter, required_topology
+from cbltest.plugins.cblpytest_fixture import parsed_config_key
+
+TOPOLOGY = {
+    "test-servers": [{"url": "http://ts0:8080"}, {"url": "http://ts1:8080"}],
+    "sync-gateways": [{"hostname": "sgw0"}],
+    "couchbase-servers": [{"hostname": "cbs0"}],
+}
+
+
+def _make_config(*args: str) -> pytest.Config:
+    config = pytest.Config.fromdictargs({}, ["--config", str(Path(__file__).with_name("empty_config.json")), *args])
+    config.stash[parsed_config_key] = ParsedConfig(TOPOLOGY)
+    return config
+
+
+def _make_item(name: str, markers: dict[str, int] | None = None, cbse: list[int] | None = None) -> pytest.Item:
+    item = MagicMock(spec=pytest.Item)
+    item.nodeid = name
+    active = {key: SimpleNamespace(args=(value,)) for key, value in (markers or {}).items()}
+    item.get_closest_marker.side_effect = lambda key: active.get(key)
+    item.iter_markers.side_effect = lambda name: [SimpleNamespace(args=(n,)) for n in (cbse or [])]
+    return cast(pytest.Item, item)
+
+
+class TestRequiredTopology:
+    def test_unsatisfiable_tests_are_deselected(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        config = _make_config()
+        deselected: list[pytest.Item] = []
+        monkeypatch.setattr(config.hook, "pytest_deselected", lambda items: deselected.extend(items))
+        items = [
+            _make_item("unmarked"),
+            _make_item("fits", {"min_test_servers": 2, "min_sync_gateways": 1}),
+            _make_item("too_many_ts", {"min_test_servers": 3}),
+            _make_item("needs_es", {"min_edge_servers": 1}),
+            _make_item("needs_clusters", {"min_clusters": 2}),
+        ]
+
+        required_topology.pytest_collection_modifyitems(config, items)
+
+        assert [i.nodeid for i in items] == ["unmarked", "fits"]
+        assert [i.nodeid for i in deselected] == ["too_many_ts", "needs_es", "needs_clusters"]
+
+    def test_nothing_deselected_leaves_items_alone(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        config = _make_config()
+        pytest_deselected = MagicMock()
+        monkeypatch.setattr(config.hook, "pytest_deselected", pytest_deselected)
+        items = [_make_item("fits", {"min_couchbase_servers": 1})]
+
+        required_topology.pytest_collection_modifyitems(config, items)
+
+        assert [i.nodeid for i in items] == ["fits"]
+        pytest_deselected.assert_not_called()
+
+    def test_unmet_requirement_reason(self) -> None:
+        parsed = ParsedConfig(TOPOLOGY)
+
+        assert required_topology.unmet_requirement({"min_sync_gateways": 2}, parsed) == "Insufficient Sync Gateways"
+        assert required_topology.unmet_requirement({"min_clusters": 1}, parsed) is None
+
+
+class TestCbseFilter:
+    def test_unrelated_tests_are_deselected(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        config = _make_config("--cbse", "1234")
+        pytest_deselected = MagicMock()
+        monkeypatch.setattr(config.hook, "pytest_deselected", pytest_deselected)
+        items = [_make_item("related", cbse=[1234]), _make_item("other", cbse=[99]), _make_item("unmarked")]
+
+        cbse_filter.pytest_collection_modifyitems(config, items)
+
+        assert [i.nodeid for i in items] == ["related"]
+        deselected = pytest_deselected.call_args.kwargs["items"]
+        assert [i.nodeid for i in deselected] == ["other", "unmarked"]
+
+    def test_no_filter_without_option(self) -> None:
+        config = _make_config()
+        items = [_make_item("unmarked")]
+
+        cbse_filter.pytest_collection_modifyitems(config, items)
+
+        assert [i.nodeid for i in items] == ["unmarked"]
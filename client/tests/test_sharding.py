@@ -0,0 +1,143 @@
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+from cbltest.configparser import ParsedConfig
+from cbltest.greenboarduploader import count_from_junit_xml
+from cbltest.plugins import shard_runner
+from cbltest.sharding import assign_groups, merge_junit, partition_config
+
+RAW_CONFIG: dict[str, Any] = {
+    "test-servers": [{"url": f"http://ts{i}:8080"} for i in range(8)],
+    "sync-gateways": [
+        {"hostname": "sgw0", "cluster_index": 0},
+        {"hostname": "sgw1", "cluster_index": 0},
+        {"hostname": "sgw2", "cluster_index": 1},
+        {"hostname": "sgw3", "cluster_index": 2},
+    ],
+    "couchbase-servers": [
+        {"hostname": "cbs0", "cluster_index": 0},
+        {"hostname": "cbs1", "cluster_index": 1},
+        {"hostname": "cbs2", "cluster_index": 2},
+    ],
+    "load-balancers": ["lb0"],
+    "logslurp": "logslurp:8180",
+    "greenboard": {"hostname": "gb", "username": "user", "password": "pass"},
+}
+
+
+def _junit(path: Path, passed: int, failed: int) -> Path:
+    cases = "".join(f'<testcase classname="t" name="pass{i}"/>' for i in range(passed))
+    cases += "".join(f'<testcase classname="t" name="fail{i}"><failure message="x"/></testcase>' for i in range(failed))
+    path.write_text(
+        f'<?xml version="1.0" encoding="utf-8"?><testsuites><testsuite name="pytest" tests="{passed + failed}" '
+        f'failures="{failed}" errors="0" skipped="0">{cases}</testsuite></testsuites>'
+    )
+    return path
+
+
+class TestPartitionConfig:
+    def test_clusters_are_never_split(self) -> None:
+        shards = partition_config(RAW_CONFIG, 2)
+
+        assert len(shards) == 2
+        assert [s["hostname"] for s in shards[0]["sync-gateways"]] == ["sgw0", "sgw1", "sgw3"]
+        assert [s["hostname"] for s in shards[0]["couchbase-servers"]] == ["cbs0", "cbs2"]
+        assert [s["hostname"] for s in shards[1]["sync-gateways"]] == ["sgw2"]
+        assert [s["hostname"] for s in shards[1]["couchbase-servers"]] == ["cbs1"]
+
+    def test_cluster_indexes_are_renumbered(self) -> None:
+        shards = partition_config(RAW_CONFIG, 2)
+
+        assert [s["cluster_index"] for s in shards[0]["sync-gateways"]] == [0, 0, 1]
+        assert [s["cluster_index"] for s in shards[0]["couchbase-servers"]] == [0, 1]
+        assert [s["cluster_index"] for s in shards[1]["sync-gateways"]] == [0]
+        assert [s["cluster_index"] for s in shards[1]["couchbase-servers"]] == [0]
+
+    def test_test_servers_are_dealt_out(self) -> None:
+        shards = partition_config(RAW_CONFIG, 4)
+
+        assert [len(s["test-servers"]) for s in shards] == [2, 2, 2, 2]
+        assert [ts["url"] for ts in shards[1]["test-servers"]] == ["http://ts1:8080", "http://ts5:8080"]
+
+    def test_shared_and_run_wide_entries(self) -> None:
+        shards = partition_config(RAW_CONFIG, 3)
+
+        assert [s["load-balancers"] for s in shards] == [["lb0"], [], []]
+        assert all(s["logslurp"] == "logslurp:8180" for s in shards)
+        assert all("greenboard" not in s for s in shards)
+
+    def test_shard_count_is_capped_by_topology(self) -> None:
+        assert len(partition_config(RAW_CONFIG, 20)) == 8
+        assert len(partition_config({"sync-gateways": [{"hostname": "sgw0"}]}, 4)) == 1
+
+    def test_original_is_unchanged(self) -> None:
+        partition_config(RAW_CONFIG, 3)
+
+        assert [s["cluster_index"] for s in RAW_CONFIG["sync-gateways"]] == [0, 0, 1, 2]
+
+
+class TestAssignGroups:
+    def test_largest_groups_are_spread_first(self) -> None:
+        shards = [ParsedConfig(c) for c in partition_config(RAW_CONFIG, 2)]
+        groups = [
+            ({"min_test_servers": 1}, 2),
+            ({"min_test_servers": 1}, 10),
+            ({"min_test_servers": 1}, 5),
+            ({"min_test_servers": 1}, 4),
+        ]
+
+        assert assign_groups(groups, shards) == [1, 0, 1, 1]
+
+    def test_requirements_are_respected(self) -> None:
+        shards = [ParsedConfig(c) for c in partition_config(RAW_CONFIG, 2)]
+        groups = [
+            ({"min_sync_gateways": 2}, 1),
+            ({"min_clusters": 2}, 1),
+            ({"min_load_balancers": 1}, 1),
+        ]
+
+        assert assign_groups(groups, shards) == [0, 0, 0]
+
+    def test_unplaceable_groups_stay_behind(self) -> None:
+        shards = [ParsedConfig(c) for c in partition_config(RAW_CONFIG, 2)]
+        groups = [({}, 3), ({"min_test_servers": 5}, 1), ({"min_clusters": 3}, 1)]
+
+        assert assign_groups(groups, shards) == [None, None, None]
+
+
+class TestMergeJunit:
+    def test_counts_are_combined(self, tmp_path: Path) -> None:
+        output = _junit(tmp_path / "main.xml", 1, 0)
+        inputs = [output, _junit(tmp_path / "shard0.xml", 3, 1), _junit(tmp_path / "shard1.xml", 2, 2)]
+
+        merge_junit(inputs, output)
+
+        assert count_from_junit_xml(output) == (6, 3, 0)
+
+
+class TestStopWorkers:
+    @pytest.mark.skipif(sys.platform == "win32", reason="relies on POSIX signals")
+    def test_running_workers_are_stopped(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(shard_runner, "_WORKER_STOP_GRACE", 0.5)
+        # One worker that exits when terminated, one that has to be killed, and one that already exited
+        ignores_term = (
+            "import signal, sys, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print(flush=True); time.sleep(60)"
+        )
+        processes = [
+            subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"]),
+            subprocess.Popen([sys.executable, "-c", ignores_term], stdout=subprocess.PIPE),
+            subprocess.Popen([sys.executable, "-c", "pass"]),
+        ]
+        processes[2].wait()
+        # Don't terminate the second one before it has ignored SIGTERM
+        assert processes[1].stdout is not None
+        processes[1].stdout.readline()
+
+        shard_runner._stop_workers(list(enumerate(processes)))
+
+        assert all(p.poll() is not None for p in processes)
+        assert processes[1].returncode == -9
+        processes[1].stdout.close()
@@ -0,0 +1,130 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from cbltest import steptiming
+from cbltest.steptiming import (
+    COUCHBASE_SERVER,
+    SYNC_GATEWAY,
+    TEST_SERVER,
+    StepRecorder,
+    StepTiming,
+    find_regressions,
+    load_report,
+    write_report,
+)
+
+
+@pytest.fixture
+def recorder(monkeypatch: pytest.MonkeyPatch) -> StepRecorder:
+    # The step_timing plugin is recording the global recorder for this test
+    # already, so use a separate one
+    recorder = StepRecorder()
+    monkeypatch.setattr(steptiming, "_recorder", recorder)
+    recorder.begin_test("test_thing")
+    return recorder
+
+
+class TestStepRecorder:
+    def test_calls_are_attributed_to_the_current_step(self, recorder: StepRecorder) -> None:
+        steptiming.record_call(TEST_SERVER, 0.5)
+        recorder.begin_step(1, "Create the database\nwith some more detail")
+        steptiming.record_call(SYNC_GATEWAY, 1.0)
+        steptiming.record_call(SYNC_GATEWAY, 2.0)
+        recorder.begin_step(2, "Check the documents")
+        recorder.end_test()
+
+        assert [(s.index, s.description) for s in recorder.steps] == [
+            (0, "(before the first step)"),
+            (1, "Create the database"),
+            (2, "Check the documents"),
+        ]
+        assert recorder.steps[0].services == {TEST_SERVER: 0.5}
+        assert recorder.steps[1].services == {SYNC_GATEWAY: 3.0}
+        assert recorder.steps[1].calls == {SYNC_GATEWAY: 2}
+
+    def test_trivial_first_step_is_dropped(self, recorder: StepRecorder) -> None:
+        recorder.begin_step(1, "Only step")
+        recorder.end_test()
+
+        assert [s.index for s in recorder.steps] == [1]
+
+    def test_tests_without_steps_are_not_recorded(self, recorder: StepRecorder) -> None:
+        steptiming.record_call(TEST_SERVER, 0.5)
+        recorder.end_test()
+
+        assert recorder.steps == []
+
+    def test_nothing_is_recorded_outside_a_test(self, recorder: StepRecorder) -> None:
+        recorder.end_test()
+        recorder.begin_step(1, "Not in a test")
+        steptiming.record_call(TEST_SERVER, 0.5)
+
+        assert recorder.steps == []
+
+
+class TestServiceCall:
+    def test_nested_calls_to_the_same_service_count_once(self, recorder: StepRecorder) -> None:
+        recorder.begin_step(1, "Step")
+        with steptiming.service_call(COUCHBASE_SERVER):
+            steptiming.record_call(COUCHBASE_SERVER, 10.0)
+            with steptiming.service_call(COUCHBASE_SERVER):
+                pass
+
+        assert recorder.steps == []
+        recorder.end_test()
+        assert recorder.steps[0].calls == {COUCHBASE_SERVER: 1}
+        assert recorder.steps[0].services[COUCHBASE_SERVER] < 1.0
+
+    def test_waiting_inside_a_call_is_not_service_time(self, recorder: StepRecorder) -> None:
+        recorder.begin_step(1, "Step")
+        with steptiming.service_call(COUCHBASE_SERVER):
+            steptiming.blocking_wait(0.05)
+
+        recorder.end_test()
+        step = recorder.steps[0]
+        assert step.wait >= 0.05
+        assert step.services[COUCHBASE_SERVER] < 0.05
+
+    def test_async_wait(self, recorder: StepRecorder) -> None:
+        async def run() -> None:
+            with steptiming.service_call(SYNC_GATEWAY):
+                await steptiming.wait(0.05)
+
+        recorder.begin_step(1, "Step")
+        asyncio.run(run())
+        recorder.end_test()
+
+        step = recorder.steps[0]
+        assert step.wait >= 0.05
+        assert step.other < 0.05
+        assert step.calls == {SYNC_GATEWAY: 1}
+
+
+class TestReport:
+    def test_round_trip(self, tmp_path: Path) -> None:
+        steps = [StepTiming("test_a", 1, "First", 2.5, {TEST_SERVER: 1.0}, {TEST_SERVER: 3}, 0.5)]
+
+        write_report(tmp_path / "steps.json", steps)
+        loaded = load_report(tmp_path / "steps.json")
+
+        assert [s.to_json() for s in loaded] == [s.to_json() for s in steps]
+        assert loaded[0].other == 1.0
+
+    def test_find_regressions(self) -> None:
+        baseline = [
+            StepTiming("test_a", 1, "Slower", 10.0),
+            StepTiming("test_a", 2, "Noisy", 0.1),
+            StepTiming("test_a", 3, "Same", 10.0),
+        ]
+        steps = [
+            StepTiming("test_a", 1, "Slower", 13.0),
+            StepTiming("test_a", 2, "Noisy", 0.5),
+            StepTiming("test_a", 3, "Same", 11.0),
+            StepTiming("test_b", 1, "New", 100.0),
+        ]
+
+        regressions = find_regressions(steps, baseline, 0.2)
+
+        assert [(r.current.test, r.current.index) for r in regressions] == [("test_a", 1)]
+        assert regressions[0].ratio == pytest.approx(1.3)
@@ -23,7 +23,6 @@ from cbltest.api.syncgateway import (
     ScopeConfig,
     SyncGateway,
 )
-from cbltest.httplog import _HttpLogWriter
 from pydantic import ValidationError
 
 # (SyncGateway, response specs the test server serves, headers the server saw)
@@ -50,7 +49,7 @@ async def sync_gateway(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Async
     the next one; with exactly one entry left, that response repeats (useful for
     polling loops like wait_for_db_online). `received` accumulates the headers of
     every request the server saw, so tests can assert on what went out on the wire."""
-    monkeypatch.setattr(_HttpLogWriter, "_HttpLogWriter__record_path", tmp_path / "http_log")
+    monkeypatch.setenv("CBL_HTTP_LOG_DIR", str(tmp_path / "http_log"))
     monkeypatch.setattr(
         "cbltest.api.syncgateway.requests.get",
         lambda *args, **kwargs: _FakeConfigResponse(),
@@ -0,0 +1,114 @@
+import gzip
+import io
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from environment.aws.common import io as env_io
+from environment.aws.common.io import tar_directory, untar_directory, unzip_directory, zip_directory
+
+
+class _UnseekableStream(io.BytesIO):
+    # Like an SFTP upload: ZipFile can't go back to patch a header it already wrote
+    def seekable(self) -> bool:
+        return False
+
+    def tell(self) -> int:
+        raise io.UnsupportedOperation("tell")
+
+    def seek(self, offset: int, whence: int = 0, /) -> int:
+        raise io.UnsupportedOperation("seek")
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> dict[str, bytes]:
+    files = {
+        "README.md": b"hello " * 1000,
+        "bin/random.bin": os.urandom(4096),
+        "lib/nested/deep.txt": b"",
+        "lib/nested/data.json": b'{"key": "value"}\n' * 500,
+        "build/ignored.o": b"ignored",
+    }
+    for name, data in files.items():
+        path = tmp_path / "src" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    return files
+
+
+def _check(archive: zipfile.ZipFile, files: dict[str, bytes]) -> None:
+    assert archive.testzip() is None
+    expected = {name: data for name, data in files.items() if not name.startswith("build/")}
+    assert sorted(archive.namelist()) == sorted(expected)
+    for name, data in expected.items():
+        assert archive.read(name) == data
+
+
+class TestZipDirectory:
+    def test_round_trip(self, tmp_path: Path, source: dict[str, bytes]) -> None:
+        output = tmp_path / "out.zip"
+        zip_directory(tmp_path / "src", output, excludes=["build"], workers=2)
+
+        with zipfile.ZipFile(output) as archive:
+            _check(archive, source)
+            # Incompressible files are stored rather than deflated
+            assert archive.getinfo("README.md").compress_type == zipfile.ZIP_DEFLATED
+            assert archive.getinfo("bin/random.bin").compress_type == zipfile.ZIP_STORED
+
+        unzip_directory(output, tmp_path / "extracted")
+        assert (tmp_path / "extracted" / "lib" / "nested" / "data.json").read_bytes() == source["lib/nested/data.json"]
+
+    def test_mixed_with_streamed_members(
+        self, tmp_path: Path, source: dict[str, bytes], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Files over the threshold are streamed by ZipFile.write between the ones read
+        # ahead by the workers
+        monkeypatch.setattr(env_io, "_STREAM_THRESHOLD", 2048)
+        output = tmp_path / "out.zip"
+        zip_directory(tmp_path / "src", output, excludes=["build"], workers=2)
+
+        with zipfile.ZipFile(output) as archive:
+            _check(archive, source)
+
+    def test_unseekable_stream(self, tmp_path: Path, source: dict[str, bytes]) -> None:
+        stream = _UnseekableStream()
+        zip_directory(tmp_path / "src", stream, excludes=["build"], workers=2)
+
+        with zipfile.ZipFile(io.BytesIO(stream.getvalue())) as archive:
+            _check(archive, source)
+
+
+class TestTarDirectory:
+    def test_round_trip_in_one_pass(
+        self, tmp_path: Path, source: dict[str, bytes], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Files over the threshold and links are extracted by tarfile in between the
+        # ones written by the workers, without going back over the archive
+        (tmp_path / "src" / "link.md").symlink_to("README.md")
+        monkeypatch.setattr(env_io, "_STREAM_THRESHOLD", 2048)
+        output = tmp_path / "out.tar.gz"
+        tar_directory(tmp_path / "src", output, excludes=["build"], workers=2)
+
+        backwards: list[int] = []
+        seek = gzip.GzipFile.seek
+
+        def recording_seek(self: gzip.GzipFile, offset: int, whence: int = 0) -> int:
+            if whence == 0 and offset < self.tell():
+                backwards.append(offset)
+
+            return seek(self, offset, whence)
+
+        monkeypatch.setattr(gzip.GzipFile, "seek", recording_seek)
+        untar_directory(output, tmp_path / "extracted", workers=2)
+
+        assert backwards == []
+        extracted = tmp_path / "extracted"
+        for name, data in source.items():
+            assert (extracted / name).exists() == (not name.startswith("build/"))
+            if not name.startswith("build/"):
+                assert (extracted / name).read_bytes() == data
+
+        assert os.readlink(extracted / "link.md") == "README.md"
@@ -0,0 +1,413 @@
+"""
+This module provides a content-addressed cache for downloaded artifacts (Sync Gateway and
+Edge Server packages, test server packages and tools), shared by every script on the agent.
+
+Artifacts are stored by SHA-256 under the cache directory and indexed by URL, so an artifact
+is only downloaded once no matter how many scripts or checkouts ask for it.  Writes are
+atomic (download to a temporary file, verify, then rename), the least recently used
+artifacts are evicted once the cache grows past its size cap, and large files are fetched
+with several concurrent HTTP Range requests, each of which picks up where it left off if
+its connection drops.  Several processes on the agent can use the
+cache at once: changes to the index, eviction, and copying artifacts out of the cache all
+happen under a file lock.
+
+The cache directory defaults to ~/.cache/cbl-tdk/artifacts and can be moved with the
+TDK_ARTIFACT_CACHE environment variable; TDK_ARTIFACT_CACHE_MAX_GB sets the size cap.
+
+Classes:
+    ArtifactCache: A content-addressed, size capped cache of downloaded artifacts.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Final
+from uuid import uuid4
+
+import click
+import requests
+from tqdm import tqdm
+
+from environment.aws.common.output import header
+
+_DEFAULT_MAX_BYTES: Final[int] = 20 * 1024 * 1024 * 1024
+_CHUNK_SIZE: Final[int] = 1024 * 1024
+_RANGE_THRESHOLD: Final[int] = 32 * 1024 * 1024
+_RANGE_RETRIES: Final[int] = 3
+
+# (connect, read) timeouts for every request, so that a stalled server fails the
+# download instead of hanging the run; the read timeout applies between chunks
+_TIMEOUT: Final[tuple[float, float]] = (10.0, 60.0)
+
+
+def _sha256_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+if sys.platform == "win32":
+    import msvcrt
+
+    def _lock_file(f: IO[bytes]) -> None:
+        # LK_LOCK only retries for 10 seconds, so keep trying until the lock is free
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                time.sleep(0.1)
+
+    def _unlock_file(f: IO[bytes]) -> None:
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def _lock_file(f: IO[bytes]) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f: IO[bytes]) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ArtifactCache:
+    """
+    A content-addressed, size capped cache of downloaded artifacts.
+
+    Usage:
+        cache = ArtifactCache.default()
+        path = cache.fetch(url)                     # path inside the cache, do not modify
+        cache.materialize(url, SCRIPT_DIR / name)   # place a copy somewhere else
+        cache.put(url, local_path)                  # add a locally produced file
+    """
+
+    __default: ArtifactCache | None = None
+    __default_lock: Final[threading.Lock] = threading.Lock()
+
+    @property
+    def root(self) -> Path:
+        """Gets the directory the cache is stored in"""
+        return self.__root
+
+    @property
+    def max_bytes(self) -> int:
+        """Gets the size above which the least recently used artifacts are evicted"""
+        return self.__max_bytes
+
+    def __init__(self, root: Path, max_bytes: int = _DEFAULT_MAX_BYTES, range_parts: int = 8) -> None:
+        assert max_bytes > 0, "max_bytes must be positive"
+        assert range_parts > 0, "range_parts must be positive"
+        self.__root = root
+        self.__objects = root / "objects"
+        self.__tmp = root / "tmp"
+        self.__index_path = root / "index.json"
+        self.__lock_path = root / "index.lock"
+        self.__max_bytes = max_bytes
+        self.__range_parts = range_parts
+        self.__lock = threading.RLock()
+        self.__lock_depth = 0
+        self.__url_locks: dict[str, threading.Lock] = {}
+        self.__objects.mkdir(parents=True, exist_ok=True)
+        self.__tmp.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def default(cls) -> ArtifactCache:
+        """
+        Get the cache shared by every script, configured by the TDK_ARTIFACT_CACHE and
+        TDK_ARTIFACT_CACHE_MAX_GB environment variables.
+
+        Returns:
+            ArtifactCache: The shared cache.
+        """
+        with cls.__default_lock:
+            if cls.__default is None:
+                root = os.environ.get("TDK_ARTIFACT_CACHE")
+                max_gb = os.environ.get("TDK_ARTIFACT_CACHE_MAX_GB")
+                cls.__default = ArtifactCache(
+                    Path(root) if root else Path.home() / ".cache" / "cbl-tdk" / "artifacts",
+                    int(float(max_gb) * 1024 * 1024 * 1024) if max_gb else _DEFAULT_MAX_BYTES,
+                )
+
+            return cls.__default
+
+    @contextmanager
+    def _locked(self) -> Generator[None]:
+        # Held around every read-modify-write of the index, and around anything that
+        # must not race with eviction.  The thread lock serializes this process and the
+        # file lock serializes the other processes on the agent; it is reentrant, since
+        # a second flock from this process on a new file descriptor would deadlock.
+        with self.__lock:
+            if self.__lock_depth > 0:
+                self.__lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self.__lock_depth -= 1
+
+                return
+
+            with open(self.__lock_path, "a+b") as lock_file:
+                _lock_file(lock_file)
+                self.__lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self.__lock_depth = 0
+                    _unlock_file(lock_file)
+
+    def _read_index(self) -> dict[str, dict[str, Any]]:
+        try:
+            with open(self.__index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_index(self, index: dict[str, dict[str, Any]]) -> None:
+        tmp_path = self.__tmp / f"index-{uuid4().hex}.json"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+
+        os.replace(tmp_path, self.__index_path)
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.__objects / sha256
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self.__lock:
+            return self.__url_locks.setdefault(url, threading.Lock())
+
+    def lookup(self, url: str, sha256: str | None = None) -> Path | None:
+        """
+        Find a cached artifact without downloading it, and mark it as recently used.
+
+        Args:
+            url (str): The URL the artifact was downloaded from.
+            sha256 (str | None): The expected checksum, which may match an artifact
+                downloaded from a different URL.
+
+        Returns:
+            Path | None: The path of the cached artifact, or None if it is not cached.
+        """
+        with self._locked():
+            index = self._read_index()
+            entry = index.get(url)
+            if sha256 is not None:
+                digest = sha256
+            elif entry is not None:
+                digest = entry["sha256"]
+            else:
+                return None
+
+            if not self._object_path(digest).exists():
+                return None
+
+            index[url] = {
+                "sha256": digest,
+                "size": self._object_path(digest).stat().st_size,
+                "last_used": time.time(),
+            }
+            self._write_index(index)
+            return self._object_path(digest)
+
+    def fetch(self, url: str, sha256: str | None = None) -> Path:
+        """
+        Get an artifact from the cache, downloading it first if needed.  The returned
+        file belongs to the cache and must not be modified or deleted.
+
+        Args:
+            url (str): The URL to download the artifact from.
+            sha256 (str | None): The expected checksum, verified after downloading.
+
+        Returns:
+            Path: The path of the cached artifact.
+
+        Raises:
+            ValueError: If the downloaded artifact does not match the expected checksum.
+            requests.HTTPError: If the download fails.
+        """
+        with self._url_lock(url):
+            cached = self.lookup(url, sha256)
+            if cached is not None:
+                click.secho(f"{Path(url).name} found in artifact cache", fg="green")
+                return cached
+
+            header(f"Downloading {url}")
+            tmp_path = self.__tmp / f"download-{uuid4().hex}"
+            try:
+                self._download(url, tmp_path)
+                digest = _sha256_file(tmp_path)
+                if sha256 is not None and digest != sha256:
+                    raise ValueError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+
+                # Under the lock, so eviction can't remove the object before it is indexed
+                with self._locked():
+                    os.replace(tmp_path, self._object_path(digest))
+                    return self._record(url, digest)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+
+    def put(self, url: str, path: Path) -> Path:
+        """
+        Add a local file (e.g. something that was just built) to the cache, as if it had
+        been downloaded from `url`.
+
+        Args:
+            url (str): The URL to index the artifact under.
+            path (Path): The file to add; it is copied, not moved.
+
+        Returns:
+            Path: The path of the cached artifact.
+        """
+        with self._url_lock(url):
+            tmp_path = self.__tmp / f"put-{uuid4().hex}"
+            try:
+                shutil.copyfile(path, tmp_path)
+                digest = _sha256_file(tmp_path)
+                # Under the lock, so eviction can't remove the object before it is indexed
+                with self._locked():
+                    os.replace(tmp_path, self._object_path(digest))
+                    return self._record(url, digest)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+
+    def _record(self, url: str, digest: str) -> Path:
+        with self._locked():
+            index = self._read_index()
+            index[url] = {
+                "sha256": digest,
+                "size": self._object_path(digest).stat().st_size,
+                "last_used": time.time(),
+            }
+            self._write_index(index)
+            self._evict(keep=digest)
+
+        return self._object_path(digest)
+
+    def materialize(self, url: str, dest: Path, sha256: str | None = None) -> Path:
+        """
+        Place a copy of an artifact at `dest`, downloading it into the cache first if
+        needed.  The copy can be modified freely without affecting the cache.
+
+        Args:
+            url (str): The URL to download the artifact from.
+            dest (Path): Where to place the artifact.
+            sha256 (str | None): The expected checksum.
+
+        Returns:
+            Path: `dest`
+        """
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            cached = self.fetch(url, sha256)
+            # Another process may evict the artifact between fetching and copying it,
+            # in which case it is fetched again.  Never hard link: the callers unpack
+            # and edit what they are given, which would corrupt the cached object.
+            tmp_dest = dest.with_name(f".{dest.name}.{uuid4().hex}")
+            with self._locked():
+                if not cached.exists():
+                    continue
+
+                shutil.copyfile(cached, tmp_dest)
+
+            os.replace(tmp_dest, dest)
+            return dest
+
+    def _download(self, url: str, output_path: Path) -> None:
+        # Not every server answers HEAD, in which case just stream the file
+        head = requests.head(url, allow_redirects=True, timeout=_TIMEOUT)
+        total = int(head.headers.get("content-length", 0)) if head.ok else 0
+        ranged = head.ok and head.headers.get("accept-ranges", "").lower() == "bytes" and total >= _RANGE_THRESHOLD
+        with tqdm(total=total, unit="iB", unit_scale=True, unit_divisor=1024, desc=Path(url).name) as bar:
+            if ranged and self._download_ranges(head.url, output_path, total, bar):
+                return
+
+            bar.reset()
+            with requests.get(url, stream=True, timeout=_TIMEOUT) as r:
+                r.raise_for_status()
+                with open(output_path, "wb") as f:
+                    for chunk in r.iter_content(_CHUNK_SIZE):
+                        bar.update(f.write(chunk))
+
+    def _download_ranges(self, url: str, output_path: Path, total: int, bar: tqdm) -> bool:
+        part_size = -(-total // self.__range_parts)
+        ranges = [(start, min(start + part_size, total) - 1) for start in range(0, total, part_size)]
+        bar_lock = threading.Lock()
+        with open(output_path, "wb") as f:
+            f.truncate(total)
+
+        def fetch_range(byte_range: tuple[int, int]) -> bool:
+            # If the connection drops part way through, ask for the rest of the range
+            start, end = byte_range
+            for attempt in range(_RANGE_RETRIES + 1):
+                try:
+                    with requests.get(
+                        url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=_TIMEOUT
+                    ) as r:
+                        r.raise_for_status()
+                        if r.status_code != 206:
+                            return False
+
+                        with open(output_path, "r+b") as f:
+                            f.seek(start)
+                            for chunk in r.iter_content(_CHUNK_SIZE):
+                                written = f.write(chunk)
+                                start += written
+                                with bar_lock:
+                                    bar.update(written)
+
+                    if start > end:
+                        return True
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                    if attempt == _RANGE_RETRIES:
+                        raise
+
+            raise requests.ConnectionError(
+                f"Range {byte_range[0]}-{end} of {url} ended early {_RANGE_RETRIES + 1} times"
+            )
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            if all(executor.map(fetch_range, ranges)):
+                return output_path.stat().st_size == total
+
+        click.secho("Server ignored range requests, falling back to a single stream", fg="yellow")
+        return False
+
+    def _evict(self, keep: str) -> None:
+        # Always called with the lock held, so no other process is copying an artifact
+        # out of the cache or changing the index while this runs
+        index = self._read_index()
+        sizes: dict[str, int] = {}
+        last_used: dict[str, float] = {}
+        for entry in index.values():
+            digest = entry["sha256"]
+            sizes[digest] = entry["size"]
+            last_used[digest] = max(last_used.get(digest, 0.0), entry["last_used"])
+
+        total = sum(sizes.values())
+        for digest in sorted(last_used, key=lambda d: last_used[d]):
+            if total <= self.__max_bytes:
+                break
+
+            if digest == keep:
+                continue
+
+            click.secho(f"Evicting {digest[:12]} ({sizes[digest] / 1024 / 1024:.1f} MiB) from artifact cache")
+            self._object_path(digest).unlink(missing_ok=True)
+            total -= sizes[digest]
+            index = {url: entry for url, entry in index.items() if entry["sha256"] != digest}
+
+        self._write_index(index)
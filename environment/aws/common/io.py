@@ -9,22 +9,37 @@ Functions:
     sftp_progress_bar(sftp: paramiko.SFTPClient, local_path: Path, remote_path: str) -> None:
         Upload a file via SFTP with a progress bar.
 
-    zip_directory(input: Path, output: Path) -> None:
-        Zip the contents of a directory.
+    sftp_upload_stream(sftp: paramiko.SFTPClient, remote_path: str, write: Callable[[BinaryIO], None]) -> None:
+        Upload data produced on the fly via SFTP with a progress bar, without an intermediate file.
 
-    unzip_directory(input: Path, output: Path) -> None:
-        Unzip the contents of a zip file to a directory.
+    zip_directory(input: Path, output: Path | BinaryIO, excludes: list[str] | None = None, ...) -> None:
+        Zip the contents of a directory, reading files ahead in parallel.
+
+    unzip_directory(input: Path, output: Path, workers: int | None = None) -> None:
+        Unzip the contents of a zip file to a directory, extracting files in parallel.
+
+    tar_directory(input: Path, output: Path | BinaryIO, excludes: list[str] | None = None, ...) -> None:
+        Create a .tar.gz archive of the contents of a directory, compressing in parallel.
+
+    untar_directory(input: Path, output: Path, workers: int | None = None) -> None:
+        Extract the contents of a .tar.gz archive to a directory, writing files in parallel.
 """
 
+import fnmatch
+import gzip
 import os
+import re
 import sys
 import tarfile
 import time
 import zipfile
-from collections.abc import Iterator
-from contextlib import contextmanager
-from fnmatch import fnmatch
+import zlib
+from collections import deque
+from collections.abc import Callable, Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
+from typing import BinaryIO, Final, cast
 
 import click
 import paramiko
@@ -34,6 +49,10 @@ from tqdm import tqdm
 
 LIGHT_GRAY = (128, 128, 128)
 
+_STREAM_THRESHOLD: Final[int] = 64 * 1024 * 1024
+_GZIP_BLOCK_SIZE: Final[int] = 4 * 1024 * 1024
+_PROBE_SIZE: Final[int] = 256 * 1024
+
 
 def write_chunk(channel: Channel) -> None:
     chunk = channel.recv(1024).decode(errors="ignore")
@@ -97,13 +116,134 @@ def sftp_progress_bar(sftp: paramiko.SFTPClient, local_path: Path, remote_path:
         sftp.put(local_path, remote_path, callback=callback)
 
 
-def zip_directory(input: Path, output: Path, excludes: list[str] | None = None) -> None:
+class _ProgressWriter:
+    # Counts the bytes written to a stream; deliberately has no tell() so that ZipFile
+    # treats it as unseekable and never tries to go back and patch a header
+    def __init__(self, output: BinaryIO, bar: tqdm) -> None:
+        self.__output = output
+        self.__bar = bar
+
+    def write(self, data: bytes) -> int:
+        self.__output.write(data)
+        self.__bar.update(len(data))
+        return len(data)
+
+    def flush(self) -> None:
+        self.__output.flush()
+
+
+def sftp_upload_stream(sftp: paramiko.SFTPClient, remote_path: str, write: Callable[[BinaryIO], None]) -> None:
     """
-    Zip the contents of a directory.
+    Upload data produced on the fly (e.g. an archive as it is being compressed) via SFTP with
+    a progress bar, without writing it to a local file first.  The data is uploaded to a
+    temporary name and renamed once complete, so a failed upload never leaves a partial
+    file at `remote_path`.
+
+    Args:
+        sftp (paramiko.SFTPClient): The SFTP client.
+        remote_path (str): The remote path where the data will be uploaded.
+        write (Callable[[BinaryIO], None]): Writes the data to the stream it is passed.
+    """
+    partial_path = f"{remote_path}.partial"
+    try:
+        with (
+            sftp.open(partial_path, "wb", bufsize=1024 * 1024) as f,
+            tqdm(unit="B", unit_scale=True, desc=Path(remote_path).name) as bar,
+        ):
+            # Don't wait for the server to acknowledge each write before sending the next
+            f.set_pipelined(True)
+            # Only write and flush are ever used, which _ProgressWriter provides
+            write(cast(BinaryIO, _ProgressWriter(f, bar)))
+
+        sftp.posix_rename(partial_path, remote_path)
+    except BaseException:
+        try:
+            sftp.remove(partial_path)
+        except OSError:
+            pass
+
+        raise
+
+
+def _compile_excludes(excludes: list[str]) -> Callable[[str, bool], bool]:
+    # Every pattern is folded into one regex up front, rather than running fnmatch over
+    # each pattern for each path.  The rules are the same as before: a plain name matches
+    # a directory with exactly that relative path, any pattern is matched against the
+    # relative path, and directories also match as "dir/" and "dir/." so that patterns
+    # like "build/**" exclude the directory itself.
+    plain_dirs = {pat for pat in excludes if not any(ch in pat for ch in "*?[]") and "/" not in pat}
+    if not excludes:
+        return lambda rel_posix, is_dir: False
+
+    combined = re.compile("|".join(f"(?:{fnmatch.translate(os.path.normcase(pat))})" for pat in excludes))
+
+    def is_excluded(rel_posix: str, is_dir: bool) -> bool:
+        if is_dir and rel_posix in plain_dirs:
+            return True
+
+        normalized = os.path.normcase(rel_posix)
+        if combined.match(normalized):
+            return True
+
+        return is_dir and bool(
+            combined.match(os.path.normcase(rel_posix + "/")) or combined.match(os.path.normcase(rel_posix + "/."))
+        )
+
+    return is_excluded
+
+
+def _collect_files(input: Path, excludes: list[str] | None) -> list[tuple[Path, str]]:
+    is_excluded = _compile_excludes(excludes or [])
+    entries: list[tuple[Path, str]] = []
+    for root, dirs, files in os.walk(input):
+        root_path = Path(root)
+        rel_root = root_path.relative_to(input)
+        dirs[:] = sorted(d for d in dirs if not is_excluded((rel_root / d).as_posix(), True))
+        for file in sorted(files):
+            rel_file = (rel_root / file).as_posix()
+            if not is_excluded(rel_file, False):
+                entries.append((root_path / file, rel_file))
+
+    return entries
+
+
+def _default_workers() -> int:
+    return min(32, os.cpu_count() or 1)
+
+
+def _read_member(path: Path, level: int) -> tuple[bytes, int]:
+    # Deflating a sample of the file is enough to tell whether compressing the rest of
+    # it is worth the time; already compressed data (images, libraries, nested archives)
+    # is stored as is
+    data = path.read_bytes()
+    probe = data[:_PROBE_SIZE]
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    if len(compressor.compress(probe) + compressor.flush()) >= len(probe) * 0.95:
+        return data, zipfile.ZIP_STORED
+
+    return data, zipfile.ZIP_DEFLATED
+
+
+def zip_directory(
+    input: Path,
+    output: Path | BinaryIO,
+    excludes: list[str] | None = None,
+    workers: int | None = None,
+    level: int = 6,
+) -> None:
+    """
+    Zip the contents of a directory.  Files are read, and checked for whether they are
+    worth compressing, ahead of the writer on a pool of worker threads; the entries are
+    written in a deterministic order, so the output can be a stream (e.g. an SFTP file)
+    as well as a path.  Use tar_directory where the package format allows it, since it
+    also compresses in parallel.
 
     Args:
         input (Path): The path to the directory to be zipped.
-        output (Path): The path where the zip file will be saved.
+        output (Path | BinaryIO): The path where the zip file will be saved, or a writable stream.
+        excludes (list[str] | None): Glob patterns, relative to `input`, of paths to leave out.
+        workers (int | None): The number of reader threads (defaults to the CPU count).
+        level (int): The deflate compression level.
 
     Raises:
         RuntimeError: If the input directory does not exist.
@@ -111,52 +251,45 @@ def zip_directory(input: Path, output: Path, excludes: list[str] | None = None)
     if not input.exists():
         raise RuntimeError(f"{input} does not exist...")
 
-    excludes = excludes or []
-
-    def is_excluded(rel_path: Path, is_dir: bool) -> bool:
-        rel_posix = rel_path.as_posix()
-        # For directories also test pattern with trailing slash variants
-        for pat in excludes:
-            # Expand simple directory name patterns (e.g. '__pycache__')
-            if is_dir and not any(ch in pat for ch in "*?[]") and "/" not in pat and rel_posix == pat:
-                return True
-            # Direct match
-            if fnmatch(rel_posix, pat):
-                return True
-            # Allow directory patterns written without trailing /** by user
-            if is_dir and (fnmatch(rel_posix + "/", pat) or fnmatch(rel_posix + "/.", pat)):
-                return True
-        return False
-
-    click.echo("Zipping...")
-    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(input):
-            root_path = Path(root)
-            pruned_dirs = []
-            for d in dirs:
-                rel_dir = (root_path / d).relative_to(input)
-                if is_excluded(rel_dir, is_dir=True):
-                    continue
-                pruned_dirs.append(d)
-            dirs[:] = pruned_dirs
-
-            for file in files:
-                rel_file = (root_path / file).relative_to(input)
-                if is_excluded(rel_file, is_dir=False):
-                    continue
-                file_path = root_path / file
-                zipf.write(file_path, rel_file)
+    entries = _collect_files(input, excludes)
+    workers = workers or _default_workers()
+    pending: deque[tuple[Path, str, Future[tuple[bytes, int]] | None]] = deque()
+    with (
+        zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED, compresslevel=level) as zipf,
+        ThreadPoolExecutor(max_workers=workers) as executor,
+        tqdm(total=len(entries), desc="Zipping") as bar,
+    ):
+
+        def drain(limit: int) -> None:
+            while len(pending) > limit:
+                path, arcname, future = pending.popleft()
+                if future is None:
+                    zipf.write(path, arcname)
+                else:
+                    data, compress_type = future.result()
+                    zipf.writestr(zipfile.ZipInfo.from_file(path, arcname), data, compress_type, level)
+
+                bar.update(1)
+
+        for path, arcname in entries:
+            # Very large files are streamed by ZipFile itself rather than held in memory
+            large = path.stat().st_size >= _STREAM_THRESHOLD
+            pending.append((path, arcname, None if large else executor.submit(_read_member, path, level)))
+            drain(workers * 2)
+
+        drain(0)
 
     click.echo("Done")
 
 
-def unzip_directory(input: Path, output: Path) -> None:
+def unzip_directory(input: Path, output: Path, workers: int | None = None) -> None:
     """
-    Unzip the contents of a zip file to a directory.
+    Unzip the contents of a zip file to a directory, extracting files on a pool of worker threads.
 
     Args:
         input (Path): The path to the zip file to be unzipped.
         output (Path): The path where the contents will be extracted.
+        workers (int | None): The number of extraction threads (defaults to the CPU count).
 
     Raises:
         RuntimeError: If the input zip file does not exist.
@@ -165,36 +298,103 @@ def unzip_directory(input: Path, output: Path) -> None:
         raise RuntimeError(f"{input} does not exist...")
 
     with zipfile.ZipFile(input, "r") as zipf:
-        for member in tqdm(zipf.infolist(), desc="Unzipping"):
+        members = zipf.infolist()
+        symlinks = [m for m in members if (m.external_attr >> 16) & 0o170000 == 0o120000]
+        regular = [m for m in members if m not in symlinks]
+
+        # Create every directory up front, since ZipFile.extract is not safe against
+        # two threads creating the same parent at once
+        for member in regular:
+            target = output / member.filename
+            (target if member.is_dir() else target.parent).mkdir(parents=True, exist_ok=True)
+
+        def extract(member: zipfile.ZipInfo) -> None:
+            zipf.extract(member, output)
+            # Preserve file permissions
+            perm = member.external_attr >> 16
+            if perm and not member.is_dir():
+                (output / member.filename).chmod(perm)
+
+        with ThreadPoolExecutor(max_workers=workers or _default_workers()) as executor:
+            for _ in tqdm(executor.map(extract, regular), total=len(regular), desc="Unzipping"):
+                pass
+
+        for member in symlinks:
+            # Read the symlink target from the ZIP file
+            with zipf.open(member) as link_file:
+                target = link_file.read().decode("utf-8")
+
             extracted_path = output / member.filename
-            # Check if the member is a symlink
-            is_symlink = (member.external_attr >> 16) & 0o120000 == 0o120000
-            if is_symlink:
-                # Read the symlink target from the ZIP file
-                with zipf.open(member) as link_file:
-                    target = link_file.read().decode("utf-8")
-
-                # Create the symlink
-                extracted_path.parent.mkdir(parents=True, exist_ok=True)
-                extracted_path.symlink_to(target)
-            else:
-                # Extract regular files and directories
-                zipf.extract(member, output)
-                # Preserve file permissions
-                perm = member.external_attr >> 16
-                if perm:
-                    extracted_path.chmod(perm)
+            extracted_path.parent.mkdir(parents=True, exist_ok=True)
+            extracted_path.symlink_to(target)
+
+        # Directory permissions last, so that read-only directories can still be filled
+        for member in regular:
+            perm = member.external_attr >> 16
+            if perm and member.is_dir():
+                (output / member.filename).chmod(perm)
 
     click.echo("Done")
 
 
-def tar_directory(input: Path, output: Path) -> None:
+class _ParallelGzipWriter:
+    # A write-only file object that gzips fixed size blocks on a pool of worker threads.
+    # Each block becomes its own gzip member; a concatenation of members is a valid gzip
+    # file that gzip, tar and Python's gzip module all read as one stream.
+
+    def __init__(self, output: BinaryIO, workers: int, level: int) -> None:
+        self.__output = output
+        self.__level = level
+        self.__workers = workers
+        self.__executor = ThreadPoolExecutor(max_workers=workers)
+        self.__buffer = bytearray()
+        self.__pending: deque[Future[bytes]] = deque()
+
+    def write(self, data: bytes) -> int:
+        self.__buffer += data
+        while len(self.__buffer) >= _GZIP_BLOCK_SIZE:
+            self.__submit(bytes(self.__buffer[:_GZIP_BLOCK_SIZE]))
+            del self.__buffer[:_GZIP_BLOCK_SIZE]
+
+        return len(data)
+
+    def __submit(self, block: bytes) -> None:
+        self.__pending.append(self.__executor.submit(gzip.compress, block, self.__level, mtime=0))
+        self.__drain(self.__workers * 2)
+
+    def __drain(self, limit: int) -> None:
+        while len(self.__pending) > limit:
+            self.__output.write(self.__pending.popleft().result())
+
+    def close(self) -> None:
+        try:
+            if self.__buffer:
+                self.__submit(bytes(self.__buffer))
+                self.__buffer.clear()
+
+            self.__drain(0)
+        finally:
+            self.__executor.shutdown(cancel_futures=True)
+
+
+def tar_directory(
+    input: Path,
+    output: Path | BinaryIO,
+    excludes: list[str] | None = None,
+    workers: int | None = None,
+    level: int = 6,
+) -> None:
     """
-    Create a .tar.gz archive of the contents of a directory.
+    Create a .tar.gz archive of the contents of a directory, compressing blocks of the
+    archive on a pool of worker threads.  The output can be a stream (e.g. an SFTP file)
+    as well as a path.
 
     Args:
         input (Path): The path to the directory to be archived.
-        output (Path): The path where the .tar.gz file will be saved.
+        output (Path | BinaryIO): The path where the .tar.gz file will be saved, or a writable stream.
+        excludes (list[str] | None): Glob patterns, relative to `input`, of paths to leave out.
+        workers (int | None): The number of compression threads (defaults to the CPU count).
+        level (int): The gzip compression level.
 
     Raises:
         RuntimeError: If the input directory does not exist.
@@ -203,22 +403,34 @@ def tar_directory(input: Path, output: Path) -> None:
         raise RuntimeError(f"{input} does not exist...")
 
     click.echo("Compressing")
-    with tarfile.open(output, "w:gz") as tar:
-        for root, _, files in os.walk(input):
-            for file in tqdm(files, desc="Archiving"):
-                file_path = Path(root) / file
-                tar.add(file_path, arcname=file_path.relative_to(input))
+    entries = _collect_files(input, excludes)
+    with ExitStack() as stack:
+        stream = stack.enter_context(open(output, "wb")) if isinstance(output, Path) else output
+        gz = _ParallelGzipWriter(stream, workers or _default_workers(), level)
+        stack.callback(gz.close)
+        # A stream ("w|") only ever writes to its file object, which is all gz supports
+        with tarfile.open(fileobj=cast(BinaryIO, gz), mode="w|") as tar:
+            for file_path, arcname in tqdm(entries, desc="Archiving"):
+                tar.add(file_path, arcname=arcname)
 
     click.echo("Done")
 
 
-def untar_directory(input: Path, output: Path) -> None:
+def _write_file(path: Path, data: bytes, mode: int) -> None:
+    path.write_bytes(data)
+    if mode:
+        path.chmod(mode)
+
+
+def untar_directory(input: Path, output: Path, workers: int | None = None) -> None:
     """
-    Extract the contents of a .tar.gz archive to a directory.
+    Extract the contents of a .tar.gz archive to a directory in a single pass.
+    Decompression is sequential, but files are written out on a pool of worker threads.
 
     Args:
         input (Path): The path to the .tar.gz file to be extracted.
         output (Path): The path where the contents will be extracted.
+        workers (int | None): The number of threads writing files (defaults to the CPU count).
 
     Raises:
         RuntimeError: If the input .tar.gz file does not exist.
@@ -227,14 +439,44 @@ def untar_directory(input: Path, output: Path) -> None:
         raise RuntimeError(f"{input} does not exist...")
 
     click.echo("Extracting")
-    with tarfile.open(input, "r:gz") as tar:
-        for member in tqdm(tar.getmembers(), desc="Extracting"):
-            tar.extract(member, path=output)
+    workers = workers or _default_workers()
+    directories: list[tarfile.TarInfo] = []
+    pending: deque[Future[None]] = deque()
+    with tarfile.open(input, "r:gz") as tar, ThreadPoolExecutor(max_workers=workers) as executor:
+        # Every member is handled as soon as it is read, since going back to one later
+        # means decompressing the archive again from the start
+        for member in tqdm(tar, desc="Extracting"):
+            if Path(member.name).is_absolute() or ".." in Path(member.name).parts:
+                raise RuntimeError(f"Refusing to extract {member.name} outside of {output}")
 
-            # Preserve file permissions
             extracted_path = output / member.name
-            if member.mode and not member.islnk() and not member.issym():
-                extracted_path.chmod(member.mode)
+            if member.isdir():
+                extracted_path.mkdir(parents=True, exist_ok=True)
+                directories.append(member)
+            elif member.isreg() and member.size < _STREAM_THRESHOLD:
+                extracted_path.parent.mkdir(parents=True, exist_ok=True)
+                reader = tar.extractfile(member)
+                assert reader is not None
+                pending.append(executor.submit(_write_file, extracted_path, reader.read(), member.mode))
+                while len(pending) > workers * 4:
+                    pending.popleft().result()
+            else:
+                # Links may point at files still being written, so let those finish first.
+                # Very large files are not worth holding in memory, so tarfile streams them.
+                while pending:
+                    pending.popleft().result()
+
+                tar.extract(member, path=output)
+                # Preserve file permissions
+                if member.mode and not member.islnk() and not member.issym():
+                    extracted_path.chmod(member.mode)
+
+        for future in pending:
+            future.result()
+
+        for member in directories:
+            if member.mode:
+                (output / member.name).chmod(member.mode)
 
     click.echo("Done")
 
@@ -280,7 +522,7 @@ def configure_terminal_encoding() -> None:
 
 
 @contextmanager
-def pushd(new_dir: Path) -> Iterator[None]:
+def pushd(new_dir: Path) -> Generator[None]:
     prev_dir = Path.cwd()
     try:
         os.chdir(new_dir)
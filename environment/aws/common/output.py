@@ -8,6 +8,8 @@ Functions:
 
 import click
 
+from environment.aws.common.task_graph import current_task
+
 
 def header(text: str) -> None:
     """
@@ -15,10 +17,17 @@ def header(text: str) -> None:
 
     === It looks like this ==
 
+    When called from inside a provisioning task the task name is prepended, so that
+    output from concurrently running tasks can be told apart.
+
     Args:
         text (str): The text to print
     """
 
+    task = current_task()
+    if task is not None:
+        text = f"[{task}] {text}"
+
     click.echo()
     click.secho(f"=== {text} ===", fg="green")
     click.echo()
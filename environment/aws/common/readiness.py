@@ -0,0 +1,77 @@
+"""
+This module provides an async readiness prober for services that are started as part of a
+test environment.  A service is considered ready as soon as it returns any HTTP response.
+
+Functions:
+    wait_until_ready(url: str, timeout: float = 60.0, initial_delay: float = 0.25, max_delay: float = 5.0) -> float:
+        Poll a URL with exponential backoff until it responds, and return how long that took.
+
+    wait_all_ready(urls: list[str], timeout: float = 60.0) -> dict[str, float]:
+        Poll several URLs concurrently until they all respond.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+import click
+
+
+async def wait_until_ready(
+    url: str,
+    timeout: float = 60.0,
+    initial_delay: float = 0.25,
+    max_delay: float = 5.0,
+) -> float:
+    """
+    Poll a URL with exponential backoff until it returns any HTTP response.
+
+    Args:
+        url (str): The URL to poll.
+        timeout (float): The number of seconds to keep trying for.
+        initial_delay (float): The delay after the first failed attempt, doubled after each failure.
+        max_delay (float): The upper bound on the delay between attempts.
+
+    Returns:
+        float: The number of seconds until the first successful response.
+
+    Raises:
+        TimeoutError: If the URL does not respond within the timeout.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+    attempt = 0
+    async with aiohttp.ClientSession() as session:
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            try:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=max(remaining, 0.1))):
+                    return time.monotonic() - start
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"{url} did not respond within {timeout:.0f}s ({attempt} attempts)") from e
+
+                click.secho(f"{url} not ready yet ({type(e).__name__}), retrying in {delay:.2f}s...", fg="yellow")
+                await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, max_delay)
+
+
+async def wait_all_ready(urls: list[str], timeout: float = 60.0) -> dict[str, float]:
+    """
+    Poll several URLs concurrently until they all respond.
+
+    Args:
+        urls (list[str]): The URLs to poll.
+        timeout (float): The number of seconds to keep trying each URL for.
+
+    Returns:
+        dict[str, float]: The number of seconds each URL took to respond.
+
+    Raises:
+        TimeoutError: If any URL does not respond within the timeout.
+    """
+    latencies = await asyncio.gather(*(wait_until_ready(url, timeout) for url in urls))
+    return dict(zip(urls, latencies))
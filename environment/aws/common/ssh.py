@@ -0,0 +1,234 @@
+"""
+This module provides pooled SSH connections and batched remote operations for setting up
+EC2 nodes.  A single connection per host is shared by everything that talks to it, and
+since SSH multiplexes channels over one connection, several commands can run on a host at
+the same time.
+
+Classes:
+    SSHPool: A thread safe pool of SSH connections, one per host and user.
+
+Functions:
+    push_files(ssh: paramiko.SSHClient, files: dict[str, Path]) -> list[str]:
+        Upload files in a single tar stream, skipping the ones whose remote copy is identical.
+
+    push_directory(ssh: paramiko.SSHClient, local_dir: Path, remote_dir: str) -> list[str]:
+        Upload the contents of a directory in a single tar stream, skipping unchanged files.
+
+    remote_exec_parallel(ssh: paramiko.SSHClient, commands: list[tuple[str, str]], fail_on_error: bool = True) -> None:
+        Run several remote commands concurrently, streaming their output.
+
+    output_prefix(ssh: paramiko.SSHClient) -> str:
+        Get the label to prefix remote output with: the current task, or else the host.
+"""
+
+import hashlib
+import shlex
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import click
+import paramiko
+
+from environment.aws.common.io import LIGHT_GRAY
+from environment.aws.common.output import header
+from environment.aws.common.task_graph import current_task
+
+
+class SSHPool:
+    """
+    A thread safe pool of SSH connections, one per host and user.  Connections are opened
+    on first use and reopened if they drop; callers must not close the clients they get.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__clients: dict[tuple[str, str], paramiko.SSHClient] = {}
+        self.__host_locks: dict[tuple[str, str], threading.Lock] = {}
+
+    def get(self, hostname: str, pkey: paramiko.PKey, username: str = "ec2-user") -> paramiko.SSHClient:
+        """
+        Get a connected SSH client for a host, reusing an existing connection if possible.
+
+        Args:
+            hostname (str): The host to connect to.
+            pkey (paramiko.PKey): The private key for SSH access.
+            username (str): The user to connect as.
+
+        Returns:
+            paramiko.SSHClient: The connected client.
+        """
+        key = (hostname, username)
+        with self.__lock:
+            host_lock = self.__host_locks.setdefault(key, threading.Lock())
+
+        with host_lock:
+            client = self.__clients.get(key)
+            transport = client.get_transport() if client is not None else None
+            if client is not None and transport is not None and transport.is_active():
+                return client
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(hostname, username=username, pkey=pkey)
+            transport = client.get_transport()
+            if transport is not None:
+                transport.set_keepalive(30)
+
+            self.__clients[key] = client
+            return client
+
+    def close_all(self) -> None:
+        """
+        Close every pooled connection.
+        """
+        with self.__lock:
+            clients = list(self.__clients.values())
+            self.__clients.clear()
+
+        for client in clients:
+            client.close()
+
+
+ssh_pool = SSHPool()
+"""The connection pool shared by the setup scripts"""
+
+
+def output_prefix(ssh: paramiko.SSHClient) -> str:
+    """
+    Get the label to prefix the output of a remote command with: the name of the task
+    running on the calling thread, or else the address of the host.
+
+    Args:
+        ssh (paramiko.SSHClient): The SSH client the command runs on.
+
+    Returns:
+        str: The label.
+    """
+    task = current_task()
+    if task is not None:
+        return task
+
+    transport = ssh.get_transport()
+    return transport.getpeername()[0] if transport is not None else ""
+
+
+def _sha256(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def _remote_hashes(ssh: paramiko.SSHClient, remote_paths: list[str]) -> dict[str, str]:
+    # One round trip for every file; missing files are simply absent from the output
+    quoted = " ".join(shlex.quote(p) for p in remote_paths)
+    _, stdout, _ = ssh.exec_command(f"sha256sum -- {quoted} 2>/dev/null; true")
+    hashes: dict[str, str] = {}
+    for line in stdout.read().decode().splitlines():
+        digest, _, path = line.partition("  ")
+        if path:
+            hashes[path] = digest
+
+    return hashes
+
+
+def push_files(ssh: paramiko.SSHClient, files: dict[str, Path]) -> list[str]:
+    """
+    Upload files in a single tar stream, skipping the ones whose remote copy already has
+    the same SHA-256.  Remote paths must be absolute and writable by the SSH user; missing
+    parent directories are created and file modes are preserved.
+
+    Args:
+        ssh (paramiko.SSHClient): The SSH client.
+        files (dict[str, Path]): The local file to upload to each remote path.
+
+    Returns:
+        list[str]: The remote paths that were uploaded.
+
+    Raises:
+        Exception: If extracting the stream on the remote host fails.
+    """
+    if not files:
+        return []
+
+    remote_hashes = _remote_hashes(ssh, list(files))
+    changed = {remote: local for remote, local in files.items() if remote_hashes.get(remote) != _sha256(local)}
+    prefix = output_prefix(ssh)
+    if not changed:
+        click.secho(f"[{prefix}] {len(files)} file(s) already up to date", fg=LIGHT_GRAY)
+        return []
+
+    click.secho(f"[{prefix}] Uploading {len(changed)} of {len(files)} file(s)", fg=LIGHT_GRAY)
+    stdin, stdout, stderr = ssh.exec_command("tar -xf - -C / --no-same-owner")
+    with tarfile.open(fileobj=stdin, mode="w|") as tar:
+        for remote, local in changed.items():
+            tar.add(local, arcname=remote.lstrip("/"), recursive=False)
+
+    stdin.channel.shutdown_write()
+    exit_status = stdout.channel.recv_exit_status()
+    if exit_status != 0:
+        raise Exception(f"Extracting uploaded files failed with exit status {exit_status}: {stderr.read().decode()}")
+
+    return list(changed)
+
+
+def push_directory(ssh: paramiko.SSHClient, local_dir: Path, remote_dir: str) -> list[str]:
+    """
+    Upload the contents of a directory in a single tar stream, skipping unchanged files.
+
+    Args:
+        ssh (paramiko.SSHClient): The SSH client.
+        local_dir (Path): The directory to upload.
+        remote_dir (str): The absolute remote directory to upload into.
+
+    Returns:
+        list[str]: The remote paths that were uploaded.
+    """
+    files = {
+        f"{remote_dir.rstrip('/')}/{path.relative_to(local_dir).as_posix()}": path
+        for path in sorted(local_dir.rglob("*"))
+        if path.is_file()
+    }
+    return push_files(ssh, files)
+
+
+def _run_streamed(ssh: paramiko.SSHClient, command: str, prefix: str) -> tuple[int, str]:
+    _, stdout, stderr = ssh.exec_command(command, get_pty=True)
+    for line in iter(stdout.readline, ""):
+        click.secho(f"[{prefix}] {line}", fg=LIGHT_GRAY, nl=False)
+
+    return stdout.channel.recv_exit_status(), stderr.read().decode()
+
+
+def remote_exec_parallel(ssh: paramiko.SSHClient, commands: list[tuple[str, str]], fail_on_error: bool = True) -> None:
+    """
+    Run several independent remote commands concurrently over one connection, streaming
+    their output as it arrives.
+
+    Args:
+        ssh (paramiko.SSHClient): The SSH client.
+        commands (list[tuple[str, str]]): (command, description) pairs.
+        fail_on_error (bool): Whether to raise an exception if any command fails.
+
+    Raises:
+        Exception: If a command fails and fail_on_error is True.
+    """
+    if not commands:
+        return
+
+    prefix = output_prefix(ssh)
+    header(", ".join(desc for _, desc in commands))
+    with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+        results = list(executor.map(lambda c: _run_streamed(ssh, c[0], prefix), commands))
+
+    for (command, _), (exit_status, error) in zip(commands, results):
+        if fail_on_error and exit_status != 0:
+            click.secho(error, fg="red")
+            raise Exception(f"Command '{command}' failed with exit status {exit_status}")
+
+    header("Done!")
+    click.echo()
@@ -0,0 +1,342 @@
+"""
+This module provides a small dependency-aware task runner used to provision the pieces
+of a backend concurrently.  Tasks are plain callables that declare the names of the
+tasks they depend on; a task starts as soon as all of its dependencies have finished,
+subject to a bound on the number of tasks running at once.
+
+Classes:
+    TaskResult: The outcome and timing of a single task.
+    TaskGraph: A set of tasks and their dependencies that can be run concurrently.
+
+Functions:
+    current_task() -> str | None:
+        Get the name of the task running on the calling thread, if any.
+
+    set_task_kind(kind: str) -> None:
+        Reclassify the task running on the calling thread once it knows what work it is doing.
+
+    task_history() -> list[TaskResult]:
+        Get the results of every task run so far, including the ones in nested graphs.
+
+    run_parallel(tasks: Mapping[str, Callable[[], object]], max_workers: int = 8, kind: str | None = None) -> list[TaskResult]:
+        Run independent tasks concurrently and raise the first failure.
+
+    run_task(name: str, fn: Callable[[], object], kind: str | None = None) -> TaskResult:
+        Run a single task on the calling thread, timed and recorded like a task in a graph.
+"""
+
+import threading
+import time
+from collections.abc import Callable, Mapping
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import click
+
+_task_local = threading.local()
+_history: list["TaskResult"] = []
+_history_lock = threading.Lock()
+
+
+def current_task() -> str | None:
+    """
+    Get the name of the task running on the calling thread, if any.  Nested task
+    graphs (e.g. the per-node tasks inside a stage) are named parent/child.
+
+    Returns:
+        str | None: The task name, or None if not called from inside a task.
+    """
+    return getattr(_task_local, "name", None)
+
+
+def set_task_kind(kind: str) -> None:
+    """
+    Reclassify the task running on the calling thread, for tasks that only find out
+    what work they are doing once they run (e.g. a build that turns out to be cached).
+    Does nothing when not called from inside a task.
+
+    Args:
+        kind (str): The new kind of the task.
+    """
+    result = getattr(_task_local, "result", None)
+    if result is not None:
+        result.kind = kind
+
+
+def task_history() -> list["TaskResult"]:
+    """
+    Get the results of every task that has finished so far in this process, including
+    the per-node tasks of nested graphs, in the order they finished.  Used to record
+    how long each kind of task takes so that future runs can be planned.
+
+    Returns:
+        list[TaskResult]: The finished tasks.
+    """
+    with _history_lock:
+        return list(_history)
+
+
+def _execute(result: "TaskResult", fn: Callable[[], object], name: str, origin: float) -> None:
+    # Runs a task on the calling thread, making it the current task for the duration
+    # and recording its timing in the history
+    _task_local.name = name
+    _task_local.result = result
+    result.start = time.monotonic() - origin
+    click.secho(f"[{name}] started", fg="cyan")
+    try:
+        fn()
+    finally:
+        result.end = time.monotonic() - origin
+        _task_local.name = None
+        _task_local.result = None
+        with _history_lock:
+            _history.append(result)
+
+
+class TaskResult:
+    """
+    The outcome and timing of a single task.
+
+    Attributes:
+        name (str): The name of the task.
+        kind (str): What sort of work the task does (e.g. "sgw node"), used to
+            group the timings of similar tasks.  Defaults to the name.
+        deps (list[str]): The names of the tasks this task waited for.
+        start (float): The time the task started, relative to the start of the graph.
+        end (float): The time the task finished, relative to the start of the graph.
+        error (BaseException | None): The exception the task raised, if any.
+        skipped (bool): Whether the task was skipped because a dependency failed.
+    """
+
+    def __init__(self, name: str, deps: list[str], kind: str | None = None) -> None:
+        self.name = name
+        self.kind = kind or name
+        self.deps = deps
+        self.start = 0.0
+        self.end = 0.0
+        self.error: BaseException | None = None
+        self.skipped = False
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None and not self.skipped
+
+
+class TaskGraph:
+    """
+    A set of named tasks and their dependencies that can be run concurrently.
+
+    Usage:
+        graph = TaskGraph(max_workers=4)
+        graph.add("cbs", setup_cbs)
+        graph.add("sgw", setup_sgw, deps=["cbs"])
+        graph.add("logslurp", setup_logslurp)
+        graph.run()
+        graph.print_summary()
+    """
+
+    def __init__(self, max_workers: int = 8) -> None:
+        assert max_workers > 0, "max_workers must be positive"
+        self.__max_workers = max_workers
+        self.__tasks: dict[str, Callable[[], object]] = {}
+        self.__results: dict[str, TaskResult] = {}
+
+    @property
+    def names(self) -> list[str]:
+        """Gets the names of the tasks, in the order they were added"""
+        return list(self.__tasks)
+
+    @property
+    def results(self) -> list[TaskResult]:
+        """Gets the results of the tasks, in the order they were added"""
+        return list(self.__results.values())
+
+    def add(self, name: str, fn: Callable[[], object], deps: list[str] | None = None, kind: str | None = None) -> None:
+        """
+        Add a task to the graph.  Dependencies must already have been added, which
+        also guarantees that the graph has no cycles.
+
+        Args:
+            name (str): The unique name of the task.
+            fn (Callable[[], object]): The work to perform; anything it returns is ignored.
+            deps (list[str] | None): The names of the tasks that must finish first.
+            kind (str | None): What sort of work the task does, if not identified by its name.
+        """
+        assert name not in self.__tasks, f"Duplicate task '{name}'"
+        deps = deps or []
+        for dep in deps:
+            assert dep in self.__tasks, f"Task '{name}' depends on unknown task '{dep}'"
+
+        self.__tasks[name] = fn
+        self.__results[name] = TaskResult(name, deps, kind)
+
+    def run(self, raise_on_error: bool = True) -> list[TaskResult]:
+        """
+        Run every task, starting each one as soon as its dependencies have finished.
+        If a task fails, the tasks that depend on it (directly or not) are skipped
+        while unrelated tasks run to completion.
+
+        Args:
+            raise_on_error (bool): Whether to re-raise the first failure once all tasks are done.
+
+        Returns:
+            list[TaskResult]: The results of the tasks, in the order they were added.
+        """
+        parent = current_task()
+        origin = time.monotonic()
+        pending = dict(self.__results)
+        running: dict[Future, TaskResult] = {}
+        finished: set[str] = set()
+        failures: list[TaskResult] = []
+
+        def label(name: str) -> str:
+            return name if parent is None else f"{parent}/{name}"
+
+        def execute(result: TaskResult) -> None:
+            _execute(result, self.__tasks[result.name], label(result.name), origin)
+
+        with ThreadPoolExecutor(max_workers=self.__max_workers) as executor:
+            while pending or running:
+                for result in list(pending.values()):
+                    dep_results = [self.__results[d] for d in result.deps]
+                    if any(d.error is not None or d.skipped for d in dep_results):
+                        result.skipped = True
+                        del pending[result.name]
+                        click.secho(f"[{label(result.name)}] skipped because a dependency failed", fg="yellow")
+                    elif all(d.name in finished for d in dep_results):
+                        del pending[result.name]
+                        running[executor.submit(execute, result)] = result
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = running.pop(future)
+                    result.error = future.exception()
+                    finished.add(result.name)
+                    if result.error is not None:
+                        failures.append(result)
+                        click.secho(
+                            f"[{label(result.name)}] failed after {result.duration:.1f}s: {result.error}", fg="red"
+                        )
+                    else:
+                        click.secho(f"[{label(result.name)}] finished in {result.duration:.1f}s", fg="cyan")
+
+        if failures and raise_on_error:
+            error = failures[0].error
+            assert error is not None, "a failed task always has an error"
+            raise error
+
+        return self.results
+
+    def critical_path(self) -> list[TaskResult]:
+        """
+        Get the chain of tasks that determined the total run time: starting from the
+        task that finished last, repeatedly follow the dependency that finished last.
+
+        Returns:
+            list[TaskResult]: The tasks on the critical path, in execution order.
+        """
+        finished = [r for r in self.__results.values() if not r.skipped]
+        if not finished:
+            return []
+
+        path = [max(finished, key=lambda r: r.end)]
+        while path[-1].deps:
+            path.append(max((self.__results[d] for d in path[-1].deps), key=lambda r: r.end))
+
+        return list(reversed(path))
+
+    def print_summary(self) -> None:
+        """
+        Print the duration of every task and the critical path through the graph.
+        """
+        if not self.__results:
+            return
+
+        click.echo()
+        click.secho("=== Provisioning summary ===", fg="green")
+        click.echo()
+        width = max((len(name) for name in self.__results), default=0)
+        for result in sorted(self.__results.values(), key=lambda r: r.start):
+            if result.skipped:
+                status = click.style("skipped", fg="yellow")
+            elif result.error is not None:
+                status = click.style("failed", fg="red")
+            else:
+                status = click.style("ok", fg="green")
+
+            click.echo(
+                f"{result.name:<{width}}  {result.start:7.1f}s -> {result.end:7.1f}s  {result.duration:7.1f}s  {status}"
+            )
+
+        path = self.critical_path()
+        if path:
+            total = path[-1].end
+            serial = sum(r.duration for r in self.__results.values() if not r.skipped)
+            click.echo()
+            click.echo(f"Critical path ({total:.1f}s): {' -> '.join(f'{r.name} ({r.duration:.1f}s)' for r in path)}")
+            click.echo(f"Sum of task durations: {serial:.1f}s")
+
+
+def run_parallel(
+    tasks: Mapping[str, Callable[[], object]], max_workers: int = 8, kind: str | None = None
+) -> list[TaskResult]:
+    """
+    Run independent tasks concurrently, e.g. the per-node setup inside a provisioning
+    stage, and raise the first failure once every task has finished.
+
+    Args:
+        tasks (Mapping[str, Callable[[], object]]): The tasks to run, keyed by name.
+        max_workers (int): The maximum number of tasks to run at once.
+        kind (str | None): What sort of work the tasks do, if not identified by their names.
+
+    Returns:
+        list[TaskResult]: The results of the tasks.
+    """
+    graph = TaskGraph(max_workers)
+    for name, fn in tasks.items():
+        graph.add(name, fn, kind=kind)
+
+    return graph.run()
+
+
+def run_task(name: str, fn: Callable[[], object], kind: str | None = None) -> TaskResult:
+    """
+    Run a single task on the calling thread, e.g. the one node of a stage that must be
+    set up before the others.  It is timed and recorded in the task history (and can
+    reclassify itself with set_task_kind) just like a task run in a graph, without
+    needing a thread pool.
+
+    Args:
+        name (str): The name of the task.
+        fn (Callable[[], object]): The task to run.
+        kind (str | None): What sort of work the task does, if not identified by its name.
+
+    Returns:
+        TaskResult: The result of the task.
+
+    Raises:
+        BaseException: Whatever the task raised, after its result has been recorded.
+    """
+    parent = current_task()
+    parent_result = getattr(_task_local, "result", None)
+    result = TaskResult(name, [], kind)
+    label = name if parent is None else f"{parent}/{name}"
+    try:
+        _execute(result, fn, label, time.monotonic())
+    except BaseException as e:
+        result.error = e
+        click.secho(f"[{label}] failed after {result.duration:.1f}s: {e}", fg="red")
+        raise
+    finally:
+        # The task ran on the caller's thread, which may itself be a task
+        _task_local.name = parent
+        _task_local.result = parent_result
+
+    click.secho(f"[{label}] finished in {result.duration:.1f}s", fg="cyan")
+    return result
@@ -1,7 +1,11 @@
+import hashlib
 import json
 import subprocess
 from enum import Enum
-from typing import Any
+from pathlib import Path
+from typing import Any, Final
+
+_FINGERPRINT_FILE: Final[str] = ".terraform_fingerprint.json"
 
 
 class OutputType(Enum):
@@ -56,3 +60,109 @@ def get_terraform_json(directory: str, *, name: str | None = None) -> Any:
     """
     output_str = get_terraform_output(directory, name=name, type=OutputType.JSON)
     return json.loads(output_str)
+
+
+def _hash_files(hasher: Any, paths: list[Path]) -> None:
+    for path in paths:
+        hasher.update(f"{path.name}\0".encode())
+        hasher.update(path.read_bytes() if path.exists() else b"<missing>")
+        hasher.update(b"\0")
+
+
+def _config_fingerprint(directory: Path) -> str:
+    # The configuration and the provider lock file are what terraform init depends on
+    hasher = hashlib.sha256()
+    _hash_files(hasher, sorted(directory.glob("*.tf")) + [directory / ".terraform.lock.hcl"])
+    return hasher.hexdigest()
+
+
+def _apply_fingerprint(directory: Path, variables: dict[str, str]) -> str:
+    hasher = hashlib.sha256()
+    hasher.update(_config_fingerprint(directory).encode())
+    hasher.update(json.dumps(variables, sort_keys=True).encode())
+    _hash_files(hasher, [directory / "terraform.tfstate"])
+    return hasher.hexdigest()
+
+
+def _read_fingerprints(directory: Path) -> dict[str, str]:
+    try:
+        with open(directory / _FINGERPRINT_FILE) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _write_fingerprints(directory: Path, fingerprints: dict[str, str]) -> None:
+    with open(directory / _FINGERPRINT_FILE, "w") as f:
+        json.dump(fingerprints, f, indent=2)
+
+
+def terraform_init(directory: str) -> None:
+    """
+    Run terraform init, unless it has already been run for the current configuration
+    and provider lock file.
+
+    Args:
+        directory (str): The directory where the Terraform configuration is located.
+
+    Raises:
+        RuntimeError: If terraform init fails.
+    """
+    path = Path(directory)
+    fingerprints = _read_fingerprints(path)
+    config = _config_fingerprint(path)
+    if (path / ".terraform").is_dir() and fingerprints.get("init") == config:
+        return
+
+    result = subprocess.run(["terraform", "init"], capture_output=False, text=True, cwd=directory)
+    if result.returncode != 0:
+        raise RuntimeError(f"Command 'terraform init' failed with exit status {result.returncode}: {result.stderr}")
+
+    fingerprints["init"] = config
+    _write_fingerprints(path, fingerprints)
+
+
+def terraform_apply_needed(directory: str, variables: dict[str, str]) -> bool:
+    """
+    Check whether terraform apply has anything to do, i.e. whether the configuration,
+    the variables or the state have changed since the last successful apply.  Changes
+    made to the infrastructure outside of terraform are not detected.
+
+    Args:
+        directory (str): The directory where the Terraform configuration is located.
+        variables (dict[str, str]): The variables that would be passed to terraform apply.
+
+    Returns:
+        bool: True unless the last successful apply was for the same inputs and state.
+    """
+    path = Path(directory)
+    return _read_fingerprints(path).get("apply") != _apply_fingerprint(path, variables)
+
+
+def record_terraform_apply(directory: str, variables: dict[str, str]) -> None:
+    """
+    Record a successful terraform apply, so that an identical apply can be skipped.
+    Must be called after the apply, since the fingerprint includes the resulting state.
+
+    Args:
+        directory (str): The directory where the Terraform configuration is located.
+        variables (dict[str, str]): The variables that were passed to terraform apply.
+    """
+    path = Path(directory)
+    fingerprints = _read_fingerprints(path)
+    fingerprints["apply"] = _apply_fingerprint(path, variables)
+    _write_fingerprints(path, fingerprints)
+
+
+def forget_terraform_apply(directory: str) -> None:
+    """
+    Forget the last successful terraform apply, e.g. because the resources are being
+    destroyed, so that the next apply is not skipped.
+
+    Args:
+        directory (str): The directory where the Terraform configuration is located.
+    """
+    path = Path(directory)
+    fingerprints = _read_fingerprints(path)
+    if fingerprints.pop("apply", None) is not None:
+        _write_fingerprints(path, fingerprints)
@@ -0,0 +1,144 @@
+"""
+This module provides a local store of how long each kind of provisioning task has taken
+on previous runs (e.g. "sgw node", "prepare android (build)" or "terraform apply"), so
+that the cost of a topology can be estimated before it is brought up.
+
+The store is a JSON file that defaults to ~/.cache/cbl-tdk/timings.json and can be moved
+with the TDK_TIMINGS_STORE environment variable.  Only the most recent samples of each
+kind are kept, so estimates follow changes in the environment.
+
+Classes:
+    TimingStore: Historical durations of provisioning tasks, by kind.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import statistics
+from pathlib import Path
+from typing import Final
+from uuid import uuid4
+
+from environment.aws.common.task_graph import TaskResult
+
+_MAX_SAMPLES: Final[int] = 20
+
+
+class TimingStore:
+    """
+    Historical durations of provisioning tasks, by kind.
+
+    Usage:
+        store = TimingStore.load()
+        store.record_results(task_history())
+        store.save()
+        store.estimate("sgw node")  # median of the recorded samples, or None
+    """
+
+    @property
+    def path(self) -> Path:
+        """Gets the file the store is saved to"""
+        return self.__path
+
+    @property
+    def kinds(self) -> list[str]:
+        """Gets the kinds of task that have recorded samples"""
+        return sorted(self.__samples)
+
+    def __init__(self, path: Path, samples: dict[str, list[float]] | None = None) -> None:
+        self.__path = path
+        self.__samples = samples or {}
+
+    @staticmethod
+    def default_path() -> Path:
+        """
+        Get the location of the store shared by every script, configured by the
+        TDK_TIMINGS_STORE environment variable.
+
+        Returns:
+            Path: The store file.
+        """
+        path = os.environ.get("TDK_TIMINGS_STORE")
+        return Path(path) if path else Path.home() / ".cache" / "cbl-tdk" / "timings.json"
+
+    @staticmethod
+    def load(path: Path | None = None) -> TimingStore:
+        """
+        Load the store, starting an empty one if it does not exist or is unreadable.
+
+        Args:
+            path (Path | None): The store file, or None for the default.
+
+        Returns:
+            TimingStore: The store.
+        """
+        path = path or TimingStore.default_path()
+        try:
+            with open(path) as f:
+                raw = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return TimingStore(path)
+
+        samples = {kind: [float(d) for d in durations] for kind, durations in raw.get("samples", {}).items()}
+        return TimingStore(path, samples)
+
+    def record(self, kind: str, duration: float) -> None:
+        """
+        Record how long one task of a given kind took.
+
+        Args:
+            kind (str): The kind of task.
+            duration (float): The number of seconds it took.
+        """
+        samples = self.__samples.setdefault(kind, [])
+        samples.append(round(duration, 1))
+        del samples[:-_MAX_SAMPLES]
+
+    def record_results(self, results: list[TaskResult]) -> None:
+        """
+        Record the durations of the tasks that succeeded.  Failed and skipped tasks are
+        ignored, since their durations say nothing about a normal run.
+
+        Args:
+            results (list[TaskResult]): The finished tasks.
+        """
+        for result in results:
+            if result.succeeded:
+                self.record(result.kind, result.duration)
+
+    def estimate(self, kind: str) -> float | None:
+        """
+        Estimate how long a task of a given kind will take.
+
+        Args:
+            kind (str): The kind of task.
+
+        Returns:
+            float | None: The median of the recorded durations, or None if there are none.
+        """
+        samples = self.__samples.get(kind)
+        return statistics.median(samples) if samples else None
+
+    def sample_count(self, kind: str) -> int:
+        """
+        Get the number of recorded durations for a kind of task.
+
+        Args:
+            kind (str): The kind of task.
+
+        Returns:
+            int: The number of samples.
+        """
+        return len(self.__samples.get(kind, []))
+
+    def save(self) -> None:
+        """
+        Save the store, atomically replacing the previous contents.
+        """
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.__path.with_name(f".{self.__path.name}.{uuid4().hex}")
+        with open(tmp_path, "w") as f:
+            json.dump({"samples": self.__samples}, f, indent=2, sort_keys=True)
+
+        os.replace(tmp_path, self.__path)
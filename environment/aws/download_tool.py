@@ -9,7 +9,6 @@ from pathlib import Path
 from typing import Final
 
 import click
-import requests
 
 SCRIPT_DIR: Final[Path] = Path(__file__).parent.resolve()
 
@@ -19,8 +18,8 @@ if __name__ == "__main__":
 
     configure_terminal_encoding()
 
+from environment.aws.common.artifact_cache import ArtifactCache
 from environment.aws.common.io import (
-    download_progress_bar,
     untar_directory,
     unzip_directory,
 )
@@ -114,10 +113,7 @@ def download_cbbackupmgr(version: str) -> None:
 
     dest_dir.mkdir(parents=True, exist_ok=True)
     url = f"https://packages.couchbase.com/releases/{version}/couchbase-server-dev-tools-{version}-{os}_{arch}.{ext}"
-    download = requests.get(url, stream=True)
-    download.raise_for_status()
-    tmp_file = TMP_LOCATION / f"download.{ext}"
-    download_progress_bar(download, tmp_file)
+    tmp_file = ArtifactCache.default().materialize(url, TMP_LOCATION / f"download.{ext}")
     _extract(tmp_file)
     tmp_file.unlink()
     version_location.write_text(version)
@@ -23,24 +23,26 @@ Functions:
 """
 
 import json
-import os
 import sys
+from functools import partial
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from typing import Final, cast
 
 import click
 import paramiko
 import requests
 from cryptography.x509 import ExtendedKeyUsageOID
-from tqdm import tqdm
 
+from environment.aws.common.artifact_cache import ArtifactCache
 from environment.aws.common.io import LIGHT_GRAY, sftp_progress_bar
 from environment.aws.common.output import header
-from environment.aws.common.x509_certificate import create_cert
+from environment.aws.common.ssh import output_prefix, push_files, remote_exec_parallel, ssh_pool
+from environment.aws.common.task_graph import run_parallel, set_task_kind
+from environment.aws.common.x509_certificate import CertKeyPair, create_cert
 from environment.aws.topology_setup.setup_topology import TopologyConfig
 
 SCRIPT_DIR = Path(__file__).resolve().parent
-current_ssh = ""
 
 
 class EsDownloadInfo:
@@ -147,30 +149,13 @@ def download_es_package(download_info: EsDownloadInfo) -> None:
     if download_info.is_release:
         return
 
-    local_path = SCRIPT_DIR / download_info.local_filename
-
-    if not os.path.exists(local_path):
-        header(f"Downloading {download_info.url} to {download_info.local_filename}")
-        with requests.get(download_info.url, stream=True) as r:
-            r.raise_for_status()
-            with (
-                open(local_path, "wb") as f,
-                tqdm(
-                    desc=download_info.local_filename,
-                    total=int(r.headers.get("content-length", 0)),
-                    unit="iB",
-                    unit_scale=True,
-                    unit_divisor=1024,
-                ) as bar,
-            ):
-                for chunk in r.iter_content(chunk_size=8192):
-                    size = f.write(chunk)
-                    bar.update(size)
-    else:
-        click.secho(
-            f"File {download_info.local_filename} already exists, skipping download.",
-            fg="yellow",
-        )
+    # The artifact cache skips the download when any previous run on this machine
+    # already fetched the package, and copies it into place
+    cache = ArtifactCache.default()
+    if cache.lookup(download_info.url) is not None:
+        set_task_kind("es download (cached)")
+
+    cache.materialize(download_info.url, SCRIPT_DIR / download_info.local_filename)
 
 
 def remote_exec(ssh: paramiko.SSHClient, command: str, desc: str, fail_on_error: bool = True) -> None:
@@ -190,7 +175,7 @@ def remote_exec(ssh: paramiko.SSHClient, command: str, desc: str, fail_on_error:
 
     _, stdout, stderr = ssh.exec_command(command, get_pty=True)
     for line in iter(stdout.readline, ""):
-        click.secho(f"[{current_ssh}] {line}", fg=LIGHT_GRAY, nl=False)
+        click.secho(f"[{output_prefix(ssh)}] {line}", fg=LIGHT_GRAY, nl=False)
 
     exit_status = stdout.channel.recv_exit_status()
     if fail_on_error and exit_status != 0:
@@ -208,7 +193,30 @@ def remote_exec_bg(ssh: paramiko.SSHClient, command: str, desc: str) -> None:
     click.echo()
 
 
-def setup_server(hostname: str, pkey: paramiko.Ed25519Key, es_info: EsDownloadInfo) -> None:
+def write_client_certs(ca: CertKeyPair) -> None:
+    """
+    Create the client certificate for the test client and write it, along with the CA
+    that signs every Edge Server certificate, to ~/.cbl_certs.  This is done once for
+    the topology, before the nodes are set up, so the one client certificate is trusted
+    by every node.
+
+    Args:
+        ca (CertKeyPair): The CA that signs the Edge Server certificates.
+    """
+    client = create_cert("test-client", ca, usages=[ExtendedKeyUsageOID.CLIENT_AUTH])
+    CERT_DIR = Path.home() / ".cbl_certs"
+    CERT_DIR.mkdir(exist_ok=True)
+    with open(CERT_DIR / "client_cert.pem", "wb") as f:
+        f.write(client.pem_bytes())
+
+    with open(CERT_DIR / "client_key.pem", "wb") as f:
+        f.write(client.private_pem_bytes())
+
+    with open(CERT_DIR / "ca_cert.pem", "wb") as f:
+        f.write(ca.pem_bytes())
+
+
+def setup_server(hostname: str, pkey: paramiko.Ed25519Key, es_info: EsDownloadInfo, ca: CertKeyPair) -> None:
     """
     Set up an Edge Server on an EC2 instance.
 
@@ -216,25 +224,18 @@ def setup_server(hostname: str, pkey: paramiko.Ed25519Key, es_info: EsDownloadIn
         hostname (str): The hostname or IP address of the EC2 instance.
         pkey (paramiko.Ed25519Key): The private key for SSH access.
         es_info (EsDownloadInfo): The download information for Edge Server.
+        ca (CertKeyPair): The CA that signs the Edge Server certificate.
     """
     if es_info.is_release:
         click.echo(f"Setting up server {hostname} with ES {es_info.version}")
     else:
         click.echo(f"Setting up server {hostname} with ES {es_info.version}-{es_info.build_no}")
 
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(hostname, username="ec2-user", pkey=pkey)
+    ssh = ssh_pool.get(hostname, pkey)
 
-    global current_ssh
-    current_ssh = hostname
-    sftp = ssh.open_sftp()
-    sftp_progress_bar(sftp, SCRIPT_DIR / "configure-system.sh", "/tmp/configure-system.sh")
+    push_files(ssh, {"/tmp/configure-system.sh": SCRIPT_DIR / "configure-system.sh"})
     remote_exec(ssh, "bash /tmp/configure-system.sh", "Setting up instance")
 
-    for file in (SCRIPT_DIR / "shell2http").iterdir():
-        sftp_progress_bar(sftp, file, f"/home/ec2-user/shell2http/{file.name}")
-
     if es_info.is_release:
         remote_exec(
             ssh,
@@ -243,74 +244,56 @@ def setup_server(hostname: str, pkey: paramiko.Ed25519Key, es_info: EsDownloadIn
             fail_on_error=False,
         )
     else:
+        sftp = ssh.open_sftp()
         sftp_progress_bar(
             sftp,
             SCRIPT_DIR / es_info.local_filename,
             f"/tmp/{es_info.local_filename}",
         )
+        sftp.close()
 
-    sftp_progress_bar(sftp, SCRIPT_DIR / "Caddyfile", "/home/ec2-user/Caddyfile")
-    ca = create_cert("EdgeTestCA", is_ca=True)
     cert = create_cert(hostname, ca, usages=[ExtendedKeyUsageOID.SERVER_AUTH])
-    client = create_cert("test-client", ca, usages=[ExtendedKeyUsageOID.CLIENT_AUTH])
-    ca_cert = ca.pem_bytes()
-    cert_pem = cert.pem_bytes()
-    key_pem = cert.private_pem_bytes()
-    client_cert = client.pem_bytes()
-    client_key = client.private_pem_bytes()
-
-    with open("/tmp/es_key.pem", "wb") as f:
-        f.write(key_pem)
-
-    with open("/tmp/es_cert.pem", "wb") as f:
-        f.write(cert_pem)
-
-    with open("/tmp/ca_cert.pem", "wb") as f:
-        f.write(ca_cert)
 
-    CERT_DIR = Path.home() / ".cbl_certs"
-    CERT_DIR.mkdir(exist_ok=True)
-
-    client_cert_path = CERT_DIR / "client_cert.pem"
-    client_key_path = CERT_DIR / "client_key.pem"
-    ca_cert_path = CERT_DIR / "ca_cert.pem"
-
-    with open(client_cert_path, "wb") as f:
-        f.write(client_cert)
-
-    with open(client_key_path, "wb") as f:
-        f.write(client_key)
-
-    with open(ca_cert_path, "wb") as f:
-        f.write(ca_cert)
-
-    sftp_progress_bar(sftp, Path("/tmp/es_cert.pem"), "/home/ec2-user/cert/es_cert.pem")
-    sftp_progress_bar(sftp, Path("/tmp/es_key.pem"), "/home/ec2-user/cert/es_key.pem")
-    sftp_progress_bar(sftp, Path("/tmp/ca_cert.pem"), "/home/ec2-user/cert/ca_cert.pem")
-    sftp_progress_bar(
-        sftp,
-        SCRIPT_DIR / "config" / "config.json",
-        "/tmp/config.json",
-    )
-    aws_dir = SCRIPT_DIR.parent
-    sftp_progress_bar(
-        sftp,
-        aws_dir / "sgw_setup" / "cert" / "sg_cert.pem",
-        "/home/ec2-user/cert/sg_cert.pem",
+    # Nodes are set up concurrently, so each one stages its certs in its own directory
+    with TemporaryDirectory(prefix="es-cert-") as staging:
+        staging_dir = Path(staging)
+        with open(staging_dir / "es_key.pem", "wb") as f:
+            f.write(cert.private_pem_bytes())
+
+        with open(staging_dir / "es_cert.pem", "wb") as f:
+            f.write(cert.pem_bytes())
+
+        with open(staging_dir / "ca_cert.pem", "wb") as f:
+            f.write(ca.pem_bytes())
+
+        # All the small files go up in one stream, skipping any that are unchanged
+        aws_dir = SCRIPT_DIR.parent
+        database_dir = "/home/ec2-user/database"
+        files = {
+            "/home/ec2-user/Caddyfile": SCRIPT_DIR / "Caddyfile",
+            "/home/ec2-user/cert/es_cert.pem": staging_dir / "es_cert.pem",
+            "/home/ec2-user/cert/es_key.pem": staging_dir / "es_key.pem",
+            "/home/ec2-user/cert/ca_cert.pem": staging_dir / "ca_cert.pem",
+            "/home/ec2-user/cert/sg_cert.pem": aws_dir / "sgw_setup" / "cert" / "sg_cert.pem",
+            "/tmp/config.json": SCRIPT_DIR / "config" / "config.json",
+        }
+        for file in (SCRIPT_DIR / "shell2http").iterdir():
+            files[f"/home/ec2-user/shell2http/{file.name}"] = file
+
+        datasets = list((SCRIPT_DIR / "dataset").iterdir())
+        for file in datasets:
+            files[f"{database_dir}/{file.name}"] = file
+
+        push_files(ssh, files)
+
+    remote_exec_parallel(
+        ssh,
+        [
+            (f"unzip -o {database_dir}/{file.name} -d {database_dir}", f"Unzipping dataset {file.name}")
+            for file in datasets
+        ],
+        fail_on_error=False,
     )
-    database_dir = "/home/ec2-user/database"
-    for file in (SCRIPT_DIR / "dataset").iterdir():
-        sftp_progress_bar(sftp, file, f"{database_dir}/{file.name}")
-        remote_exec(
-            ssh,
-            f"unzip -o {database_dir}/{file.name} -d {database_dir}",
-            f"Unzipping dataset {file.name}",
-            fail_on_error=False,
-        )
-
-    Path("/tmp/es_key.pem").unlink()
-    Path("/tmp/es_cert.pem").unlink()
-    sftp.close()
 
     remote_exec(
         ssh,
@@ -343,20 +326,40 @@ def setup_server(hostname: str, pkey: paramiko.Ed25519Key, es_info: EsDownloadIn
         "Starting ES",
     )
 
-    ssh.close()
 
-
-def main(topology: TopologyConfig) -> None:
+def main(topology: TopologyConfig, max_workers: int = 8) -> None:
     """
-    Set up the Sync Gateway topology on EC2 instances.
+    Set up the Edge Server topology on EC2 instances.  The packages are downloaded
+    concurrently, once per version, and the nodes are then set up concurrently.
 
     Args:
         topology (TopologyConfig): The topology configuration.
+        max_workers (int): The maximum number of nodes to set up at once.
     """
     if len(topology.edge_servers) == 0:
         return
 
-    for es in topology.edge_servers:
-        es_info = EsDownloadInfo(es.version)
-        download_es_package(es_info)
-        setup_server(es.hostname, topology.ssh_key, es_info)
+    versions = dict.fromkeys(es.version for es in topology.edge_servers)
+    es_infos = {version: EsDownloadInfo(version) for version in versions}
+    run_parallel(
+        {
+            f"download {info.version}": partial(download_es_package, info)
+            for info in es_infos.values()
+            if not info.is_release
+        },
+        max_workers,
+        kind="es download",
+    )
+
+    # One CA and client certificate for the whole topology, so that the client
+    # certificate written locally works against every node
+    ca = create_cert("EdgeTestCA", is_ca=True)
+    write_client_certs(ca)
+    run_parallel(
+        {
+            es.hostname: partial(setup_server, es.hostname, topology.ssh_key, es_infos[es.version], ca)
+            for es in topology.edge_servers
+        },
+        max_workers,
+        kind="es node",
+    )
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+
+"""
+This module is a dry run of start_backend.py.  It resolves everything start_backend.py would
+do for a topology (whether the backend can be reused, which nodes need to be installed, which
+packages are already in the artifact cache and which test servers need to be built) and
+estimates how long the run will take from the durations of previous runs, without touching
+AWS or any device.
+
+Durations come from the timing store (see common/timings.py) that start_backend.py records
+into after every run; kinds of task that have never run on this machine fall back to rough
+defaults.  The estimate follows the same structure as the real run: terraform first, then
+the stages concurrently (Sync Gateway after Couchbase Server), each setting up its nodes at
+most --max-parallel at a time.
+
+Classes:
+    PlannedTask: A single task the run would perform, with its estimated duration.
+    PlannedStage: A stage of the run and the tasks inside it.
+    BackendPlan: The estimated schedule of a run.
+
+Functions:
+    plan_backend(topology: TopologyConfig, timings: TimingStore, max_parallel: int = 8, reuse: bool = False) -> BackendPlan:
+        Resolve the provisioning graph of a topology and estimate its duration.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import sys
+from pathlib import Path
+from typing import Any, Final
+
+import click
+import requests
+
+SCRIPT_DIR = Path(__file__).parent
+if __name__ == "__main__":
+    sys.path.append(str(SCRIPT_DIR.parents[1]))
+    from environment.aws.common.io import configure_terminal_encoding
+
+    configure_terminal_encoding()
+
+from environment.aws.common.artifact_cache import ArtifactCache
+from environment.aws.common.output import header
+from environment.aws.common.terraform import terraform_apply_needed
+from environment.aws.common.timings import TimingStore
+from environment.aws.es_setup.setup_edge_servers import EsDownloadInfo
+from environment.aws.sgw_setup.setup_sgw import SgwDownloadInfo
+from environment.aws.start_backend import TopologyParamType, terraform_variables, topology_has_aws_resources
+from environment.aws.topology_setup.backend_manifest import BackendManifest
+from environment.aws.topology_setup.setup_topology import TopologyConfig
+from environment.aws.topology_setup.test_server import LATESTBUILDS_URL, TestServer
+
+# Rough durations (in seconds) for kinds of task that have no recorded history yet
+_DEFAULT_ESTIMATES: Final[dict[str, float]] = {
+    "terraform apply": 180.0,
+    "terraform apply (unchanged)": 5.0,
+    "backend reuse": 30.0,
+    "cbs node": 240.0,
+    "cbs join node": 300.0,
+    "sgw download": 60.0,
+    "sgw download (cached)": 2.0,
+    "sgw node": 150.0,
+    "es download": 60.0,
+    "es download (cached)": 2.0,
+    "es node": 150.0,
+    "lb": 120.0,
+    "logslurp": 120.0,
+}
+_DEFAULT_BUILD: Final[float] = 900.0
+_DEFAULT_CACHED_BUILD: Final[float] = 60.0
+_DEFAULT_DOWNLOAD: Final[float] = 60.0
+_DEFAULT_LAUNCH: Final[float] = 90.0
+
+# A single task taking at least this share of the total is worth calling out
+_SERIAL_WARNING_SHARE: Final[float] = 0.5
+
+
+def _default_estimate(kind: str) -> float:
+    if kind in _DEFAULT_ESTIMATES:
+        return _DEFAULT_ESTIMATES[kind]
+
+    if kind.startswith("build ") and kind.endswith(" (cached)"):
+        return _DEFAULT_CACHED_BUILD
+
+    if kind.startswith("build "):
+        return _DEFAULT_BUILD
+
+    if kind.startswith("download "):
+        return _DEFAULT_DOWNLOAD
+
+    return _DEFAULT_LAUNCH
+
+
+class PlannedTask:
+    """
+    A single task the run would perform, with its estimated duration.
+
+    Attributes:
+        name (str): The name of the task, as start_backend.py would print it.
+        kind (str): The kind of task, used to look up its history.
+        estimate (float): The estimated number of seconds the task takes.
+        samples (int): The number of previous runs the estimate is based on (0 for a default).
+        note (str): What the planner found out about the task (e.g. "cached locally").
+        deps (list[str]): The names of the tasks in the same stage that must finish first.
+    """
+
+    def __init__(
+        self, name: str, kind: str, timings: TimingStore, note: str = "", deps: list[str] | None = None
+    ) -> None:
+        self.name = name
+        self.kind = kind
+        self.samples = timings.sample_count(kind)
+        estimate = timings.estimate(kind)
+        self.estimate = estimate if estimate is not None else _default_estimate(kind)
+        self.note = note
+        self.deps = deps or []
+
+
+class PlannedStage:
+    """
+    A stage of the run and the tasks inside it.
+
+    Attributes:
+        name (str): The name of the stage.
+        tasks (list[PlannedTask]): The tasks in the stage.
+        duration (float): The estimated number of seconds the stage takes.
+        deps (list[str]): The names of the stages that must finish first.
+        start (float): The estimated start time, relative to the start of the run.
+        critical (list[PlannedTask]): The chain of tasks that determines the duration of the stage.
+    """
+
+    def __init__(
+        self, name: str, tasks: list[PlannedTask], duration: float, critical: list[PlannedTask], deps: list[str]
+    ) -> None:
+        self.name = name
+        self.tasks = tasks
+        self.duration = duration
+        self.critical = critical
+        self.deps = deps
+        self.start = 0.0
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+
+class BackendPlan:
+    """
+    The estimated schedule of a run of start_backend.py.
+
+    Attributes:
+        stages (list[PlannedStage]): The stages of the run, in the order they start.
+        reused (bool): Whether the existing backend would be reused.
+        warnings (list[str]): The problems found with the topology (e.g. slow serial steps).
+    """
+
+    def __init__(self, stages: list[PlannedStage], reused: bool) -> None:
+        self.stages = stages
+        self.reused = reused
+        self.warnings: list[str] = []
+
+    @property
+    def total(self) -> float:
+        """Gets the estimated wall clock duration of the run"""
+        return max((s.end for s in self.stages), default=0.0)
+
+    def critical_path(self) -> list[PlannedStage]:
+        """
+        Get the chain of stages that determines the total duration: starting from the stage
+        that finishes last, repeatedly follow the dependency that finishes last.
+
+        Returns:
+            list[PlannedStage]: The stages on the critical path, in execution order.
+        """
+        if not self.stages:
+            return []
+
+        by_name = {s.name: s for s in self.stages}
+        path = [max(self.stages, key=lambda s: s.end)]
+        while path[-1].deps:
+            path.append(max((by_name[d] for d in path[-1].deps), key=lambda s: s.end))
+
+        return list(reversed(path))
+
+    def to_json(self) -> dict[str, Any]:
+        """
+        Describe the plan in a JSON serializable form, e.g. for sizing CI slots.
+
+        Returns:
+            dict[str, Any]: The plan.
+        """
+        return {
+            "total": round(self.total, 1),
+            "reused": self.reused,
+            "critical_path": [s.name for s in self.critical_path()],
+            "stages": [
+                {
+                    "name": s.name,
+                    "start": round(s.start, 1),
+                    "duration": round(s.duration, 1),
+                    "tasks": [
+                        {
+                            "name": t.name,
+                            "kind": t.kind,
+                            "estimate": round(t.estimate, 1),
+                            "samples": t.samples,
+                            "note": t.note,
+                        }
+                        for t in s.tasks
+                    ],
+                }
+                for s in self.stages
+            ],
+            "warnings": self.warnings,
+        }
+
+
+def _makespan(durations: list[float], workers: int) -> float:
+    # Tasks are started in order as workers free up, which is what a thread pool does
+    finish_times = [0.0] * min(workers, max(len(durations), 1))
+    for duration in durations:
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + duration)
+
+    return max(finish_times)
+
+
+def _longest(tasks: list[PlannedTask]) -> list[PlannedTask]:
+    return [max(tasks, key=lambda t: t.estimate)] if tasks else []
+
+
+def _download_note(url: str) -> tuple[str, bool]:
+    cached = ArtifactCache.default().lookup(url) is not None
+    return ("cached locally", True) if cached else ("download needed", False)
+
+
+def _plan_cbs(topology: TopologyConfig, timings: TimingStore, max_parallel: int) -> PlannedStage:
+    tasks: list[PlannedTask] = []
+    cluster_durations: list[float] = []
+    critical: list[PlannedTask] = []
+    longest = -1.0
+    for index, cluster in enumerate(topology.backend_spec()["clusters"]):
+        first = PlannedTask(f"cluster{index} node 0", "cbs node", timings, f"install {cluster['version']}")
+        joiners = [
+            PlannedTask(f"cluster{index} node {n}", "cbs join node", timings, f"install {cluster['version']}")
+            for n in range(1, cluster["nodes"])
+        ]
+        tasks += [first, *joiners]
+        duration = first.estimate + _makespan([t.estimate for t in joiners], max_parallel)
+        cluster_durations.append(duration)
+        if duration > longest:
+            longest = duration
+            critical = [first, *_longest(joiners)]
+
+    return PlannedStage("cbs", tasks, _makespan(cluster_durations, max_parallel), critical, [])
+
+
+def _plan_downloads(
+    product: str, versions: list[str], timings: TimingStore, max_parallel: int
+) -> tuple[list[PlannedTask], float]:
+    tasks: list[PlannedTask] = []
+    for version in dict.fromkeys(versions):
+        try:
+            info = SgwDownloadInfo(version) if product == "sgw" else EsDownloadInfo(version)
+        except (requests.RequestException, ValueError) as e:
+            tasks.append(
+                PlannedTask(f"download {version}", f"{product} download", timings, f"unresolved ({type(e).__name__})")
+            )
+            continue
+
+        if info.is_release:
+            # Release packages are fetched by the nodes themselves
+            continue
+
+        note, cached = _download_note(info.url)
+        kind = f"{product} download (cached)" if cached else f"{product} download"
+        tasks.append(PlannedTask(f"download {info.version}-{info.build_no}", kind, timings, note))
+
+    return tasks, _makespan([t.estimate for t in tasks], max_parallel) if tasks else 0.0
+
+
+def _plan_nodes(
+    name: str, versions: list[str], timings: TimingStore, max_parallel: int, deps: list[str]
+) -> PlannedStage:
+    downloads, download_duration = _plan_downloads(name, versions, timings, max_parallel)
+    nodes = [
+        PlannedTask(f"{name}{index}", f"{name} node", timings, f"install {version}")
+        for index, version in enumerate(versions)
+    ]
+    duration = download_duration + _makespan([t.estimate for t in nodes], max_parallel)
+    return PlannedStage(name, downloads + nodes, duration, _longest(downloads) + _longest(nodes), deps)
+
+
+def _plan_test_servers(topology: TopologyConfig, timings: TimingStore, max_parallel: int) -> PlannedStage:
+    # Mirrors TopologyConfig.run_test_servers: one prepare task per distinct package, with
+    # builds for the same platform one after the other, then a launch per location
+    tasks: dict[str, PlannedTask] = {}
+    last_build: dict[str, str] = {}
+    for test_server_input in topology.test_server_inputs:
+        platform = test_server_input.platform
+        prepare_name = f"prepare {platform} {test_server_input.cbl_version}"
+        if test_server_input.download:
+            prepare_name += " (download)"
+
+        if prepare_name not in tasks:
+            deps: list[str] = []
+            note = ""
+            try:
+                test_server = TestServer.create(platform, test_server_input.cbl_version)
+            except (requests.RequestException, ValueError) as e:
+                test_server = None
+                note = f"unresolved ({type(e).__name__})"
+
+            if test_server_input.download:
+                kind = f"download {platform}"
+                if test_server is not None:
+                    note, _ = _download_note(f"{LATESTBUILDS_URL}/{test_server.latestbuilds_path}")
+            else:
+                kind = f"build {platform}"
+                if test_server is not None:
+                    location = test_server.cached_build_location()
+                    if location is not None:
+                        kind += " (cached)"
+                        note = f"build cache hit ({location})"
+                    else:
+                        note = "build needed"
+
+                if platform in last_build:
+                    deps.append(last_build[platform])
+
+                last_build[platform] = prepare_name
+
+            tasks[prepare_name] = PlannedTask(prepare_name, kind, timings, note, deps)
+
+        name = f"{platform} @ {test_server_input.location}"
+        tasks[name] = PlannedTask(name, f"launch {platform}", timings, "install and launch", [prepare_name])
+
+    # Longest path through the tasks, which were added after their dependencies
+    finish: dict[str, float] = {}
+    via: dict[str, str | None] = {}
+    for task in tasks.values():
+        dep = max(task.deps, key=lambda d: finish[d], default=None)
+        finish[task.name] = (finish[dep] if dep is not None else 0.0) + task.estimate
+        via[task.name] = dep
+
+    critical: list[PlannedTask] = []
+    last = max(finish, key=lambda n: finish[n], default=None)
+    while last is not None:
+        critical.insert(0, tasks[last])
+        last = via[last]
+
+    # The graph runs at most max_parallel tasks at once, so a wide topology can't
+    # finish faster than its total work spread over the workers
+    work = _makespan([t.estimate for t in tasks.values()], max_parallel) if tasks else 0.0
+    duration = max(finish.values(), default=0.0)
+    return PlannedStage("test_servers", list(tasks.values()), max(duration, work), critical, [])
+
+
+def plan_backend(
+    topology: TopologyConfig, timings: TimingStore, max_parallel: int = 8, reuse: bool = False
+) -> BackendPlan:
+    """
+    Resolve everything start_backend.py would do for a topology and estimate how long it
+    would take.  Nothing is provisioned, downloaded or built; the only network access is
+    resolving versions and checking the remote build cache.
+
+    Args:
+        topology (TopologyConfig): The topology to plan.
+        timings (TimingStore): The durations of previous runs.
+        max_parallel (int): The --max-parallel that start_backend.py would be run with.
+        reuse (bool): Whether start_backend.py would be run with --reuse.
+
+    Returns:
+        BackendPlan: The estimated schedule.
+    """
+    spec = topology.backend_spec()
+    has_aws = topology_has_aws_resources(topology)
+    manifest = BackendManifest.load() if reuse and has_aws else None
+    reused = manifest is not None and manifest.spec == spec
+
+    stages: list[PlannedStage] = []
+    if reused:
+        task = PlannedTask("backend reuse", "backend reuse", timings, "health check and reset, no nodes reinstalled")
+        stages.append(PlannedStage("backend reuse", [task], task.estimate, [task], []))
+    elif has_aws:
+        if terraform_apply_needed(str(SCRIPT_DIR), terraform_variables(topology)):
+            kind = "terraform apply"
+            note = "backend was provisioned for a different topology" if reuse and manifest is not None else ""
+        else:
+            kind = "terraform apply (unchanged)"
+            note = "inputs and state unchanged, outputs read from state"
+
+        task = PlannedTask("terraform apply", kind, timings, note)
+        stages.append(PlannedStage("terraform apply", [task], task.estimate, [task], []))
+
+        if spec["clusters"]:
+            stages.append(_plan_cbs(topology, timings, max_parallel))
+
+        if spec["sync_gateways"]:
+            versions = [s["version"] for s in spec["sync_gateways"]]
+            stages.append(_plan_nodes("sgw", versions, timings, max_parallel, ["cbs"] if spec["clusters"] else []))
+
+        if spec["edge_servers"]:
+            stages.append(_plan_nodes("es", [e["version"] for e in spec["edge_servers"]], timings, max_parallel, []))
+
+        if spec["load_balancers"]:
+            task = PlannedTask("lb", "lb", timings, f"{len(spec['load_balancers'])} load balancer(s)")
+            stages.append(PlannedStage("lb", [task], task.estimate, [task], []))
+
+        if spec["logslurp"]:
+            task = PlannedTask("logslurp", "logslurp", timings)
+            stages.append(PlannedStage("logslurp", [task], task.estimate, [task], []))
+
+    if topology.test_server_inputs:
+        stages.append(_plan_test_servers(topology, timings, max_parallel))
+
+    # Everything starts once terraform (or the reuse check) is done, except that Sync
+    # Gateway also waits for Couchbase Server
+    by_name: dict[str, PlannedStage] = {}
+    for stage in stages:
+        if by_name and stages[0].name in ("terraform apply", "backend reuse"):
+            stage.deps.insert(0, stages[0].name)
+
+        stage.start = max((by_name[d].end for d in stage.deps), default=0.0)
+        by_name[stage.name] = stage
+
+    plan = BackendPlan(stages, reused)
+    _add_warnings(plan, max_parallel)
+    return plan
+
+
+def _add_warnings(plan: BackendPlan, max_parallel: int) -> None:
+    total = plan.total
+    if total <= 0:
+        return
+
+    for stage in plan.critical_path():
+        for task in stage.critical:
+            if task.estimate >= total * _SERIAL_WARNING_SHARE:
+                plan.warnings.append(
+                    f"The run serializes on '{task.name}' ({task.estimate:.0f}s of {total:.0f}s), "
+                    "nothing else can shorten it"
+                )
+
+    for stage in plan.stages:
+        for task in (t for t in stage.tasks if t.kind.startswith("build ") and t.deps):
+            plan.warnings.append(
+                f"'{task.name}' waits for '{task.deps[0]}', since builds for the same platform share an output directory"
+            )
+
+        nodes = [t for t in stage.tasks if t.kind.endswith(" node")]
+        if len(nodes) > max_parallel:
+            plan.warnings.append(
+                f"{stage.name} has {len(nodes)} nodes but --max-parallel is {max_parallel}, "
+                f"so they are set up in {-(-len(nodes) // max_parallel)} waves"
+            )
+
+    defaults = sorted({t.kind for s in plan.stages for t in s.tasks if t.samples == 0})
+    if defaults:
+        plan.warnings.append(f"No history for {', '.join(defaults)}; default estimates used")
+
+
+def print_plan(plan: BackendPlan) -> None:
+    """
+    Print the estimated schedule, the critical path and any warnings.
+
+    Args:
+        plan (BackendPlan): The plan to print.
+    """
+    header("Provisioning plan")
+    if plan.reused:
+        click.secho("The existing backend matches this topology and would be reused (if healthy)", fg="green")
+
+    width = max((len(t.name) for s in plan.stages for t in s.tasks), default=0)
+    for stage in plan.stages:
+        click.secho(f"{stage.name}: {stage.start:7.0f}s -> {stage.end:7.0f}s  ({stage.duration:.0f}s)", fg="cyan")
+        for task in stage.tasks:
+            source = f"median of {task.samples}" if task.samples else "default"
+            click.echo(f"  {task.name:<{width}}  {task.estimate:7.0f}s  {source:<14}  {task.note}")
+
+    click.echo()
+    path = plan.critical_path()
+    steps = [f"{t.name} ({t.estimate:.0f}s)" for s in path for t in s.critical]
+    click.echo(f"Critical path: {' -> '.join(steps)}")
+    click.secho(f"Estimated wall clock time: {plan.total / 60:.1f} minutes", fg="green")
+    for warning in plan.warnings:
+        click.secho(f"WARNING: {warning}", fg="yellow")
+
+
+@click.command()
+@click.option(
+    "--topology",
+    help="The path to the topology configuration file",
+    default=TopologyConfig(),
+    type=TopologyParamType(),
+)
+@click.option(
+    "--max-parallel",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="The --max-parallel that start_backend.py will be run with",
+    envvar="TDK_MAX_PARALLEL",
+)
+@click.option(
+    "--reuse",
+    type=bool,
+    is_flag=True,
+    help="Plan for start_backend.py --reuse",
+    envvar="TDK_REUSE_BACKEND",
+)
+@click.option(
+    "--json-out",
+    help="The path to also write the plan to as JSON (e.g. for sizing CI slots)",
+    type=click.Path(writable=True, path_type=Path),
+)
+def cli_entry(topology: TopologyConfig, max_parallel: int, reuse: bool, json_out: Path | None) -> None:
+    plan = plan_backend(topology, TimingStore.load(), max_parallel, reuse)
+    print_plan(plan)
+    if json_out is not None:
+        with open(json_out, "w") as fout:
+            json.dump(plan.to_json(), fout, indent=2)
+
+
+if __name__ == "__main__":
+    cli_entry()
@@ -52,6 +52,18 @@ couchbase_cli_check() {
   }
 }
 
+# Nodes joining the same cluster are provisioned concurrently, and a node cannot be
+# added or rebalanced in while another rebalance is running, so retry those steps
+couchbase_cli_retry() {
+  for attempt in $(seq 1 30); do
+    couchbase-cli $* && return
+    echo "couchbase-cli command failed (attempt $attempt), retrying in 10 seconds..."
+    sleep 10
+  done
+  echo Previous couchbase-cli command kept failing
+  panic
+}
+
 curl_check() {
   status=$(curl -sS -w "%{http_code}" -o /tmp/curl.txt $*)
   cat /tmp/curl.txt
@@ -70,11 +82,11 @@ my_ip=$(ifconfig | grep "inet 10" | awk '{print $2}')
 
 if [[ ! -z $E2E_PARENT_CLUSTER ]]; then
   echo "Adding node to cluster $E2E_PARENT_CLUSTER with private IP $my_ip"
-  couchbase_cli_check server-add -c $E2E_PARENT_CLUSTER -u Administrator -p password --server-add $my_ip \
+  couchbase_cli_retry server-add -c $E2E_PARENT_CLUSTER -u Administrator -p password --server-add $my_ip \
     --server-add-username Administrator --server-add-password password --services data,index,query
   echo
   echo "Rebalancing cluster"
-  couchbase_cli_check rebalance -c $E2E_PARENT_CLUSTER -u Administrator -p password
+  couchbase_cli_retry rebalance -c $E2E_PARENT_CLUSTER -u Administrator -p password
   echo
 else
   echo "Set up the cluster"
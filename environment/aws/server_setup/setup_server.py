@@ -13,6 +13,7 @@ Functions:
         Main function to set up the Couchbase Server topology.
 """
 
+from functools import partial
 from pathlib import Path
 
 import click
@@ -22,13 +23,13 @@ from environment.aws.common.docker import start_container
 from environment.aws.common.io import (
     get_ec2_hostname,
     realtime_output,
-    sftp_progress_bar,
 )
 from environment.aws.common.output import header
-from environment.aws.topology_setup.setup_topology import TopologyConfig
+from environment.aws.common.ssh import push_directory, push_files, remote_exec_parallel, ssh_pool
+from environment.aws.common.task_graph import run_parallel, run_task
+from environment.aws.topology_setup.setup_topology import ClusterConfig, TopologyConfig
 
 SCRIPT_DIR = Path(__file__).resolve().parent
-current_ssh = ""
 
 
 def remote_exec(ssh: paramiko.SSHClient, command: str, desc: str, fail_on_error: bool = True) -> None:
@@ -89,17 +90,15 @@ def setup_node(
         cluster (Optional[str]): The cluster to join, if any.
     """
     header(f"Setting up server {hostname} with version {version}")
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(hostname, username="ec2-user", pkey=pkey)
-
-    sftp = ssh.open_sftp()
-    sftp_progress_bar(sftp, SCRIPT_DIR / "configure-node.sh", "/tmp/configure-node.sh")
-    sftp_progress_bar(sftp, SCRIPT_DIR / "configure-system.sh", "/tmp/configure-system.sh")
-    sftp_progress_bar(sftp, SCRIPT_DIR / "Caddyfile", "/home/ec2-user/Caddyfile")
-
-    global current_ssh
-    current_ssh = hostname
+    ssh = ssh_pool.get(hostname, pkey)
+    push_files(
+        ssh,
+        {
+            "/tmp/configure-node.sh": SCRIPT_DIR / "configure-node.sh",
+            "/tmp/configure-system.sh": SCRIPT_DIR / "configure-system.sh",
+            "/home/ec2-user/Caddyfile": SCRIPT_DIR / "Caddyfile",
+        },
+    )
 
     remote_exec(
         ssh,
@@ -108,21 +107,16 @@ def setup_node(
     )
 
     # Upload shell2http scripts (directory created by configure-system.sh)
-    shell2http_dir = SCRIPT_DIR / "shell2http"
-    for file in shell2http_dir.iterdir():
-        sftp_progress_bar(sftp, file, f"/home/ec2-user/shell2http/{file.name}")
-    sftp.close()
+    push_directory(ssh, SCRIPT_DIR / "shell2http", "/home/ec2-user/shell2http")
 
-    # Make shell2http scripts executable
-    remote_exec(
+    remote_exec_parallel(
         ssh,
-        "chmod +x /home/ec2-user/shell2http/*.sh",
-        "Making shell2http scripts executable",
+        [
+            ("chmod +x /home/ec2-user/shell2http/*.sh", "Making shell2http scripts executable"),
+            ("/home/ec2-user/caddy start", "Starting CBS log fileserver"),
+        ],
     )
-
-    remote_exec(ssh, "/home/ec2-user/caddy start", "Starting CBS log fileserver")
     remote_exec_bg(ssh, "bash /home/ec2-user/shell2http/start.sh", "Starting CBS management server")
-    ssh.close()
 
     ec2_hostname = get_ec2_hostname(hostname)
     docker_args = [
@@ -153,26 +147,42 @@ def setup_node(
     )
 
 
-def main(topology: TopologyConfig) -> None:
+def main(topology: TopologyConfig, max_workers: int = 8) -> None:
     """
-    Set up the Couchbase Server topology on EC2 instances.
+    Set up the Couchbase Server topology on EC2 instances.  Clusters are set up
+    concurrently; within a cluster the first node is set up before the others, which
+    join it, are set up concurrently.
 
     Args:
         topology (TopologyConfig): The topology configuration.
+        max_workers (int): The maximum number of nodes to set up at once.
     """
 
     if len(topology.clusters) == 0:
         return
-    for cluster_config in topology.clusters:
-        setup_node(
-            cluster_config.public_hostnames[0],
-            topology.ssh_key,
-            cluster_config.version,
+
+    def setup_cluster(cluster_config: ClusterConfig) -> None:
+        primary = cluster_config.public_hostnames[0]
+        run_task(primary, partial(setup_node, primary, topology.ssh_key, cluster_config.version), kind="cbs node")
+        run_parallel(
+            {
+                server: partial(
+                    setup_node,
+                    server,
+                    topology.ssh_key,
+                    cluster_config.version,
+                    primary,  # Use public hostname for external access
+                )
+                for server in cluster_config.public_hostnames[1:]
+            },
+            max_workers,
+            kind="cbs join node",
         )
-        for server in cluster_config.public_hostnames[1:]:
-            setup_node(
-                server,
-                topology.ssh_key,
-                cluster_config.version,
-                cluster_config.public_hostnames[0],  # Use public hostname for external access
-            )
+
+    run_parallel(
+        {
+            f"cluster{idx}": partial(setup_cluster, cluster_config)
+            for idx, cluster_config in enumerate(topology.clusters)
+        },
+        max_workers,
+    )
@@ -29,20 +29,23 @@ import copy
 import json
 import os
 import sys
+from functools import partial
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from typing import Final, cast
 
 import click
 import paramiko
 import requests
-from tqdm import tqdm
 
+from environment.aws.common.artifact_cache import ArtifactCache
 from environment.aws.common.io import LIGHT_GRAY, sftp_progress_bar
 from environment.aws.common.output import header
+from environment.aws.common.ssh import output_prefix, push_files, remote_exec_parallel, ssh_pool
+from environment.aws.common.task_graph import run_parallel, set_task_kind
 from environment.aws.topology_setup.setup_topology import TopologyConfig
 
 SCRIPT_DIR = Path(__file__).resolve().parent
-current_ssh = ""
 
 
 class SgwDownloadInfo:
@@ -149,38 +152,22 @@ def download_sgw_package(download_info: SgwDownloadInfo) -> None:
     if download_info.is_release:
         return
 
-    local_path = SCRIPT_DIR / download_info.local_filename
-
-    if not os.path.exists(local_path):
-        header(f"Downloading {download_info.url} to {download_info.local_filename}")
-        with requests.get(download_info.url, stream=True) as r:
-            r.raise_for_status()
-            with (
-                open(local_path, "wb") as f,
-                tqdm(
-                    desc=download_info.local_filename,
-                    total=int(r.headers.get("content-length", 0)),
-                    unit="iB",
-                    unit_scale=True,
-                    unit_divisor=1024,
-                ) as bar,
-            ):
-                for chunk in r.iter_content(chunk_size=8192):
-                    size = f.write(chunk)
-                    bar.update(size)
-    else:
-        click.secho(
-            f"File {download_info.local_filename} already exists, skipping download.",
-            fg="yellow",
-        )
+    # The artifact cache skips the download when any previous run on this machine
+    # already fetched the package, and copies it into place
+    cache = ArtifactCache.default()
+    if cache.lookup(download_info.url) is not None:
+        set_task_kind("sgw download (cached)")
 
+    cache.materialize(download_info.url, SCRIPT_DIR / download_info.local_filename)
 
-def setup_config(server_hostname: str) -> None:
+
+def setup_config(server_hostname: str, output_dir: Path = SCRIPT_DIR) -> None:
     """
     Write the server hostname to the bootstrap configuration files.
 
     Args:
         server_hostname (str): The hostname of the Couchbase Server.
+        output_dir (Path): The directory to write the generated files to.
     """
     header(f"Writing {server_hostname} to bootstrap configs as CBS IP")
 
@@ -191,13 +178,13 @@ def setup_config(server_hostname: str) -> None:
     # 1. Default bootstrap.json
     default_config = copy.deepcopy(base_config)
     default_config["bootstrap"]["server"] = f"couchbases://{server_hostname}"
-    with open(SCRIPT_DIR / "bootstrap.json", "w") as fout:
+    with open(output_dir / "bootstrap.json", "w") as fout:
         json.dump(default_config, fout, indent=4)
 
     # 2. bootstrap-alternate.json (with explicit port for alternate address testing)
     alternate_config = copy.deepcopy(base_config)
     alternate_config["bootstrap"]["server"] = f"couchbases://{server_hostname}:11207"
-    with open(SCRIPT_DIR / "bootstrap-alternate.json", "w") as fout:
+    with open(output_dir / "bootstrap-alternate.json", "w") as fout:
         json.dump(alternate_config, fout, indent=4)
 
     # 3. bootstrap-x509-cacert-only.json (with x509 CA cert for CBS testing)
@@ -205,13 +192,13 @@ def setup_config(server_hostname: str) -> None:
     x509_config["bootstrap"]["server"] = f"couchbases://{server_hostname}"
     x509_config["bootstrap"]["server_tls_skip_verify"] = False
     x509_config["bootstrap"]["ca_cert_path"] = "/home/ec2-user/cert/cbs-ca-cert.pem"
-    with open(SCRIPT_DIR / "bootstrap-x509-cacert-only.json", "w") as fout:
+    with open(output_dir / "bootstrap-x509-cacert-only.json", "w") as fout:
         json.dump(x509_config, fout, indent=4)
 
     # 4. bootstrap-cbs-alternate.json (with custom CBS ports for CBS testing)
     cbs_alternate_config = copy.deepcopy(base_config)
     cbs_alternate_config["bootstrap"]["server"] = f"couchbases://{server_hostname}:11207"
-    with open(SCRIPT_DIR / "bootstrap-cbs-alternate.json", "w") as fout:
+    with open(output_dir / "bootstrap-cbs-alternate.json", "w") as fout:
         json.dump(cbs_alternate_config, fout, indent=4)
 
     with open(SCRIPT_DIR / "start-sgw.sh.in") as file:
@@ -219,7 +206,7 @@ def setup_config(server_hostname: str) -> None:
 
     start_sgw_content = "#!/bin/sh\n\n" + start_sgw_content.replace("{{server-ip}}", server_hostname)
 
-    with open(SCRIPT_DIR / "start-sgw.sh", "w", newline="\n") as file:
+    with open(output_dir / "start-sgw.sh", "w", newline="\n") as file:
         file.write(start_sgw_content)
 
 
@@ -240,7 +227,7 @@ def remote_exec(ssh: paramiko.SSHClient, command: str, desc: str, fail_on_error:
 
     _, stdout, stderr = ssh.exec_command(command, get_pty=True)
     for line in iter(stdout.readline, ""):
-        click.secho(f"[{current_ssh}] {line}", fg=LIGHT_GRAY, nl=False)
+        click.secho(f"[{output_prefix(ssh)}] {line}", fg=LIGHT_GRAY, nl=False)
 
     exit_status = stdout.channel.recv_exit_status()
     if fail_on_error and exit_status != 0:
@@ -266,7 +253,12 @@ def remote_exec_bg(ssh: paramiko.SSHClient, command: str, desc: str) -> None:
     click.echo()
 
 
-def setup_server(hostname: str, pkey: paramiko.Ed25519Key, sgw_info: SgwDownloadInfo) -> None:
+def setup_server(
+    hostname: str,
+    pkey: paramiko.Ed25519Key,
+    sgw_info: SgwDownloadInfo,
+    config_dir: Path = SCRIPT_DIR,
+) -> None:
     """
     Set up a Sync Gateway server on an EC2 instance.
 
@@ -274,20 +266,16 @@ def setup_server(hostname: str, pkey: paramiko.Ed25519Key, sgw_info: SgwDownload
         hostname (str): The hostname or IP address of the EC2 instance.
         pkey (paramiko.Ed25519Key): The private key for SSH access.
         sgw_info (SgwDownloadInfo): The download information for Sync Gateway.
+        config_dir (Path): The directory that setup_config wrote the generated files to.
     """
     if sgw_info.is_release:
         click.echo(f"Setting up server {hostname} with SGW {sgw_info.version}")
     else:
         click.echo(f"Setting up server {hostname} with SGW {sgw_info.version}-{sgw_info.build_no}")
 
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(hostname, username="ec2-user", pkey=pkey)
+    ssh = ssh_pool.get(hostname, pkey)
 
-    global current_ssh
-    current_ssh = hostname
-    sftp = ssh.open_sftp()
-    sftp_progress_bar(sftp, SCRIPT_DIR / "configure-system.sh", "/tmp/configure-system.sh")
+    push_files(ssh, {"/tmp/configure-system.sh": SCRIPT_DIR / "configure-system.sh"})
     remote_exec(ssh, "bash /tmp/configure-system.sh", "Setting up instance")
 
     if sgw_info.is_release:
@@ -298,6 +286,7 @@ def setup_server(hostname: str, pkey: paramiko.Ed25519Key, sgw_info: SgwDownload
             fail_on_error=False,
         )
     else:
+        sftp = ssh.open_sftp()
         try:
             existing_remote = sftp.stat(f"/tmp/{sgw_info.local_filename}")
         except OSError:
@@ -314,43 +303,34 @@ def setup_server(hostname: str, pkey: paramiko.Ed25519Key, sgw_info: SgwDownload
                 SCRIPT_DIR / sgw_info.local_filename,
                 f"/tmp/{sgw_info.local_filename}",
             )
+        sftp.close()
+
+    # All the small files go up in one stream, skipping any that are unchanged
+    files = {
+        "/home/ec2-user/start-sgw.sh": config_dir / "start-sgw.sh",
+        "/home/ec2-user/cert/sg_cert.pem": SCRIPT_DIR / "cert" / "sg_cert.pem",
+        "/home/ec2-user/cert/sg_key.pem": SCRIPT_DIR / "cert" / "sg_key.pem",
+        "/home/ec2-user/Caddyfile": SCRIPT_DIR / "Caddyfile",
+    }
+    for config in [
+        "bootstrap.json",
+        "bootstrap-alternate.json",
+        "bootstrap-x509-cacert-only.json",
+        "bootstrap-cbs-alternate.json",
+    ]:
+        files[f"/home/ec2-user/config/{config}"] = config_dir / config
 
-    sftp_progress_bar(sftp, SCRIPT_DIR / "start-sgw.sh", "/home/ec2-user/start-sgw.sh")
-    sftp_progress_bar(sftp, SCRIPT_DIR / "bootstrap.json", "/home/ec2-user/config/bootstrap.json")
-    sftp_progress_bar(
-        sftp,
-        SCRIPT_DIR / "bootstrap-alternate.json",
-        "/home/ec2-user/config/bootstrap-alternate.json",
-    )
-    sftp_progress_bar(
-        sftp,
-        SCRIPT_DIR / "bootstrap-x509-cacert-only.json",
-        "/home/ec2-user/config/bootstrap-x509-cacert-only.json",
-    )
-    sftp_progress_bar(
-        sftp,
-        SCRIPT_DIR / "bootstrap-cbs-alternate.json",
-        "/home/ec2-user/config/bootstrap-cbs-alternate.json",
-    )
-    sftp_progress_bar(sftp, SCRIPT_DIR / "cert" / "sg_cert.pem", "/home/ec2-user/cert/sg_cert.pem")
-    sftp_progress_bar(sftp, SCRIPT_DIR / "cert" / "sg_key.pem", "/home/ec2-user/cert/sg_key.pem")
-    sftp_progress_bar(sftp, SCRIPT_DIR / "Caddyfile", "/home/ec2-user/Caddyfile")
     for file in (SCRIPT_DIR / "shell2http").iterdir():
-        sftp_progress_bar(sftp, file, f"/home/ec2-user/shell2http/{file.name}")
-    sftp.close()
+        files[f"/home/ec2-user/shell2http/{file.name}"] = file
 
-    # Make shell2http scripts executable
-    remote_exec(
-        ssh,
-        "chmod +x /home/ec2-user/shell2http/*.sh",
-        "Making shell2http scripts executable",
-    )
+    push_files(ssh, files)
 
-    remote_exec(
+    remote_exec_parallel(
         ssh,
-        "sudo rpm -e couchbase-sync-gateway",
-        "Uninstalling Couchbase SGW",
-        fail_on_error=False,
+        [
+            ("chmod +x /home/ec2-user/shell2http/*.sh", "Making shell2http scripts executable"),
+            ("sudo rpm -e couchbase-sync-gateway || true", "Uninstalling Couchbase SGW"),
+        ],
     )
 
     remote_exec(
@@ -367,21 +347,53 @@ def setup_server(hostname: str, pkey: paramiko.Ed25519Key, sgw_info: SgwDownload
     )
     remote_exec(ssh, "bash /home/ec2-user/start-sgw.sh", "Starting SGW")
 
-    ssh.close()
-
 
-def main(topology: TopologyConfig) -> None:
+def main(topology: TopologyConfig, max_workers: int = 8) -> None:
     """
-    Set up the Sync Gateway topology on EC2 instances.
+    Set up the Sync Gateway topology on EC2 instances.  The packages are downloaded
+    concurrently, once per version, and the nodes are then set up concurrently.
 
     Args:
         topology (TopologyConfig): The topology configuration.
+        max_workers (int): The maximum number of nodes to set up at once.
     """
     if len(topology.sync_gateways) == 0:
         return
 
-    for sgw in topology.sync_gateways:
-        sgw_info = SgwDownloadInfo(sgw.version)
-        download_sgw_package(sgw_info)
-        setup_config(sgw.cluster_hostname)
-        setup_server(sgw.hostname, topology.ssh_key, sgw_info)
+    versions = dict.fromkeys(sgw.version for sgw in topology.sync_gateways)
+    sgw_infos = {version: SgwDownloadInfo(version) for version in versions}
+    run_parallel(
+        {
+            f"download {info.version}": partial(download_sgw_package, info)
+            for info in sgw_infos.values()
+            if not info.is_release
+        },
+        max_workers,
+        kind="sgw download",
+    )
+
+    # Each node reads the configs generated for its cluster, so give every cluster
+    # its own directory rather than sharing the files in SCRIPT_DIR
+    with TemporaryDirectory(prefix="sgw-config-") as temp_dir:
+        config_dirs: dict[str, Path] = {}
+        for sgw in topology.sync_gateways:
+            if sgw.cluster_hostname not in config_dirs:
+                config_dir = Path(temp_dir) / str(len(config_dirs))
+                config_dir.mkdir()
+                setup_config(sgw.cluster_hostname, config_dir)
+                config_dirs[sgw.cluster_hostname] = config_dir
+
+        run_parallel(
+            {
+                sgw.hostname: partial(
+                    setup_server,
+                    sgw.hostname,
+                    topology.ssh_key,
+                    sgw_infos[sgw.version],
+                    config_dirs[sgw.cluster_hostname],
+                )
+                for sgw in topology.sync_gateways
+            },
+            max_workers,
+            kind="sgw node",
+        )
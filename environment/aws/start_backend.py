@@ -5,19 +5,23 @@ This module prepares an AWS EC2 environment for running end-to-end (E2E) tests.
 writing TDK configurations, and managing the lifecycle of Couchbase Server, Sync Gateway, and Logslurp instances.
 
 Functions:
-    terraform_apply(public_key_name: str, topology: TopologyConfig) -> None:
-        Apply the Terraform configuration to set up the AWS environment.
+    terraform_variables(topology: TopologyConfig) -> dict[str, str]:
+        Get the Terraform variables for a topology.
+
+    terraform_apply(topology: TopologyConfig) -> bool:
+        Apply the Terraform configuration to set up the AWS environment, unless nothing changed.
 
     write_config(in_config_file: str, topology: TopologyConfig, output: IO[str]) -> None:
         Write the TDK configuration based on the provided topology.
 
-    main(topology: TopologyConfig, public_key_name: str, sgw_url: str, tdk_config_in: str, cbs_version: str = "7.6.4", tdk_config_out: Optional[str] = None) -> None:
+    main(topology: TopologyConfig, tdk_config_in: str, tdk_config_out: Optional[str] = None, steps: BackendSteps = BackendSteps.ALL, max_parallel: int = 8, reuse: bool = False) -> None:
         Main function to set up the AWS environment and run the test servers.
 """
 
 import json
 import subprocess
 import sys
+import time
 from enum import Flag, auto
 from pathlib import Path
 from time import sleep
@@ -33,11 +37,16 @@ if __name__ == "__main__":
     configure_terminal_encoding()
 
 from environment.aws.common.output import header
+from environment.aws.common.ssh import ssh_pool
+from environment.aws.common.task_graph import TaskGraph, task_history
+from environment.aws.common.terraform import record_terraform_apply, terraform_apply_needed, terraform_init
+from environment.aws.common.timings import TimingStore
 from environment.aws.es_setup.setup_edge_servers import main as es_main
 from environment.aws.lb_setup.setup_load_balancers import main as lb_main
 from environment.aws.logslurp_setup.setup_logslurp import main as logslurp_main
 from environment.aws.server_setup.setup_server import main as server_main
 from environment.aws.sgw_setup.setup_sgw import main as sgw_main
+from environment.aws.topology_setup.backend_manifest import BackendManifest, try_reuse_backend
 from environment.aws.topology_setup.setup_topology import TopologyConfig
 from environment.aws.topology_setup.setup_topology import main as topology_main
 
@@ -77,14 +86,37 @@ def topology_has_aws_resources(topology: TopologyConfig) -> bool:
     )
 
 
-def terraform_apply(topology: TopologyConfig) -> None:
+def terraform_variables(topology: TopologyConfig) -> dict[str, str]:
     """
-    Apply the Terraform configuration to set up the AWS environment.
+    Get the Terraform variables for a topology.
+
+    Args:
+        topology (TopologyConfig): The topology configuration.
+
+    Returns:
+        dict[str, str]: The value of each variable.
+    """
+    return {
+        "server_count": str(topology.total_cbs_count),
+        "sgw_count": str(topology.total_sgw_count),
+        "es_count": str(topology.total_es_count),
+        "lb_count": str(topology.total_lb_count),
+        "logslurp": str(topology.wants_logslurp).lower(),
+    }
+
+
+def terraform_apply(topology: TopologyConfig) -> bool:
+    """
+    Apply the Terraform configuration to set up the AWS environment.  If the configuration,
+    the variables and the state are the same as after the last successful apply, init and
+    apply are skipped and the outputs are read straight from the state.
 
     Args:
-        public_key_name (str): The name of the public key stored in AWS.
         topology (TopologyConfig): The topology configuration.
 
+    Returns:
+        bool: True if terraform apply was run.
+
     Raises:
         Exception: If any Terraform command fails.
     """
@@ -92,39 +124,29 @@ def terraform_apply(topology: TopologyConfig) -> None:
     header("Starting terraform apply")
     if not topology_has_aws_resources(topology):
         click.secho("No AWS resources requested, skipping terraform", fg="yellow")
-        return
+        return False
 
-    result = subprocess.run(["terraform", "init"], capture_output=False, text=True, cwd=SCRIPT_DIR)
-    if result.returncode != 0:
-        raise Exception(f"Command 'terraform init' failed with exit status {result.returncode}: {result.stderr}")
-
-    sgw_count = topology.total_sgw_count
-    es_count = topology.total_es_count
-    cbs_count = topology.total_cbs_count
-    lb_count = topology.total_lb_count
-    wants_logslurp = str(topology.wants_logslurp).lower()
-
-    command = [
-        "terraform",
-        "apply",
-        f"-var=server_count={cbs_count}",
-        f"-var=sgw_count={sgw_count}",
-        f"-var=es_count={es_count}",
-        f"-var=lb_count={lb_count}",
-        f"-var=logslurp={wants_logslurp}",
-        "-auto-approve",
-    ]
+    variables = terraform_variables(topology)
+    if not terraform_apply_needed(str(SCRIPT_DIR), variables):
+        click.secho("Terraform inputs and state unchanged since the last apply, skipping init and apply", fg="green")
+        topology.read_from_terraform(str(SCRIPT_DIR))
+        return False
+
+    terraform_init(str(SCRIPT_DIR))
+    command = ["terraform", "apply", *(f"-var={name}={value}" for name, value in variables.items()), "-auto-approve"]
     result = subprocess.run(command, capture_output=False, text=True, cwd=SCRIPT_DIR)
 
     if result.returncode != 0:
         raise Exception(f"Command '{' '.join(command)}' failed with exit status {result.returncode}: {result.stderr}")
 
+    record_terraform_apply(str(SCRIPT_DIR), variables)
     topology.read_from_terraform(str(SCRIPT_DIR))
 
     header("Done, sleeping for 5s")
     # The machines won't be ready immediately, so we need to wait a bit
     # before SSH access succeeds
     sleep(5)
+    return True
 
 
 def write_config(in_config_file: str, topology: TopologyConfig, output: IO[str]) -> None:
@@ -248,7 +270,8 @@ class BackendSteps(Flag):
     LB_PROVISION = auto()
     LS_PROVISION = auto()
     TS_RUN = auto()
-    ALL = TERRAFORM_APPLY | CBS_PROVISION | SGW_PROVISION | ES_PROVISION | LB_PROVISION | LS_PROVISION | TS_RUN
+    PROVISION = TERRAFORM_APPLY | CBS_PROVISION | SGW_PROVISION | ES_PROVISION | LB_PROVISION | LS_PROVISION
+    ALL = PROVISION | TS_RUN
 
 
 def main(
@@ -256,6 +279,8 @@ def main(
     tdk_config_in: str,
     tdk_config_out: str | None = None,
     steps: BackendSteps = BackendSteps.ALL,
+    max_parallel: int = 8,
+    reuse: bool = False,
 ) -> None:
     """
     Main function to set up the AWS environment and run the test servers.
@@ -267,17 +292,29 @@ def main(
         private_key (Optional[str], optional): The private key to use for the SSH connection. Defaults to None.
         tdk_config_out (Optional[str], optional): The path to write the resulting TDK configuration file. Defaults to None.
         steps (BackendSteps, optional): The steps to execute. Defaults to BackendSteps.ALL.
+        max_parallel (int, optional): The maximum number of provisioning tasks (stages, and nodes
+            within a stage) to run at once. Defaults to 8.
+        reuse (bool, optional): Whether to reuse (after a health check and reset) the backend left
+            by a previous run with the same topology, instead of provisioning. Defaults to False.
     """
-    if steps & BackendSteps.TERRAFORM_APPLY:
+    terraform_duration: float | None = None
+    terraform_kind = "terraform apply"
+    start = time.monotonic()
+    reused = reuse and topology_has_aws_resources(topology) and try_reuse_backend(topology)
+    reuse_duration = time.monotonic() - start
+    if reused:
+        steps &= ~BackendSteps.PROVISION
+    elif steps & BackendSteps.TERRAFORM_APPLY:
         if not check_sts_status():
             return
 
-        terraform_apply(topology)
+        start = time.monotonic()
+        applied = terraform_apply(topology)
+        if topology_has_aws_resources(topology):
+            terraform_kind = "terraform apply" if applied else "terraform apply (unchanged)"
+            terraform_duration = time.monotonic() - start
     else:
-        result = subprocess.run(["terraform", "init"], capture_output=False, text=True, cwd=SCRIPT_DIR)
-        if result.returncode != 0:
-            raise Exception(f"Command 'terraform init' failed with exit status {result.returncode}: {result.stderr}")
-
+        terraform_init(str(SCRIPT_DIR))
         click.echo()
         click.secho("Skipping terraform apply...", fg="yellow")
         click.echo()
@@ -290,35 +327,50 @@ def main(
     topology.resolve_test_servers()
     topology.dump()
 
-    if steps & BackendSteps.CBS_PROVISION:
-        server_main(topology)
-    else:
-        click.secho("Skipping Couchbase Server provisioning...", fg="yellow")
-
-    if steps & BackendSteps.SGW_PROVISION:
-        sgw_main(topology)
-    else:
-        click.secho("Skipping Sync Gateway provisioning...", fg="yellow")
-
-    if steps & BackendSteps.ES_PROVISION:
-        es_main(topology)
-    else:
-        click.secho("Skipping Edge Server provisioning...", fg="yellow")
-
-    if steps & BackendSteps.LB_PROVISION:
-        lb_main(topology)
-    else:
-        click.secho("Skipping load balancer provisioning...", fg="yellow")
-
-    if steps & BackendSteps.LS_PROVISION:
-        logslurp_main(topology)
-    else:
-        click.secho("Skipping Logslurp provisioning...", fg="yellow")
-
-    if steps & BackendSteps.TS_RUN:
-        topology_main(topology)
-    else:
-        click.secho("Skipping test server install and run...", fg="yellow")
+    # CBS must be up before SGW bootstraps against it; everything else is independent
+    # and runs alongside it.  Each stage also sets up its own nodes concurrently.
+    graph = TaskGraph(max_parallel)
+    stages = [
+        (BackendSteps.CBS_PROVISION, "cbs", lambda: server_main(topology, max_parallel), [], "Couchbase Server"),
+        (BackendSteps.SGW_PROVISION, "sgw", lambda: sgw_main(topology, max_parallel), ["cbs"], "Sync Gateway"),
+        (BackendSteps.ES_PROVISION, "es", lambda: es_main(topology, max_parallel), [], "Edge Server"),
+        (BackendSteps.LB_PROVISION, "lb", lambda: lb_main(topology), [], "load balancer"),
+        (BackendSteps.LS_PROVISION, "logslurp", lambda: logslurp_main(topology), [], "Logslurp"),
+        (
+            BackendSteps.TS_RUN,
+            "test_servers",
+            lambda: topology_main(topology, max_parallel),
+            [],
+            "test server install and run",
+        ),
+    ]
+    for step, name, fn, deps, desc in stages:
+        if steps & step:
+            graph.add(name, fn, [d for d in deps if d in graph.names])
+        elif step == BackendSteps.TS_RUN:
+            click.secho("Skipping test server install and run...", fg="yellow")
+        else:
+            click.secho(f"Skipping {desc} provisioning...", fg="yellow")
+
+    try:
+        graph.run()
+    finally:
+        ssh_pool.close_all()
+        graph.print_summary()
+
+        # Feed the planner (see plan_backend.py) with how long this run took
+        timings = TimingStore.load()
+        timings.record_results(task_history())
+        if terraform_duration is not None:
+            timings.record(terraform_kind, terraform_duration)
+        if reused:
+            timings.record("backend reuse", reuse_duration)
+
+        timings.save()
+
+    # Record a fully provisioned backend so that a later run can reuse it
+    if (steps & BackendSteps.PROVISION) == BackendSteps.PROVISION and topology_has_aws_resources(topology):
+        BackendManifest.from_topology(topology).save()
 
     if tdk_config_out is not None:
         with open(tdk_config_out, "w") as fout:
@@ -388,6 +440,21 @@ def main(
     help="Skip test server install and run step",
     envvar="TDK_NO_TS_RUN",
 )
+@click.option(
+    "--max-parallel",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="The maximum number of provisioning tasks to run at once",
+    envvar="TDK_MAX_PARALLEL",
+)
+@click.option(
+    "--reuse",
+    type=bool,
+    is_flag=True,
+    help="Reuse the backend from a previous run with the same topology if it is healthy, resetting its state",
+    envvar="TDK_REUSE_BACKEND",
+)
 @click.option(
     "--tdk-config-in",
     required=True,
@@ -405,6 +472,8 @@ def cli_entry(
     no_lb_provision: bool,
     no_ls_provision: bool,
     no_ts_run: bool,
+    max_parallel: int,
+    reuse: bool,
 ) -> None:
     steps = BackendSteps.ALL
     if no_terraform_apply:
@@ -427,6 +496,8 @@ def cli_entry(
         tdk_config_in,
         tdk_config_out,
         steps,
+        max_parallel,
+        reuse,
     )
 
 
@@ -24,7 +24,9 @@ if __name__ == "__main__":
     configure_terminal_encoding()
 
 from environment.aws.common.output import header
+from environment.aws.common.terraform import forget_terraform_apply
 from environment.aws.start_backend import check_sts_status
+from environment.aws.topology_setup.backend_manifest import BackendManifest
 from environment.aws.topology_setup.setup_topology import TopologyConfig
 
 
@@ -152,6 +154,9 @@ def main(topology: str | None, steps: BackendStopSteps, sgw_index: int | None =
     result = None
     if terraform_command:
         header("Starting terraform destroy")
+        # Whatever happens next, the backend is no longer the one recorded for reuse
+        BackendManifest.remove()
+        forget_terraform_apply(str(SCRIPT_DIR))
         result = subprocess.run(terraform_command, cwd=SCRIPT_DIR, capture_output=False, text=True)
         if result.returncode != 0:
             click.secho(
@@ -0,0 +1,307 @@
+"""
+This module lets start_backend.py reuse a backend that an earlier run provisioned, instead of
+reapplying terraform and reprovisioning every node.  After a successful provisioning run a
+manifest describing the backend (versions, node counts and hostnames) is written next to the
+terraform state.  A later run with the same topology health checks every node in parallel
+and resets the state tests leave behind through the Sync Gateway and Couchbase Server REST
+APIs, which takes seconds rather than tens of minutes.
+
+Classes:
+    BackendManifest: The persisted description of a provisioned backend.
+
+Functions:
+    check_health(topology: TopologyConfig, timeout: float = 10.0) -> list[str]:
+        Check every backend node concurrently and describe the ones that are unhealthy.
+
+    reset_backend(topology: TopologyConfig) -> None:
+        Delete Sync Gateway databases and Couchbase Server buckets, then restart Sync Gateway.
+
+    try_reuse_backend(topology: TopologyConfig, manifest_path: Path = MANIFEST_PATH) -> bool:
+        Reuse a matching, healthy backend if there is one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Final
+
+import aiohttp
+import click
+
+from environment.aws.common.output import header
+from environment.aws.common.readiness import wait_until_ready
+from environment.aws.topology_setup.setup_topology import TopologyConfig
+
+MANIFEST_PATH: Final[Path] = Path(__file__).resolve().parents[1] / "backend_manifest.json"
+
+_CBS_AUTH: Final[aiohttp.BasicAuth] = aiohttp.BasicAuth("Administrator", "password")
+_SGW_AUTH: Final[aiohttp.BasicAuth] = aiohttp.BasicAuth("admin", "password")
+
+
+class BackendManifest:
+    """
+    The persisted description of a provisioned backend: the spec it was provisioned for
+    (see TopologyConfig.backend_spec) and the hostnames of its nodes.
+    """
+
+    __version: Final[int] = 1
+
+    @property
+    def spec(self) -> dict[str, Any]:
+        """Gets the backend spec the backend was provisioned for"""
+        return self.__spec
+
+    @property
+    def hosts(self) -> dict[str, Any]:
+        """Gets the hostnames of the backend nodes"""
+        return self.__hosts
+
+    @property
+    def created(self) -> float:
+        """Gets the time the backend was provisioned"""
+        return self.__created
+
+    def __init__(self, spec: dict[str, Any], hosts: dict[str, Any], created: float | None = None) -> None:
+        self.__spec = spec
+        self.__hosts = hosts
+        self.__created = created if created is not None else time.time()
+
+    @staticmethod
+    def from_topology(topology: TopologyConfig) -> BackendManifest:
+        """
+        Describe the backend a topology was just provisioned on.
+
+        Args:
+            topology (TopologyConfig): The provisioned topology.
+
+        Returns:
+            BackendManifest: The manifest for the backend.
+        """
+        return BackendManifest(topology.backend_spec(), topology.backend_hosts())
+
+    @staticmethod
+    def load(path: Path = MANIFEST_PATH) -> BackendManifest | None:
+        """
+        Load a previously saved manifest.
+
+        Args:
+            path (Path): The manifest file.
+
+        Returns:
+            BackendManifest | None: The manifest, or None if there is none (or it is unreadable).
+        """
+        try:
+            with open(path) as f:
+                raw = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        if raw.get("version") != BackendManifest.__version:
+            return None
+
+        return BackendManifest(raw["spec"], raw["hosts"], raw["created"])
+
+    def save(self, path: Path = MANIFEST_PATH) -> None:
+        """
+        Save the manifest, atomically replacing any previous one.
+
+        Args:
+            path (Path): The manifest file.
+        """
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {"version": self.__version, "spec": self.__spec, "hosts": self.__hosts, "created": self.__created},
+                f,
+                indent=2,
+            )
+
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def remove(path: Path = MANIFEST_PATH) -> None:
+        """
+        Remove the manifest, e.g. because the backend was torn down.
+
+        Args:
+            path (Path): The manifest file.
+        """
+        path.unlink(missing_ok=True)
+
+
+async def _check(
+    session: aiohttp.ClientSession, name: str, url: str, auth: aiohttp.BasicAuth | None = None
+) -> str | None:
+    # With credentials the request must succeed; without, any response short of a
+    # server error means the service is up
+    try:
+        async with session.get(url, ssl=False, auth=auth) as resp:
+            if resp.status >= 500 or (auth is not None and resp.status != 200):
+                return f"{name}: {url} returned {resp.status}"
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return f"{name}: {url} unreachable ({type(e).__name__})"
+
+    return None
+
+
+async def _check_cluster(session: aiohttp.ClientSession, index: int, hostname: str, nodes: int) -> str | None:
+    url = f"http://{hostname}:8091/pools/default"
+    try:
+        async with session.get(url, auth=_CBS_AUTH) as resp:
+            if resp.status != 200:
+                return f"cluster {index}: {url} returned {resp.status}"
+
+            body = await resp.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return f"cluster {index}: {url} unreachable ({type(e).__name__})"
+
+    healthy = [n for n in body.get("nodes", []) if n.get("status") == "healthy"]
+    if len(healthy) != nodes:
+        return f"cluster {index}: {len(healthy)} of {nodes} nodes healthy"
+
+    return None
+
+
+async def _check_health(topology: TopologyConfig, timeout: float) -> list[str]:
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        checks = [
+            _check_cluster(session, i, cluster.public_hostnames[0], len(cluster.public_hostnames))
+            for i, cluster in enumerate(topology.clusters)
+        ]
+        checks += [
+            _check(session, f"sgw {sgw.hostname}", f"https://{sgw.hostname}:4985/_all_dbs", auth=_SGW_AUTH)
+            for sgw in topology.sync_gateways
+        ]
+        checks += [
+            _check(session, f"es {es.hostname}", f"https://{es.hostname}:59840/") for es in topology.edge_servers
+        ]
+        checks += [
+            _check(session, f"lb {lb.hostname}", f"https://{lb.hostname}:4984/") for lb in topology.load_balancers
+        ]
+        if topology.logslurp is not None:
+            checks.append(_check(session, "logslurp", f"http://{topology.logslurp}:8180/"))
+
+        results = await asyncio.gather(*checks)
+
+    return [r for r in results if r is not None]
+
+
+def check_health(topology: TopologyConfig, timeout: float = 10.0) -> list[str]:
+    """
+    Check every backend node concurrently: each cluster must report all of its nodes
+    healthy, Sync Gateway must answer its admin API, and the other nodes must respond.
+
+    Args:
+        topology (TopologyConfig): The topology, with hostnames applied.
+        timeout (float): The number of seconds to wait for each node.
+
+    Returns:
+        list[str]: A description of each problem found (empty if the backend is healthy).
+    """
+    return asyncio.run(_check_health(topology, timeout))
+
+
+async def _delete_sgw_databases(session: aiohttp.ClientSession, hostname: str) -> None:
+    async with session.get(f"https://{hostname}:4985/_all_dbs", auth=_SGW_AUTH, ssl=False) as resp:
+        resp.raise_for_status()
+        db_names = await resp.json()
+
+    for db_name in db_names:
+        click.echo(f"[{hostname}] Deleting Sync Gateway database {db_name}")
+        async with session.delete(f"https://{hostname}:4985/{db_name}/", auth=_SGW_AUTH, ssl=False) as resp:
+            # Another Sync Gateway on the same cluster may already have deleted it
+            if resp.status != 404:
+                resp.raise_for_status()
+
+
+async def _drop_buckets(session: aiohttp.ClientSession, hostname: str) -> None:
+    async with session.get(f"http://{hostname}:8091/pools/default/buckets", auth=_CBS_AUTH) as resp:
+        resp.raise_for_status()
+        buckets = await resp.json()
+
+    async def drop(name: str) -> None:
+        click.echo(f"[{hostname}] Dropping bucket {name}")
+        async with session.delete(f"http://{hostname}:8091/pools/default/buckets/{name}", auth=_CBS_AUTH) as resp:
+            if resp.status != 404:
+                resp.raise_for_status()
+
+    await asyncio.gather(*(drop(b["name"]) for b in buckets))
+
+
+async def _restart_sgw(session: aiohttp.ClientSession, hostname: str) -> None:
+    click.echo(f"[{hostname}] Restarting Sync Gateway with the bootstrap config")
+    async with session.post(f"http://{hostname}:20001/restart-sgw", data="bootstrap") as resp:
+        resp.raise_for_status()
+
+    await wait_until_ready(f"https://{hostname}:4984/", timeout=60.0)
+
+
+async def _reset_backend(topology: TopologyConfig) -> None:
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as session:
+        # Databases first, so that Sync Gateway isn't left pointing at dropped buckets
+        await asyncio.gather(*(_delete_sgw_databases(session, sgw.hostname) for sgw in topology.sync_gateways))
+        await asyncio.gather(*(_drop_buckets(session, cluster.public_hostnames[0]) for cluster in topology.clusters))
+        await asyncio.gather(*(_restart_sgw(session, sgw.hostname) for sgw in topology.sync_gateways))
+
+
+def reset_backend(topology: TopologyConfig) -> None:
+    """
+    Reset the state that tests leave behind: delete every Sync Gateway database, drop every
+    Couchbase Server bucket, and restart Sync Gateway with its bootstrap config.  Edge
+    Server databases are restored by the tests themselves, so are left alone.
+
+    Args:
+        topology (TopologyConfig): The topology, with hostnames applied.
+    """
+    asyncio.run(_reset_backend(topology))
+
+
+def try_reuse_backend(topology: TopologyConfig, manifest_path: Path = MANIFEST_PATH) -> bool:
+    """
+    Reuse the backend recorded in the manifest if it was provisioned for the same backend
+    spec as `topology` and is healthy, applying its hostnames to `topology` and resetting
+    its state.
+
+    Args:
+        topology (TopologyConfig): The topology to bring up.
+        manifest_path (Path): The manifest file.
+
+    Returns:
+        bool: True if the backend was reused, False if it needs to be provisioned.
+    """
+    header("Checking for a reusable backend")
+    manifest = BackendManifest.load(manifest_path)
+    if manifest is None:
+        click.secho("No backend manifest found, provisioning from scratch", fg="yellow")
+        return False
+
+    if manifest.spec != topology.backend_spec():
+        click.secho("The existing backend was provisioned for a different topology, reprovisioning", fg="yellow")
+        return False
+
+    start = time.monotonic()
+    topology.apply_backend_hosts(manifest.hosts)
+    problems = check_health(topology)
+    if problems:
+        click.secho("The existing backend is unhealthy, reprovisioning:", fg="yellow")
+        for problem in problems:
+            click.secho(f"\t{problem}", fg="yellow")
+
+        # The hostnames will be read again from terraform
+        topology.clear_backend_hosts()
+        return False
+
+    click.secho(f"Backend healthy after {time.monotonic() - start:.1f}s, resetting state", fg="green")
+    try:
+        reset_backend(topology)
+    except (aiohttp.ClientError, asyncio.TimeoutError, TimeoutError) as e:
+        click.secho(f"Resetting the existing backend failed ({e}), reprovisioning", fg="yellow")
+        topology.clear_backend_hosts()
+        return False
+
+    click.secho(f"Reusing backend provisioned at {time.ctime(manifest.created)}", fg="green")
+    return True
@@ -0,0 +1,123 @@
+"""
+This module computes the keys used to cache test server builds.  A build is identified by
+a hash of its source tree together with the CBL version and the toolchain it was built
+with, so that an unchanged test server is never rebuilt, whether the previous build
+happened on this machine or was published to the remote build cache.
+
+Functions:
+    hash_sources(source_dirs: list[Path]) -> str:
+        Hash the source files in the given directories.
+
+    toolchain_fingerprint(commands: list[list[str]]) -> str:
+        Describe the toolchain by the output of version commands.
+
+    build_cache_enabled() -> bool:
+        Check whether the build cache is enabled (i.e. TDK_BUILD_CACHE is not set to 0).
+"""
+
+import hashlib
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def _list_sources(source_dir: Path) -> list[str] | None:
+    # Ask git for tracked and untracked-but-not-ignored files, so that build outputs,
+    # downloaded libraries and other ignored files don't affect the key
+    try:
+        result = subprocess.run(
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            cwd=source_dir,
+            capture_output=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return sorted({p for p in result.stdout.decode().split("\0") if p})
+
+
+def _hash_entry(source_dir: Path, rel_path: str) -> str:
+    path = source_dir / rel_path
+    if path.is_dir():
+        # A submodule, identified by the commit it is checked out at
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True)
+        return f"submodule:{result.stdout.decode().strip()}"
+
+    if path.is_symlink():
+        return f"symlink:{os.readlink(path)}"
+
+    if not path.exists():
+        # Deleted but not yet staged
+        return "deleted"
+
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def hash_sources(source_dirs: list[Path]) -> str:
+    """
+    Hash the source files in the given directories.  Inside a git checkout only the files
+    git would consider (tracked, or untracked and not ignored) are hashed; otherwise every
+    file is.
+
+    Args:
+        source_dirs (list[Path]): The directories containing the sources.
+
+    Returns:
+        str: The SHA-256 of the relative paths and contents of the source files.
+    """
+    hasher = hashlib.sha256()
+    with ThreadPoolExecutor() as executor:
+        for source_dir in source_dirs:
+            files = _list_sources(source_dir)
+            if files is None:
+                files = sorted(p.relative_to(source_dir).as_posix() for p in source_dir.rglob("*") if p.is_file())
+
+            digests = executor.map(lambda rel_path: _hash_entry(source_dir, rel_path), files)
+            hasher.update(f"{source_dir.name}\n".encode())
+            for rel_path, digest in zip(files, digests):
+                hasher.update(f"{rel_path}\0{digest}\n".encode())
+
+    return hasher.hexdigest()
+
+
+def toolchain_fingerprint(commands: list[list[str]]) -> str:
+    """
+    Describe the toolchain a test server is built with by the output of version commands
+    (e.g. ["cmake", "--version"]).  A missing tool is recorded as such rather than failing,
+    since the build itself will report it.
+
+    Args:
+        commands (list[list[str]]): The commands to run.
+
+    Returns:
+        str: The combined output of the commands.
+    """
+    outputs: list[str] = []
+    for command in commands:
+        try:
+            result = subprocess.run(command, capture_output=True, timeout=60)
+            output = (result.stdout + result.stderr).decode(errors="ignore").strip()
+        except (OSError, subprocess.TimeoutExpired):
+            output = "unavailable"
+
+        outputs.append(f"{' '.join(command)}: {output}")
+
+    return "\n".join(outputs)
+
+
+def build_cache_enabled() -> bool:
+    """
+    Check whether the build cache is enabled.  Setting TDK_BUILD_CACHE=0 always builds
+    from source.
+
+    Returns:
+        bool: True unless the build cache has been disabled.
+    """
+    return os.environ.get("TDK_BUILD_CACHE", "1") != "0"
@@ -3,11 +3,15 @@
 """
 This module builds and optionally uploads Couchbase Lite test servers to the latestbuilds server.
 It includes functions for checking if an upload already exists, compressing the server package, and uploading the package via SFTP.
+Packages that are archives of a directory are compressed straight into the SFTP upload, without an intermediate file.
 
 Functions:
     upload_exists(server: TestServer) -> bool:
         Check if the server package already exists on the latestbuilds server.
 
+    publish_to_build_cache(ssh: paramiko.SSHClient, server: TestServer, remote_path: str) -> None:
+        Copy an uploaded package to its build cache location on the latestbuilds server.
+
     main() -> None:
         Main function to build and optionally upload the Couchbase Lite test server.
 """
@@ -24,14 +28,15 @@ if __name__ == "__main__":
     configure_terminal_encoding()
 
 import os
+import shlex
 from argparse import ArgumentParser
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 
 import click
 import paramiko
 import requests
 
-from environment.aws.common.io import sftp_progress_bar
+from environment.aws.common.io import sftp_progress_bar, sftp_upload_stream
 from environment.aws.common.output import header
 from environment.aws.topology_setup.test_server import TestServer
 
@@ -60,6 +65,27 @@ def upload_exists(server: TestServer) -> bool:
     raise RuntimeError(f"Unexpected status code {response.status_code} from latestbuilds")
 
 
+def publish_to_build_cache(ssh: paramiko.SSHClient, server: TestServer, remote_path: str) -> None:
+    """
+    Copy an uploaded package to its build cache location on the latestbuilds server, so
+    that other machines building the same sources reuse it instead of rebuilding.
+
+    Args:
+        ssh (paramiko.SSHClient): The SSH client connected to the latestbuilds server.
+        server (TestServer): The test server instance.
+        remote_path (str): The path the package was uploaded to.
+    """
+    cache_path = f"/data/builds/latestbuilds/{server.build_cache_path}"
+    header(f"Publishing to build cache {server.build_key()[:12]}")
+    _, stdout, stderr = ssh.exec_command(
+        f"mkdir -p {shlex.quote(str(PurePosixPath(cache_path).parent))} && "
+        f"cp {shlex.quote(remote_path)} {shlex.quote(cache_path)}"
+    )
+    if stdout.channel.recv_exit_status() != 0:
+        # The upload itself succeeded, so this only costs other machines a rebuild
+        click.secho(f"Failed to publish to build cache: {stderr.read().decode()}", fg="yellow")
+
+
 def main() -> None:
     """
     Main function to build and optionally upload the Couchbase Lite test server.
@@ -83,6 +109,11 @@ def main() -> None:
         action="store_true",
         help="Enable CI mode (only build if necessary to upload)",
     )
+    parser.add_argument(
+        "--no-build-cache",
+        action="store_true",
+        help="Always build from source, ignoring (and not publishing to) the build cache",
+    )
 
     args = parser.parse_args()
     server = TestServer.create(args.platform, args.version)
@@ -91,7 +122,9 @@ def main() -> None:
         click.secho("Server already exists on latestbuilds, skipping build", fg="green")
         sys.exit(0)
 
-    server.build()
+    package_path = None if args.no_build_cache else server.cached_build()
+    if args.no_build_cache:
+        server.build()
 
     if not args.ci and not args.upload:
         click.secho("Upload not requested, skipping", fg="yellow")
@@ -105,7 +138,6 @@ def main() -> None:
         click.secho("LATESTBUILDS_PASSWORD env var is not set", fg="red")
         sys.exit(1)
 
-    package_path = Path(server.compress_package())
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     ssh.connect(
@@ -114,13 +146,21 @@ def main() -> None:
         password=os.environ["LATESTBUILDS_PASSWORD"],
     )
 
-    header("Uploading compressed server")
     sftp = ssh.open_sftp()
-    sftp_progress_bar(
-        sftp,
-        package_path,
-        f"/data/builds/latestbuilds/{server.latestbuilds_path}",
-    )
+    remote_path = f"/data/builds/latestbuilds/{server.latestbuilds_path}"
+    if package_path is not None:
+        # Already compressed into (or taken from) the build cache
+        header("Uploading compressed server")
+        sftp_progress_bar(sftp, package_path, remote_path)
+        publish_to_build_cache(ssh, server, remote_path)
+    elif server.package_source() is not None:
+        # Compress straight into the upload rather than to a local file first
+        header("Compressing and uploading server")
+        sftp_upload_stream(sftp, remote_path, server.write_package)
+    else:
+        header("Uploading compressed server")
+        sftp_progress_bar(sftp, Path(server.compress_package()), remote_path)
+
     sftp.close()
 
 
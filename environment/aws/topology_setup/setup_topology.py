@@ -17,18 +17,20 @@ Functions:
         Main function to run the test servers based on the provided topology configuration.
 """
 
+import asyncio
 import io
 import json
+from functools import partial
 from pathlib import Path
-from time import sleep
-from typing import Final, cast
+from typing import Any, Final, cast
 
 import click
-import requests
 from paramiko import Ed25519Key
 
 from environment.aws.common.io import get_ec2_hostname
 from environment.aws.common.output import header
+from environment.aws.common.readiness import wait_until_ready
+from environment.aws.common.task_graph import TaskGraph, set_task_kind
 from environment.aws.common.terraform import get_terraform_json
 from environment.aws.topology_setup.test_server import TestServer
 
@@ -521,6 +523,7 @@ class TopologyConfig:
         self.__edge_server_inputs: list[EdgeServerInput] = []
         self.__test_server_inputs: list[TestServerInput] = []
         self.__test_servers: list[TestServerConfig] = []
+        self.__test_server_startup_times: dict[str, float] = {}
         self.__load_balancers: list[LoadBalancerConfig] = []
         self.__load_balancer_inputs: list[LoadBalancerInput] = []
         self._wants_logslurp: bool | None = None
@@ -638,6 +641,10 @@ class TopologyConfig:
     def test_servers(self) -> list[TestServerConfig]:
         return self.__test_servers
 
+    @property
+    def test_server_inputs(self) -> list[TestServerInput]:
+        return self.__test_server_inputs
+
     @property
     def load_balancers(self) -> list[LoadBalancerConfig]:
         return self.__load_balancers
@@ -690,6 +697,67 @@ class TopologyConfig:
         ssh_key_material = cast(str, all_info["private_key_material"]["value"])
         self.__ssh_key = Ed25519Key.from_private_key(io.StringIO(ssh_key_material))
 
+    def backend_spec(self) -> dict[str, Any]:
+        """
+        Describe the AWS backend this topology asks for (versions, node counts and how
+        the pieces connect), ignoring test servers and hostnames.  Two topologies with
+        the same spec can share a provisioned backend.
+
+        Returns:
+            dict[str, Any]: A JSON serializable description of the backend.
+        """
+        return {
+            "clusters": [{"version": c.version, "nodes": c.server_count} for c in self.__cluster_inputs],
+            "sync_gateways": [{"version": s.version, "cluster": s.cluster_index} for s in self.__sync_gateway_inputs],
+            "edge_servers": [{"version": e.version} for e in self.__edge_server_inputs],
+            "load_balancers": [lb.sync_gateways for lb in self.__load_balancer_inputs],
+            "logslurp": self.wants_logslurp,
+            "tag": self.__tag,
+        }
+
+    def backend_hosts(self) -> dict[str, Any]:
+        """
+        Get the hostnames of the provisioned backend, in the form accepted by
+        apply_backend_hosts.
+
+        Returns:
+            dict[str, Any]: The public and internal hostnames of every backend node.
+        """
+        return {
+            "cbs": [h for c in self.__clusters for h in c.public_hostnames],
+            "cbs_internal": [h for c in self.__clusters for h in c.internal_hostnames],
+            "sgw": [s.hostname for s in self.__sync_gateways],
+            "sgw_internal": [s.internal_hostname for s in self.__sync_gateways],
+            "es": [e.hostname for e in self.__edge_servers],
+            "es_internal": [e.internal_hostname for e in self.__edge_servers],
+            "lb": [lb.hostname for lb in self.__load_balancers],
+            "logslurp": self.__logslurp,
+        }
+
+    def apply_backend_hosts(self, hosts: dict[str, Any]) -> None:
+        """
+        Apply hostnames previously returned by backend_hosts, instead of reading them
+        from terraform.
+
+        Args:
+            hosts (dict[str, Any]): The hostnames of every backend node.
+        """
+        self.apply_server_hostnames(list(hosts["cbs"]), list(hosts["cbs_internal"]))
+        self.apply_sgw_hostnames(list(hosts["sgw"]), list(hosts["sgw_internal"]))
+        self.apply_es_hostnames(list(hosts["es"]), list(hosts["es_internal"]))
+        self.apply_lb_hostnames(list(hosts["lb"]))
+        self.__logslurp = hosts["logslurp"]
+
+    def clear_backend_hosts(self) -> None:
+        """
+        Forget the hostnames applied by apply_backend_hosts or read_from_terraform.
+        """
+        self.__clusters.clear()
+        self.__sync_gateways.clear()
+        self.__edge_servers.clear()
+        self.__load_balancers.clear()
+        self.__logslurp = None
+
     def resolve_test_servers(self) -> None:
         """
         Resolve the IP addresses of the test servers based on their locations.
@@ -707,24 +775,46 @@ class TopologyConfig:
                 )
             )
 
-    def run_test_servers(self) -> None:
+    @property
+    def test_server_startup_times(self) -> dict[str, float]:
         """
-        Run the test servers based on their configurations.
+        The number of seconds each test server (by location) took to respond after being
+        launched, as measured by the last call to run_test_servers
         """
-        for test_server_input in self.__test_server_inputs:
-            test_server = TestServer.create(test_server_input.platform, test_server_input.cbl_version)
+        return self.__test_server_startup_times
+
+    def run_test_servers(self, max_workers: int = 8) -> None:
+        """
+        Run the test servers based on their configurations.  Each distinct test server
+        package is downloaded or built once (builds for the same platform one at a time,
+        since they share an output directory, and unchanged sources are served from the
+        build cache instead of being rebuilt), and every test server using it is then
+        installed, launched and probed concurrently.
+
+        Args:
+            max_workers (int): The maximum number of test servers to bring up at once.
+        """
+        graph = TaskGraph(max_workers)
+        packages: dict[tuple[str, str, bool], list[TestServer]] = {}
+        last_build: dict[str, str] = {}
+        self.__test_server_startup_times.clear()
 
+        def prepare(test_server_input: TestServerInput, package: list[TestServer]) -> None:
+            test_server = TestServer.create(test_server_input.platform, test_server_input.cbl_version)
             if test_server_input.download:
                 test_server.download()
             else:
-                test_server.build()
+                test_server.cached_build()
+                if test_server.downloaded:
+                    set_task_kind(f"build {test_server_input.platform} (cached)")
 
-            bridge = test_server.create_bridge()
+            package.append(test_server)
+
+        def launch(test_server_input: TestServerInput, package: list[TestServer]) -> None:
+            bridge = package[0].create_bridge()
             bridge.validate(test_server_input.location)
             bridge.install(test_server_input.location)
             bridge.run(test_server_input.location)
-            port = 5555 if test_server_input.platform.startswith("dotnet") else 8080
-
             if test_server_input.platform == "js":
                 """Javascript is not just a simple launch, it involves a reverse connection
                 initiation which is too complicated to set up here just to test.  So skip
@@ -732,22 +822,50 @@ class TopologyConfig:
                 click.secho("Skipping connection check for js...", fg="yellow")
                 return
 
+            port = 5555 if test_server_input.platform.startswith("dotnet") else 8080
             ip = bridge.get_ip(test_server_input.location, fallback=test_server_input.ip_hint)
+            try:
+                latency = asyncio.run(wait_until_ready(f"http://{ip}:{port}", timeout=60.0))
+            except TimeoutError as e:
+                raise RuntimeError(f"Test server failed to start at {test_server_input.location}") from e
 
-            success = False
-            for _ in range(30):
-                try:
-                    requests.get(f"http://{ip}:{port}")
-                    success = True
-                except requests.exceptions.ConnectionError:
-                    click.secho(
-                        f"Failed to connect to test server at {ip}:{port}, retrying in 1s...",
-                        fg="yellow",
-                    )
-                    sleep(1)
+            self.__test_server_startup_times[test_server_input.location] = latency
+            click.secho(f"Test server at {test_server_input.location} ready after {latency:.1f}s", fg="green")
+
+        for test_server_input in self.__test_server_inputs:
+            key = (test_server_input.platform, test_server_input.cbl_version, test_server_input.download)
+            prepare_name = f"prepare {test_server_input.platform} {test_server_input.cbl_version}"
+            if test_server_input.download:
+                prepare_name += " (download)"
+
+            if key not in packages:
+                packages[key] = []
+                deps = []
+                if not test_server_input.download:
+                    if test_server_input.platform in last_build:
+                        deps.append(last_build[test_server_input.platform])
+
+                    last_build[test_server_input.platform] = prepare_name
+
+                graph.add(
+                    prepare_name,
+                    partial(prepare, test_server_input, packages[key]),
+                    deps,
+                    kind=f"{'download' if test_server_input.download else 'build'} {test_server_input.platform}",
+                )
+
+            graph.add(
+                f"{test_server_input.platform} @ {test_server_input.location}",
+                partial(launch, test_server_input, packages[key]),
+                [prepare_name],
+                kind=f"launch {test_server_input.platform}",
+            )
 
-            if not success:
-                raise RuntimeError(f"Test server failed to start at {test_server_input.location}")
+        graph.run()
+        if self.__test_server_startup_times:
+            header("Test server startup times")
+            for location, latency in self.__test_server_startup_times.items():
+                click.echo(f"{location}: {latency:.1f}s")
 
     def stop_test_servers(self) -> None:
         """
@@ -888,11 +1006,12 @@ class TopologyConfig:
             click.echo()
 
 
-def main(topology: TopologyConfig) -> None:
+def main(topology: TopologyConfig, max_workers: int = 8) -> None:
     """
     Main function to run the test servers based on the provided topology configuration.
 
     Args:
         topology (TopologyConfig): The topology configuration.
+        max_workers (int): The maximum number of test servers to bring up at once.
     """
-    topology.run_test_servers()
+    topology.run_test_servers(max_workers)
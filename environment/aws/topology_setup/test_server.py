@@ -30,9 +30,21 @@ Functions:
     download(self) -> None:
         Download the test server package from the latestbuilds server.
 
+    cached_build(self) -> Path | None:
+        Build the test server, or reuse a cached package built from identical inputs.
+
+    build_key(self) -> str:
+        Get the hash of the sources, CBL version and toolchain that identifies a build.
+
     compress_package(self) -> str:
         Compress the test server package.
 
+    package_source(self) -> tuple[Path, list[str]] | None:
+        Get the directory the package is an archive of, and the patterns excluded from it.
+
+    write_package(self, output: BinaryIO) -> None:
+        Stream the compressed test server package without an intermediate file.
+
     uncompress_package(self, path: Path) -> None:
         Uncompress the test server package.
 
@@ -42,17 +54,22 @@ Functions:
 
 from __future__ import annotations
 
+import hashlib
 import importlib
+import json
+import shutil
 from abc import ABC, abstractmethod
 from collections.abc import Callable
 from pathlib import Path
-from typing import Any, ClassVar, Final
+from typing import Any, BinaryIO, ClassVar, Final
 
 import click
 import requests
 
-from environment.aws.common.io import download_progress_bar
+from environment.aws.common.artifact_cache import ArtifactCache
+from environment.aws.common.io import tar_directory, zip_directory
 from environment.aws.common.output import header
+from environment.aws.topology_setup.build_cache import build_cache_enabled, hash_sources, toolchain_fingerprint
 from environment.aws.topology_setup.test_server_platforms.platform_bridge import (
     PlatformBridge,
 )
@@ -60,6 +77,10 @@ from environment.aws.topology_setup.test_server_platforms.platform_bridge import
 SCRIPT_DIR = Path(__file__).resolve().parent
 TEST_SERVER_DIR = (SCRIPT_DIR / ".." / ".." / ".." / "servers").resolve()
 DOWNLOADED_TEST_SERVER_DIR = TEST_SERVER_DIR / "downloaded"
+LATESTBUILDS_URL = "https://latestbuilds.service.couchbase.com/builds/latestbuilds"
+# How long to wait for latestbuilds to answer a HEAD request, so that an unreachable
+# server fails the check instead of hanging the run (or a dry-run plan)
+HEAD_TIMEOUT: Final[float] = 10.0
 
 
 class TestServer(ABC):
@@ -91,6 +112,12 @@ class TestServer(ABC):
         download(self) -> None:
             Download the test server package from the latestbuilds server.
 
+        cached_build(self) -> Path | None:
+            Build the test server, or reuse a cached package built from identical inputs.
+
+        build_key(self) -> str:
+            Get the hash of the sources, CBL version and toolchain that identifies a build.
+
         compress_package(self) -> str:
             Compress the test server package.
 
@@ -110,6 +137,7 @@ class TestServer(ABC):
             self.__build_no_cache[self.product] = {}
 
         self.__version = self.__normalize_version(version)
+        self.__build_key: str | None = None
         self._downloaded = False
 
     def __normalize_version(self, version: str) -> str:
@@ -258,26 +286,154 @@ class TestServer(ABC):
         Raises:
             FileNotFoundError: If the test server package is not found on the latestbuilds server.
         """
-        url = f"https://latestbuilds.service.couchbase.com/builds/latestbuilds/{self.latestbuilds_path}"
-        header(f"Downloading {url}")
-        download_dir = DOWNLOADED_TEST_SERVER_DIR / self.platform / self.version
-        download_dir.mkdir(parents=True, exist_ok=True)
-        if (download_dir / ".downloaded").exists():
-            click.secho("Already downloaded", fg="green")
+        url = f"{LATESTBUILDS_URL}/{self.latestbuilds_path}"
+        if self._is_extracted(url):
+            click.secho(f"{url} already downloaded and extracted", fg="green")
             click.echo()
             self._downloaded = True
             return
 
-        response = requests.head(url)
-        if response.status_code == 404:
-            raise FileNotFoundError(f"Test server not found at {url}")
-        response.raise_for_status()
+        # The package itself comes from the shared artifact cache, so only the
+        # extraction is repeated if the download directory was cleaned
+        cache = ArtifactCache.default()
+        if cache.lookup(url) is None:
+            response = requests.head(url, timeout=HEAD_TIMEOUT)
+            if response.status_code == 404:
+                raise FileNotFoundError(f"Test server not found at {url}")
+            response.raise_for_status()
+
+        self._extract_package(url)
+
+    @property
+    def source_dirs(self) -> list[Path]:
+        """
+        Get the directories whose contents determine the build, used to key the build cache.
+        Platforms that return no directories are always built from source.
+        """
+        return []
+
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        """
+        Get the commands whose output identifies the toolchain the test server is built
+        with (e.g. ["cmake", "--version"]), used to key the build cache.
+        """
+        return []
+
+    def build_key(self) -> str:
+        """
+        Get the key that identifies a build of this test server: a hash of its sources,
+        the CBL version and the toolchain.
+
+        Returns:
+            str: The build key.
+        """
+        if self.__build_key is None:
+            inputs = {
+                "platform": self.platform,
+                "version": self.version,
+                "package": self.latestbuilds_path,
+                "toolchain": toolchain_fingerprint(self.toolchain_commands),
+                "sources": hash_sources(self.source_dirs),
+            }
+            self.__build_key = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+        return self.__build_key
+
+    @property
+    def build_cache_path(self) -> str:
+        """
+        Get the path on the latestbuilds server where the package for the current build
+        key is published, so that other machines can reuse it.
+        """
+        name = Path(self.latestbuilds_path).name
+        return f"{self.product}/build-cache/{self.platform}/{self.build_key()}/{name}"
+
+    @property
+    def downloaded(self) -> bool:
+        """
+        Get whether the test server package was downloaded (or restored from the build
+        cache) rather than built.
+        """
+        return self._downloaded
+
+    def cached_build_location(self) -> str | None:
+        """
+        Find out, without fetching anything, where cached_build would find a package for
+        the current build key.
+
+        Returns:
+            str | None: "local" for the local artifact cache, "remote" for the remote build
+                cache, or None if the test server would have to be built.
+        """
+        if not self.source_dirs or not build_cache_enabled():
+            return None
+
+        url = f"{LATESTBUILDS_URL}/{self.build_cache_path}"
+        if ArtifactCache.default().lookup(url) is not None:
+            return "local"
+
+        try:
+            if requests.head(url, timeout=HEAD_TIMEOUT).status_code == 200:
+                return "remote"
+        except requests.RequestException:
+            pass
+
+        return None
+
+    def cached_build(self) -> Path | None:
+        """
+        Build the test server, unless a package built from the same sources, CBL version
+        and toolchain is in the local artifact cache or the remote build cache.  A cached
+        package is extracted as if it had been downloaded, and a fresh build is compressed
+        and added to the local cache.  Set TDK_BUILD_CACHE=0 to always build from source.
+
+        Returns:
+            Path | None: The package for this build (cached or freshly compressed), or None if
+                the build cache is disabled or not supported by the platform.
+        """
+        if not self.source_dirs or not build_cache_enabled():
+            self.build()
+            return None
+
+        url = f"{LATESTBUILDS_URL}/{self.build_cache_path}"
+        cache = ArtifactCache.default()
+        cached = cache.lookup(url)
+        if cached is None:
+            try:
+                if requests.head(url, timeout=HEAD_TIMEOUT).status_code == 200:
+                    cached = cache.fetch(url)
+            except requests.RequestException as e:
+                click.secho(f"Remote build cache unavailable ({e}), building from source", fg="yellow")
+
+        if cached is not None:
+            click.secho(
+                f"Reusing cached {self.platform} {self.version} build {self.build_key()[:12]}",
+                fg="green",
+            )
+            if not self._is_extracted(url):
+                self._extract_package(url)
+
+            self._downloaded = True
+            return cached
+
+        self.build()
+        header(f"Caching {self.platform} {self.version} build {self.build_key()[:12]}")
+        return cache.put(url, Path(self.compress_package()))
+
+    def _is_extracted(self, url: str) -> bool:
+        marker = DOWNLOADED_TEST_SERVER_DIR / self.platform / self.version / ".downloaded"
+        return marker.exists() and marker.read_text().strip() == url
 
-        response = requests.get(url, stream=True)
-        file_path = download_dir / Path(url).name
-        download_progress_bar(response, file_path)
+    def _extract_package(self, url: str) -> None:
+        # The marker records which package was extracted, since a downloaded package and
+        # cached builds of different sources share the same directory
+        download_dir = DOWNLOADED_TEST_SERVER_DIR / self.platform / self.version
+        shutil.rmtree(download_dir, ignore_errors=True)
+        download_dir.mkdir(parents=True, exist_ok=True)
+        file_path = ArtifactCache.default().materialize(url, download_dir / Path(url).name)
         self.uncompress_package(file_path)
-        Path(download_dir / ".downloaded").touch()
+        (download_dir / ".downloaded").write_text(url)
         self._downloaded = True
 
     @abstractmethod
@@ -289,6 +445,38 @@ class TestServer(ABC):
             str: The path to the compressed package.
         """
 
+    def package_source(self) -> tuple[Path, list[str]] | None:
+        """
+        Get the directory that compress_package archives, and the patterns it excludes, so
+        that the package can be streamed by write_package.
+
+        Returns:
+            tuple[Path, list[str]] | None: The directory and exclude patterns, or None if the
+                package is not an archive of a directory (e.g. an .apk or .jar).
+        """
+        return None
+
+    def write_package(self, output: BinaryIO) -> None:
+        """
+        Stream the compressed test server package to `output` as it is being compressed,
+        without an intermediate file.  The archive format follows latestbuilds_path.
+
+        Args:
+            output (BinaryIO): The stream to write the package to.
+
+        Raises:
+            RuntimeError: If the package is not an archive of a directory.
+        """
+        source = self.package_source()
+        if source is None:
+            raise RuntimeError(f"The {self.platform} test server package cannot be streamed")
+
+        publish_dir, excludes = source
+        if self.latestbuilds_path.endswith(".tar.gz"):
+            tar_directory(publish_dir, output, excludes)
+        else:
+            zip_directory(publish_dir, output, excludes)
+
     @abstractmethod
     def uncompress_package(self, path: Path) -> None:
         """
@@ -79,6 +79,14 @@ class CTestServer(TestServer):
     def product(self) -> str:
         return "couchbase-lite-c"
 
+    @property
+    def source_dirs(self) -> list[Path]:
+        return [C_TEST_SERVER_DIR]
+
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        return [["cmake", "--version"]]
+
 
 class CTestServer_Desktop(CTestServer):
     def _download_cbl(self) -> None:
@@ -176,6 +184,10 @@ class CTestServer_iOS(CTestServer):
     def __init__(self, version: str) -> None:
         super().__init__(version)
 
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        return [*super().toolchain_commands, ["xcodebuild", "-version"]]
+
     @property
     def platform(self) -> str:
         """
@@ -292,6 +304,15 @@ class CTestServer_iOS(CTestServer):
             "com.couchbase.CBLTestServer",
         )
 
+    def package_source(self) -> tuple[Path, list[str]]:
+        """
+        Get the directory the test server package is an archive of.
+
+        Returns:
+            tuple[Path, list[str]]: The publish directory, and no exclude patterns.
+        """
+        return IOS_BUILD_DIR / "Build" / "Products" / "Release-iphoneos" / "TestServer.app", []
+
     def compress_package(self) -> str:
         """
         Compress the C test server package.
@@ -300,9 +321,9 @@ class CTestServer_iOS(CTestServer):
             str: The path to the compressed package.
         """
         header(f"Compressing C test server for {self.platform}")
-        publish_dir = IOS_BUILD_DIR / "Build" / "Products" / "Release-iphoneos" / "TestServer.app"
+        publish_dir, excludes = self.package_source()
         zip_path = publish_dir.parents[5] / "testserver_ios.zip"
-        zip_directory(publish_dir, zip_path)
+        zip_directory(publish_dir, zip_path, excludes)
         return str(zip_path)
 
     def uncompress_package(self, path: Path) -> None:
@@ -328,6 +349,10 @@ class CTestServer_Android(CTestServer):
     def __init__(self, version: str) -> None:
         super().__init__(version)
 
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        return [*super().toolchain_commands, ["java", "-version"]]
+
     @property
     def platform(self) -> str:
         """
@@ -509,6 +534,15 @@ class CTestServer_Windows(CTestServer_Desktop):
         )
         return ExeBridge(str(prefix / "testserver.exe"))
 
+    def package_source(self) -> tuple[Path, list[str]]:
+        """
+        Get the directory the test server package is an archive of.
+
+        Returns:
+            tuple[Path, list[str]]: The publish directory, and no exclude patterns.
+        """
+        return C_TEST_SERVER_DIR / "build" / "out" / "bin", []
+
     def compress_package(self) -> str:
         """
         Compress the C test server package.
@@ -517,9 +551,9 @@ class CTestServer_Windows(CTestServer_Desktop):
             str: The path to the compressed package.
         """
         header("Compressing C test server for Windows")
-        publish_dir = C_TEST_SERVER_DIR / "build" / "out" / "bin"
+        publish_dir, excludes = self.package_source()
         zip_path = publish_dir.parents[5] / "testserver_windows.zip"
-        zip_directory(publish_dir, zip_path)
+        zip_directory(publish_dir, zip_path, excludes)
         return str(zip_path)
 
 
@@ -573,6 +607,15 @@ class CTestServer_macOS(CTestServer_Desktop):
         )
         return ExeBridge(str(prefix / "testserver"))
 
+    def package_source(self) -> tuple[Path, list[str]]:
+        """
+        Get the directory the test server package is an archive of.
+
+        Returns:
+            tuple[Path, list[str]]: The publish directory, and no exclude patterns.
+        """
+        return C_TEST_SERVER_DIR / "build" / "out" / "bin", []
+
     def compress_package(self) -> str:
         """
         Compress the C test server package.
@@ -581,9 +624,9 @@ class CTestServer_macOS(CTestServer_Desktop):
             str: The path to the compressed package.
         """
         header("Compressing C test server for macOS")
-        publish_dir = C_TEST_SERVER_DIR / "build" / "out" / "bin"
+        publish_dir, excludes = self.package_source()
         zip_path = publish_dir.parents[5] / "testserver_macos.zip"
-        zip_directory(publish_dir, zip_path)
+        zip_directory(publish_dir, zip_path, excludes)
         return str(zip_path)
 
 
@@ -637,6 +680,15 @@ class CTestServer_Linux(CTestServer_Desktop):
         )
         return ExeBridge(str(prefix / "testserver"))
 
+    def package_source(self) -> tuple[Path, list[str]]:
+        """
+        Get the directory the test server package is an archive of.
+
+        Returns:
+            tuple[Path, list[str]]: The publish directory, and no exclude patterns.
+        """
+        return C_TEST_SERVER_DIR / "build" / "out" / "bin", []
+
     def compress_package(self) -> str:
         """
         Compress the C test server package.
@@ -645,10 +697,10 @@ class CTestServer_Linux(CTestServer_Desktop):
             str: The path to the compressed package.
         """
         header(f"Compressing C test server for {self.platform}")
-        publish_dir = C_TEST_SERVER_DIR / "build" / "out" / "bin"
+        publish_dir, excludes = self.package_source()
 
         tar_path = publish_dir.parents[5] / f"testserver_{self.platform}.tar.gz"
-        tar_directory(publish_dir, tar_path)
+        tar_directory(publish_dir, tar_path, excludes)
         return str(tar_path)
 
     def uncompress_package(self, path: Path) -> None:
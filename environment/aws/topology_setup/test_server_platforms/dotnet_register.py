@@ -80,6 +80,14 @@ class DotnetTestServer(TestServer):
     def __init__(self, version: str) -> None:
         super().__init__(version)
 
+    @property
+    def source_dirs(self) -> list[Path]:
+        return [DOTNET_TEST_SERVER_DIR]
+
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        return [["dotnet", "--version"]]
+
     @property
     @abstractmethod
     def dotnet_framework(self) -> str:
@@ -171,6 +179,14 @@ class DotnetTestServerCli(TestServer):
     def __init__(self, version: str) -> None:
         super().__init__(version)
 
+    @property
+    def source_dirs(self) -> list[Path]:
+        return [DOTNET_TEST_SERVER_DIR]
+
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        return [["dotnet", "--version"]]
+
     @property
     @abstractmethod
     def rid(self) -> str:
@@ -240,6 +256,10 @@ class DotnetTestServer_iOS(DotnetTestServer):
     def __init__(self, version: str) -> None:
         super().__init__(version)
 
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        return [*super().toolchain_commands, ["xcodebuild", "-version"]]
+
     @property
     def platform(self) -> str:
         """
@@ -318,6 +338,18 @@ class DotnetTestServer_iOS(DotnetTestServer):
             "com.couchbase.dotnet.testserver",
         )
 
+    def package_source(self) -> tuple[Path, list[str]]:
+        """
+        Get the directory the test server package is an archive of.
+
+        Returns:
+            tuple[Path, list[str]]: The publish directory, and no exclude patterns.
+        """
+        publish_dir = (
+            DOTNET_TEST_SERVER_DIR / "testserver" / "bin" / "Release" / "net10.0-ios" / "ios-arm64" / "testserver.app"
+        )
+        return publish_dir, []
+
     def compress_package(self) -> str:
         """
         Compress the .NET test server package.
@@ -326,11 +358,9 @@ class DotnetTestServer_iOS(DotnetTestServer):
             str: The path to the compressed package.
         """
         header(f"Compressing .NET test server for {self.platform}")
-        publish_dir = (
-            DOTNET_TEST_SERVER_DIR / "testserver" / "bin" / "Release" / "net10.0-ios" / "ios-arm64" / "testserver.app"
-        )
+        publish_dir, excludes = self.package_source()
         zip_path = publish_dir.parents[5] / "testserver_ios.zip"
-        zip_directory(publish_dir, zip_path)
+        zip_directory(publish_dir, zip_path, excludes)
         return str(zip_path)
 
     def uncompress_package(self, path: Path) -> None:
@@ -510,6 +540,15 @@ class DotnetTestServer_Windows(DotnetTestServerCli):
             ["--silent", "5555"],
         )
 
+    def package_source(self) -> tuple[Path, list[str]]:
+        """
+        Get the directory the test server package is an archive of.
+
+        Returns:
+            tuple[Path, list[str]]: The publish directory, and no exclude patterns.
+        """
+        return DOTNET_TEST_SERVER_DIR / "testserver.cli" / "bin" / "Release" / "net8.0" / "win-x64" / "publish", []
+
     def compress_package(self) -> str:
         """
         Compress the .NET test server package.
@@ -518,9 +557,9 @@ class DotnetTestServer_Windows(DotnetTestServerCli):
             str: The path to the compressed package.
         """
         header(f"Compressing .NET test server for {self.platform}")
-        publish_dir = DOTNET_TEST_SERVER_DIR / "testserver.cli" / "bin" / "Release" / "net8.0" / "win-x64" / "publish"
+        publish_dir, excludes = self.package_source()
         zip_path = publish_dir.parents[5] / "testserver_windows.zip"
-        zip_directory(publish_dir, zip_path)
+        zip_directory(publish_dir, zip_path, excludes)
         return str(zip_path)
 
     def uncompress_package(self, path: Path) -> None:
@@ -546,6 +585,10 @@ class DotnetTestServer_macOS(DotnetTestServer):
     def __init__(self, version: str) -> None:
         super().__init__(version)
 
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        return [*super().toolchain_commands, ["xcodebuild", "-version"]]
+
     @property
     def platform(self) -> str:
         """
@@ -615,16 +658,13 @@ class DotnetTestServer_macOS(DotnetTestServer):
         )
         return macOSBridge(str(prefix / "testserver.app"))
 
-    def compress_package(self) -> str:
+    def package_source(self) -> tuple[Path, list[str]]:
         """
-        Compress the .NET test server package.
+        Get the directory the test server package is an archive of.
 
         Returns:
-            str: The path to the compressed package.
+            tuple[Path, list[str]]: The publish directory, and no exclude patterns.
         """
-
-        # https://github.com/dotnet/macios/issues/21594
-        header(f"Compressing .NET test server for {self.platform}")
         publish_dir = (
             DOTNET_TEST_SERVER_DIR
             / "testserver"
@@ -634,8 +674,21 @@ class DotnetTestServer_macOS(DotnetTestServer):
             / "maccatalyst-x64"
             / "testserver.app"
         )
+        return publish_dir, []
+
+    def compress_package(self) -> str:
+        """
+        Compress the .NET test server package.
+
+        Returns:
+            str: The path to the compressed package.
+        """
+
+        # https://github.com/dotnet/macios/issues/21594
+        header(f"Compressing .NET test server for {self.platform}")
+        publish_dir, excludes = self.package_source()
         zip_path = publish_dir.parents[5] / "testserver_macos.zip"
-        zip_directory(publish_dir, zip_path)
+        zip_directory(publish_dir, zip_path, excludes)
         return str(zip_path)
 
     def uncompress_package(self, path: Path) -> None:
@@ -238,6 +238,14 @@ class JAKTestServer(TestServer):
         super().__init__(version)
         self.__gradle_target = gradle_target
 
+    @property
+    def source_dirs(self) -> list[Path]:
+        return [JAK_TEST_SERVER_DIR]
+
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        return [["java", "-version"]]
+
     def build(self) -> None:
         """
         Build the JAK test server.
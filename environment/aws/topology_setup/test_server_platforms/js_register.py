@@ -163,15 +163,15 @@ class JavascriptTestServer(TestServer):
         click.echo("Installing dependencies")
         subprocess.run(["bun", "install"], check=True, cwd=working_dir)
 
+    def package_source(self) -> tuple[Path, list[str]]:
+        return JS_TEST_SERVER_DIR, [f"{ZIP_FOLDER_NAME}/**", ".gitignore", "bun.lock*"]
+
     def compress_package(self) -> str:
         header(f"Compressing JS test server for {self.platform}")
         ZIP_DIR.mkdir(parents=True, exist_ok=True)
         zip_path = ZIP_DIR / "testserver.zip"
-        zip_directory(
-            JS_TEST_SERVER_DIR,
-            zip_path,
-            excludes=[f"{ZIP_FOLDER_NAME}/**", ".gitignore", "bun.lock*"],
-        )
+        publish_dir, excludes = self.package_source()
+        zip_directory(publish_dir, zip_path, excludes=excludes)
         return str(zip_path)
 
     def uncompress_package(self, path: Path) -> None:
@@ -63,6 +63,14 @@ class SwiftTestServer(TestServer):
     def product(self) -> str:
         return "couchbase-lite-ios"
 
+    @property
+    def source_dirs(self) -> list[Path]:
+        return [SWIFT_TEST_SERVER_DIR]
+
+    @property
+    def toolchain_commands(self) -> list[list[str]]:
+        return [["xcodebuild", "-version"]]
+
     def cbl_filename(self, version: str) -> str:
         return f"couchbase-lite-swift_xc_enterprise_{version}.zip"
 
@@ -184,6 +192,15 @@ class SwiftTestServer_iOS(SwiftTestServer):
             "com.couchbase.ios.testserver",
         )
 
+    def package_source(self) -> tuple[Path, list[str]]:
+        """
+        Get the directory the test server package is an archive of.
+
+        Returns:
+            tuple[Path, list[str]]: The publish directory, and no exclude patterns.
+        """
+        return BUILD_DEVICE_DIR / "Build" / "Products" / "Release-iphoneos" / "TestServer-iOS.app", []
+
     def compress_package(self) -> str:
         """
         Compress the Swift test server package.
@@ -192,9 +209,9 @@ class SwiftTestServer_iOS(SwiftTestServer):
             str: The path to the compressed package.
         """
         header("Compressing Swift test server for iOS")
-        publish_dir = BUILD_DEVICE_DIR / "Build" / "Products" / "Release-iphoneos" / "TestServer-iOS.app"
+        publish_dir, excludes = self.package_source()
         zip_path = publish_dir.parents[5] / "testserver_ios.zip"
-        zip_directory(publish_dir, zip_path)
+        zip_directory(publish_dir, zip_path, excludes)
         return str(zip_path)
 
     def uncompress_package(self, path: Path) -> None:
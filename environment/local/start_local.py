@@ -5,13 +5,17 @@
 # independently, e.g. to iterate on Sync Gateway without rebuilding/restarting the test
 # server.
 #
+# The stages run as a dependency graph, so e.g. Sync Gateway is started as soon as it is
+# built (and Couchbase Server is up) while the test server is still downloading. With
+# --reuse, stages whose processes are already running and healthy are skipped.
+#
 # Usage::
 #
 #   uv run environment/local/start_local.py --server rosmar
 #   cd tests/dev_e2e
 #   uv run pytest --config "$(cat ../../environment/local/topology_config)"
 #
-import concurrent.futures
+import asyncio
 import json
 import os
 import pathlib
@@ -23,6 +27,7 @@ from collections.abc import Callable
 from typing import Any
 from urllib.parse import urlsplit
 
+import aiohttp
 import click
 import requests
 from cbltest.configparser import CouchbaseServerInfo
@@ -33,6 +38,8 @@ if __name__ == "__main__":
     sys.path.append(str(SCRIPT_DIR.parent.parent))
 
 from environment.aws import download_tool
+from environment.aws.common.readiness import wait_until_ready
+from environment.aws.common.task_graph import TaskGraph
 from environment.aws.topology_setup import setup_topology
 from environment.aws.topology_setup.test_server_platforms.exe_bridge import ExeBridge
 
@@ -48,6 +55,8 @@ TEST_CONFIG = {
     "rosmar": TOPOLOGY_CONFIG_DIR / "rosmar_config.json",
     "cbs": TOPOLOGY_CONFIG_DIR / "cbs_config.json",
 }
+TEST_SERVER_URL = "http://localhost:8080/"
+SYNC_GATEWAY_URL = "http://localhost:4984/"
 
 
 @click.command()
@@ -115,6 +124,12 @@ TEST_CONFIG = {
     is_flag=True,
     help="Stop the running Sync Gateway process and exit, skipping all other stages.",
 )
+@click.option(
+    "--reuse",
+    is_flag=True,
+    help="Skip the test server and Sync Gateway stages if their processes are already running and "
+    "healthy (assumes they were started with the same options).",
+)
 def main(
     server: str,
     connstr: str | None,
@@ -128,6 +143,7 @@ def main(
     skip_sync_gateway_build: bool,
     skip_sync_gateway_start: bool,
     stop_sync_gateway: bool,
+    reuse: bool,
 ) -> None:
     if stop_sync_gateway:
         ExeBridge(
@@ -168,34 +184,85 @@ def main(
             "integration-test/start_cbs.py in the checkout)."
         )
 
+    if reuse:
+        running = probe_running_services()
+        if running["test server"]:
+            click.secho("Test server already running, reusing it", fg="green")
+            skip_testserver = True
+        if running["sync gateway"]:
+            click.secho("Sync Gateway already running, reusing it", fg="green")
+            skip_sync_gateway_build = skip_sync_gateway_start = True
+
     repo_dir = None
     if not skip_sync_gateway_build or start_cbs:
         repo_dir = resolve_sync_gateway_repo_dir(repo_path, git_tag)
 
-    cbs_future = None
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        futures = []
-        if not skip_testserver:
-            futures.append(executor.submit(run_test_server, build_testserver))
-        if not skip_sync_gateway_build:
-            assert repo_dir is not None
-            futures.append(executor.submit(build_sync_gateway, repo_dir))
-        if start_cbs:
-            assert repo_dir is not None
-            cbs_future = executor.submit(start_cbs_cluster, repo_dir)
-            futures.append(cbs_future)
-        for future in futures:
-            future.result()
-
-    if cbs_future:
-        connstr = cbs_future.result()
+    # Sync Gateway waits for its binary and for Couchbase Server, but not for the test
+    # server, which is usually the slowest stage
+    graph = TaskGraph()
+    sgw_config_path: list[str] = []
+
+    def cbs_stage() -> None:
+        nonlocal connstr
+        assert repo_dir is not None
+        connstr = start_cbs_cluster(repo_dir)
+
+    def sgw_config_stage() -> None:
+        sgw_config_path.append(resolve_sync_gateway_config(server, connstr, admin_user, admin_password))
 
+    def sgw_start_stage() -> None:
+        start_sync_gateway(sgw_config_path[0])
+        latency = asyncio.run(wait_until_ready(SYNC_GATEWAY_URL, timeout=60.0))
+        click.secho(f"Sync Gateway ready after {latency:.1f}s", fg="green")
+
+    def topology_config_stage() -> None:
+        topology_config_path = resolve_topology_config(server, connstr, admin_user, admin_password)
+        TOPOLOGY_CONFIG_OUTPUT.write_text(str(topology_config_path))
+        click.echo(f"Topology config for pytest ({topology_config_path}) written to {TOPOLOGY_CONFIG_OUTPUT}")
+
+    if not skip_testserver:
+        graph.add("test server", lambda: run_test_server(build_testserver))
+    if start_cbs:
+        graph.add("couchbase server", cbs_stage)
+    if not skip_sync_gateway_build:
+        assert repo_dir is not None
+        graph.add("sync gateway build", lambda: build_sync_gateway(repo_dir))
+    cbs_deps = [name for name in ("couchbase server",) if name in graph.names]
     if not skip_sync_gateway_start:
-        start_sync_gateway(server, connstr, admin_user, admin_password)
+        graph.add("sync gateway config", sgw_config_stage, cbs_deps)
+        graph.add(
+            "sync gateway start",
+            sgw_start_stage,
+            [name for name in ("sync gateway build", "sync gateway config") if name in graph.names],
+        )
+    graph.add("topology config", topology_config_stage, cbs_deps)
 
-    topology_config_path = resolve_topology_config(server, connstr, admin_user, admin_password)
-    TOPOLOGY_CONFIG_OUTPUT.write_text(str(topology_config_path))
-    click.echo(f"Topology config for pytest ({topology_config_path}) written to {TOPOLOGY_CONFIG_OUTPUT}")
+    try:
+        graph.run()
+    finally:
+        graph.print_summary()
+
+
+async def _is_healthy(session: aiohttp.ClientSession, url: str) -> bool:
+    try:
+        async with session.get(url):
+            return True
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return False
+
+
+async def _probe_running_services() -> dict[str, bool]:
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
+        test_server, sync_gateway = await asyncio.gather(
+            _is_healthy(session, TEST_SERVER_URL), _is_healthy(session, SYNC_GATEWAY_URL)
+        )
+
+    return {"test server": test_server, "sync gateway": sync_gateway}
+
+
+def probe_running_services() -> dict[str, bool]:
+    """Check concurrently whether the local test server and Sync Gateway are already running and responding."""
+    return asyncio.run(_probe_running_services())
 
 
 def _connstr_hosts(connstr: str) -> list[str]:
@@ -334,15 +401,23 @@ def parse_hostname(connstr: str) -> str:
     return _connstr_hosts(connstr)[0].split(":")[0]
 
 
+async def _get_cbs_version(hostname: str, admin_user: str, admin_password: str) -> str:
+    url = f"http://{hostname}:8091/pools"
+    # A freshly started cluster may not be listening yet, so back off until it is
+    await wait_until_ready(url, timeout=120.0)
+    async with (
+        aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session,
+        session.get(url, auth=aiohttp.BasicAuth(admin_user, admin_password)) as resp,
+    ):
+        resp.raise_for_status()
+        body = await resp.json()
+
+    return body["implementationVersion"].split("-")[0]
+
+
 def get_cbs_version(hostname: str, admin_user: str, admin_password: str) -> str:
-    """Query the given Couchbase Server instance for its release version."""
-    r = requests.get(
-        f"http://{hostname}:8091/pools",
-        auth=(admin_user, admin_password),
-        timeout=10,
-    )
-    r.raise_for_status()
-    return r.json()["implementationVersion"].split("-")[0]
+    """Query the given Couchbase Server instance for its release version, waiting for it to come up."""
+    return asyncio.run(_get_cbs_version(hostname, admin_user, admin_password))
 
 
 def _write_patched_json(
@@ -394,9 +469,8 @@ def resolve_sync_gateway_config(server: str, connstr: str | None, admin_user: st
     return config_path
 
 
-def start_sync_gateway(server: str, connstr: str | None, admin_user: str, admin_password: str) -> None:
-    """Stop any running sync_gateway process and start a new one for the given server type."""
-    config_path = resolve_sync_gateway_config(server, connstr, admin_user, admin_password)
+def start_sync_gateway(config_path: str) -> None:
+    """Stop any running sync_gateway process and start a new one with the given config."""
     bridge = ExeBridge(
         exe_path=str(SYNC_GATEWAY_BIN),
         extra_args=[config_path],
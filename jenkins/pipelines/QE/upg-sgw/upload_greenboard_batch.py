@@ -37,7 +37,10 @@ def cli_entry(config_path: str, results_file: str) -> None:
         return
 
     uploader = GreenboardUploader(gb["hostname"], gb["username"], gb["password"])
-    uploader.upload_upgrade_batch(results_file)
+    try:
+        uploader.upload_upgrade_batch(results_file)
+    finally:
+        uploader.close()
 
 
 if __name__ == "__main__":